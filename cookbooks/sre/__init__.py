@@ -3,20 +3,28 @@
 from abc import abstractmethod, ABCMeta
 from argparse import ArgumentParser, ArgumentTypeError, Namespace, SUPPRESS
 from collections import defaultdict
-from dataclasses import dataclass, field
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
 from datetime import datetime, timedelta, timezone
+import json
 from logging import getLogger
 from math import ceil
+import threading
 import time
 from typing import Optional, Union
 
 from cumin import nodeset, NodeSet, nodeset_fromlist
+from prettytable import PrettyTable
+from requests import RequestException, Session
 from spicerack import Spicerack
 from spicerack.administrative import Reason
 from spicerack.cookbook import CookbookBase, CookbookRunnerBase
 from spicerack.icinga import IcingaError
 from spicerack.service import TooManyDiscoveryRecordsError
 from spicerack.remote import RemoteHosts
+from wmflib import interactive
 from wmflib.interactive import (
     ask_confirmation,
     confirm_on_failure,
@@ -27,6 +35,8 @@ from wmflib.interactive import (
 
 # Shared SRE configuration for phabricator bot
 PHABRICATOR_BOT_CONFIG_FILE = "/etc/phabricator_ops-monitoring-bot.conf"
+HTTP_CHECKS_MAX_WORKERS = 16
+"""The maximum number of hosts to run the HTTP checks on at the same time."""
 logger = getLogger(__name__)
 
 
@@ -67,6 +77,11 @@ class Results:
             raise ValueError(f"hosts already recorded failed: {intersection}")
         self.successful.update(nodes)
 
+    def update(self, other: "Results") -> None:
+        """Add the successful and failed nodes of the results of a subset of the hosts."""
+        self.success(other.successful)
+        self.fail(other.failed)
+
     def report(self) -> int:
         """Report on results."""
         if not self.failed:
@@ -83,6 +98,263 @@ class Results:
         return 1
 
 
+@contextmanager
+def serialized_prompts() -> Iterator[None]:
+    """Context manager to let the operator answer one interactive prompt at a time, also from multiple threads.
+
+    The wmflib.interactive functions like confirm_on_failure() look up ask_input() at call time, so wrapping it with a
+    lock prevents the prompts of concurrent threads from interleaving on the terminal.
+    """
+    ask_input = interactive.ask_input
+    lock = threading.Lock()
+
+    def locked_ask_input(*args, **kwargs):
+        with lock:
+            return ask_input(*args, **kwargs)
+
+    interactive.ask_input = locked_ask_input
+    try:
+        yield
+    finally:
+        interactive.ask_input = ask_input
+
+
+@dataclass(frozen=True)
+class HTTPCheck:
+    """An HTTP(S) check to run on each host, by default expecting a 200 response."""
+
+    url: str
+    """The URL to request, with a {host} placeholder for the FQDN of each host, e.g. http://{host}/."""
+    expected_status: tuple[int, ...] = (200,)
+    expected_reason: Optional[str] = None
+    """The expected HTTP reason phrase, if it matters to tell apart different servers."""
+    headers: dict[str, str] = field(default_factory=dict)
+    method: str = "HEAD"
+    timeout: float = 5.0
+    """The timeout in seconds of the request to each host."""
+
+
+@dataclass
+class HTTPCheckResult:
+    """The result of an HTTPCheck on a single host, as of its last attempt."""
+
+    host: str
+    attempts: int = 0
+    status: Optional[int] = None
+    error: str = ""
+    duration: float = 0.0
+
+    @property
+    def passed(self) -> bool:
+        """Whether the last attempt returned one of the expected statuses."""
+        return not self.error
+
+
+def run_http_checks(session: Session, hosts: NodeSet, check: HTTPCheck, *, attempts: int = 3,
+                    delay: Union[int, float] = 5) -> dict[str, HTTPCheckResult]:
+    """Run an HTTP check on all the hosts concurrently, retrying only the failed ones.
+
+    It returns as soon as the check passed on every host, logging a table with the result of each host.
+
+    Arguments:
+        session: the requests session to use.
+        hosts: the hosts to check.
+        check: the check to run.
+        attempts: the maximum number of attempts for each host.
+        delay: the seconds to wait before retrying the failed hosts.
+
+    Returns:
+        The result of each host.
+
+    """
+    results = {host: HTTPCheckResult(host) for host in hosts}
+
+    def check_host(host: str) -> None:
+        result = results[host]
+        result.attempts += 1
+        start = time.monotonic()
+        try:
+            response = session.request(check.method, check.url.format(host=host), headers=check.headers,
+                                       timeout=check.timeout, allow_redirects=False)
+            result.status, result.error = response.status_code, ""
+            if (response.status_code not in check.expected_status
+                    or (check.expected_reason is not None and response.reason != check.expected_reason)):
+                result.error = f"unexpected status {response.status_code} {response.reason}"
+        except RequestException as error:
+            result.status, result.error = None, str(error)
+        result.duration = time.monotonic() - start
+
+    pending = list(results)
+    for attempt in range(1, attempts + 1):
+        with ThreadPoolExecutor(max_workers=min(HTTP_CHECKS_MAX_WORKERS, len(pending))) as executor:
+            list(executor.map(check_host, pending))
+        pending = [host for host in pending if not results[host].passed]
+        if not pending:
+            break
+        if attempt < attempts:
+            logger.info("HTTP check %s failed on %d host(s), retrying them in %ss: %s",
+                        check.url, len(pending), delay, ",".join(pending))
+            time.sleep(delay)
+
+    table = PrettyTable(["Host", "Result", "Status", "Attempts", "Time"])
+    for result in results.values():
+        table.add_row([result.host, "OK" if result.passed else f"FAIL ({result.error})", result.status or "-",
+                       result.attempts, f"{result.duration:.2f}s"])
+    logger.info("HTTP check %s results:\n%s", check.url, table)
+    return results
+
+
+@dataclass(frozen=True)
+class Stage:
+    """A completed stage of a cookbook run, as recorded by a StageTimeline."""
+
+    name: str
+    start: float
+    """The seconds elapsed since the start of the timeline when the stage started."""
+    duration: float
+    hosts: str = ""
+    wait: bool = False
+    """Whether the stage was spent waiting (sleeps, polling, waiting for reboots) rather than acting."""
+    parent: str = ""
+    """The name of the stage this one was nested in, if any."""
+    failed: bool = False
+
+
+class StageTimeline:
+    """Record the stages of a cookbook run, to find out which ones dominate its wall-clock time.
+
+    Stages are recorded with the :py:meth:`stage` context manager and can be nested, also from multiple threads.
+    At the end of the run :py:meth:`report` logs a summary by stage name, with how much time was spent waiting
+    rather than acting on the hosts, and the full timeline as JSON at debug level.
+
+    Examples:
+        ::
+
+            timeline = StageTimeline("rolling reboot")
+            with timeline.stage("reboot", hosts):
+                hosts.reboot()
+            with timeline.stage("wait reboot", hosts, wait=True):
+                hosts.wait_reboot_since(reboot_time)
+            timeline.report()
+
+    """
+
+    def __init__(self, name: str) -> None:
+        """Initialize the timeline, starting its clock.
+
+        Arguments:
+            name: a description of the run, included in the report.
+
+        """
+        self.name = name
+        self.stages: list[Stage] = []
+        self._started = datetime.now(timezone.utc)
+        self._origin = time.monotonic()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._wait_seconds = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        """The seconds elapsed since the timeline was started."""
+        return time.monotonic() - self._origin
+
+    @contextmanager
+    def stage(self, name: str, hosts: Union[NodeSet, RemoteHosts, str, None] = None, *,
+              wait: bool = False) -> Iterator[None]:
+        """Context manager to record a stage, also when it raises.
+
+        Arguments:
+            name: the name of the stage, stages with the same name are aggregated in the summary.
+            hosts: the hosts the stage acted on, if any.
+            wait: whether the stage is spent waiting rather than acting.
+
+        """
+        stack = self._local.__dict__.setdefault("stack", [])
+        parent, in_wait = stack[-1] if stack else ("", False)
+        stack.append((name, wait or in_wait))
+        start = time.monotonic()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            stack.pop()
+            self.add(name, start, hosts, wait=wait, parent=parent, failed=failed, count_wait=wait and not in_wait)
+
+    def add(self, name: str, start: float, hosts: Union[NodeSet, RemoteHosts, str, None] = None, *,
+            wait: bool = False, parent: str = "", failed: bool = False, count_wait: Optional[bool] = None) -> Stage:
+        """Record a stage that started at the given time and ended now.
+
+        Arguments:
+            name: the name of the stage.
+            start: when the stage started, as returned by :py:func:`time.monotonic`.
+            hosts: the hosts the stage acted on, if any.
+            wait: whether the stage was spent waiting rather than acting.
+            parent: the name of the stage this one was nested in, if any.
+            failed: whether the stage raised.
+            count_wait: whether to include the stage in the total waiting time, defaults to ``wait``. Waits nested
+                in other waits are recorded but not counted twice.
+
+        Returns:
+            The recorded stage.
+
+        """
+        end = time.monotonic()
+        if isinstance(hosts, RemoteHosts):
+            hosts = hosts.hosts
+        recorded = Stage(name=name, start=start - self._origin, duration=end - start,
+                         hosts=str(hosts) if hosts is not None else "", wait=wait, parent=parent, failed=failed)
+        with self._lock:
+            self.stages.append(recorded)
+            if wait if count_wait is None else count_wait:
+                self._wait_seconds += recorded.duration
+
+        return recorded
+
+    def summary(self) -> str:
+        """Return a table of the recorded stages aggregated by name, the most expensive first."""
+        totals: dict[str, list[Stage]] = defaultdict(list)
+        for recorded in self.stages:
+            totals[recorded.name].append(recorded)
+
+        table = PrettyTable(["Stage", "Count", "Total", "Mean", "Max", "Type"])
+        table.align = "l"
+        for name, stages in sorted(totals.items(), key=lambda item: -sum(s.duration for s in item[1])):
+            durations = [recorded.duration for recorded in stages]
+            table.add_row([
+                name,
+                len(stages),
+                f"{sum(durations):.1f}s",
+                f"{sum(durations) / len(durations):.1f}s",
+                f"{max(durations):.1f}s",
+                "wait" if stages[0].wait else "work",
+            ])
+
+        elapsed = self.elapsed
+        waiting = min(self._wait_seconds, elapsed)
+        return (f"{self.name} took {elapsed:.1f}s, of which {waiting:.1f}s "
+                f"({waiting / elapsed if elapsed else 0:.0%}) waiting:\n{table}")
+
+    def to_json(self) -> str:
+        """Return the full timeline as a JSON document."""
+        return json.dumps({
+            "name": self.name,
+            "started": self._started.isoformat(),
+            "elapsed": self.elapsed,
+            "waiting": self._wait_seconds,
+            "stages": [asdict(recorded) for recorded in self.stages],
+        })
+
+    def report(self) -> None:
+        """Log the summary of the recorded stages and, at debug level, the JSON timeline."""
+        if not self.stages:
+            return
+
+        logger.info("Stage timings: %s", self.summary())
+        logger.debug("Stage timeline: %s", self.to_json())
+
+
 class SREBatchBase(CookbookBase, metaclass=ABCMeta):
     """Common Reboot class CookbookBase class
 
@@ -97,6 +369,9 @@ class SREBatchBase(CookbookBase, metaclass=ABCMeta):
     min_grace_sleep = 1
     max_failed = 1
     valid_actions: tuple[str, ...] = ("reboot", "restart_daemons")
+    supports_concurrent_groups = False
+    """Whether to add the --concurrent-groups option. Set it only when the runner keeps its per-batch state per
+    thread, as the batches of the concurrent groups are run by the same runner instance."""
 
     def argument_parser(self) -> ArgumentParser:
         """Parse arguments"""
@@ -148,6 +423,15 @@ class SREBatchBase(CookbookBase, metaclass=ABCMeta):
             default=self.grace_sleep,
             help="the amount of time to sleep in seconds between each batch",
         )
+        if self.supports_concurrent_groups:
+            parser.add_argument(
+                "--concurrent-groups",
+                action="store_true",
+                help=(
+                    "split the hosts in independent groups, by default one per datacenter, and run the batches of "
+                    "each group concurrently, each with its own --max-failed and grace sleep"
+                ),
+            )
         act = parser.add_argument(
             "action",
             choices=self.valid_actions,
@@ -200,14 +484,22 @@ class SREBatchRunnerBase(CookbookRunnerBase, metaclass=ABCMeta):
         self._args = args
         self._spicerack = spicerack
         self.logger = getLogger(".".join((self.__module__, self.__class__.__name__)))
+        self.timeline = StageTimeline(f"rolling {args.action}")
         self.host_groups = self._hosts()
         self.all_hosts = nodeset_fromlist(group.hosts for group in self.host_groups)
-        self.results = Results(action=args.action, hosts=self.all_hosts)
+        self._results = Results(action=args.action, hosts=self.all_hosts)
+        self._local = threading.local()
+        self._http_checks_session: Optional[Session] = None
         try:
             self._action_method = getattr(self, f"_{args.action}_action")
         except AttributeError as error:
             raise RuntimeError(f"Invalid action ({args.action})") from error
 
+    @property
+    def results(self) -> Results:
+        """The results of the concurrent group the current thread is running, of all the hosts otherwise."""
+        return getattr(self._local, "results", self._results)
+
     def _reason(self, hosts: NodeSet) -> Reason:
         """Return the reason for administrative actions on given hosts"""
         reason = f"{self._args.action} {hosts}: {self._args.reason}"
@@ -238,6 +530,14 @@ class SREBatchRunnerBase(CookbookRunnerBase, metaclass=ABCMeta):
         """Property to return a list of daemons to restart"""
         return []
 
+    @property
+    def upgrade_packages(self) -> list:
+        """Property to return a list of packages, optionally as package=version, installed by the upgrade action
+
+        When not empty the packages are downloaded on all the hosts before the rolling upgrade starts.
+        """
+        return []
+
     @property
     @abstractmethod
     def allowed_aliases(self) -> list:
@@ -297,10 +597,11 @@ class SREBatchRunnerBase(CookbookRunnerBase, metaclass=ABCMeta):
 
         puppet = self._spicerack.puppet(hosts)
         if self.disable_puppet_on_restart:
-            with puppet.disabled(reason):
+            with puppet.disabled(reason), self.timeline.stage("restart daemons", hosts):
                 confirm_on_failure(hosts.run_sync, *restart_cmds)
         else:
-            confirm_on_failure(hosts.run_sync, *restart_cmds)
+            with self.timeline.stage("restart daemons", hosts):
+                confirm_on_failure(hosts.run_sync, *restart_cmds)
 
     def _reboot_action(self, hosts: RemoteHosts, reason: Reason) -> None:
         """Reboot a set of hosts with downtime
@@ -318,14 +619,20 @@ class SREBatchRunnerBase(CookbookRunnerBase, metaclass=ABCMeta):
         if not self._spicerack.dry_run:
             if self.disable_puppet_on_reboot:
                 with puppet.disabled(reason):
-                    confirm_on_failure(hosts.reboot, batch_size=len(hosts))
-                    hosts.wait_reboot_since(reboot_time, print_progress_bars=False)
-                confirm_on_failure(puppet.run, quiet=True)
+                    with self.timeline.stage("reboot", hosts):
+                        confirm_on_failure(hosts.reboot, batch_size=len(hosts))
+                    with self.timeline.stage("wait reboot", hosts, wait=True):
+                        hosts.wait_reboot_since(reboot_time, print_progress_bars=False)
+                with self.timeline.stage("puppet run", hosts):
+                    confirm_on_failure(puppet.run, quiet=True)
 
             else:
-                confirm_on_failure(hosts.reboot, batch_size=len(hosts))
-                hosts.wait_reboot_since(reboot_time, print_progress_bars=False)
-                puppet.wait_since(reboot_time)
+                with self.timeline.stage("reboot", hosts):
+                    confirm_on_failure(hosts.reboot, batch_size=len(hosts))
+                with self.timeline.stage("wait reboot", hosts, wait=True):
+                    hosts.wait_reboot_since(reboot_time, print_progress_bars=False)
+                with self.timeline.stage("wait puppet run", hosts, wait=True):
+                    puppet.wait_since(reboot_time)
 
     def _run_scripts(self, scripts: list, hosts: RemoteHosts) -> None:
         """Run a list of scripts
@@ -345,7 +652,8 @@ class SREBatchRunnerBase(CookbookRunnerBase, metaclass=ABCMeta):
         """
         for script in scripts:
             try:
-                confirm_on_failure(hosts.run_async, script)
+                with self.timeline.stage(script, hosts):
+                    confirm_on_failure(hosts.run_async, script)
             except AbortError:
                 self.logger.error("%s: execution aborted", script)
                 self.results.fail(hosts.hosts)
@@ -379,7 +687,8 @@ class SREBatchRunnerBase(CookbookRunnerBase, metaclass=ABCMeta):
                 self._action_method(
                     hosts, reason
                 )  # Call the method tied to the specific action
-                icinga_hosts.wait_for_optimal(skip_acked=True)
+                with self.timeline.stage("wait optimal", hosts, wait=True):
+                    icinga_hosts.wait_for_optimal(skip_acked=True)
             self.results.success(hosts.hosts)
         except IcingaError as error:
             ask_confirmation(f"Failed to downtime hosts: {error}")
@@ -409,6 +718,74 @@ class SREBatchRunnerBase(CookbookRunnerBase, metaclass=ABCMeta):
         """
         self._run_scripts(self.post_scripts, hosts)
 
+    def wait_for_grace_period(self, hosts: RemoteHosts) -> None:
+        """Wait before moving to the next batch, after the action on the given batch of hosts is completed.
+
+        By default this function just sleeps for `--grace-sleep` seconds
+
+        Arguments:
+            hosts (`RemoteHosts`): the batch of hosts that was just actioned
+
+        """
+        # pylint: disable=unused-argument
+        self._sleep(self._args.grace_sleep)
+
+    def verify_http(self, hosts: RemoteHosts, check: HTTPCheck, *, attempts: int = 3,
+                    delay: Union[int, float] = 5) -> None:
+        """Run an HTTP check on all the hosts of the batch concurrently, retrying only the failed ones.
+
+        Meant to be called from post_action() to verify the hosts before moving on.
+
+        Arguments:
+            hosts (`RemoteHosts`): the batch of hosts to check
+            check (`HTTPCheck`): the check to run on each host
+            attempts (`int`): the maximum number of attempts for each host
+            delay (`int`, `float`): the seconds to wait before retrying the failed hosts
+
+        Raises:
+            RuntimeError: if the check is still failing on any host after all the attempts.
+
+        """
+        if self._spicerack.dry_run:
+            self.logger.info("Skipping HTTP check %s on %s in dry-run mode", check.url, hosts)
+            return
+
+        if self._http_checks_session is None:
+            # Retries are handled by run_http_checks() only for the failed hosts
+            self._http_checks_session = self._spicerack.requests_session(__name__, tries=1)
+        with self.timeline.stage("http checks", hosts, wait=True):
+            results = run_http_checks(self._http_checks_session, hosts.hosts, check, attempts=attempts, delay=delay)
+
+        failed = [host for host, result in results.items() if not result.passed]
+        if failed:
+            raise RuntimeError(f"HTTP check {check.url} failed on {len(failed)} host(s): {','.join(failed)}")
+
+    def prestage_packages(self) -> None:
+        """Download the upgrade packages on all the hosts at once and check that the cached .deb files match
+
+        This leaves only the unpacking of the packages to the upgrade action of each batch, shortening the time each
+        host spends depooled. The apt sources must already be up to date, as Puppet is not run on the hosts.
+        """
+        packages = " ".join(self.upgrade_packages)
+        hosts = self._spicerack.remote().query(f"D{{{self.all_hosts}}}")
+        apt_get = self._spicerack.apt_get(hosts)
+        with self.timeline.stage("prestage packages", hosts):
+            confirm_on_failure(apt_get.update)
+            confirm_on_failure(apt_get.run, f"install --download-only {packages}")
+            # Fails if any of the .deb files to install is not in the cache or doesn't match the checksum
+            confirm_on_failure(apt_get.run, f"install --download-only --no-download {packages}")
+
+    def concurrent_group_key(self, host: str) -> str:
+        """Return the key of the independent group the host belongs to, when running with --concurrent-groups
+
+        By default the datacenter in the FQDN of the host. Override it to group the hosts by cluster or role instead.
+
+        Arguments:
+            host (`str`): the FQDN of the host
+
+        """
+        return host.split(".")[1] if "." in host else ""
+
     def group_action(self, host_group_idx, number_of_batches: int) -> None:
         """Action to perform once for every host group, right before working on the first batch
 
@@ -420,36 +797,95 @@ class SREBatchRunnerBase(CookbookRunnerBase, metaclass=ABCMeta):
 
     def batch_action(self) -> int:
         """Cookbook to perform an action on all hosts per group in batches"""
-        for host_group_idx, host_group in enumerate(self.host_groups):
-            number_of_hosts = len(host_group.hosts)
-            number_of_batches = ceil(number_of_hosts / self._batchsize(number_of_hosts))
-            self.group_action(host_group_idx, number_of_batches)
-            for batch_idx, batch in enumerate(host_group.split(number_of_batches)):
-                if len(self.results.failed) >= self._args.max_failed:
-                    self.logger.error(
-                        "Too many errors. Stopping the rolling %s.  See report for further details",
-                        self._args.action,
-                    )
-                    break
-                try:
-                    logger.info(
-                        "Running action: %s on hosts %s", self._args.action, batch
-                    )
+        try:
+            if self._args.action == "upgrade" and self.upgrade_packages:
+                self.prestage_packages()
+            for host_group_idx, host_group in enumerate(self.host_groups):
+                self._group_batch_action(host_group_idx, host_group)
+        finally:
+            self.timeline.report()
+
+        return self.results.report()
+
+    def _number_of_batches(self, hosts: RemoteHosts) -> int:
+        """Return the number of batches to split the hosts into"""
+        number_of_hosts = len(hosts.hosts)
+        return ceil(number_of_hosts / self._batchsize(number_of_hosts))
+
+    def _concurrent_groups(self, host_group: RemoteHosts) -> dict[str, RemoteHosts]:
+        """Split the host group by concurrent_group_key(), if running with --concurrent-groups"""
+        if not getattr(self._args, "concurrent_groups", False):
+            return {"": host_group}
+
+        groups = defaultdict(list)
+        for host in host_group.hosts:
+            groups[self.concurrent_group_key(host)].append(host)
+
+        if len(groups) == 1:
+            return {"": host_group}
+
+        remote = self._spicerack.remote()
+        return {key: remote.query(f"D{{{nodeset_fromlist(hosts)}}}") for key, hosts in sorted(groups.items())}
+
+    def _group_batch_action(self, host_group_idx: int, host_group: RemoteHosts) -> None:
+        """Perform the action on all the hosts of a host group in batches, recording the stage timings"""
+        groups = self._concurrent_groups(host_group)
+        with self.timeline.stage("group action", host_group):
+            self.group_action(host_group_idx, sum(self._number_of_batches(hosts) for hosts in groups.values()))
+
+        if len(groups) == 1:
+            self._run_batches(host_group)
+            return
+
+        self.logger.info("Running the %s concurrently on %d groups of hosts: %s", self._args.action, len(groups),
+                         ", ".join(f"{key} ({hosts})" for key, hosts in groups.items()))
+        with serialized_prompts(), ThreadPoolExecutor(max_workers=len(groups)) as executor:
+            futures = [executor.submit(self._run_concurrent_group, key, hosts) for key, hosts in groups.items()]
+
+        for future in futures:
+            self._results.update(future.result())
+
+    def _run_concurrent_group(self, key: str, hosts: RemoteHosts) -> Results:
+        """Run the batches of a concurrent group of hosts, returning its own results"""
+        self._local.results = Results(action=self._args.action, hosts=hosts.hosts)
+        try:
+            with self.timeline.stage(f"group {key}", hosts):
+                self._run_batches(hosts)
+            return self._local.results
+        finally:
+            del self._local.results
+
+    def _run_batches(self, hosts: RemoteHosts) -> None:
+        """Perform the action on the hosts in batches, stopping after --max-failed failures"""
+        number_of_batches = self._number_of_batches(hosts)
+        for batch_idx, batch in enumerate(hosts.split(number_of_batches)):
+            if len(self.results.failed) >= self._args.max_failed:
+                self.logger.error(
+                    "Too many errors. Stopping the rolling %s.  See report for further details",
+                    self._args.action,
+                )
+                break
+            try:
+                logger.info(
+                    "Running action: %s on hosts %s", self._args.action, batch
+                )
+                with self.timeline.stage("pre action", batch):
                     self.pre_action(batch)
+                with self.timeline.stage("action", batch):
                     self.action(batch)
+                with self.timeline.stage("post action", batch):
                     self.post_action(batch)
-                    if batch_idx + 1 < number_of_batches:
-                        self._sleep(self._args.grace_sleep)
-                    self.results.success(batch.hosts)
-                except Exception as error:  # pylint: disable=broad-except
-                    self.results.fail(batch.hosts)
-                    self.logger.error(
-                        "received the following error while performing %s: %s",
-                        self._args.action,
-                        error,
-                    )
-
-        return self.results.report()
+                if batch_idx + 1 < number_of_batches:
+                    with self.timeline.stage("grace sleep", batch, wait=True):
+                        self.wait_for_grace_period(batch)
+                self.results.success(batch.hosts)
+            except Exception as error:  # pylint: disable=broad-except
+                self.results.fail(batch.hosts)
+                self.logger.error(
+                    "received the following error while performing %s: %s",
+                    self._args.action,
+                    error,
+                )
 
     def run(self) -> int:
         """Perform rolling reboot servers in batches"""
@@ -520,9 +956,11 @@ class SRELBBatchRunnerBase(SREBatchRunnerBase, metaclass=ABCMeta):
                 name="|".join(hosts.hosts.striter()),
                 **kwargs,
             ):
-                self.wait_for_depool()
+                with self.timeline.stage("wait depool", hosts, wait=True):
+                    self.wait_for_depool()
                 super().action(hosts)
-                self.wait_for_repool()
+                with self.timeline.stage("wait repool", hosts, wait=True):
+                    self.wait_for_repool()
         except Exception:
             self.logger.error("#" * 50)
             self.logger.error(
@@ -1,2 +1,197 @@
 """CDN Cookbooks"""
+
+import json
+import time
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+from dataclasses import dataclass
+from typing import Optional
+
+from spicerack import Spicerack
+from spicerack.remote import RemoteExecutionError, RemoteHosts
+
+from cookbooks.sre import SREBatchBase, SRELBBatchRunnerBase
+
 __owner_team__ = "Traffic"
+
+VARNISHSTAT_COMMAND = "varnishstat -n frontend -1 -j -f MAIN.cache_hit -f MAIN.cache_miss -f MAIN.n_object"
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    """A snapshot of the counters of a Varnish frontend."""
+
+    hits: int
+    misses: int
+    objects: int
+
+    @classmethod
+    def from_varnishstat(cls, output: str) -> "CacheStats":
+        """Parse the output of varnishstat in JSON format.
+
+        Arguments:
+            output (str): the output of the varnishstat command.
+
+        """
+        data = json.loads(output)
+        counters = data.get("counters", data)  # Varnish 6.5+ nests the counters
+        return cls(
+            hits=counters["MAIN.cache_hit"]["value"],
+            misses=counters["MAIN.cache_miss"]["value"],
+            objects=counters["MAIN.n_object"]["value"],
+        )
+
+    def hit_ratio(self, previous: Optional["CacheStats"] = None) -> Optional[float]:
+        """Return the hit ratio since the previous snapshot or since Varnish started, None if there was no traffic.
+
+        Arguments:
+            previous (cookbooks.sre.cdn.CacheStats, optional): an earlier snapshot of the same Varnish frontend. It is
+                ignored if the counters were reset in the meanwhile by a restart.
+
+        """
+        hits, misses = self.hits, self.misses
+        if previous is not None and previous.hits <= hits and previous.misses <= misses:
+            hits -= previous.hits
+            misses -= previous.misses
+
+        if hits + misses == 0:
+            return None
+
+        return hits / (hits + misses)
+
+
+def get_cache_stats(hosts: RemoteHosts) -> dict[str, CacheStats]:
+    """Get a snapshot of the Varnish frontend counters of the given hosts.
+
+    Arguments:
+        hosts (spicerack.remote.RemoteHosts): the CDN hosts to query.
+
+    Raises:
+        spicerack.remote.RemoteExecutionError: if varnishstat fails on any host.
+
+    """
+    stats = {}
+    results = hosts.run_sync(VARNISHSTAT_COMMAND, is_safe=True, print_output=False, print_progress_bars=False)
+    for nodeset, output in results:
+        host_stats = CacheStats.from_varnishstat(output.message().decode())
+        for host in nodeset:
+            stats[host] = host_stats
+
+    return stats
+
+
+class CDNBatchBase(SREBatchBase):
+    """Base class for the CDN rolling cookbooks that restart the Varnish frontend, wiping its in-memory cache."""
+
+    warmth_fraction = 0.9
+    supports_concurrent_groups = True
+
+    def argument_parser(self) -> ArgumentParser:
+        """Parse arguments"""
+        parser = super().argument_parser()
+
+        def validate_fraction(fraction):
+            fraction = float(fraction)
+            if not 0 <= fraction <= 1:
+                raise ArgumentTypeError("the warmth fraction must be between 0 and 1")
+            return fraction
+
+        parser.add_argument(
+            "--warmth-fraction",
+            type=validate_fraction,
+            default=self.warmth_fraction,
+            help=(
+                "move to the next batch as soon as the frontend hit ratio and object count of the repooled hosts "
+                "reach this fraction of their value before the action, waiting at most --grace-sleep seconds. "
+                "Set it to 0 to always wait for --grace-sleep seconds."
+            ),
+        )
+        return parser
+
+
+class CDNBatchRunnerBase(SRELBBatchRunnerBase):
+    """Roll action Base class that waits between batches until the Varnish frontend caches are warm again.
+
+    The frontend counters are collected before the action on each batch as the baseline. After the repool the
+    counters are polled every `warmth_poll_interval` seconds, until the hit ratio since the previous poll and the
+    number of objects of all the hosts in the batch reach `--warmth-fraction` of their baseline, or until
+    `--grace-sleep` seconds have passed.
+    """
+
+    warmth_poll_interval = 60
+
+    def __init__(self, args: Namespace, spicerack: Spicerack) -> None:
+        """Initialize the runner."""
+        super().__init__(args, spicerack)
+        self._warmth_baseline: dict[str, CacheStats] = {}
+
+    def pre_action(self, hosts: RemoteHosts) -> None:
+        """Collect the baseline frontend counters of the hosts before running the pre scripts."""
+        for host in hosts.hosts:
+            self._warmth_baseline.pop(host, None)
+
+        if self._args.warmth_fraction:
+            try:
+                with self.timeline.stage("cache baseline", hosts):
+                    self._warmth_baseline.update(get_cache_stats(hosts))
+            except RemoteExecutionError as error:
+                self.logger.warning("Unable to get the baseline cache counters of %s, the grace period will be "
+                                    "%s seconds: %s", hosts, self._args.grace_sleep, error)
+
+        super().pre_action(hosts)
+
+    def wait_for_grace_period(self, hosts: RemoteHosts) -> None:
+        """Wait until the frontend caches of the hosts are warm again, for at most `--grace-sleep` seconds."""
+        if any(host not in self._warmth_baseline for host in hosts.hosts):
+            super().wait_for_grace_period(hosts)
+            return
+
+        if self._spicerack.dry_run:
+            self.logger.info("Would have waited up to %s seconds for the frontend caches of %s to be warm",
+                             self._args.grace_sleep, hosts)
+            return
+
+        start = time.monotonic()
+        previous: dict[str, CacheStats] = {}
+        while True:
+            remaining = self._args.grace_sleep - (time.monotonic() - start)
+            if remaining <= 0:
+                self.logger.info("Grace period for %s: upper bound of %s seconds reached, moving to the next batch",
+                                 hosts, self._args.grace_sleep)
+                return
+
+            time.sleep(min(self.warmth_poll_interval, remaining))
+            elapsed = time.monotonic() - start
+            try:
+                current = get_cache_stats(hosts)
+            except RemoteExecutionError as error:
+                self.logger.warning("Grace period for %s after %.0fs: unable to get the cache counters: %s",
+                                    hosts, elapsed, error)
+                continue
+
+            warm = [self._is_warm(host, current[host], previous.get(host), elapsed) for host in sorted(current)]
+            if all(warm):
+                self.logger.info("Grace period for %s: frontend caches warm after %.0fs out of at most %s seconds, "
+                                 "moving to the next batch", hosts, elapsed, self._args.grace_sleep)
+                return
+
+            previous = current
+
+    def _is_warm(self, host: str, current: CacheStats, previous: Optional[CacheStats], elapsed: float) -> bool:
+        """Log the comparison of the host's frontend counters with its baseline and return whether it is warm."""
+        baseline = self._warmth_baseline[host]
+        fraction = self._args.warmth_fraction
+        target_ratio = (baseline.hit_ratio() or 0.0) * fraction
+        target_objects = baseline.objects * fraction
+        hit_ratio = current.hit_ratio(previous)
+        warm = hit_ratio is not None and hit_ratio >= target_ratio and current.objects >= target_objects
+        self.logger.info(
+            "Grace period for %s after %.0fs: hit ratio %s (target %.3f), objects %d (target %.0f): %s",
+            host,
+            elapsed,
+            "n/a" if hit_ratio is None else f"{hit_ratio:.3f}",
+            target_ratio,
+            current.objects,
+            target_objects,
+            "warm" if warm else "cold",
+        )
+        return warm
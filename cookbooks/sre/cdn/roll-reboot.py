@@ -2,10 +2,10 @@
 
 from wmflib.constants import ALL_DATACENTERS
 
-from cookbooks.sre import SREBatchBase, SRELBBatchRunnerBase
+from cookbooks.sre.cdn import CDNBatchBase, CDNBatchRunnerBase
 
 
-class Batch(SREBatchBase):
+class Batch(CDNBatchBase):
     """Reboot CP nodes in the CDN
 
     Example usage:
@@ -19,6 +19,12 @@ class Batch(SREBatchBase):
             --reason 'Kernel update' \
             --task-id T123456 \
             --grace-sleep 1200
+
+        cookbook sre.cdn.roll-reboot \
+            --alias 'cp-upload_esams' \
+            --reason 'Kernel update' \
+            --task-id T123456 \
+            --warmth-fraction 0.95
     """
 
     batch_default = 1
@@ -31,7 +37,7 @@ class Batch(SREBatchBase):
         return Runner(args, self.spicerack)
 
 
-class Runner(SRELBBatchRunnerBase):
+class Runner(CDNBatchRunnerBase):
     """Roll reboot/restart a CDN cluster"""
 
     depool_sleep = 60
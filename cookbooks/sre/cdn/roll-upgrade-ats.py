@@ -10,8 +10,9 @@ from cookbooks.sre import SREBatchBase, SRELBBatchRunnerBase
 class RollUpgradeATS(SREBatchBase):
     r"""Roll upgrade Apache Traffic Server in the CDN cluster.
 
+    * Download ATS and components on all hosts, letting apt dictate the versions
     * Depool
-    * Install ATS and components, letting apt dictate the versions
+    * Install the downloaded packages
     * Restart related services
     * Repool
 
@@ -47,9 +48,7 @@ class RollUpgradeATSRunner(SRELBBatchRunnerBase):
 
         apt_get = self._spicerack.apt_get(hosts)
         confirm_on_failure(apt_get.update)
-        confirm_on_failure(apt_get.install,
-                           'trafficserver',
-                           'trafficserver-experimental-plugins')
+        confirm_on_failure(apt_get.install, *self.upgrade_packages)
 
         self._restart_daemons_action(hosts, reason)
         # Run any potential corrective measures.
@@ -76,6 +75,11 @@ class RollUpgradeATSRunner(SRELBBatchRunnerBase):
         """Override the default runtime description"""
         return f'Rolling upgrade of ATS on {self._query()} - {self._args.reason} ({self._args.task_id})'
 
+    @property
+    def upgrade_packages(self) -> list:
+        """Return the list of packages to install with the upgrade action"""
+        return ['trafficserver', 'trafficserver-experimental-plugins']
+
     @property
     def restart_daemons(self) -> list:
         """Return a list of daemons to restart when using the restart action"""
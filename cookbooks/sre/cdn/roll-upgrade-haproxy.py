@@ -10,8 +10,9 @@ from cookbooks.sre import SREBatchBase, SRELBBatchRunnerBase
 class RollUpgradeHAProxy(SREBatchBase):
     r"""Roll upgrade HAProxy in the CDN cluster.
 
+    * Download HAProxy on all hosts, letting apt dictate the versions
     * Depool
-    * Install HAProxy, letting apt dictate the versions
+    * Install the downloaded package
     * Restart related services
     * Repool
 
@@ -51,7 +52,7 @@ class RollUpgradeHAProxyRunner(SRELBBatchRunnerBase):
 
         apt_get = self._spicerack.apt_get(hosts)
         confirm_on_failure(apt_get.update)
-        confirm_on_failure(apt_get.install, 'haproxy')
+        confirm_on_failure(apt_get.install, *self.upgrade_packages)
 
         # Run any potential corrective measures.
         puppet.run()
@@ -79,6 +80,11 @@ class RollUpgradeHAProxyRunner(SRELBBatchRunnerBase):
         """Override the default runtime description"""
         return f'rolling upgrade of HAProxy on {self._query()} - {self._args.reason} ({self._args.task_id})'
 
+    @property
+    def upgrade_packages(self) -> list:
+        """Return the list of packages to install with the upgrade action"""
+        return ['haproxy']
+
     @property
     def restart_daemons(self) -> list:
         """Return a list of daemons to restart when using the restart action"""
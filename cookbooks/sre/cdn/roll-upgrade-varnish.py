@@ -4,14 +4,15 @@ from spicerack.administrative import Reason
 from spicerack.remote import RemoteHosts
 from wmflib.constants import ALL_DATACENTERS
 from wmflib.interactive import confirm_on_failure
-from cookbooks.sre import SREBatchBase, SRELBBatchRunnerBase
+from cookbooks.sre.cdn import CDNBatchBase, CDNBatchRunnerBase
 
 
-class RollUpgradeVarnish(SREBatchBase):
+class RollUpgradeVarnish(CDNBatchBase):
     r"""Roll upgrade Varnish in the CDN cluster.
 
+    * Download Varnish and components on all hosts, letting apt dictate the versions
     * Depool
-    * Install Varnish and components, letting apt dictate the versions
+    * Install the downloaded packages
     * Restart related services
     * Repool
 
@@ -23,7 +24,7 @@ class RollUpgradeVarnish(SREBatchBase):
     """
 
     # Reboot/Restart wipes the in-memory cache, so a high grace sleep is
-    # required.
+    # required. It's the upper bound of the wait for the cache to be warm again.
     batch_max = 1
     grace_sleep = 1500
     min_grace_sleep = 1200
@@ -34,7 +35,7 @@ class RollUpgradeVarnish(SREBatchBase):
         return RollUpgradeVarnishRunner(args, self.spicerack)
 
 
-class RollUpgradeVarnishRunner(SRELBBatchRunnerBase):
+class RollUpgradeVarnishRunner(CDNBatchRunnerBase):
     """Upgrade and restart Varnish"""
 
     depool_sleep = 60
@@ -47,17 +48,7 @@ class RollUpgradeVarnishRunner(SRELBBatchRunnerBase):
 
         apt_get = self._spicerack.apt_get(hosts)
         confirm_on_failure(apt_get.update)
-        confirm_on_failure(
-            apt_get.install,
-            "libvarnishapi3",
-            "libvmod-netmapper",
-            "libvmod-querysort",
-            "libvmod-wmfuniq",
-            "varnish",
-            "varnish-modules",
-            "varnish-re2",
-            "varnishkafka",
-        )
+        confirm_on_failure(apt_get.install, *self.upgrade_packages)
 
         self._restart_daemons_action(hosts, reason)
         # Run any potential corrective measures.
@@ -84,6 +75,20 @@ class RollUpgradeVarnishRunner(SRELBBatchRunnerBase):
         """Override the default runtime description"""
         return f'rolling upgrade of Varnish on {self._query()} - {self._args.reason} ({self._args.task_id})'
 
+    @property
+    def upgrade_packages(self) -> list:
+        """Return the list of packages to install with the upgrade action"""
+        return [
+            "libvarnishapi3",
+            "libvmod-netmapper",
+            "libvmod-querysort",
+            "libvmod-wmfuniq",
+            "varnish",
+            "varnish-modules",
+            "varnish-re2",
+            "varnishkafka",
+        ]
+
     @property
     def restart_daemons(self) -> list:
         """Return a list of daemons to restart when using the restart action"""
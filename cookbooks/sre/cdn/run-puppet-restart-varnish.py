@@ -15,44 +15,25 @@ Those are the steps provided by the cookbook:
 - Start Varnish service (_custom_action())
 - Test that ports (80 and 443) are open (post_action)
 - Repool the host (automatic)
+- Wait for the Varnish frontend cache to be warm again (automatic)
 """
 
 from argparse import Namespace
 
-import requests
-
 from wmflib.constants import ALL_DATACENTERS
 from wmflib.interactive import confirm_on_failure
 
 from spicerack import Spicerack
-from cookbooks.sre import SREBatchBase, SRELBBatchRunnerBase
-
-
-def check_http_redirect(host, dry_run: bool) -> bool:
-    """Check if HAProxy handle redirect correctly.
-
-    Check also Varnish does not listen on port 80 (Varnish uses 'TLS Redirect'
-    reason).
-
-    Returns:
-        bool: False if any of the requirement fails.
-
-    """
-    if dry_run:
-        return True
+from cookbooks.sre import HTTPCheck
+from cookbooks.sre.cdn import CDNBatchBase, CDNBatchRunnerBase
 
-    headers = {'Host': 'wikimedia.org'}
 
-    s = "http://{}".format(host)
-    res = requests.head(s, headers=headers, timeout=2)
-    if not res.is_redirect:
-        return False
-    if res.reason != 'Moved Permanently':
-        return False
-    return True
+# HAProxy must handle the redirect, Varnish uses the 'TLS Redirect' reason instead of 'Moved Permanently'
+HTTP_REDIRECT_CHECK = HTTPCheck("http://{host}", expected_status=(301,), expected_reason='Moved Permanently',
+                                headers={'Host': 'wikimedia.org'}, timeout=2)
 
 
-class MovePort80(SREBatchBase):
+class MovePort80(CDNBatchBase):
     r"""Roll apply configuration using puppet-agent for both HAProxy and Varnish
 
     This cookbook is useful when managing both Varnish and HAProxy configuration
@@ -69,7 +50,7 @@ class MovePort80(SREBatchBase):
             --grace-sleep 1200
     """
 
-    grace_sleep = 1200  # Wait 20m between batches
+    grace_sleep = 1200  # Wait at most 20m between batches for the cache to be warm again
     batch_max = 1
     valid_actions = ('custom',)
     max_failed = 1
@@ -91,7 +72,7 @@ class MovePort80(SREBatchBase):
         return MovePort80Runner(args, self.spicerack)
 
 
-class MovePort80Runner(SRELBBatchRunnerBase):
+class MovePort80Runner(CDNBatchRunnerBase):
     r"""Roll apply configuration using puppet-agent for both HAProxy and Varnish."""
 
     depool_sleep = 30
@@ -133,7 +114,6 @@ class MovePort80Runner(SRELBBatchRunnerBase):
         ]
 
     def post_action(self, hosts):
-        """Just to check that ports passed as parameters are open."""
-        if not check_http_redirect(hosts.hosts, self._spicerack.dry_run):
-            raise RuntimeError(f"Redirect check on host {hosts.hosts} failed!")
+        """Check that HAProxy handles the redirect on port 80 on all the hosts of the batch."""
+        self.verify_http(hosts, HTTP_REDIRECT_CHECK)
         super().post_action(hosts)
@@ -4,15 +4,16 @@ This cookbook is useful when moving purged from one DC to another
 
 Those are the steps provided by the cookbook:
 
+- Transfer kafka consumer offsets of all the hosts at once and verify them (group_action())
 - Depool the host (automatic)
 - Disable icinga notification (automatic)
 - Check that puppet-agent is disabled (pre_scripts)
-- Transfer kafka consumer offset (_custom_action)
 - Enable and run Puppet (puppet agent **must** be disabled first with cumin) (_custom_action())
 - Repool the host (automatic)
 """
 
 from argparse import Namespace
+from collections import defaultdict
 
 from wmflib.constants import ALL_DATACENTERS, CORE_DATACENTERS
 from wmflib.interactive import confirm_on_failure
@@ -20,6 +21,8 @@ from wmflib.interactive import confirm_on_failure
 from spicerack import Spicerack
 from cookbooks.sre import SREBatchBase, SRELBBatchRunnerBase
 
+KAFKA_CONSUMER_GROUPS = "kafka-consumer-groups --bootstrap-server localhost:9092"
+
 
 class TransferPurgedOffsets(SREBatchBase):
     r"""Roll apply configuration using puppet-agent for purged
@@ -37,7 +40,8 @@ class TransferPurgedOffsets(SREBatchBase):
     """
 
     grace_sleep = 30  # Wait 30s between batches
-    batch_max = 1
+    batch_default = 2
+    batch_max = 6
     valid_actions = ('custom',)
     max_failed = 1
 
@@ -69,6 +73,8 @@ class TransferPurgedOffsets(SREBatchBase):
 class TransferPurgedOffsetsRunner(SRELBBatchRunnerBase):
     r"""Roll apply configuration using puppet-agent."""
 
+    depool_threshold = 6  # Maximum allowed batch size
+
     def __init__(self, args: Namespace, spicerack: Spicerack) -> None:
         """We need to override this in order to use the args.puppet_reason"""
         super().__init__(args, spicerack)
@@ -93,14 +99,46 @@ class TransferPurgedOffsetsRunner(SRELBBatchRunnerBase):
         """Override the parent property to optimize the query."""
         return 'A:cp'  # This query must include all hosts matching all the allowed_aliases
 
-    def _custom_action(self, hosts, _):
-        """The actual transfer consumer position / run puppet logic resides here."""
-        # we are safe here cause batch_max = 1
-        hostname = hosts.hosts[0].split('.')[0]
-        cmd = f"kafka-consumer-groups --bootstrap-server localhost:9092 --group {hostname} --reset-offsets " \
-            "--to-latest --all-topics --execute"
-        confirm_on_failure(self.kafka_host.run_sync, cmd)
+    def group_action(self, host_group_idx, number_of_batches: int) -> None:
+        """Transfer the consumer positions of all the hosts before running Puppet on them.
+
+        The consumer groups on the destination cluster are not in use until Puppet is run, so they can all be reset in
+        a single kafka-consumer-groups run instead of starting a JVM for each host.
+        """
+        hosts = self.host_groups[host_group_idx]
+        groups = [host.split('.')[0] for host in hosts.hosts]
+        group_args = " ".join(f"--group {group}" for group in groups)
+        cmd = f"{KAFKA_CONSUMER_GROUPS} {group_args} --reset-offsets --to-latest --all-topics --execute"
+        with self.timeline.stage("reset offsets", hosts):
+            confirm_on_failure(self.kafka_host.run_sync, cmd)
+            if self._spicerack.dry_run:
+                self.logger.info("Skipping the verification of the committed offsets in DRY-RUN mode")
+            else:
+                confirm_on_failure(self._verify_offsets, groups)
+
+    def _verify_offsets(self, groups: list[str]) -> None:
+        """Check that all the consumer groups have committed offsets on the destination cluster."""
+        group_args = " ".join(f"--group {group}" for group in groups)
+        results = self.kafka_host.run_sync(f"{KAFKA_CONSUMER_GROUPS} {group_args} --describe --offsets",
+                                           is_safe=True, print_output=False, print_progress_bars=False)
+        offsets: dict[str, list[str]] = defaultdict(list)
+        for _, output in results:
+            # GROUP TOPIC PARTITION CURRENT-OFFSET LOG-END-OFFSET LAG CONSUMER-ID HOST CLIENT-ID
+            for line in output.message().decode().splitlines():
+                fields = line.split()
+                if len(fields) >= 4 and fields[0] in groups:
+                    offsets[fields[0]].append(fields[3])
+
+        missing = sorted(group for group in groups if not offsets[group] or not all(
+            offset.isdigit() for offset in offsets[group]))
+        if missing:
+            raise RuntimeError(f"No committed offsets on kafka-main-{self._dc_to} for the consumer groups: {missing}")
+
+        self.logger.info("Verified the committed offsets of %d consumer groups on kafka-main-%s",
+                         len(groups), self._dc_to)
 
+    def _custom_action(self, hosts, _):
+        """The actual run puppet logic resides here, the consumer positions were already transferred."""
         puppet = self._spicerack.puppet(hosts)
         confirm_on_failure(puppet.run, enable_reason=self._puppet_reason)
 
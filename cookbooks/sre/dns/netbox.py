@@ -1,7 +1,12 @@
 """Update and deploy the DNS records generated from Netbox data.
 
 Run the script that generates the DNS zonefile snippets on the Netbox host to update the exposed git repository with
-the snippets and then deploy them to the authdns hosts, reloading gdnsd.
+the snippets and then deploy them to the authdns hosts, reloading gdnsd. The passive Netbox copies of the repository,
+the authdns deploy and the sync of the Netbox hiera data are run at the same time.
+
+With --delta the Netbox changelog is checked first and the generation is skipped altogether if no object that
+affects the records was changed since the last commit of the generated repository. That commit is still deployed to
+the authdns hosts that didn't successfully deploy it yet, for example after a failed run.
 
 Usage example:
     cookbook sre.dns.netbox -t T12345 'Decommissioned mw12[22-35]'
@@ -11,7 +16,11 @@ import argparse
 import json
 import logging
 
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
 from cumin.transports import Command
+from spicerack.remote import RemoteExecutionError
 from wmflib.interactive import ask_confirmation, confirm_on_failure
 
 
@@ -25,6 +34,15 @@ NETBOX_HOSTS_QUERY = 'A:netbox'
 AUTHDNS_NETBOX_CHECKOUT_PATH = '/srv/git/netbox_dns_snippets'
 AUTHDNS_USER = 'netboxdns'
 AUTHDNS_DNS_CHECKOUT_PATH = '/srv/authdns/git'
+# The SHA1 of the Netbox-generated repository last successfully deployed by this cookbook on each authdns host, the
+# deploys done outside of this cookbook are not recorded and the --delta runs will deploy the commit again.
+AUTHDNS_NETBOX_DEPLOYED_PATH = '/srv/authdns/netbox_dns_snippets.deployed'
+# The Netbox object types whose changes can affect the generated records: the IP addresses and prefixes and the
+# interfaces, devices and virtual machines the IP addresses are assigned to.
+DNS_OBJECT_TYPES = ('ipam.ipaddress', 'ipam.prefix', 'dcim.interface', 'dcim.device', 'virtualization.vminterface',
+                    'virtualization.virtualmachine')
+# How far before the last commit to look for changes, to include the ones made while that commit was being generated.
+DELTA_LOOKBACK = timedelta(minutes=10)
 
 
 def argument_parser():
@@ -45,17 +63,19 @@ def argument_parser():
                         help=('CAUTION: to be used only in an emergency! Allow to edit the files manually before '
                               'committing them. Be aware that any subsequent run of the cookbook will try to revert '
                               'the manual modifications.'))
+    parser.add_argument('--delta', action='store_true',
+                        help=('Skip the generation of the records if nothing affecting them has been changed in '
+                              'Netbox since the last commit of the generated repository, only deploying that commit '
+                              'where not yet deployed. Has no effect with --force or --emergency-manual-edit.'))
     parser.add_argument('message', help='Commit message')
 
     return parser
 
 
-def run(args, spicerack):  # pylint: disable=too-many-locals
+def run(args, spicerack):
     """Required by Spicerack API."""
-    remote = spicerack.remote()
     netbox_host = spicerack.netbox_master_host()
     netbox_hostname = str(netbox_host)
-    netbox_hosts = remote.query(NETBOX_HOSTS_QUERY)
     reason = spicerack.admin_reason(args.message, task_id=args.task_id)
     # Always set an accessible CWD for runuser because the Python git module passes it to Popen
     base_command = ('cd /tmp && runuser -u {user} -- python3 '
@@ -69,6 +89,24 @@ def run(args, spicerack):  # pylint: disable=too-many-locals
     # NO_CHANGES_RETURN_CODE = 99 in generate_dns_snippets.py
     command = Command(command_str, ok_codes=[0, 99])
 
+    if args.delta and not args.force and not args.emergency_manual_edit:
+        last_sha1, last_commit = get_last_commit(netbox_host)
+        changes = get_netbox_changes(spicerack, last_commit)
+        if changes:
+            logger.info('%d Netbox changes since the last commit:\n%s', len(changes), '\n'.join(changes))
+        else:
+            outdated = get_authdns_outdated(get_authdns_hosts(spicerack), last_sha1)
+            if not outdated:
+                logger.info('No changes in Netbox since the last commit %s, already deployed, nothing to do.',
+                            last_sha1)
+                return 0
+
+            logger.info('No changes in Netbox since the last commit %s, deploying it where not yet deployed: %s',
+                        last_sha1, ', '.join(outdated))
+            if spicerack.dry_run:
+                return 0
+            return update_repositories(args, spicerack, last_sha1, reason)
+
     logger.info('Generating the DNS records from Netbox data. It will take a couple of minutes.')
     results = netbox_host.run_sync(command, is_safe=True)
     metadata = {}
@@ -109,31 +147,141 @@ def run(args, spicerack):  # pylint: disable=too-many-locals
         command = ('{base} push "{path}" "{sha1}"').format(base=base_command, path=metadata.get('path', ''), sha1=sha1)
         results = netbox_host.run_sync(command)
 
+    return update_repositories(args, spicerack, sha1, reason)
+
+
+def update_repositories(args, spicerack, sha1, reason):
+    """Update the copies of the generated repository to the given commit and deploy it, syncing the Netbox hiera.
+
+    Arguments:
+        args (argparse.Namespace): the parsed arguments.
+        spicerack (spicerack.Spicerack): the Spicerack instance.
+        sha1 (str): the commit of the generated repository to update to.
+        reason (spicerack.administrative.Reason): the reason of the run.
+
+    Returns:
+        int: the return code of the Netbox hiera sync.
+
+    """
+    remote = spicerack.remote()
+    netbox_host = spicerack.netbox_master_host()
+    netbox_hosts = remote.query(NETBOX_HOSTS_QUERY)
     passive_netbox_hosts = remote.query(str(netbox_hosts.hosts - netbox_host.hosts))
-    logger.info('Updating the Netbox passive copies of the repository on %s', passive_netbox_hosts)
-    passive_netbox_hosts.run_sync('runuser -u {user} -- git -C "{path}" fetch {host} master:master'.format(
-        path=NETBOX_BARE_REPO_PATH, user=NETBOX_USER, host=netbox_hostname))
+    passive_netbox_command = 'runuser -u {user} -- git -C "{path}" fetch {host} master:master'.format(
+        path=NETBOX_BARE_REPO_PATH, user=NETBOX_USER, host=netbox_host)
 
-    # Get only pooled hosts
-    conftool = spicerack.confctl('node')
-    authdns_hostnames = [
-        h.name for h in conftool.filter_objects({'pooled': 'yes'}, cluster='dnsbox', service='authdns-update')]
-    authdns_hosts = remote.query(','.join(authdns_hostnames))
-    logger.info('Updating the authdns copies of the repository on %s', authdns_hosts)
-    confirm_on_failure(
-        authdns_hosts.run_sync,
+    authdns_hosts = get_authdns_hosts(spicerack)
+    authdns_commands = [
         'runuser -u {user} -- git -C "{path}" fetch && git -C "{path}" merge --ff-only {sha1}'.format(
-            path=AUTHDNS_NETBOX_CHECKOUT_PATH, user=AUTHDNS_USER, sha1=sha1))
-
+            path=AUTHDNS_NETBOX_CHECKOUT_PATH, user=AUTHDNS_USER, sha1=sha1)]
     if args.skip_authdns_update:
         logger.warning(('ATTENTION! Skipping deploy of the updated zonefiles. The next manual authdns-update or '
                         'run of this cookbook will deploy the changes!'))
     else:
-        logger.info('Deploying the updated zonefiles on %s', authdns_hosts)
-        confirm_on_failure(
-            authdns_hosts.run_sync,
-            'cd {git} && utils/deploy-check.py -g {netbox} --deploy'.format(
-                git=AUTHDNS_DNS_CHECKOUT_PATH, netbox=AUTHDNS_NETBOX_CHECKOUT_PATH))
-
-    # Use the netbox-hiera return code as return code for this one too
-    return spicerack.run_cookbook('sre.puppet.sync-netbox-hiera', [f'Triggered by {__name__}: {reason.reason}'])
+        # Record the deployed commit only on success, for the --delta runs to know where it is still to be deployed
+        authdns_commands.append(
+            'cd {git} && utils/deploy-check.py -g {netbox} --deploy && echo {sha1} > {deployed}'.format(
+                git=AUTHDNS_DNS_CHECKOUT_PATH, netbox=AUTHDNS_NETBOX_CHECKOUT_PATH, sha1=sha1,
+                deployed=AUTHDNS_NETBOX_DEPLOYED_PATH))
+
+    logger.info('Updating the Netbox passive copies of the repository on %s', passive_netbox_hosts)
+    logger.info('Updating the authdns copies of the repository%s on %s',
+                '' if args.skip_authdns_update else ' and deploying the updated zonefiles', authdns_hosts)
+    updates = {
+        'Netbox passive copies update': (passive_netbox_hosts, [passive_netbox_command]),
+        'authdns update': (authdns_hosts, authdns_commands),
+    }
+    with ThreadPoolExecutor(max_workers=len(updates)) as executor:
+        futures = {
+            name: executor.submit(hosts.run_sync, *commands, print_progress_bars=False)
+            for name, (hosts, commands) in updates.items()
+        }
+        # The hiera sync asks for confirmation, run it here while the repository updates run in the background.
+        # Use the netbox-hiera return code as return code for this one too
+        ret = spicerack.run_cookbook('sre.puppet.sync-netbox-hiera', [f'Triggered by {__name__}: {reason.reason}'])
+
+    # The commands are idempotent, retry the failed updates one at a time from the start.
+    for name, future in futures.items():
+        try:
+            future.result()
+        except RemoteExecutionError as e:
+            logger.error('The %s failed: %s', name, e)
+            hosts, commands = updates[name]
+            confirm_on_failure(hosts.run_sync, *commands)
+
+    return ret
+
+
+def get_authdns_hosts(spicerack):
+    """Return the pooled authdns hosts.
+
+    Arguments:
+        spicerack (spicerack.Spicerack): the Spicerack instance.
+
+    Returns:
+        spicerack.remote.RemoteHosts: the pooled authdns hosts.
+
+    """
+    conftool = spicerack.confctl('node')
+    authdns_hostnames = [
+        h.name for h in conftool.filter_objects({'pooled': 'yes'}, cluster='dnsbox', service='authdns-update')]
+    return spicerack.remote().query(','.join(authdns_hostnames))
+
+
+def get_last_commit(netbox_host):
+    """Return the SHA1 and the date of the last commit of the generated repository.
+
+    Arguments:
+        netbox_host (spicerack.remote.RemoteHosts): the Netbox master host, with the generated repository.
+
+    Returns:
+        tuple: the SHA1 as string and the commit date as datetime.
+
+    """
+    command = 'cd /tmp && runuser -u {user} -- git -C "{path}" log -1 --format="%H %cI" master'.format(
+        user=NETBOX_USER, path=NETBOX_BARE_REPO_PATH)
+    for _, output in netbox_host.run_sync(command, is_safe=True, print_output=False, print_progress_bars=False):
+        sha1, _, date = output.message().decode().strip().partition(' ')
+        return sha1, datetime.fromisoformat(date)
+
+    raise RuntimeError('Unable to get the last commit of {path}'.format(path=NETBOX_BARE_REPO_PATH))
+
+
+def get_authdns_outdated(authdns_hosts, sha1):
+    """Return the authdns hosts on which the given commit of the generated repository was not successfully deployed.
+
+    Arguments:
+        authdns_hosts (spicerack.remote.RemoteHosts): the authdns hosts to check.
+        sha1 (str): the expected deployed commit.
+
+    Returns:
+        list: the names of the hosts with a different or unknown deployed commit.
+
+    """
+    command = 'cat {path} 2>/dev/null || true'.format(path=AUTHDNS_NETBOX_DEPLOYED_PATH)
+    deployed = set()
+    for hosts, output in authdns_hosts.run_sync(command, is_safe=True, print_output=False, print_progress_bars=False):
+        if output.message().decode().strip() == sha1:
+            deployed.update(hosts)
+
+    return [host for host in authdns_hosts.hosts if host not in deployed]
+
+
+def get_netbox_changes(spicerack, last_commit):
+    """Return a description of the Netbox changes that affect the DNS records since the last generated commit.
+
+    Arguments:
+        spicerack (spicerack.Spicerack): the Spicerack instance.
+        last_commit (datetime.datetime): the date of the last commit of the generated repository.
+
+    Returns:
+        list: the changed object type and representation of each change, in chronological order.
+
+    """
+    since = last_commit - DELTA_LOOKBACK
+    logger.info('Looking for changes of %s in Netbox since %s', ', '.join(DNS_OBJECT_TYPES), since.isoformat())
+    changes = spicerack.netbox().api.core.object_changes.filter(
+        changed_object_type=list(DNS_OBJECT_TYPES), time_after=since.isoformat())
+    return sorted('{time} {action} {type} {repr}'.format(
+        time=change.time, action=change.action.value, type=change.changed_object_type, repr=change.object_repr)
+        for change in changes)
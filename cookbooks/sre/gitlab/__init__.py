@@ -3,10 +3,11 @@
 import logging
 import re
 
+from collections.abc import Callable
 from datetime import timedelta
+from types import ModuleType
 
-import gitlab
-
+from wmflib.decorators import RetryParams
 from spicerack.decorators import retry
 from spicerack.remote import RemoteHosts
 
@@ -14,6 +15,19 @@ __owner_team__ = "Collaboration Services"
 logger = logging.getLogger(__name__)
 
 
+def _gitlab() -> ModuleType:
+    """Return the python-gitlab module, imported only by the cookbooks that talk to the API as it's slow to import."""
+    import gitlab  # pylint: disable=import-outside-toplevel
+
+    return gitlab
+
+
+def _retry_on_gitlab_errors(params: RetryParams, _func: Callable, _args: tuple, _kwargs: dict) -> None:
+    """Set the python-gitlab API errors as the @retry exceptions, at call time to not import python-gitlab before."""
+    exceptions = _gitlab().exceptions
+    params.exceptions = (exceptions.GitlabUpdateError, exceptions.GitlabHttpError)
+
+
 def get_gitlab_url(host: RemoteHosts) -> str:
     """Fetch GitLab external_url from gitlab.rb config"""
     logger.info('Fetch GitLab external_url from gitlab.rb config')
@@ -38,8 +52,18 @@ def get_disk_usage_for_path(host: RemoteHosts, path: str) -> int:
     raise RuntimeError(f"Unable to extract free space from: {path}")
 
 
+def get_checksum_for_path(host: RemoteHosts, path: str) -> str:
+    """Fetches the SHA-256 checksum of the file at the path provided"""
+    results = host.run_sync(f"/usr/bin/sha256sum {path}", is_safe=True, print_output=False, print_progress_bars=False)
+    for _, output in results:
+        for line in output.message().decode().splitlines():
+            return line.split()[0]
+    raise RuntimeError(f"Unable to get the checksum of {path} on {host}")
+
+
 def pause_runners(token: str, url: str, dry_run: bool = True):
     """Pause all active runners"""
+    gitlab = _gitlab()
     gitlab_instance = gitlab.Gitlab(url, private_token=token)
     active_runners = gitlab_instance.runners.all(scope='active', all=True)
     paused_runners = []
@@ -61,7 +85,7 @@ def pause_runners(token: str, url: str, dry_run: bool = True):
     delay=timedelta(seconds=10),
     backoff_mode='constant',
     failure_message='Waiting for GitLab API to become available again',
-    exceptions=(gitlab.exceptions.GitlabUpdateError, gitlab.exceptions.GitlabHttpError,))
+    dynamic_params_callbacks=(_retry_on_gitlab_errors,))
 def unpause_runners(paused_runners, dry_run=True):
     """Unpause a list of runners"""
     for runner in paused_runners:
@@ -1,23 +1,42 @@
 """GitLab failover cookbook"""
 
 import logging
+import time
 
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import timedelta
 from argparse import ArgumentParser
+from typing import Iterator
 from urllib.parse import urlparse
 
-from spicerack.remote import RemoteHosts
+from prettytable import PrettyTable
+from spicerack.decorators import retry
+from spicerack.remote import RemoteExecutionError, RemoteHosts
 from wmflib.interactive import ensure_shell_is_durable, ask_confirmation, get_secret, confirm_on_failure
 from cookbooks.sre import CookbookBase, CookbookRunnerBase, PHABRICATOR_BOT_CONFIG_FILE
 from cookbooks.sre.gitlab import (
-    get_gitlab_url, get_disk_usage_for_path, lock_backups_on_host,
+    get_checksum_for_path, get_gitlab_url, get_disk_usage_for_path, lock_backups_on_host,
     pause_runners, unlock_backups_on_host, unpause_runners
 )
 
 BACKUP_DIRECTORY = '/srv/gitlab-backup'
+GITLAB_BACKUP = "/usr/bin/gitlab-backup"
 GITLAB_CTL = "/usr/bin/gitlab-ctl"
 GITLAB_RESTORE_PATH = "/srv/gitlab-backup/"
 DISK_HIGH_THRESHOLD = 40
+GITLAB_BACKUP_TASKS = (
+    "db", "repositories", "uploads", "builds", "artifacts", "lfs", "terraform_state", "registry", "pages",
+    "packages", "ci_secure_files",
+)
+# The backup components of a pipelined failover, in restore order, with the gitlab-backup tasks each one includes.
+# The database must be restored first as the restore of the other components relies on it.
+BACKUP_COMPONENTS = {
+    "db": ("db",),
+    "repositories": ("repositories",),
+    "uploads": tuple(task for task in GITLAB_BACKUP_TASKS if task not in ("db", "repositories")),
+}
+TRANSFER_TRIES = 3
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +63,14 @@ class Failover(CookbookBase):
       Example: https://gerrit.wikimedia.org/r/c/operations/dns/+/891888
 
 
+    By default a single full backup is created, transferred and restored one step after the other with the
+    gitlab-backup.sh and gitlab-restore.sh scripts. With --pipelined the backup is instead split into components
+    (database, repositories, uploads and the other files) that are created one after the other on the old host with
+    gitlab-backup directly. Each component is transferred as soon as it has been created, while the next one is being
+    created. Transfers resume from where they were interrupted and are verified with a checksum. Once all of them
+    succeeded the puppet role change for the new primary is requested and the components are restored in order.
+    The time GitLab spent read-only is reported at the end, with the timings of each step.
+
     Usage example:
 
     # Changes gitlab.wmo from gitlab1003 to gitlab2002, and gitlab-replica.wmo from gitlab2002 to gitlab1003
@@ -65,6 +92,12 @@ class Failover(CookbookBase):
             required=True,
             help="Host that we want to switch to (e.g., existing gitlab-replica.wm.o, will become gitlab.wm.o)",
         )
+        parser.add_argument(
+            "--pipelined",
+            action="store_true",
+            help=("Create and transfer the backup components as a pipeline with gitlab-backup directly, instead of "
+                  "a single full backup with the gitlab-backup.sh and gitlab-restore.sh scripts"),
+        )
 
         return parser
 
@@ -92,6 +125,11 @@ class FailoverRunner(CookbookRunnerBase):
         self.message = f"Failover of gitlab from {self.switch_from_host} to {self.switch_to_host}"
         self.phabricator = spicerack.phabricator(PHABRICATOR_BOT_CONFIG_FILE)
         self.task_id = args.task_id
+        self.pipelined = args.pipelined
+        # Start and end of each step of the data migration, in seconds since GitLab was made read-only,
+        # keyed by backup component and stage.
+        self.timings: dict[str, dict[str, tuple[float, float]]] = {}
+        self.read_only_since = 0.0
 
         self.reason = self.spicerack.admin_reason(reason=self.message, task_id=self.task_id)
 
@@ -136,26 +174,19 @@ class FailoverRunner(CookbookRunnerBase):
             self.gitlab_token, self.switch_from_gitlab_url, dry_run=self.spicerack.dry_run
         )
         self.make_host_read_only(self.switch_from_host)
+        self.read_only_since = time.monotonic()
 
-        backup_file = self.start_backup_on_switch_from_host()
-        self.transfer_backup_file(backup_file)
-
-        self.safe_rollback = False
-
-        # TODO: It would be nice to add in something that would check the host to make sure the role is applied
-        # correctly before proceeding
-        ask_confirmation(
-            f"Please merge the change to set the puppet role for gitlab primary on {self.switch_to_host}. "
-            "When you hit go, we will re-enable puppet and execute a puppet run"
-        )
-        self.spicerack.puppet(self.switch_to_host).run(enable_reason=self.reason)
-        self.start_restore_process()
+        if self.pipelined:
+            self.failover_pipelined()
+        else:
+            self.failover_sequentially()
 
         ask_confirmation(
             f"Please merge a DNS update to point `{self.switch_from_gitlab_url}` to {self.switch_to_host} "
             f"and `{self.switch_to_gitlab_url}` to {self.switch_from_host}"
         )
         confirm_on_failure(self.check_for_correct_dns)
+        self.report_read_only_window()
 
         ask_confirmation(
             f"Please verify that the switchover to {self.switch_from_gitlab_url} is operating as expected. "
@@ -254,6 +285,176 @@ class FailoverRunner(CookbookRunnerBase):
         logger.info("Placing 'deploy' page on %s", host)
         host.run_sync(f"{GITLAB_CTL} deploy-page up", print_progress_bars=False)
 
+    @contextmanager
+    def timed(self, component: str, stage: str) -> Iterator[None]:
+        """Records the start and end of a stage of a backup component, relative to when GitLab became read-only"""
+        start = time.monotonic() - self.read_only_since
+        try:
+            yield
+        finally:
+            self.timings.setdefault(component, {})[stage] = (start, time.monotonic() - self.read_only_since)
+
+    def confirm_primary_role(self) -> None:
+        """Asks to merge the puppet role change for the new primary and runs puppet on it"""
+        self.safe_rollback = False
+
+        # TODO: It would be nice to add in something that would check the host to make sure the role is applied
+        # correctly before proceeding
+        ask_confirmation(
+            f"Please merge the change to set the puppet role for gitlab primary on {self.switch_to_host}. "
+            "When you hit go, we will re-enable puppet and execute a puppet run"
+        )
+        self.spicerack.puppet(self.switch_to_host).run(enable_reason=self.reason)
+
+    def failover_sequentially(self) -> None:
+        """Creates, transfers and restores a single full backup, one step after the other"""
+        with self.timed("full", "backup"):
+            backup_file = self.start_backup_on_switch_from_host()
+        with self.timed("full", "transfer"):
+            self.transfer_backup_file(backup_file)
+
+        self.confirm_primary_role()
+        with self.timed("full", "restore"):
+            self.start_restore_process()
+
+    def failover_pipelined(self) -> None:
+        """Creates and transfers the backup components as a pipeline, then restores them
+
+        The components are created one at a time on the switch_from host, each one is transferred while the next
+        one is being created. The puppet role change for the new primary is requested only once all the transfers
+        succeeded, so that a failure up to that point can still be safely rolled back. The switch_to host then
+        restores the components in order.
+        """
+        logger.info(
+            "Locking backups on %s and %s to prevent the backup and restore crons from interfering",
+            self.switch_from_host,
+            self.switch_to_host,
+        )
+        lock_backups_on_host(self.switch_from_host, BACKUP_DIRECTORY)
+        lock_backups_on_host(self.switch_to_host, BACKUP_DIRECTORY)
+        self.switch_to_host.run_sync(
+            f"rm -f {BACKUP_DIRECTORY}/failover_*_gitlab_backup.tar", print_progress_bars=False
+        )
+
+        logger.info("Creating the %s backup components on %s", ", ".join(BACKUP_COMPONENTS), self.switch_from_host)
+        logger.info("*** THIS IS SLOW. THE REPOSITORIES ALONE WILL TAKE 30 MINUTES OR MORE ***")
+        backups = ThreadPoolExecutor(max_workers=1)
+        transfers = ThreadPoolExecutor(max_workers=1)
+        try:
+            pending = []
+            for component in BACKUP_COMPONENTS:
+                backup = backups.submit(self.create_component_backup, component)
+                pending.append(transfers.submit(self.transfer_component_backup, component, backup))
+
+            for transfer in pending:
+                transfer.result()
+        finally:
+            backups.shutdown(cancel_futures=True)
+            transfers.shutdown(cancel_futures=True)
+
+        self.confirm_primary_role()
+        logger.info("Stopping puma and sidekiq on %s to restore the backup components", self.switch_to_host)
+        self.switch_to_host.run_sync(
+            f"{GITLAB_CTL} stop puma && {GITLAB_CTL} stop sidekiq", print_progress_bars=False
+        )
+        for component in BACKUP_COMPONENTS:
+            with self.timed(component, "restore"):
+                self.restore_component_backup(component)
+
+        logger.info("Reconfiguring and restarting GitLab on %s", self.switch_to_host)
+        self.switch_to_host.run_sync(
+            f"{GITLAB_CTL} reconfigure && {GITLAB_CTL} restart", print_progress_bars=False
+        )
+        cmd = (
+            f'echo "ApplicationSetting.last.update(home_page_url: \'{self.switch_from_gitlab_url}/explore\')" '
+            '| /usr/bin/gitlab-rails console'
+        )
+        self.switch_to_host.run_sync(cmd, print_progress_bars=False, is_safe=False)
+        unlock_backups_on_host(self.switch_to_host, BACKUP_DIRECTORY)
+
+    @staticmethod
+    def get_component_options(component: str) -> str:
+        """Returns the gitlab-backup options to create or restore only the given backup component"""
+        skip = ",".join(task for task in GITLAB_BACKUP_TASKS if task not in BACKUP_COMPONENTS[component])
+        return f"BACKUP=failover_{component} SKIP={skip}"
+
+    def create_component_backup(self, component: str) -> str:
+        """Creates the backup of a single component on the switch_from host, returns the backup file name"""
+        with self.timed(component, "backup"):
+            logger.info("Creating the %s backup on %s", component, self.switch_from_host)
+            self.switch_from_host.run_sync(
+                f"{GITLAB_BACKUP} create {self.get_component_options(component)}", print_progress_bars=False
+            )
+            logger.info("The %s backup is complete", component)
+
+        return f"failover_{component}_gitlab_backup.tar"
+
+    def transfer_component_backup(self, component: str, backup: Future) -> None:
+        """Transfers the backup of a single component as soon as it has been created"""
+        backup_file = backup.result()
+        with self.timed(component, "transfer"):
+            self.transfer_file(backup_file)
+
+    @retry(
+        tries=TRANSFER_TRIES,
+        delay=timedelta(seconds=30),
+        backoff_mode='constant',
+        failure_message='Resuming the backup transfer',
+        exceptions=(RemoteExecutionError, RuntimeError),
+    )
+    def transfer_file(self, backup_file: str) -> None:
+        """Transfers a backup file, resuming a partial transfer if any, and verifies it on the switch_to host"""
+        path = f"{BACKUP_DIRECTORY}/{backup_file}"
+        logger.info("Transferring %s to %s", backup_file, self.switch_to_host)
+        self.switch_from_host.run_sync(
+            f"/usr/bin/rsync -avp --partial --append-verify {path} rsync://{self.switch_to_host}/data-backup",
+            print_progress_bars=False
+        )
+        if self.spicerack.dry_run:
+            return
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            source, destination = executor.map(
+                lambda host: get_checksum_for_path(host, path), (self.switch_from_host, self.switch_to_host)
+            )
+        if source != destination:
+            # A stale or corrupted file can't be resumed, start over on the next try.
+            self.switch_to_host.run_sync(f"rm -f {path}", print_progress_bars=False)
+            raise RuntimeError(
+                f"Checksum mismatch for {backup_file} on {self.switch_to_host}: {destination} instead of {source}"
+            )
+        logger.info("Transferred %s to %s, checksum %s", backup_file, self.switch_to_host, source)
+
+    def restore_component_backup(self, component: str) -> None:
+        """Restores the backup of a single component on the switch_to host"""
+        logger.info("Restoring the %s backup on %s", component, self.switch_to_host)
+        self.switch_to_host.run_sync(
+            f"GITLAB_ASSUME_YES=1 {GITLAB_BACKUP} restore {self.get_component_options(component)} force=yes",
+            print_progress_bars=False,
+        )
+
+    def report_read_only_window(self) -> None:
+        """Logs and comments on the task how long GitLab was read-only and how long each step took"""
+        window = timedelta(seconds=round(time.monotonic() - self.read_only_since))
+        table = PrettyTable(["Component", "Stage", "Start", "End", "Duration"])
+        table.align = "l"
+        steps = sorted(
+            ((component, stage, start, end) for component, stages in self.timings.items()
+             for stage, (start, end) in stages.items()),
+            key=lambda step: step[2],
+        )
+        for component, stage, start, end in steps:
+            table.add_row([
+                component,
+                stage,
+                str(timedelta(seconds=round(start))),
+                str(timedelta(seconds=round(end))),
+                str(timedelta(seconds=round(end - start))),
+            ])
+
+        logger.info("GitLab was read-only for %s:\n%s", window, table)
+        self.maybe_task_comment(f"GitLab was read-only for {window} during the failover:\n```\n{table}\n```")
+
     def start_backup_on_switch_from_host(self) -> str:
         """Starts a backup on the existing Gitlab host"""
         logger.info("Creates a backup on the switch_from host.")
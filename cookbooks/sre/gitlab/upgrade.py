@@ -6,7 +6,6 @@ import re
 import time
 from packaging import version
 
-import gitlab
 from wmflib.interactive import ask_confirmation, ensure_shell_is_durable, get_secret
 from spicerack.alertmanager import AlertmanagerError
 from spicerack.cookbook import CookbookBase, CookbookRunnerBase, LockArgs
@@ -15,7 +14,7 @@ from spicerack.remote import RemoteExecutionError
 
 from cookbooks.sre import PHABRICATOR_BOT_CONFIG_FILE
 from cookbooks.sre.gitlab import (
-    get_gitlab_url, get_disk_usage_for_path, lock_backups_on_host,
+    _gitlab, get_gitlab_url, get_disk_usage_for_path, lock_backups_on_host,
     pause_runners, unlock_backups_on_host, unpause_runners
 )
 
@@ -109,7 +108,7 @@ class UpgradeRunner(CookbookRunnerBase):
         self.skip_replica_backups = args.skip_replica_backups
 
         self.token = get_secret('GitLab API Token')
-        self.gitlab_instance = gitlab.Gitlab(self.url, private_token=self.token)
+        self.gitlab_instance = _gitlab().Gitlab(self.url, private_token=self.token)
 
         self.phabricator = spicerack.phabricator(PHABRICATOR_BOT_CONFIG_FILE)
 
@@ -148,7 +147,7 @@ class UpgradeRunner(CookbookRunnerBase):
                 'message': f'Maintenance {self.message} starting soon.',
                 'broadcast_type': 'notification'
             })
-        except gitlab.exceptions.GitlabCreateError as e:
+        except _gitlab().exceptions.GitlabCreateError as e:
             raise RuntimeError("Unable to create broadcast message."
                                "Make sure your access token uses scope api and admin_mode.") from e
 
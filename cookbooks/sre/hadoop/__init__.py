@@ -23,8 +23,21 @@ edit stream for the HDFS file system (supporting HA between master nodes). The j
 cluster can sustain up to n/2 failures without causing errors, but more than that
 causes the HDFS Namenodes to shutdown (as precautionary measure).
 
+
+The helpers at the end of this module probe the state of the HDFS and Yarn daemons, so that the cookbooks can
+move on as soon as the cluster is ready instead of sleeping for a fixed amount of time.
 """
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from spicerack.remote import RemoteExecutionError, RemoteHosts
+
 __owner_team__ = "Data Platform"
+logger = logging.getLogger(__name__)
 
 # List of Hadoop cluster names (reused across cookbooks)
 HADOOP_CLUSTER_NAMES = ('test', 'analytics')
@@ -67,3 +80,135 @@ CDH_PACKAGES_NOT_IN_BIGTOP = ('avro-libs', 'hadoop-0.20-mapreduce', 'kite',
 # Due to the high number of Hadoop worker nodes, remote commands are tolerated
 # to fail up to a 10% threshold to avoid unnecessary failures of cookbook.
 HADOOP_WORKERS_CUMIN_SUCCESS_THRESHOLD = 0.9
+
+# How often to probe the state of the cluster while waiting for a condition.
+PROBE_INTERVAL_SECONDS = 10.0
+# Java processes running on the workers that are Hadoop daemons and not Yarn containers.
+WORKER_DAEMONS = ('JournalNode', 'DataNode', 'NodeManager')
+
+
+@dataclass
+class HDFSReport:
+    """The state of HDFS as reported by the active Namenode."""
+
+    live_datanodes: int
+    last_block_reports: dict[str, Optional[datetime]] = field(default_factory=dict)
+    """The time of the last full block report of each live Datanode, keyed by hostname."""
+
+
+def _get_output(remote_hosts: RemoteHosts, command: str) -> str:
+    """Run a read-only command on the given hosts and return its output."""
+    results = remote_hosts.run_sync(command, is_safe=True, print_output=False, print_progress_bars=False)
+    return '\n'.join(output.message().decode() for _, output in results)
+
+
+def get_hdfs_namenode_state(remote_handle: RemoteHosts, service: str) -> str:
+    """Return the HA state of a HDFS Namenode (e.g. active, standby), or an empty string if not reachable."""
+    try:
+        return _get_output(
+            remote_handle, f'kerberos-run-command hdfs /usr/bin/hdfs haadmin -getServiceState {service}').strip()
+    except RemoteExecutionError:
+        return ''
+
+
+def get_yarn_resourcemanager_state(remote_handle: RemoteHosts, service: str) -> str:
+    """Return the HA state of a Yarn Resourcemanager (e.g. active, standby), or an empty string if not reachable."""
+    try:
+        return _get_output(
+            remote_handle, f'kerberos-run-command yarn /usr/bin/yarn rmadmin -getServiceState {service}').strip()
+    except RemoteExecutionError:
+        return ''
+
+
+def is_hdfs_safemode_off(remote_handle: RemoteHosts) -> bool:
+    """Return whether all the HDFS Namenodes are reachable and out of safe mode."""
+    try:
+        output = _get_output(remote_handle, 'kerberos-run-command hdfs /usr/bin/hdfs dfsadmin -safemode get')
+    except RemoteExecutionError:
+        return False
+
+    lines = [line for line in output.splitlines() if line.startswith('Safe mode is')]
+    return bool(lines) and all(line.startswith('Safe mode is OFF') for line in lines)
+
+
+def get_hdfs_report(remote_handle: RemoteHosts) -> Optional[HDFSReport]:
+    """Return the live Datanodes and their last block reports from the active HDFS Namenode, None if not reachable."""
+    try:
+        output = _get_output(remote_handle, 'kerberos-run-command hdfs /usr/bin/hdfs dfsadmin -report -live')
+    except RemoteExecutionError:
+        return None
+
+    live = re.search(r'^Live datanodes \((\d+)\):', output, re.MULTILINE)
+    if live is None:
+        logger.debug('Unable to parse the HDFS report:\n%s', output)
+        return None
+
+    report = HDFSReport(live_datanodes=int(live.group(1)))
+    hostname = ''
+    for line in output.splitlines():
+        key, _, value = line.partition(': ')
+        if key == 'Hostname':
+            hostname = value.strip()
+            report.last_block_reports[hostname] = None
+        elif key == 'Last Block Report' and hostname:
+            try:  # Java's Date.toString() format, the Hadoop hosts run in UTC
+                parsed = datetime.strptime(value.strip(), '%a %b %d %H:%M:%S UTC %Y')
+            except ValueError:
+                continue
+            report.last_block_reports[hostname] = parsed.replace(tzinfo=timezone.utc)
+
+    return report
+
+
+def count_yarn_containers(remote_hosts: RemoteHosts) -> int:
+    """Return how many Yarn containers' jvms are running on the given workers, -1 if unable to check."""
+    command = 'ps -eo args | grep [j]ava | grep -v -E "{}" | wc -l'.format('|'.join(WORKER_DAEMONS))
+    try:
+        results = remote_hosts.run_sync(command, is_safe=True, print_output=False, print_progress_bars=False)
+        # Cumin groups the hosts with the same output, hence each count applies to all the hosts of its group
+        return sum(len(nodes) * int(output.message().decode().strip()) for nodes, output in results)
+    except (RemoteExecutionError, ValueError):
+        return -1
+
+
+def are_units_stopped(remote_hosts: RemoteHosts, *units: str) -> bool:
+    """Return whether none of the given systemd units is active on any of the given hosts."""
+    try:
+        remote_hosts.run_sync(f'! systemctl is-active --quiet {" ".join(units)}', is_safe=True, print_output=False,
+                              print_progress_bars=False)
+    except RemoteExecutionError:
+        return False
+
+    return True
+
+
+def wait_until(check: Callable[[], bool], description: str, timeout: float,
+               interval: float = PROBE_INTERVAL_SECONDS) -> bool:
+    """Probe the cluster until a condition holds or the timeout expires, whichever comes first.
+
+    The timeout is an upper bound: the wait ends as soon as the check succeeds. On timeout a warning is logged
+    and the cookbook moves on, as it used to do after its fixed sleep.
+
+    Arguments:
+        check: a callable that returns whether the condition holds.
+        description: the condition to wait for, used in the log messages.
+        timeout: the maximum number of seconds to wait.
+        interval: the seconds to wait between each probe.
+
+    Returns:
+        bool: whether the condition was met before the timeout.
+
+    """
+    logger.info('Waiting up to %.0f seconds for %s.', timeout, description)
+    start = time.monotonic()
+    while True:
+        if check():
+            logger.info('Condition met after %.0f seconds: %s.', time.monotonic() - start, description)
+            return True
+
+        remaining = timeout - (time.monotonic() - start)
+        if remaining <= 0:
+            logger.warning('Timed out after %.0f seconds waiting for %s, moving on.', timeout, description)
+            return False
+
+        time.sleep(min(interval, remaining))
@@ -1,7 +1,6 @@
 """Reboot all worker nodes in a given Hadoop cluster."""
 import logging
 import math
-import time
 
 from datetime import datetime, timedelta, timezone
 
@@ -9,7 +8,7 @@ from wmflib.interactive import confirm_on_failure, ensure_shell_is_durable
 
 from spicerack.cookbook import CookbookBase, CookbookRunnerBase
 
-from cookbooks.sre.hadoop import HADOOP_CLUSTER_NAMES
+from cookbooks.sre.hadoop import HADOOP_CLUSTER_NAMES, count_yarn_containers, get_hdfs_report, wait_until
 
 
 logger = logging.getLogger(__name__)
@@ -31,13 +30,15 @@ class RebootHadoopWorkers(CookbookBase):
     - disable puppet
     - stop the Yarn Namenode, to avoid any job to schedule jvm containers on the host
       (a sort of hacky drain procedure).
-    - wait some minutes to give a chance to the jvm containers to finish (if they
+    - wait for the jvm containers to finish, up to some minutes (if they
       don't it is not a big problem, jobs in Hadoop can be rescheduled).
     - stop the HDFS datanode on the host (safer than abruptively rebooting,
       from the point of view of corrupted HDFS blocks).
     - stop the HDFS journalnode (if running on the host).
     - reboot
     - wait for the host to boot
+    - wait for the HDFS Datanodes to be live again and to have sent a block report
+      to the active Namenode, up to some minutes, before moving to the next batch.
     """
 
     def argument_parser(self):
@@ -46,12 +47,13 @@ class RebootHadoopWorkers(CookbookBase):
         parser.add_argument('cluster', help='The name of the Hadoop cluster to work on.',
                             choices=HADOOP_CLUSTER_NAMES)
         parser.add_argument('--yarn-nm-sleep-seconds', type=float, default=600.0,
-                            help='Seconds to sleep after stopping the Yarn Nodemanager.')
+                            help='Maximum seconds to wait for the Yarn containers to finish after '
+                                 'stopping the Yarn Nodemanager.')
         parser.add_argument('--reboot-batch-sleep-seconds', type=float, default=600.0,
-                            help='Seconds to sleep between each batch of reboots. '
-                                 'The batches will not apply to hosts running '
-                                 'a HDFS Journalnode (that will be rebooted strictly '
-                                 'one at the time).')
+                            help='Maximum seconds to wait for the rebooted HDFS Datanodes to report '
+                                 'their blocks before the next batch of reboots. The batches '
+                                 'will not apply to hosts running a HDFS Journalnode (that will '
+                                 'be rebooted strictly one at the time).')
         parser.add_argument('--batch-size', type=int, default=2,
                             help='Size of each batch of reboots.')
         parser.add_argument('--workers-cumin-query', required=False, help='A cumin query string to select '
@@ -73,9 +75,11 @@ class RebootHadoopWorkersRunner(CookbookRunnerBase):
         if args.cluster == 'test':
             self.cluster_cumin_alias = 'A:hadoop-worker-test'
             self.hdfs_jn_cumin_alias = 'A:hadoop-hdfs-journal-test'
+            master_cumin_alias = 'A:hadoop-master-test'
         elif args.cluster == 'analytics':
             self.cluster_cumin_alias = 'A:hadoop-worker'
             self.hdfs_jn_cumin_alias = 'A:hadoop-hdfs-journal'
+            master_cumin_alias = 'A:hadoop-master'
         else:
             raise RuntimeError("Hadoop cluster {} not supported.".format(args.cluster))
 
@@ -86,6 +90,8 @@ class RebootHadoopWorkersRunner(CookbookRunnerBase):
         self.spicerack = spicerack
         self.reboot_batch_size = args.batch_size
         self.yarn_nm_sleep_seconds = args.yarn_nm_sleep_seconds
+        self.reboot_batch_sleep_seconds = args.reboot_batch_sleep_seconds
+        self.hadoop_master = self.spicerack_remote.query(master_cumin_alias)
         self.workers_cumin_query = args.workers_cumin_query
         self.reason = spicerack.admin_reason('Reboot.')
 
@@ -103,12 +109,13 @@ class RebootHadoopWorkersRunner(CookbookRunnerBase):
             puppet = self.spicerack.puppet(hadoop_workers_batch)
             puppet.disable(self.reason)
             logger.debug('Disabled puppet on: %s', hadoop_workers_batch.hosts)
+            report = get_hdfs_report(self.hadoop_master)
+            live_datanodes = report.live_datanodes if report is not None else None
             logger.info('Stopping the Yarn Nodemanagers...')
             confirm_on_failure(
                 hadoop_workers_batch.run_sync, 'systemctl stop hadoop-yarn-nodemanager')
-            logger.info(
-                'Wait %s seconds to allow jvm containers to finish..', self.yarn_nm_sleep_seconds)
-            time.sleep(self.yarn_nm_sleep_seconds)
+            wait_until(lambda: count_yarn_containers(hadoop_workers_batch) == 0,
+                       'the jvm containers to finish', self.yarn_nm_sleep_seconds)
             logger.info('Stopping the HDFS Datanodes...')
             confirm_on_failure(
                 hadoop_workers_batch.run_sync, 'systemctl stop hadoop-hdfs-datanode')
@@ -126,6 +133,28 @@ class RebootHadoopWorkersRunner(CookbookRunnerBase):
                 hadoop_workers_batch.wait_reboot_since, reboot_time)
             puppet.enable(self.reason)
             logger.debug('Enabled puppet on: %s', hadoop_workers_batch.hosts)
+            wait_until(lambda: self._datanodes_reported_since(hadoop_workers_batch, reboot_time, live_datanodes),
+                       'the HDFS Datanodes to be live and to send a block report', self.reboot_batch_sleep_seconds)
+
+    def _datanodes_reported_since(self, hadoop_workers_batch, since, live_datanodes=None):
+        """Return whether all the Datanodes of the batch are live and sent a block report after the given time.
+
+        If given, also the total number of live Datanodes must be back to at least live_datanodes.
+        """
+        report = get_hdfs_report(self.hadoop_master)
+        if report is None:
+            return False
+
+        if live_datanodes is not None and report.live_datanodes < live_datanodes:
+            logger.debug('HDFS live Datanodes: %d, waiting for %d', report.live_datanodes, live_datanodes)
+            return False
+
+        for host in hadoop_workers_batch.hosts:
+            last_block_report = report.last_block_reports.get(host)
+            if last_block_report is None or last_block_report < since:
+                return False
+
+        return True
 
     def run(self):
         """Reboot all Hadoop workers of a given cluster"""
@@ -1,13 +1,13 @@
 """Restart all Hadoop jvm daemons on master hosts."""
 import logging
-import time
 
 from datetime import timedelta
 
 from spicerack.cookbook import CookbookBase, CookbookRunnerBase
 from wmflib.interactive import ask_confirmation, ensure_shell_is_durable
 
-from . import HADOOP_CLUSTER_NAMES
+from . import (HADOOP_CLUSTER_NAMES, get_hdfs_namenode_state, get_yarn_resourcemanager_state,
+               is_hdfs_safemode_off, wait_until)
 
 logger = logging.getLogger(__name__)
 
@@ -18,13 +18,16 @@ class RollRestartMasters(CookbookBase):
     - Set Icinga/Alertmanager downtime for all nodes (no puppet disable or depool is needed).
     - Check the status of Yarn Resourcemanager daemons (expecting an active and a standby node).
     - Check the status of HDFS Namenode daemons (expecting an active and a standby node).
-    - Restart one Resource Manager at a time.
+    - Restart one Resource Manager at a time, waiting for it to rejoin the HA pair.
     - Force a failover of HDFS Namenode to the standby node.
-    - Restart one HDFS Namenode (the current standby).
+    - Restart one HDFS Namenode (the current standby), waiting for it to be back as standby and
+      for all the Namenodes to be out of safe mode.
     - Force a failover of HDFS Namenode to the standby node (basically restoring the prev. state).
     - Restart the Mapreduce history server (only on one host).
     - Remove the Icinga/Alertmanager downtime.
 
+    The sleep options are upper bounds: each step moves on as soon as the daemons report the expected state.
+
     Usage example:
       cookbook sre.hadoop.roll-restart-masters analytics
       cookbook sre.hadoop.roll-restart-masters --yarn-rm-sleep-seconds 180 --hdfs-nn-sleep-seconds 900 backup
@@ -36,9 +39,9 @@ class RollRestartMasters(CookbookBase):
         parser.add_argument('cluster', help='The name of the Hadoop cluster to work on.',
                             choices=HADOOP_CLUSTER_NAMES)
         parser.add_argument('--yarn-rm-sleep-seconds', type=float, default=60.0,
-                            help="Seconds to sleep between Yarn Resourcemanager restarts.")
+                            help="Maximum seconds to wait between Yarn Resourcemanager restarts.")
         parser.add_argument('--hdfs-nn-sleep-seconds', type=float, default=600.0,
-                            help="Seconds to sleep between HDFS Namenode restarts.")
+                            help="Maximum seconds to wait between HDFS Namenode restarts.")
 
         return parser
 
@@ -105,8 +108,10 @@ class RollRestartMastersRunner(CookbookRunnerBase):
         with self.alerting_hosts.downtimed(self.admin_reason, duration=timedelta(minutes=120)):
             logger.info("Restarting Yarn Resourcemanager on Master.")
             self.hadoop_master.run_sync('systemctl restart hadoop-yarn-resourcemanager')
-            logger.info("Sleeping %s seconds.", self.yarn_rm_sleep)
-            time.sleep(self.yarn_rm_sleep)
+            wait_until(
+                lambda: get_yarn_resourcemanager_state(
+                    self.hadoop_master, self.hadoop_master_service) in ('active', 'standby'),
+                'the Yarn Resourcemanager on the master to rejoin the HA pair', self.yarn_rm_sleep)
             logger.info("Restarting Yarn Resourcemanager on Standby.")
             self.hadoop_standby.run_sync('systemctl restart hadoop-yarn-resourcemanager')
 
@@ -118,16 +123,14 @@ class RollRestartMastersRunner(CookbookRunnerBase):
             logger.info("Run manual HDFS failover from master to standby.")
             run_hdfs_namenode_failover(self.hadoop_master, self.hadoop_master_service, self.hadoop_standby_service)
 
-            logger.info("Sleeping 30 seconds.")
-            time.sleep(30)
+            self._wait_hdfs_active(self.hadoop_standby_service)
 
             logger.info("Restart HDFS Namenode on the master.")
             self.hadoop_master.run_async(
                 'systemctl restart hadoop-hdfs-zkfc',
                 'systemctl restart hadoop-hdfs-namenode')
 
-            logger.info("Sleeping %s seconds.", self.hdfs_nn_sleep)
-            time.sleep(self.hdfs_nn_sleep)
+            self._wait_hdfs_namenode_ready(self.hadoop_master_service)
 
             print_hadoop_service_state(
                 self.hadoop_master, self.hadoop_master_service, self.hadoop_standby_service, yarn=False)
@@ -137,16 +140,14 @@ class RollRestartMastersRunner(CookbookRunnerBase):
             logger.info("Run manual HDFS failover from standby to master.")
             run_hdfs_namenode_failover(self.hadoop_master, self.hadoop_standby_service, self.hadoop_master_service)
 
-            logger.info("Sleeping 30 seconds.")
-            time.sleep(30)
+            self._wait_hdfs_active(self.hadoop_master_service)
 
             logger.info("Restart HDFS Namenode on the standby.")
             self.hadoop_standby.run_async(
                 'systemctl restart hadoop-hdfs-zkfc',
                 'systemctl restart hadoop-hdfs-namenode')
 
-            logger.info("Sleeping %s seconds.", self.hdfs_nn_sleep)
-            time.sleep(self.hdfs_nn_sleep)
+            self._wait_hdfs_namenode_ready(self.hadoop_standby_service)
 
             logger.info("\n\nSummary of active/standby statuses after the restarts:")
 
@@ -156,7 +157,19 @@ class RollRestartMastersRunner(CookbookRunnerBase):
             logger.info("Restart MapReduce historyserver on the master.")
             self.hadoop_master.run_sync('systemctl restart hadoop-mapreduce-historyserver')
 
-    logger.info("All jvm restarts completed!")
+        logger.info("All jvm restarts completed!")
+
+    def _wait_hdfs_active(self, service):
+        """Wait up to 30 seconds for the given HDFS Namenode to become active after a failover."""
+        wait_until(lambda: get_hdfs_namenode_state(self.hadoop_master, service) == 'active',
+                   f'the HDFS Namenode {service} to become active', 30)
+
+    def _wait_hdfs_namenode_ready(self, service):
+        """Wait for a restarted HDFS Namenode to be back as standby, with all the Namenodes out of safe mode."""
+        wait_until(
+            lambda: (get_hdfs_namenode_state(self.hadoop_master, service) == 'standby'
+                     and is_hdfs_safemode_off(self.hadoop_master)),
+            f'the HDFS Namenode {service} to be back as standby and out of safe mode', self.hdfs_nn_sleep)
 
 
 def print_hadoop_service_state(
@@ -1,6 +1,5 @@
 """Stop an Hadoop cluster."""
 import logging
-import time
 
 from datetime import timedelta
 
@@ -10,7 +9,8 @@ from spicerack.cookbook import CookbookBase, CookbookRunnerBase
 
 from . import (HADOOP_CLUSTER_NAMES, CLUSTER_CUMIN_ALIAS,
                MASTER_CUMIN_ALIAS, STANDBY_CUMIN_ALIAS,
-               WORKERS_CUMIN_ALIAS, HDFS_JOURNAL_CUMIN_ALIAS)
+               WORKERS_CUMIN_ALIAS, HDFS_JOURNAL_CUMIN_ALIAS,
+               are_units_stopped, get_hdfs_namenode_state, get_yarn_resourcemanager_state, wait_until)
 
 logger = logging.getLogger(__name__)
 
@@ -62,6 +62,9 @@ class StopHadoopRunner(CookbookRunnerBase):
         self.hadoop_workers = spicerack.remote().query(workers_alias)
         self.hadoop_master = spicerack.remote().query(master_alias)
         self.hadoop_standby = spicerack.remote().query(standby_alias)
+        # Format of the hostnames used by the haadmin/rmadmin commands, for example an-master1001-eqiad-wmnet
+        self.hadoop_master_service = self.hadoop_master.hosts[0].replace('.', '-')
+        self.hadoop_standby_service = self.hadoop_standby.hosts[0].replace('.', '-')
 
         self.alerting_hosts = spicerack.alerting_hosts(self.hadoop_hosts.hosts)
         self.admin_reason = spicerack.admin_reason('Stop the Hadoop cluster before maintenance.')
@@ -97,18 +100,15 @@ class StopHadoopRunner(CookbookRunnerBase):
 
         logger.info('Checking HDFS master/standby status.')
 
-        hadoop_master_hdfs_service = self.hadoop_master.hosts[0].replace('.', '-')
-        hadoop_standby_hdfs_service = self.hadoop_standby.hosts[0].replace('.', '-')
-
         logger.info('HDFS Master status:')
         self.hadoop_master.run_sync(
             'kerberos-run-command hdfs /usr/bin/hdfs haadmin -getServiceState ' +
-            hadoop_master_hdfs_service)
+            self.hadoop_master_service)
 
         logger.info('HDFS Standby status:')
         self.hadoop_master.run_sync(
             'kerberos-run-command hdfs /usr/bin/hdfs haadmin -getServiceState ' +
-            hadoop_standby_hdfs_service)
+            self.hadoop_standby_service)
 
         ask_confirmation('Please make sure that the active/standby nodes are correct.')
 
@@ -124,6 +124,13 @@ class StopHadoopRunner(CookbookRunnerBase):
             'ls -lh /root/hadoop-namedir-backup-stop-cluster-cookbook*')
         logger.info("Safety checks completed, starting the procedure.")
 
+    def _confirm_master_active(self, daemon, get_state):
+        """Ask the operator whether to continue if the daemon on the master is not active after stopping the standby."""
+        state = get_state(self.hadoop_master, self.hadoop_master_service)
+        if state != 'active':
+            ask_confirmation(f'The {daemon} on the master is {state or "not reachable"} instead of active, '
+                             'continue stopping the cluster?')
+
     def run(self):
         """Restart all Hadoop jvm daemons on a given cluster"""
         ensure_shell_is_durable()
@@ -141,8 +148,9 @@ class StopHadoopRunner(CookbookRunnerBase):
         self.hadoop_standby.run_sync(
             'systemctl stop hadoop-yarn-resourcemanager')
 
-        logger.info('Sleeping some seconds to let things to stabilize.')
-        time.sleep(10)
+        wait_until(lambda: are_units_stopped(self.hadoop_standby, 'hadoop-yarn-resourcemanager'),
+                   'the Yarn Resourcemanager on the standby to be stopped', 10)
+        self._confirm_master_active('Yarn Resourcemanager', get_yarn_resourcemanager_state)
 
         self.hadoop_master.run_sync(
             'systemctl stop hadoop-yarn-resourcemanager')
@@ -159,8 +167,9 @@ class StopHadoopRunner(CookbookRunnerBase):
             'systemctl stop hadoop-hdfs-namenode',
             'systemctl stop hadoop-hdfs-zkfc')
 
-        logger.info('Sleeping one minute to let things to stabilize')
-        time.sleep(60)
+        wait_until(lambda: are_units_stopped(self.hadoop_standby, 'hadoop-hdfs-namenode', 'hadoop-hdfs-zkfc'),
+                   'the HDFS Namenode and ZKFC on the standby to be stopped', 60)
+        self._confirm_master_active('HDFS Namenode', get_hdfs_namenode_state)
 
         logger.info('Stopping HDFS Master Namenode.')
         self.hadoop_master.run_sync(
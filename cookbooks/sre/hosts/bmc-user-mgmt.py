@@ -1,22 +1,63 @@
 """Manage BMC users via Redfish"""
 
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from getpass import getpass
+from typing import Any, Callable, Optional
 
 from cumin import NodeSet
+from prettytable import PrettyTable
 from wmflib.interactive import ask_confirmation, ensure_shell_is_durable
 
 from spicerack.apiclient import APIClientResponseError
 from spicerack.cookbook import CookbookBase, CookbookRunnerBase, LockArgs
+from spicerack.decorators import retry
 from spicerack.ipmi import IpmiError
 from spicerack.netbox import NetboxError
 from spicerack.redfish import RedfishError
 
-from getpass import getpass
 from urllib3.exceptions import HTTPError
 
 logger = logging.getLogger(__name__)
 
 
+class TransientRedfishError(RedfishError):
+    """Raised when a Redfish call failed for a reason that might go away retrying it."""
+
+
+def _is_transient(error: Exception) -> bool:
+    """Return whether the given Redfish error is worth retrying.
+
+    Client errors (HTTP 4xx) are never retried, as retrying a wrong login could lock the account out of the BMC.
+    """
+    response_error = error if isinstance(error, APIClientResponseError) else error.__cause__
+    if isinstance(response_error, APIClientResponseError) and response_error.response is not None:
+        return response_error.response.status_code >= 500  # pylint: disable=no-member
+    return True
+
+
+@retry(tries=3, delay=timedelta(seconds=3), backoff_mode='linear', exceptions=(TransientRedfishError,))
+def redfish_call(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """Call a Redfish method, retrying it on transient failures.
+
+    Arguments:
+        func: the Redfish method to call.
+        *args: the positional arguments to pass to the method.
+        **kwargs: the keyword arguments to pass to the method.
+
+    Raises:
+        spicerack.redfish.RedfishError: if the call failed, after the retries for transient failures.
+
+    """
+    try:
+        return func(*args, **kwargs)
+    except (RedfishError, APIClientResponseError) as e:
+        if _is_transient(e):
+            raise TransientRedfishError(str(e)) from e
+        raise
+
+
 class BMCUserMgmt(CookbookBase):
     """Manage BMC users via Redfish
 
@@ -26,6 +67,13 @@ class BMCUserMgmt(CookbookBase):
     - ADMIN user with pwstore's management password (Supermicro only)
 
     If a new password is provided, it will be used instead of the management one.
+
+    The hosts are processed in parallel, up to --concurrency at a time, with a single Redfish session per host.
+    Transient Redfish failures are retried, authentication failures are not, to avoid locking out the accounts.
+    A report of the changes made on each host is printed at the end.
+
+    With --check-only no change is made, the current accounts of all the hosts are fetched in parallel and the
+    differences with the expected state are reported.
     """
 
     owner_team = 'Infrastructure Foundations'
@@ -62,8 +110,21 @@ class BMCUserMgmt(CookbookBase):
         parser.add_argument(
             '--max-redfish-failures',
             default=20,
+            type=int,
             help="The maximum Redfish failure to tolerate before bailing out."
         )
+        parser.add_argument(
+            '--concurrency',
+            default=10,
+            type=int,
+            help='The number of hosts to act upon in parallel (default: %(default)s).'
+        )
+        parser.add_argument(
+            '--check-only',
+            action='store_true',
+            help=('Do not change anything, fetch the current BMC accounts of all the hosts and report '
+                  'the differences with the expected ones.')
+        )
 
         return parser
 
@@ -83,12 +144,26 @@ class BMCUserMgmtRunner(CookbookRunnerBase):
         if not self.remote_hosts:
             raise RuntimeError('No hosts selected, bailing out.')
 
-        ask_confirmation(
-            f"The target hosts are {str(self.remote_hosts)}. Ok to proceed?")
+        if not args.check_only:
+            ask_confirmation(
+                f"The target hosts are {str(self.remote_hosts)}. Ok to proceed?")
+
+        self.host_status = {
+            'success': NodeSet(),
+            'fail_netbox': NodeSet(),
+            'fail_redfish': NodeSet(),
+            'fail_root_remove': NodeSet(),
+            'fail_dell_ipmi': NodeSet(),
+            'fail_ipmi': NodeSet(),
+        }
+        # Changes made (or differences found with --check-only) for each host
+        self.host_changes: dict[str, list[str]] = {}
 
     @property
     def runtime_description(self):
         """Return a nicely formatted string that represents the cookbook action."""
+        if self.args.check_only:
+            return f'check only for {len(self.remote_hosts.hosts)} hosts'
         return f'for {len(self.remote_hosts.hosts)} hosts'
 
     @property
@@ -129,194 +204,292 @@ class BMCUserMgmtRunner(CookbookRunnerBase):
                     continue
                 break
 
-        self.host_status = {
-            'success': NodeSet(),
-            'fail_netbox': NodeSet(),
-            'fail_redfish': NodeSet(),
-            'fail_root_remove': NodeSet(),
-            'fail_dell_ipmi': NodeSet(),
-            'fail_ipmi': NodeSet(),
-        }
         password_to_enforce: str = new_password if new_password else mgmt_password
-        for host in self.remote_hosts:
+        host_action = self._check_host if self.args.check_only else self._update_host
+        hosts = list(self.remote_hosts.hosts)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.args.concurrency, len(hosts)))) as executor:
+            futures = {
+                executor.submit(host_action, host, mgmt_password, password_to_enforce): host for host in hosts
+            }
             try:
-                hostname = str(host).split('.')[0]
-                logger.info("\n===== Updating %s =====\n", hostname)
-                netbox_server = self.spicerack.netbox_server(hostname)
-                netbox_data = netbox_server.as_dict()
-                if netbox_data['is_virtual']:
-                    logger.info("The host %s is virtual, skipping.", hostname)
-                    continue
-                manufacturer_slug = netbox_data['device_type']['manufacturer']['slug']
-            except (NetboxError, HTTPError) as e:
-                logger.warning('Unable to get the mgmt address from Netbox for %s: %s', hostname, e)
-                self.host_status['fail_netbox'].add(host)
+                for future in as_completed(futures):
+                    host = futures[future]
+                    status, changes = future.result()
+                    if status is None:  # Skipped
+                        continue
+                    self.host_status[status].add(host)
+                    self.host_changes[host] = changes
+                    self._check_overall_failures()
+            except BaseException:
+                executor.shutdown(wait=True, cancel_futures=True)
+                self._report()
+                raise
+
+        self._report()
+        if self.args.check_only:
+            return 1 if any(self.host_changes.values()) else 0
+        return 0
+
+    def _get_manufacturer(self, hostname: str) -> tuple[Optional[Any], str, str]:
+        """Get the Netbox server, manufacturer slug and manufacturer admin user for the given host.
+
+        Returns:
+            A tuple with the Netbox server, the manufacturer slug and its admin user. The server is None if the host
+            is virtual.
+
+        Raises:
+            RuntimeError: if the manufacturer is not supported.
+
+        """
+        netbox_server = self.spicerack.netbox_server(hostname)
+        netbox_data = netbox_server.as_dict()
+        if netbox_data['is_virtual']:
+            return None, '', ''
+        manufacturer_slug = netbox_data['device_type']['manufacturer']['slug']
+        if manufacturer_slug == 'dell':
+            manufacturer_admin = 'root'
+        elif manufacturer_slug == 'supermicro':
+            manufacturer_admin = 'ADMIN'
+        else:
+            raise RuntimeError(f'Manufacturer not supported for host {hostname}')
+
+        return netbox_server, manufacturer_slug, manufacturer_admin
+
+    def _redfish_session(self, hostname: str, manufacturer_slug: str, manufacturer_admin: str, mgmt_password: str):
+        """Set up the Redfish session to use for all the changes on the given host.
+
+        Raises:
+            spicerack.redfish.RedfishError: if unable to establish the session.
+
+        """
+        try:
+            logger.info("%s: Setting up a basic Redfish session with user %s", hostname, manufacturer_admin)
+            # We need to use an admin user that we are sure it is present on every host
+            # from a certain vendor.
+            redfish = self.spicerack.redfish(hostname, username=manufacturer_admin, password=mgmt_password)
+            # confirm redfish credentials work
+            redfish_call(redfish.get_power_state)
+        except RedfishError as e:
+            # TODO: remove me after the first run on the whole server fleet
+            # Some Supermicro's BMC don't have the management password set for the ADMIN
+            # user, probably due to some past issues with provisioning.
+            # Allow to test for the "root" user on Supermicros if the BMC replies with 401 (Not Authorized)
+            # and remove this code bit once the cookbook has run on all the servers.
+            if (manufacturer_slug == 'supermicro' and e.__cause__ is not None
+                    and isinstance(e.__cause__, APIClientResponseError)
+                    and e.__cause__.response is not None  # pylint: disable=no-member
+                    and e.__cause__.response.status_code == 401):  # pylint: disable=no-member
+                logger.info(
+                    "%s: The ADMIN user on Supermicro seems not configured with the right password, "
+                    "trying to fallback to the root user.", hostname
+                )
+                redfish = self.spicerack.redfish(hostname, username="root", password=mgmt_password)
+                # confirm redfish credentials work
+                redfish_call(redfish.get_power_state)
+            else:
+                raise
+
+        return redfish
+
+    def _check_host(self, host: str, mgmt_password: str,
+                    password_to_enforce: str) -> tuple[Optional[str], list[str]]:
+        """Fetch the current BMC accounts of a host and compare them with the expected ones, without changes.
+
+        Returns:
+            A tuple with the status key of the host in self.host_status (None if skipped) and the list of
+            differences found.
+
+        """
+        hostname = host.split('.')[0]
+        try:
+            netbox_server, manufacturer_slug, manufacturer_admin = self._get_manufacturer(hostname)
+        except (NetboxError, HTTPError) as e:
+            logger.warning('Unable to get the mgmt address from Netbox for %s: %s', hostname, e)
+            return 'fail_netbox', [f'unable to get the mgmt address from Netbox: {e}']
+        if netbox_server is None:
+            logger.info("The host %s is virtual, skipping.", hostname)
+            return None, []
+
+        try:
+            redfish = self._redfish_session(hostname, manufacturer_slug, manufacturer_admin, mgmt_password)
+            accounts = redfish_call(redfish.find_accounts)
+        except (RedfishError, APIClientResponseError, NetboxError, HTTPError) as e:
+            logger.error("Failed to retrieve the BMC accounts of %s: %s", hostname, e)
+            return 'fail_redfish', [f'unable to retrieve the BMC accounts: {e}']
+
+        drift = []
+        if 'wmfroot' not in accounts:
+            drift.append('wmfroot: missing')
+        if manufacturer_slug == 'supermicro' and 'root' in accounts:
+            drift.append('root: present, to be removed')
+        if manufacturer_admin not in accounts:
+            drift.append(f'{manufacturer_admin}: missing')
+
+        for admin_user in ('wmfroot', manufacturer_admin):
+            if admin_user not in accounts:
                 continue
-
-            if  manufacturer_slug == 'dell':
-                manufacturer_admin = 'root'
-            elif manufacturer_slug == 'supermicro':
-                manufacturer_admin = 'ADMIN'
+            try:
+                redfish_check = self.spicerack.redfish(hostname, username=admin_user, password=password_to_enforce)
+                redfish_call(redfish_check.get_power_state)
+            except (RedfishError, APIClientResponseError, NetboxError, HTTPError):
+                drift.append(f'{admin_user}: password differs')
+
+        logger.info('%s: %s', hostname, ', '.join(drift) if drift else 'up to date')
+        return 'success', drift
+
+    def _update_host(self, host: str, mgmt_password: str,  # pylint: disable=too-many-return-statements
+                     password_to_enforce: str) -> tuple[Optional[str], list[str]]:
+        """Ensure the BMC accounts of a host are the expected ones.
+
+        Returns:
+            A tuple with the status key of the host in self.host_status (None if skipped) and the list of
+            changes made.
+
+        """
+        hostname = host.split('.')[0]
+        logger.info("\n===== Updating %s =====\n", hostname)
+        try:
+            netbox_server, manufacturer_slug, manufacturer_admin = self._get_manufacturer(hostname)
+        except (NetboxError, HTTPError) as e:
+            logger.warning('Unable to get the mgmt address from Netbox for %s: %s', hostname, e)
+            return 'fail_netbox', []
+        if netbox_server is None:
+            logger.info("The host %s is virtual, skipping.", hostname)
+            return None, []
+
+        changes: list[str] = []
+        try:
+            redfish = self._redfish_session(hostname, manufacturer_slug, manufacturer_admin, mgmt_password)
+        except (RedfishError, APIClientResponseError, NetboxError, HTTPError) as e:
+            logger.error("Failed to establish a Redfish session for %s: %s", hostname, e)
+            return 'fail_redfish', changes
+
+        try:
+            accounts = redfish_call(redfish.find_accounts)
+        except RedfishError as e:
+            logger.info(
+                "Failed to retrieve the BMC accounts user from Redfish for %s: %s", hostname, e
+            )
+            return 'fail_redfish', changes
+
+        # Global administrator user, used on Supermicro and Dells
+        try:
+            if "wmfroot" not in accounts:
+                logger.info("%s: Creating the wmfroot user on the BMC.", hostname)
+                redfish_call(redfish.add_account, 'wmfroot', password_to_enforce)
+                changes.append('wmfroot: created')
             else:
-                raise RuntimeError(f'Manufacturer not supported for host {hostname}')
+                logger.info(
+                    "%s: Updating the wmfroot user's password on the BMC.", hostname)
+                redfish_call(redfish.change_user_password, 'wmfroot', password_to_enforce)
+                changes.append('wmfroot: password set')
+        except RedfishError as e:
+            logger.info(
+                "Failed add or modify the wmfroot account in Redfish for %s: %s", hostname, e
+            )
+            return 'fail_redfish', changes
 
-            try:
-                logger.info("Setting up a basic Redfish session with user %s", manufacturer_admin)
-                # We need to use an admin user that we are sure it is present on every host
-                # from a certain vendor.
-                redfish = self.spicerack.redfish(hostname, username=manufacturer_admin, password=mgmt_password)
-                # confirm redfish credentials work
-                redfish.get_power_state()
-            except (RedfishError, NetboxError, HTTPError) as e:
-                logger.error("Failed to establish a Redfish session for %s: %s", hostname, e)
-                self.host_status['fail_redfish'].add(host.hosts)
-                self._check_overall_failures()
-
-                # TODO: remove me after the first run on the whole server fleet
-                # Some Supermicro's BMC don't have the management password set for the ADMIN
-                # user, probably due to some past issues with provisioning.
-                # Allow to test for the "root" user on Supermicros if the BMC replies with 401 (Not Authorized)
-                # and remove this code bit once the cookbook has run on all the servers.
-                if (manufacturer_slug == 'supermicro' and e.__cause__ is not None
-                        and isinstance(e.__cause__, APIClientResponseError)
-                        and e.__cause__.response is not None  # pylint: disable=no-member
-                        and e.__cause__.response.status_code == 401):  # pylint: disable=no-member
-                    try:
-                        logger.info(
-                            "The ADMIN user on Supermicro seems not configured with the right password, "
-                            "trying to fallback to the root user."
-                        )
-                        redfish = self.spicerack.redfish(
-                            hostname, username="root", password=mgmt_password)
-                        # confirm redfish credentials work
-                        redfish.get_power_state()
-                    except (RedfishError, APIClientResponseError) as e:
-                        logger.error("Failed to log in as root on a Supermicro: %s", e)
-                        continue
-                else:
-                    continue
+        logger.info(
+            "%s: Updating the %s user's password on the BMC.", hostname, manufacturer_admin
+        )
+        status = 'success'
+        try:
+            redfish_call(redfish.change_user_password, manufacturer_admin, password_to_enforce)
+            changes.append(f'{manufacturer_admin}: password set')
+        except (RedfishError, APIClientResponseError) as e:
+            logger.error(
+                "An error happened while trying to change the %s's password "
+                "on %s: %s", manufacturer_admin, hostname, e
+            )
+            status = 'fail_redfish'
 
+        if manufacturer_slug == 'supermicro':
             try:
-                accounts = redfish.find_accounts()
-            except RedfishError as e:
-                logger.info(
-                    "Failed to retrieve the BMC accounts user from Redfish: %s", e
+                if "root" in accounts:
+                    # For some reason, sometimes deleting an user on Supermicro doesn't
+                    # work because some active sessions are still registered, even if
+                    # there are none. From some tests it seems that simply calling
+                    # the Sessions endpoint causes some sort of state reset, that allows
+                    # the deletion.
+                    sessions = redfish_call(redfish.request, "GET", "/redfish/v1/SessionService/Sessions").json()
+                    if "Members" in sessions:
+                        logger.info("%s: Current active sessions: %s", hostname, sessions["Members"])
+                    else:
+                        logger.info("%s: Unable to find active sessions for the BMC.", hostname)
+                    redfish_call(redfish.delete_account, "root")
+                    changes.append('root: deleted')
+            except (RedfishError, APIClientResponseError) as e:
+                logger.error(
+                    "An error happened while trying to delete the root's account "
+                    "on %s: %s", hostname, e
                 )
-                self.host_status['fail_redfish'].add(host.hosts)
-                self._check_overall_failures()
-                continue
+                return 'fail_root_remove', changes
 
-            # Global administrator user, used on Supermicro and Dells
+        if manufacturer_slug == 'dell':
+            # IPMI on Dell iDRAC requires an extra settings to allow the BMC to accept IPMI commands.
+            logger.info("%s: Setting IPMI settings for the wmfroot user.", hostname)
             try:
-                if "wmfroot" not in accounts:
-                    logger.info("Creating the wmfroot user on the BMC.")
-                    redfish.add_account('wmfroot', password_to_enforce)
+                accounts_dell = redfish_call(redfish.find_accounts)
+                if "wmfroot" in accounts_dell and "Id" in accounts_dell["wmfroot"]:
+                    wmfroot_id = accounts_dell["wmfroot"]["Id"]
+                else:
+                    logger.error("Account id for wmfroot not found on %s.", hostname)
+                    return 'fail_dell_ipmi', changes
+                if redfish.hw_model >= 10:
+                    attributes_uri = f"{redfish.oob_manager}/Oem/Dell/DellAttributes/iDRAC.Embedded.1"
                 else:
-                    logger.info(
-                        "Updating the wmfroot user's password on the BMC.")
-                    redfish.change_user_password('wmfroot', password_to_enforce)
+                    attributes_uri = f"{redfish.oob_manager}/Attributes"
+                redfish_call(
+                    redfish.request, "patch", attributes_uri,
+                    json={"Attributes": {f"Users.{wmfroot_id}.IpmiLanPrivilege": "Administrator"}}
+                )
+                changes.append('wmfroot: IPMI privilege set to Administrator')
             except RedfishError as e:
                 logger.info(
-                    "Failed add or modify the wmfroot account in Redfish: %s", e
+                    "Failed to set the IPMI settings for Dell on %s: %s", hostname, e
                 )
-                self.host_status['fail_redfish'].add(host.hosts)
-                self._check_overall_failures()
-                continue
+                return 'fail_dell_ipmi', changes
 
-            logger.info(
-                "Updating the %s user's password on the BMC.", manufacturer_admin
-            )
+        logger.info(
+            "%s: Checking that wmfroot and the manufacturer's admin can reach Redfish and use IPMI", hostname)
+        for admin_user in ['wmfroot', manufacturer_admin]:
             try:
-                redfish.change_user_password(manufacturer_admin, password_to_enforce)
-            except (RedfishError, APIClientResponseError) as e:
+                # Check if the new username and password work with a basic Redfish call
+                redfish_newpass_check = self.spicerack.redfish(
+                    hostname, username=admin_user, password=password_to_enforce
+                )
+                redfish_call(redfish_newpass_check.get_power_state)
+            except (RedfishError, NetboxError, HTTPError) as e:
                 logger.error(
-                    "An error happened while trying to change the %s's password "
-                    "on %s: %s", manufacturer_admin, hostname, e
+                    "Failed to verify get_power_state for user %s on host %s: %s",
+                    admin_user, hostname, e
                 )
-                self.host_status['fail_redfish'].add(host.hosts)
-                self._check_overall_failures()
-
-            if manufacturer_slug == 'supermicro':
-                try:
-                    if "root" in accounts:
-                        # For some reason, sometimes deleting an user on Supermicro doesn't
-                        # work because some active sessions are still registered, even if
-                        # there are none. From some tests it seems that simply calling
-                        # the Sessions endpoint causes some sort of state reset, that allows
-                        # the deletion.
-                        sessions = redfish.request("GET", "/redfish/v1/SessionService/Sessions").json()
-                        if "Members" in sessions:
-                            logger.info("Current active sessions: %s", sessions["Members"])
-                        else:
-                            logger.info("Unable to find active sessions for the BMC.")
-                        redfish.delete_account("root")
-                except (RedfishError, APIClientResponseError) as e:
-                    logger.error(
-                        "An error happened while trying to delete the root's account "
-                        "on %s: %s", hostname, e
-                    )
-                    self.host_status['fail_root_remove'].add(host.hosts)
-                    self._check_overall_failures()
-                    continue
-
-            if manufacturer_slug == 'dell':
-                # IPMI on Dell iDRAC requires an extra settings to allow the BMC to accept IPMI commands.
-                logger.info("Setting IPMI settings for the wmfroot user.")
-                try:
-                    accounts_dell = redfish.find_accounts()
-                    if "wmfroot" in accounts_dell and "Id" in accounts_dell["wmfroot"]:
-                        wmfroot_id = accounts_dell["wmfroot"]["Id"]
-                    else:
-                        logger.error("Account id for wmfroot not found.")
-                        self.host_status['fail_dell_ipmi'].add(host.hosts)
-                        self._check_overall_failures()
-                        continue
-                    if redfish.hw_model >= 10:
-                        attributes_uri = f"{redfish.oob_manager}/Oem/Dell/DellAttributes/iDRAC.Embedded.1"
-                    else:
-                        attributes_uri = f"{redfish.oob_manager}/Attributes"
-                    redfish.request(
-                        "patch", attributes_uri,
-                        json = { "Attributes": { f"Users.{wmfroot_id}.IpmiLanPrivilege": "Administrator" } }
-                    )
-                except RedfishError as e:
-                    logger.info(
-                        "Failed to set the IPMI settings for Dell: %s", e
-                    )
-                    self.host_status['fail_dell_ipmi'].add(host.hosts)
-                    self._check_overall_failures()
-                    continue
-
-            logger.info(
-                "Checking that wmfroot and the manufacturer's admin can reach Redfish and use IPMI")
-            for admin_user in ['wmfroot', manufacturer_admin]:
-                try:
-                    # Check if the new username and password work with a basic Redfish call
-                    redfish_newpass_check = self.spicerack.redfish(
-                        hostname, username=admin_user, password=password_to_enforce
-                    )
-                    redfish_newpass_check.get_power_state()
-                except (RedfishError, NetboxError, HTTPError) as e:
-                    logger.error(
-                        "Failed to verify get_power_state for user %s on host %s: %s",
-                        admin_user, hostname, e
-                    )
-                    self.host_status['fail_redfish'].add(host.hosts)
-                    break
-                try:
-                    ipmi = self.spicerack.ipmi(target=netbox_server.mgmt_fqdn, username=admin_user)
-                    ipmi.check_connection()
-                except IpmiError as e:
-                    logger.error(
-                        "Failed to verify ipmi check_connection for user %s on host %s: %s",
-                        admin_user, hostname, e
-                    )
-                    self.host_status['fail_ipmi'].add(host.hosts)
-                    break
-            else:
-                logger.info('password updated successfully for: %s', host.hosts)
-                self.host_status['success'].add(host.hosts)
-
+                return 'fail_redfish', changes
+            try:
+                ipmi = self.spicerack.ipmi(target=netbox_server.mgmt_fqdn, username=admin_user)
+                ipmi.check_connection()
+            except IpmiError as e:
+                logger.error(
+                    "Failed to verify ipmi check_connection for user %s on host %s: %s",
+                    admin_user, hostname, e
+                )
+                return 'fail_ipmi', changes
+
+        if status == 'success':
+            logger.info('password updated successfully for: %s', host)
+        return status, changes
+
+    def _report(self):
+        """Log the per-host changes (or differences with --check-only) and the hosts by status."""
+        table = PrettyTable(['Host', 'Status', 'Differences' if self.args.check_only else 'Changes'])
+        table.align = 'l'
+        for status, hosts in self.host_status.items():
+            for host in hosts:
+                table.add_row([host, status, '\n'.join(self.host_changes.get(host, [])) or '-'])
+        logger.info('\n%s', table)
+
+        if self.args.check_only:
+            return
 
         message = '''
         The following hosts completed successfully:
@@ -5,6 +5,8 @@ import re
 from abc import ABCMeta
 from argparse import ArgumentParser, Namespace
 from collections import defaultdict
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from math import ceil
 from typing import Union
 
@@ -12,12 +14,13 @@ from cumin import NodeSet
 from kubernetes.client.models import V1Taint
 from spicerack import Spicerack
 from spicerack.cookbook import LockArgs
+from spicerack.exceptions import SpicerackError
 from spicerack.k8s import KubernetesApiError, KubernetesNode
 from spicerack.netbox import NetboxServer
 from spicerack.remote import RemoteExecutionError, RemoteHosts
 
 from cookbooks.sre import (PHABRICATOR_BOT_CONFIG_FILE, SREBatchBase,
-                           SREBatchRunnerBase)
+                           SREBatchRunnerBase, serialized_prompts)
 from cookbooks.sre.hosts import OS_VERSIONS
 
 __owner_team__ = "ServiceOps"
@@ -351,6 +354,46 @@ def kubectl_version(ctrl_node: RemoteHosts) -> dict[str, dict[str, str]]:
     return version_info
 
 
+def reimage_nodes(
+    spicerack: Spicerack, nodes: Iterable[str], reimage_args: list[str], *, concurrency: int = 1
+) -> None:
+    """Reimage the given nodes running up to `concurrency` sre.hosts.reimage cookbooks at the same time.
+
+    The reimage cookbook is called with `reimage_args` followed by the short hostname of each node. With a
+    concurrency of 1 the nodes are reimaged in turn, asking the operator what to do on failure.
+    Otherwise all nodes are reimaged concurrently first, and the ones that failed are then retried one at a time
+    asking the operator what to do on failure. The reimage cookbook itself can still ask for confirmation during
+    the concurrent pass, so its prompts are serialized: the operator answers them one at a time, while the other
+    reimages asking for input wait for their turn.
+
+    Arguments:
+        spicerack: the Spicerack instance to run the reimage cookbook with.
+        nodes: the FQDNs of the nodes to reimage.
+        reimage_args: the arguments to pass to the reimage cookbook, without the hostname.
+        concurrency: the maximum number of reimages to run at the same time.
+
+    """
+    hostnames = [node.split(".")[0] for node in nodes]  # reimage takes just the hostname, not the FQDN
+    if concurrency > 1 and len(hostnames) > 1:
+        def reimage(hostname: str) -> int:
+            try:
+                return spicerack.run_cookbook("sre.hosts.reimage", [*reimage_args, hostname])
+            except SpicerackError as exc:
+                logger.error("Unable to reimage %s: %s", hostname, exc)
+                return 1
+
+        logger.info("Reimaging %d nodes, up to %d at a time: %s", len(hostnames), concurrency, hostnames)
+        with serialized_prompts(), ThreadPoolExecutor(max_workers=min(concurrency, len(hostnames))) as executor:
+            exit_codes = dict(zip(hostnames, executor.map(reimage, hostnames)))
+
+        hostnames = [hostname for hostname, exit_code in exit_codes.items() if exit_code != 0]
+        if hostnames:
+            logger.warning("Reimage failed for %s, retrying them one at a time", hostnames)
+
+    for hostname in hostnames:
+        spicerack.run_cookbook("sre.hosts.reimage", [*reimage_args, hostname], confirm=True)
+
+
 # This regex matches VLANs which require BGP peering with the core routers
 re_old_topology_vlan = re.compile(r"private1-[a-z]-(eqiad|codfw)")
 # This regex matches VLANs which require BGP peering with the ToR switches
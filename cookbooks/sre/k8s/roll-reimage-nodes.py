@@ -21,6 +21,9 @@ Usage example:
 
 This command will cause a rolling reimage of the selected nodes in the Kubernetes-staging
 cluster, waiting 35 seconds between reimages.
+
+The nodes of each drained batch are reimaged concurrently, up to --reimage-concurrency at a time.
+Nodes that failed to reimage are retried one at a time, asking the operator what to do on failure.
 """
 
 from argparse import ArgumentParser, Namespace
@@ -32,7 +35,7 @@ from spicerack.remote import RemoteHosts
 from wmflib.interactive import ask_confirmation
 
 from cookbooks.sre.hosts import OS_VERSIONS
-from cookbooks.sre.k8s import K8sBatchBase, K8sBatchRunnerBase
+from cookbooks.sre.k8s import K8sBatchBase, K8sBatchRunnerBase, reimage_nodes
 
 
 class RollReimageK8sNodes(K8sBatchBase):
@@ -53,6 +56,10 @@ class RollReimageK8sNodes(K8sBatchBase):
         parser.add_argument(
             '--exclude-target-os', action='store_true',
             help='exclude hosts that are already running the target OS version.')
+        parser.add_argument(
+            '--reimage-concurrency', type=int, default=self.batch_default, metavar='N',
+            help=('reimage up to N nodes of a drained batch at the same time (default: %(default)s). '
+                  'Use 1 to reimage them one at a time.'))
 
         # TODO --new is complicated because _hosts() won't work when the nodes aren't in puppet.
         # I will add support for it after the basic version is merged.
@@ -107,19 +114,17 @@ class RollReimageK8sNodesRunner(K8sBatchRunnerBase):
         - cordoned, drained, and depooled (by K8sBatchRunnerBase.pre_action)
         - downtimed (by SREBatchRunnerBase.action, which called this)
         """
-        for node in hosts.hosts:
-            hostname = node.split('.')[0]  # reimage takes just the hostname, not the FQDN
-            # skip initial confirmation, as we ask once at the beginning;
-            # pass --new, as the reimage cookbook unsets it when not needed
-            reimage_args = ['--force', '--new', '--os', self._args.os, hostname]
-
-            self._spicerack.run_cookbook('sre.hosts.reimage', reimage_args, confirm=True)
+        # skip initial confirmation, as we ask once at the beginning;
+        # pass --new, as the reimage cookbook unsets it when not needed
+        reimage_nodes(self._spicerack, hosts.hosts, ['--force', '--new', '--os', self._args.os],
+                      concurrency=self._args.reimage_concurrency)
 
+        for node in hosts.hosts:
             # The reimage cookbook puts spicerack actions under just the hostname, while this (and
             # the parent class) uses the FQDN, so we patch it here.
             # Currently, overwriting it at this point doesn't lose any information,
             # as this cookbook doesn't write into it. Future me will surely appreciate this.
-            self._spicerack.actions[node] = self._spicerack.actions.pop(hostname)
+            self._spicerack.actions[node] = self._spicerack.actions.pop(node.split('.')[0])
 
         # Propagate errors upwards so we don't repool broken nodes.
         # This will leave the whole batch depooled unnecessarily, but it is simple.
@@ -18,7 +18,7 @@ from wmflib.interactive import (
 )
 
 from cookbooks.sre.hosts import OS_VERSIONS
-from cookbooks.sre.k8s import ALLOWED_CUMIN_ALIASES, PROMETHEUS_MATCHERS
+from cookbooks.sre.k8s import ALLOWED_CUMIN_ALIASES, PROMETHEUS_MATCHERS, reimage_nodes
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +38,9 @@ class UpgradeK8sCluster(CookbookBase):
       by the alias.
     - Finally, reimage all the worker nodes.
 
+    Control plane and worker nodes are reimaged concurrently, up to
+    --reimage-concurrency at a time. Etcd nodes are reimaged one at a time.
+
     Once all nodes are up and running the new cluster should be running
     with base functionalities.
 
@@ -116,6 +119,16 @@ class UpgradeK8sCluster(CookbookBase):
             action="store_true",
             default=False,
         )
+        parser.add_argument(
+            "--reimage-concurrency",
+            help=(
+                "Reimage up to N control plane or worker nodes at the same time, etcd nodes "
+                "are always reimaged one at a time (default: %(default)s)"
+            ),
+            type=int,
+            default=3,
+            metavar="N",
+        )
 
         return parser
 
@@ -327,13 +340,12 @@ class UpgradeK8sClusterRunner(CookbookRunnerBase):
                 f"The control plane hosts to reimage are {self.control_plane_nodes.hosts}. \n"
                 "Does the list look good?"
             )
-            for host in self.control_plane_nodes.hosts:
-                hostname = host.split(".")[0]
-                self.spicerack.run_cookbook(
-                    "sre.hosts.reimage",
-                    ["--force", "--no-downtime", "--os", self.args.os, hostname],
-                    confirm=True,
-                )
+            reimage_nodes(
+                self.spicerack,
+                self.control_plane_nodes.hosts,
+                ["--force", "--no-downtime", "--os", self.args.os],
+                concurrency=self.args.reimage_concurrency,
+            )
             logger.info(
                 "Control plane nodes reimaged! "
                 "Checking on every node to see if the view of the cluster is "
@@ -354,13 +366,12 @@ class UpgradeK8sClusterRunner(CookbookRunnerBase):
                 f"The worker hosts to reimage are {self.worker_nodes.hosts}. \n"
                 "Does the list look good?"
             )
-            for host in self.worker_nodes.hosts:
-                hostname = host.split(".")[0]
-                self.spicerack.run_cookbook(
-                    "sre.hosts.reimage",
-                    ["--force", "--no-downtime", "--os", self.args.os, hostname],
-                    confirm=True,
-                )
+            reimage_nodes(
+                self.spicerack,
+                self.worker_nodes.hosts,
+                ["--force", "--no-downtime", "--os", self.args.os],
+                concurrency=self.args.reimage_concurrency,
+            )
             logger.info("Worker nodes reimaged!")
 
         ask_confirmation(
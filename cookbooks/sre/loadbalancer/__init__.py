@@ -1,2 +1,85 @@
 """Cookboox related to load-balancers."""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Optional
+
+from cumin import NodeSet
+from prometheus_client.parser import text_string_to_metric_families
+from requests import Session
+from spicerack import Reason, Spicerack
+from spicerack.decorators import retry
+from spicerack.remote import RemoteHosts
+from wmflib.interactive import confirm_on_failure
+
 __owner_team__ = "Traffic"
+logger = logging.getLogger(__name__)
+
+
+def get_liberica_puppet_reason(spicerack: Spicerack, task_id: Optional[str] = None) -> Reason:
+    """Return the reason Puppet is disabled with while a liberica instance is depooled.
+
+    It must be the same for all the cookbooks, as Puppet is re-enabled with it when pooling the instance back.
+    """
+    reason = "sre.loadbalancer.admin (de)pooling in progress"
+    if task_id:
+        reason += f" ({task_id})"
+    return spicerack.admin_reason(reason)
+
+
+def depool_liberica(spicerack: Spicerack, hosts: RemoteHosts, puppet_reason: Reason) -> None:
+    """Depool liberica instances by stopping the control plane service, with Puppet disabled."""
+    spicerack.puppet(hosts).disable(puppet_reason, verbatim_reason=True)
+    confirm_on_failure(hosts.run_sync, "/bin/systemctl stop liberica-cp.service")
+
+
+def pool_liberica(spicerack: Spicerack, hosts: RemoteHosts, puppet_reason: Reason) -> None:
+    """Pool liberica instances by starting the control plane service, re-enabling Puppet."""
+    confirm_on_failure(hosts.run_sync, "/bin/systemctl start liberica-cp.service")
+    spicerack.puppet(hosts).enable(puppet_reason, verbatim_reason=True)
+
+
+def is_liberica_pooled(http: Session, host: str) -> bool:
+    """Fetch gobgp metrics and check the number of advertised routes and peers"""
+    logger.info("Checking BGP status on %s", host)
+    response = http.get(f"http://{host}:3010/metrics")
+
+    established = 0
+    advertised = 0
+    for metric in text_string_to_metric_families(response.text):
+        if metric.name == "bgp_peer_state":
+            for sample in metric.samples:
+                if sample.labels.get("admin_state") == "UP" and sample.labels.get("session_state") == "ESTABLISHED":
+                    logger.debug("found BGP session with %s", sample.labels.get("peer"))
+                    established += 1
+        elif metric.name == "bgp_routes_advertised":
+            for sample in metric.samples:
+                if sample.labels.get("peer") and sample.labels.get("route_family") and int(sample.value) > 0:
+                    logger.debug("found %d %s BGP routes advertised with %s",
+                                 sample.value, sample.labels.get("route_family"), sample.labels.get("peer"))
+                    advertised += int(sample.value)
+
+    if established and advertised:
+        return True
+
+    logger.debug("no BGP advertised routes found")
+    return False
+
+
+def get_liberica_pooled(http: Session, hosts: NodeSet) -> dict[str, bool]:
+    """Return whether each liberica instance is pooled, checking all the hosts concurrently."""
+    with ThreadPoolExecutor(max_workers=max(1, len(hosts))) as executor:
+        return dict(zip(hosts, executor.map(lambda host: is_liberica_pooled(http, host), hosts)))
+
+
+@retry(tries=15, delay=timedelta(seconds=3), backoff_mode="constant", exceptions=(RuntimeError,))
+def wait_for_liberica_pooled(http: Session, hosts: NodeSet, expect_pooled: bool) -> None:
+    """Wait for all the liberica instances to be in the expected pooled state.
+
+    Raises:
+        RuntimeError: if any instance is not in the expected state after all the retries.
+
+    """
+    unexpected = [host for host, pooled in get_liberica_pooled(http, hosts).items() if pooled != expect_pooled]
+    if unexpected:
+        raise RuntimeError(f"Unexpected pooled state on {','.join(unexpected)}, want {expect_pooled}")
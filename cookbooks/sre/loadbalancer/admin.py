@@ -3,7 +3,6 @@ import argparse
 import logging
 import time
 from datetime import datetime, timedelta, timezone
-from typing import cast
 
 from prometheus_client.parser import text_string_to_metric_families
 from cumin import NodeSet
@@ -14,6 +13,13 @@ from wmflib.constants import ALL_DATACENTERS
 from wmflib.interactive import confirm_on_failure
 
 from cookbooks.sre import SREBatchBase, SREBatchRunnerBase
+from cookbooks.sre.loadbalancer import (
+    depool_liberica,
+    get_liberica_pooled,
+    get_liberica_puppet_reason,
+    pool_liberica,
+    wait_for_liberica_pooled,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +40,7 @@ class LibericaAdmin(SREBatchBase):
     grace_sleep = 30
     valid_actions = ("pool", "depool", "config_reload", "reboot")
     disable_puppet_on_reboot = True
+    supports_concurrent_groups = True
 
     def get_runner(self, args: argparse.Namespace):
         """Get the worker class."""
@@ -48,11 +55,7 @@ class LibericaAdminRunner(SREBatchRunnerBase):
         super().__init__(args, spicerack)
         self._http = spicerack.requests_session(__name__, timeout=5.0, tries=3, backoff=2.0)
         self._reload_ts = int(time.time())
-        reason = "sre.loadbalancer.admin (de)pooling in progress"
-        if args.task_id:
-            reason += f" ({args.task_id})"
-        self._puppet_reason = spicerack.admin_reason(reason)
-        self._pooled_hosts = cast(RemoteHosts, [])
+        self._puppet_reason = get_liberica_puppet_reason(spicerack, args.task_id)
 
     @property
     def allowed_aliases(self) -> list:
@@ -81,17 +84,11 @@ class LibericaAdminRunner(SREBatchRunnerBase):
 
     def _depool_action(self, hosts: RemoteHosts, _: Reason) -> None:
         """Depool liberica instance by stopping the control plane service"""
-        puppet = self._spicerack.puppet(hosts)
-        puppet.disable(self._puppet_reason, verbatim_reason=True)
-        depool_cmd = "/bin/systemctl stop liberica-cp.service"
-        confirm_on_failure(hosts.run_sync, depool_cmd)
+        depool_liberica(self._spicerack, hosts, self._puppet_reason)
 
     def _pool_action(self, hosts: RemoteHosts, _: Reason) -> None:
         """Pool liberica instance by starting the control plane service"""
-        puppet = self._spicerack.puppet(hosts)
-        pool_cmd = "/bin/systemctl start liberica-cp.service"
-        confirm_on_failure(hosts.run_sync, pool_cmd)
-        puppet.enable(self._puppet_reason, verbatim_reason=True)
+        pool_liberica(self._spicerack, hosts, self._puppet_reason)
 
     def _config_reload_action(self, hosts: RemoteHosts, _: Reason) -> None:
         reload_cmd = "/bin/systemctl reload liberica-cp.service"
@@ -102,9 +99,11 @@ class LibericaAdminRunner(SREBatchRunnerBase):
         if not self._spicerack.dry_run:
             confirm_on_failure(hosts.reboot, batch_size=len(hosts))
             hosts.wait_reboot_since(reboot_time, print_progress_bars=False)
-            if len(self._pooled_hosts) > 0:
-                self._pool_action(self._pooled_hosts, self._puppet_reason)
-                self._validate_is_pooled(self._pooled_hosts, True)
+            # The hosts of the batch of this thread that were pooled before the reboot
+            pooled_hosts = self._local.pooled_hosts
+            if len(pooled_hosts) > 0:
+                self._pool_action(pooled_hosts, self._puppet_reason)
+                self._validate_is_pooled(pooled_hosts, True)
 
     def pre_action(self, hosts: RemoteHosts) -> None:
         """Raise a RuntimeError if the instance isn't on the expected state"""
@@ -114,8 +113,8 @@ class LibericaAdminRunner(SREBatchRunnerBase):
         if self._args.action == "depool":
             self._validate_is_pooled(hosts, True)
         elif self._args.action == "reboot":
-            self._pooled_hosts = self._get_pooled(hosts)
-            self._depool_action(self._pooled_hosts, self._puppet_reason)
+            self._local.pooled_hosts = self._get_pooled(hosts)
+            self._depool_action(self._local.pooled_hosts, self._puppet_reason)
             self._validate_is_pooled(hosts, False)
 
     def post_action(self, hosts: RemoteHosts) -> None:
@@ -127,47 +126,13 @@ class LibericaAdminRunner(SREBatchRunnerBase):
         if self._args.action == "pool":
             self._validate_is_pooled(hosts, True)
 
-    @retry(tries=15, delay=timedelta(seconds=3), backoff_mode="constant", exceptions=(RuntimeError,))
     def _validate_is_pooled(self, hosts: RemoteHosts, expect_pooled: bool) -> None:
-        for fqdn in hosts.hosts:
-            pooled = self._is_pooled(fqdn)
-            if pooled != expect_pooled:
-                raise RuntimeError(f"Unexpected pooled state on {fqdn}, want {expect_pooled}, got {pooled}")
+        wait_for_liberica_pooled(self._http, hosts.hosts, expect_pooled)
 
     @retry(tries=15, delay=timedelta(seconds=3), backoff_mode="constant", exceptions=(RuntimeError,))
     def _get_pooled(self, remotehosts: RemoteHosts) -> RemoteHosts:
-        all_hosts = remotehosts.hosts
-        pooled_nodes = NodeSet()
-        for h in all_hosts:
-            if self._is_pooled(str(h)):
-                pooled_nodes.add(h)
-        return remotehosts.get_subset(pooled_nodes)
-
-    def _is_pooled(self, host: str) -> bool:
-        """Fetch gobgp metrics and check the number of advertised routes and peers"""
-        logger.info("Checking BGP status on %s", host)
-        response = self._http.get(f"http://{host}:3010/metrics")
-
-        established = 0
-        advertised = 0
-        for metric in text_string_to_metric_families(response.text):
-            if metric.name == "bgp_peer_state":
-                for sample in metric.samples:
-                    if sample.labels.get("admin_state") == "UP" and sample.labels.get("session_state") == "ESTABLISHED":
-                        logger.debug("found BGP session with %s", sample.labels.get("peer"))
-                        established += 1
-            elif metric.name == "bgp_routes_advertised":
-                for sample in metric.samples:
-                    if sample.labels.get("peer") and sample.labels.get("route_family") and int(sample.value) > 0:
-                        logger.debug("found %d %s BGP routes advertised with %s",
-                                     sample.value, sample.labels.get("route_family"), sample.labels.get("peer"))
-                        advertised += int(sample.value)
-
-        if established and advertised:
-            return True
-
-        logger.debug("no BGP advertised routes found")
-        return False
+        pooled = get_liberica_pooled(self._http, remotehosts.hosts)
+        return remotehosts.get_subset(NodeSet.fromlist([host for host, is_pooled in pooled.items() if is_pooled]))
 
     @retry(tries=3, delay=timedelta(seconds=3), backoff_mode="constant", exceptions=(RuntimeError,))
     def _validate_succesful_config_reload(self, hosts: RemoteHosts) -> None:
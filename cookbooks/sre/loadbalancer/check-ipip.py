@@ -12,11 +12,6 @@ from spicerack.remote import RemoteError
 from wmflib.constants import ALL_DATACENTERS
 from wmflib.dns import DnsNotFound
 
-# pylint: disable=no-name-in-module
-from scapy.all import IP, IPv6, TCP, sr1  # type: ignore[attr-defined]
-from scapy.all import conf as scapyconf
-# pylint: enable=no-name-in-module
-
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +59,9 @@ class CheckIPIPRunner(CookbookRunnerBase):
 
     def __init__(self, args, spicerack):
         """Initiliaze the MigrateServiceIPIPRunner runner."""
+        # scapy takes about a second to import, defer it until the cookbook is actually run
+        from scapy.all import conf as scapyconf  # pylint: disable=import-outside-toplevel,no-name-in-module
+
         scapyconf.sniff_promisc = False
         # https://github.com/secdev/scapy/issues/383
         scapyconf.checkIPinIP = False
@@ -101,6 +99,9 @@ class CheckIPIPRunner(CookbookRunnerBase):
                                inner_src_ip: str, inner_dst_ip: str,
                                dport: int) -> bool:
         """Send a single SYN packet using IPIP/IP6IP6 encapsulation"""
+        # pylint: disable-next=import-outside-toplevel,no-name-in-module
+        from scapy.all import IP, IPv6, TCP, sr1  # type: ignore[attr-defined]
+
         if ':' in inner_dst_ip:
             L3 = IPv6
         else:
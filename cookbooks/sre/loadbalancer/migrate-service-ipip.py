@@ -13,11 +13,6 @@ from wmflib.constants import CORE_DATACENTERS
 from wmflib.dns import DnsNotFound
 from wmflib.interactive import ask_confirmation, ensure_shell_is_durable
 
-# pylint: disable=no-name-in-module
-from scapy.all import IP, L3RawSocket, TCP, sr1  # type: ignore[attr-defined]
-from scapy.all import conf as scapyconf
-# pylint: enable=no-name-in-module
-
 
 logger = logging.getLogger(__name__)
 
@@ -83,6 +78,10 @@ class MigrateServiceIPIPRunner(CookbookRunnerBase):
 
     def __init__(self, args, spicerack):
         """Initiliaze the MigrateServiceIPIPRunner runner."""
+        # scapy takes about a second to import, defer it until the cookbook is actually run
+        # pylint: disable-next=import-outside-toplevel,no-name-in-module
+        from scapy.all import L3RawSocket, conf as scapyconf
+
         scapyconf.sniff_promisc = False
         scapyconf.L3socket = L3RawSocket
         # https://github.com/secdev/scapy/issues/383
@@ -141,6 +140,9 @@ class MigrateServiceIPIPRunner(CookbookRunnerBase):
                                inner_src_ip: str, inner_dst_ip: str,
                                dport: int) -> bool:
         """Send a single SYN packet using IPIP encapsulation"""
+        # pylint: disable-next=import-outside-toplevel,no-name-in-module
+        from scapy.all import IP, TCP, sr1  # type: ignore[attr-defined]
+
         s = socket(AF_INET, SOCK_STREAM)
         s.bind((inner_src_ip, 0))
         sport = s.getsockname()[1]
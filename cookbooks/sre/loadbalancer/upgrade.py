@@ -2,25 +2,36 @@
 
 import argparse
 from contextlib import nullcontext
-from datetime import timedelta
 
-from spicerack import Reason
-from spicerack.decorators import retry
-from spicerack.remote import RemoteExecutionError, RemoteHosts
+from spicerack import Reason, Spicerack
+from spicerack.remote import RemoteHosts
 from wmflib.constants import ALL_DATACENTERS
 from wmflib.interactive import confirm_on_failure
 
 from cookbooks.sre import SREBatchBase, SREBatchRunnerBase
+from cookbooks.sre.loadbalancer import (
+    depool_liberica,
+    get_liberica_puppet_reason,
+    pool_liberica,
+    wait_for_liberica_pooled,
+)
+
+LIBERICA_STOP_TIMEOUT = 30
+"""The seconds to wait for all the liberica services to be stopped after signaling them."""
 
 
 class RollUpgradeLiberica(SREBatchBase):
     r"""Roll upgrade/restart Liberica daemons
 
+    * [Only for upgrade action] Download specified liberica version on all hosts
     * [Optional] Depool
     * [Only for upgrade action] Install specified liberica version
     * Restart liberica related daemons
     * [Optional] Repool
 
+    The depool and repool are done in-process with the same steps of the sre.loadbalancer.admin cookbook.
+    With --concurrent-groups the load-balancers of each datacenter are processed at the same time.
+
     Example usage:
 
         # seamless upgrade (no depool required)
@@ -50,6 +61,7 @@ class RollUpgradeLiberica(SREBatchBase):
     batch_default = 1
     batch_max = 1
     valid_actions = ('upgrade', 'restart')
+    supports_concurrent_groups = True
 
     def argument_parser(self):
         """As specified by Spicerack API."""
@@ -72,6 +84,12 @@ class RollUpgradeLiberica(SREBatchBase):
 class RollUpgradeLibericaRunner(SREBatchRunnerBase):
     """Controller class for liberica upgrade/restart operations"""
 
+    def __init__(self, args: argparse.Namespace, spicerack: Spicerack) -> None:
+        """Initializes the parent class, also adds an http session to check the pooled state"""
+        super().__init__(args, spicerack)
+        self._http = spicerack.requests_session(__name__, timeout=5.0, tries=3, backoff=2.0)
+        self._puppet_reason = get_liberica_puppet_reason(spicerack, args.task_id)
+
     @property
     def allowed_aliases(self) -> list:
         """List of allowed aliases for host selection"""
@@ -89,6 +107,14 @@ class RollUpgradeLibericaRunner(SREBatchRunnerBase):
         """Helper property to return a cumin formatted query of allowed aliases"""
         return "A:liberica"
 
+    @property
+    def upgrade_packages(self) -> list:
+        """List of packages to install with the upgrade action"""
+        if self._args.version is None:
+            return []
+
+        return [f"liberica={self._args.version}"]
+
     @property
     def runtime_description(self) -> str:
         """pretty-print message"""
@@ -99,32 +125,34 @@ class RollUpgradeLibericaRunner(SREBatchRunnerBase):
 
     def _upgrade_action(self, hosts: RemoteHosts, reason: Reason) -> int:
         """Upgrade liberica and restart the daemons"""
-        if not self._args.seamless:
-            self._admin_cookbook("depool", hosts)
-
-        self._run(hosts, reason, upgrade=True)
-
-        if not self._args.seamless:
-            self._admin_cookbook("pool", hosts)
-
-        return 0
+        return self._depooled_run(hosts, reason, upgrade=True)
 
     def _restart_action(self, hosts: RemoteHosts, reason: Reason) -> int:
         """Restart liberica daemons"""
-        if not self._args.seamless:
-            self._admin_cookbook("depool", hosts)
-
-        self._run(hosts, reason, upgrade=False)
-
-        if not self._args.seamless:
-            self._admin_cookbook("pool", hosts)
+        return self._depooled_run(hosts, reason, upgrade=False)
 
+    def _depooled_run(self, hosts: RemoteHosts, reason: Reason, upgrade: bool) -> int:
+        """Restart the daemons, depooling the hosts first unless in seamless mode"""
+        if self._args.seamless:
+            return self._run(hosts, reason, upgrade=upgrade)
+
+        confirm_on_failure(wait_for_liberica_pooled, self._http, hosts.hosts, True)
+        depool_liberica(self._spicerack, hosts, self._puppet_reason)
+        try:
+            self._run(hosts, reason, upgrade=upgrade)
+            pool_liberica(self._spicerack, hosts, self._puppet_reason)
+            confirm_on_failure(wait_for_liberica_pooled, self._http, hosts.hosts, True)
+        except Exception:
+            self.logger.error("%s may still be depooled with Puppet disabled (%s), pool them back with: "
+                              "cookbook sre.loadbalancer.admin --query 'P{%s}' --reason '...' pool",
+                              hosts, self._puppet_reason.reason, hosts)
+            raise
         return 0
 
     def _upgrade(self, hosts: RemoteHosts) -> None:
         apt_get = self._spicerack.apt_get(hosts)
         confirm_on_failure(apt_get.update)
-        confirm_on_failure(apt_get.install, f"liberica={self._args.version}")
+        confirm_on_failure(apt_get.install, *self.upgrade_packages)
 
     def _run(self, hosts: RemoteHosts, reason: Reason, upgrade: bool) -> int:
         stop_svcs = ['fp', 'healthcheck', 'hcforwarder']
@@ -134,7 +162,7 @@ class RollUpgradeLibericaRunner(SREBatchRunnerBase):
             disable_puppet = True
         else:
             signal = 'SIGUSR1'
-            disable_puppet = False  # puppet has been already disabled by the admin cookbook
+            disable_puppet = False  # puppet has been already disabled by the depool
 
         start_svcs = list(reversed(stop_svcs))
 
@@ -153,8 +181,8 @@ class RollUpgradeLibericaRunner(SREBatchRunnerBase):
         with puppet.disabled(reason) if disable_puppet else nullcontext():
             # stop the services
             confirm_on_failure(hosts.run_sync, *stop_cmds)
-            # validate that liberica services have been stopped
-            self._check_liberica_is_stopped(hosts)
+            # wait for the liberica services to be stopped
+            self._wait_for_liberica_stopped(hosts)
             # upgrade liberica if needed
             if upgrade:
                 self._upgrade(hosts)
@@ -163,18 +191,8 @@ class RollUpgradeLibericaRunner(SREBatchRunnerBase):
 
         return 0
 
-    @retry(tries=5, delay=timedelta(seconds=3), backoff_mode='linear', exceptions=(RemoteExecutionError,))
-    def _check_liberica_is_stopped(self, hosts: RemoteHosts) -> None:
-        """Check if liberica services have been stopped"""
-        cmd = '! /bin/systemctl -q is-active liberica-*.service'
-        hosts.run_sync(cmd)
-
-    def _admin_cookbook(self, action: str, hosts: RemoteHosts) -> None:
-        """Trigger sre.loadbalancer.admin cookbook"""
-        args = [
-            '--query', f"P{{{hosts}}}",
-            '--reason', self._args.reason,
-            action
-        ]
-
-        self._spicerack.run_cookbook('sre.loadbalancer.admin', args, confirm=True)
+    def _wait_for_liberica_stopped(self, hosts: RemoteHosts) -> None:
+        """Wait for all the liberica services to be stopped, polling their systemd state on the hosts themselves"""
+        cmd = (f"/usr/bin/timeout {LIBERICA_STOP_TIMEOUT} /bin/sh -c "
+               "'while /bin/systemctl -q is-active liberica-*.service; do sleep 0.5; done'")
+        hosts.run_sync(cmd, print_progress_bars=False)
@@ -22,7 +22,6 @@ from contextlib import contextmanager
 from datetime import timedelta
 from typing import Dict, Generator, List, Tuple
 
-import transferpy.transfer
 from cookbooks.sre import PHABRICATOR_BOT_CONFIG_FILE
 from pymysql.cursors import DictCursor
 from spicerack import Spicerack
@@ -32,7 +31,6 @@ from spicerack.decorators import retry
 from spicerack.mysql import Instance as MInst
 from spicerack.mysql import Mysql
 from spicerack.remote import Remote, RemoteError, RemoteHosts
-from transferpy.Transferer import Transferer
 from wmflib.interactive import (
     AbortError,
     ask_confirmation,
@@ -402,6 +400,9 @@ class CloneMySQLRunner(CookbookRunnerBase):
         self.logger = logging.getLogger(__name__)
 
         # Other prep
+        # transferpy is only needed to run the clone, don't import it when the cookbooks are listed
+        import transferpy.transfer  # pylint: disable=import-outside-toplevel
+
         self.tp_options = dict(transferpy.transfer.parse_configurations(transferpy.transfer.CONFIG_FILE))
         # this also handles string->bool conversion where necessary
         self.tp_options = transferpy.transfer.assign_default_options(self.tp_options)
@@ -633,6 +634,8 @@ class CloneMySQLRunner(CookbookRunnerBase):
         _run(self.target_host, "xfs_growfs /srv")
 
         self.logger.info("Starting transfer")
+        from transferpy.Transferer import Transferer  # pylint: disable=import-outside-toplevel
+
         t = Transferer(
             str(self.source_host),
             "/srv/sqldata",
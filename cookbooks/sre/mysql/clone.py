@@ -21,7 +21,6 @@ from contextlib import contextmanager
 from datetime import timedelta
 from typing import Dict, Generator, List, Tuple
 
-import transferpy.transfer
 from cookbooks.sre import PHABRICATOR_BOT_CONFIG_FILE
 from pymysql.cursors import DictCursor
 from spicerack import Spicerack
@@ -31,7 +30,6 @@ from spicerack.decorators import retry
 from spicerack.mysql import Instance as MInst
 from spicerack.mysql import Mysql
 from spicerack.remote import Remote, RemoteError, RemoteHosts
-from transferpy.Transferer import Transferer
 from wmflib.config import load_yaml_config
 from wmflib.interactive import AbortError, ask_confirmation, ensure_shell_is_durable
 
@@ -438,6 +436,9 @@ class CloneMySQLRunner(CookbookRunnerBase):
         self.puppet = spicerack.puppet
 
         # Other prep
+        # transferpy is only needed to run the clone, don't import it when the cookbooks are listed
+        import transferpy.transfer  # pylint: disable=import-outside-toplevel
+
         self.tp_options = dict(transferpy.transfer.parse_configurations(transferpy.transfer.CONFIG_FILE))
         # this also handles string->bool conversion where necessary
         self.tp_options = transferpy.transfer.assign_default_options(self.tp_options)
@@ -679,6 +680,8 @@ class CloneMySQLRunner(CookbookRunnerBase):
         _run(self.target_host, "rm -rf /srv/sqldata/")
 
         log.info("Starting transfer")
+        from transferpy.Transferer import Transferer  # pylint: disable=import-outside-toplevel
+
         t = Transferer(str(self.source_host), "/srv/sqldata", [str(self.target_host)], ["/srv/"], self.tp_options)
         r = t.run()
         if r[0] != 0:
@@ -1,8 +1,5 @@
 """Cookbook to update netbox-extras."""
 
-from argparse import Namespace
-
-from spicerack import Spicerack
 from spicerack.remote import RemoteHosts
 
 from cookbooks.sre import SREBatchBase, SREBatchRunnerBase
@@ -21,12 +18,6 @@ class UpdateExtras(SREBatchBase):
 class UpdateExtrasRunner(SREBatchRunnerBase):
     """A restart runner to update the netbox-extra repository and restart netbox-uwsgi if neccesary."""
 
-    def __init__(self, args: Namespace, spicerack: Spicerack) -> None:
-        """Override base to add new param."""
-        super().__init__(args, spicerack)
-        # We only set this if validation files have changed
-        self.needs_restart = False
-
     @property
     def allowed_aliases(self):
         """Required by base class."""
@@ -37,6 +28,11 @@ class UpdateExtrasRunner(SREBatchRunnerBase):
         """Return a slightly optimised query then the base class."""
         return "A:netbox-all"
 
+    @property
+    def needs_restart(self) -> bool:
+        """Whether the validators changed, tracked per thread as each concurrent group runs its own batches."""
+        return getattr(self._local, "needs_restart", False)
+
     def action(self, hosts: RemoteHosts) -> None:
         """Action is used to only call the restart action if we need to."""
         if self.needs_restart:
@@ -75,5 +71,5 @@ class UpdateExtrasRunner(SREBatchRunnerBase):
         for _, output in results:
             for line in output.message().decode().splitlines():
                 if line.lstrip().startswith('validators'):
-                    self.needs_restart = True
+                    self._local.needs_restart = True
         self._run_scripts(self.pre_scripts, hosts)
@@ -1,9 +1,15 @@
 """Network Cookbooks"""
 import json
 import logging
+import re
+import time
 
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+from functools import partial
 from ipaddress import ip_address
-from subprocess import CalledProcessError, run
+from subprocess import PIPE, STDOUT, CalledProcessError, run
 from typing import Optional
 
 from spicerack.constants import KEYHOLDER_SOCK
@@ -14,12 +20,16 @@ from wmflib.interactive import ask_confirmation
 
 __owner_team__ = "Infrastructure Foundations"
 logger = logging.getLogger(__name__)
+HOMER_MAX_WORKERS = 4
+"""The maximum number of Homer processes run_homer() runs at the same time."""
 
 
 def configure_switch_interfaces(remote: Remote, netbox: Netbox, netbox_data: dict,
                                 print_output: bool = False) -> None:
     """Configure the switch interfaces relevant to a device.
 
+    All the interfaces on the same switch are fetched and configured at once, the switches in parallel.
+
     Arguments:
         remote: Spicerack remote instance
         netbox: pynetbox instance on the selected Netbox server
@@ -33,9 +43,9 @@ def configure_switch_interfaces(remote: Remote, netbox: Netbox, netbox_data: dic
         device_id=netbox_data['id'], mgmt_only=False, connected=True))
     if not nb_device_interfaces:
         raise RuntimeError(f"No non-mgmt connected interfaces found for {netbox_data['name']}. Please check Netbox.")
-    # Tackle interfaces one at a time
+    # Group the interfaces by switch, to configure each switch in a single transaction
+    nb_switch_interfaces: dict[str, list] = defaultdict(list)
     for nb_device_interface in nb_device_interfaces:
-
         nb_switch_interface = nb_device_interface.connected_endpoints[0]
         # Get the switch FQDN (VC or not VC)
         vc = nb_switch_interface.device.virtual_chassis
@@ -44,18 +54,32 @@ def configure_switch_interfaces(remote: Remote, netbox: Netbox, netbox_data: dic
         else:
             switch_fqdn = nb_switch_interface.device.primary_ip.dns_name
         logger.debug("%s is connected to %s:%s", nb_device_interface, switch_fqdn, nb_switch_interface)
+        nb_switch_interfaces[switch_fqdn].append(nb_switch_interface)
 
+    def get_switch_commands(switch_fqdn: str) -> tuple[RemoteHosts, list[str]]:
+        """Return the switch's RemoteHosts instance and the commands needed to configure its interfaces."""
         remote_host = remote.query('D{' + switch_fqdn + '}')
-        # Get the live interface config adds them in alphabetic order in a Netbox like dict,
-        # or None if it doesn't exist at all
-        live_interface = get_junos_live_interface_config(remote_host, nb_switch_interface.name, print_output)
-
-        commands = junos_set_interface_config(netbox_data, live_interface, nb_switch_interface)
-
+        # Get the live interfaces config in a Netbox like dict, the ones that don't exist at all are missing
+        live_interfaces = get_junos_live_interfaces_config(
+            remote_host, [interface.name for interface in nb_switch_interfaces[switch_fqdn]], print_output)
+        commands = []
+        for nb_switch_interface in nb_switch_interfaces[switch_fqdn]:
+            commands.extend(junos_set_interface_config(
+                netbox_data, live_interfaces.get(nb_switch_interface.name), nb_switch_interface))
+        return remote_host, commands
+
+    with ThreadPoolExecutor(max_workers=len(nb_switch_interfaces)) as executor:
+        switches = dict(zip(nb_switch_interfaces, executor.map(get_switch_commands, nb_switch_interfaces)))
+
+    transactions = []
+    for switch_fqdn, (remote_host, commands) in switches.items():
         if commands:
-            run_junos_commands(remote_host, commands)
+            transactions.append((remote_host, commands))
         else:
-            logger.info("No configuration change needed on the switch for %s", nb_device_interface)
+            logger.info("No configuration change needed on %s for %s", switch_fqdn, netbox_data['name'])
+
+    if transactions:
+        run_junos_transactions(transactions)
 
 
 def junos_set_interface_config(netbox_data: dict, live_interface: Optional[dict],  # pylint: disable=too-many-branches
@@ -159,18 +183,32 @@ def junos_set_interface_config(netbox_data: dict, live_interface: Optional[dict]
 
 
 def run_junos_commands(remote_host: RemoteHosts, conf_commands: list) -> None:
-    """Run commands on Juniper devices, first load the commands show the diff then exit.
-
-       Then commit confirm it.
-       Then commit check.
+    """Run commands on a Juniper device, see run_junos_transactions().
 
     Arguments:
         remote_host: Spicerack RemoteHosts instance
         conf_commands: list of Junos set commands to run
 
     """
-    # Once we get more trust in the system, we could commit the change without prompting the user.
-    for mode in ['compare', 'commit', 'confirm']:
+    run_junos_transactions([(remote_host, conf_commands)])
+
+
+def run_junos_transactions(transactions: list[tuple[RemoteHosts, list[str]]]) -> None:
+    """Run commands on Juniper devices in parallel, first load the commands show the diffs then exit.
+
+       Then commit confirm them on all the devices, once the user confirmed the diffs.
+       Then commit check them.
+
+    Each device runs all its commands in a single transaction. If the commit fails on any device the changes are
+    not confirmed on any of them, so that they are all rolled back automatically.
+
+    Arguments:
+        transactions: list of tuples with the Spicerack RemoteHosts instance of a device and the list of Junos set
+            commands to run on it.
+
+    """
+    def run(transaction: tuple[RemoteHosts, list[str]], mode: str) -> str:
+        remote_host, conf_commands = transaction
         is_safe = False
         commands = ['configure exclusive']  # Enter configuration mode with a lock on the config
         commands.extend(conf_commands)  # Add the actions
@@ -189,18 +227,34 @@ def run_junos_commands(remote_host: RemoteHosts, conf_commands: list) -> None:
                         'commit check',
                         'exit']
 
-        results_raw = remote_host.run_sync(';'.join(commands), is_safe=is_safe, print_progress_bars=False)
-        if mode == 'compare':
-            ask_confirmation('Commit the above change?')
-        elif mode == 'commit':
-            if remote_host.dry_run:
-                return None
-            output_lines = RemoteHosts.results_to_list(results_raw)[0][1].split('\n')
-            if output_lines[-2] != 'commit complete':
-                raise RuntimeError('JunOS config commit failed - see above - device may need Homer run')
-            logger.info('Commited the above change, needs to be confirmed')
-        elif mode == 'confirm':
-            logger.info('Change confirmed')
+        results_raw = remote_host.run_sync(';'.join(commands), is_safe=is_safe, print_output=False,
+                                           print_progress_bars=False)
+        return parse_results(results_raw, dry_run=remote_host.dry_run and not is_safe) or ''
+
+    # Once we get more trust in the system, we could commit the change without prompting the user.
+    with ThreadPoolExecutor(max_workers=len(transactions)) as executor:
+        diffs = list(executor.map(partial(run, mode='compare'), transactions))
+        for (remote_host, _), diff in zip(transactions, diffs):
+            logger.info("Changes on %s:\n%s", remote_host, diff)
+        ask_confirmation('Commit the above change?' if len(transactions) == 1 else
+                         f'Commit the above changes on {len(transactions)} devices?')
+
+        outputs = list(executor.map(partial(run, mode='commit'), transactions))
+        if transactions[0][0].dry_run:
+            return
+        failed = []
+        for (remote_host, _), output in zip(transactions, outputs):
+            if output.split('\n')[-2:-1] != ['commit complete']:
+                logger.error("Commit output on %s:\n%s", remote_host, output)
+                failed.append(str(remote_host))
+        if failed:
+            raise RuntimeError(f'JunOS config commit failed on {failed} - see above - device may need Homer run')
+        logger.info('Commited the above change, needs to be confirmed')
+
+        checks = list(executor.map(partial(run, mode='confirm'), transactions))
+        for (remote_host, _), check in zip(transactions, checks):
+            logger.info("Commit check on %s:\n%s", remote_host, check)
+        logger.info('Change confirmed')
 
 
 def parse_results(results_raw, json_output=False, dry_run: bool=False):
@@ -284,21 +338,56 @@ def get_junos_live_interface_config(remote_host: RemoteHosts, interface: str,
                                        is_safe=True,
                                        print_output=print_output,
                                        print_progress_bars=False)
+    interfaces = parse_junos_interfaces_config(results_raw, dry_run=remote_host.dry_run)
+    if not interfaces:
+        return None
+    return interfaces[0]
+
+
+def get_junos_live_interfaces_config(remote_host: RemoteHosts, interfaces: list[str],
+                                     print_output: bool = False) -> dict[str, dict]:
+    """Returns the running configuration of the given Junos interfaces in a Netbox format, fetched at once.
+
+    Arguments:
+        remote_host: Spicerack RemoteHosts instance
+        interfaces: target interfaces names
+        print_output: Display a more verbose output
+
+    Returns:
+        Dict of the interfaces configuration by name, the interfaces that don't exist on the device are missing
+
+    """
+    if len(interfaces) == 1:  # Avoid fetching the config of all the interfaces
+        live_interface = get_junos_live_interface_config(remote_host, interfaces[0], print_output)
+        return {interfaces[0]: live_interface} if live_interface else {}
+
+    logger.debug("Fetching the live interfaces config")
+    results_raw = remote_host.run_sync("show configuration interfaces | display json",
+                                       is_safe=True,
+                                       print_output=print_output,
+                                       print_progress_bars=False)
+    return {interface['name']: interface
+            for interface in parse_junos_interfaces_config(results_raw, dry_run=remote_host.dry_run)
+            if interface['name'] in interfaces}
+
+
+def parse_junos_interfaces_config(results_raw, dry_run: bool = False) -> list[dict]:
+    """Parse the JSON interfaces configuration of a single device into a list of Netbox like interfaces."""
     try:
-        result_json = parse_results(results_raw, json_output=True, dry_run=remote_host.dry_run)
+        result_json = parse_results(results_raw, json_output=True, dry_run=dry_run)
         if isinstance(result_json['configuration'], list):
             old_junos = True
-            interface_json = result_json['configuration'][0]['interfaces'][0]['interface'][0]
+            interfaces_json = result_json['configuration'][0]['interfaces'][0]['interface']
         elif isinstance(result_json['configuration'], dict):
             old_junos = False
-            interface_json = result_json['configuration']['interfaces']['interface'][0]
+            interfaces_json = result_json['configuration']['interfaces']['interface']
         else:
             logger.error('Network device returned unknown data: "%s"', result_json)
-            return None
+            return []
     except (KeyError, TypeError) as e:
         logger.error('Network device returned invalid data: "%s". Error: %s', results_raw, e)
-        return None
-    return junos_interface_to_netbox(interface_json, old_junos)
+        return []
+    return [junos_interface_to_netbox(interface_json, old_junos) for interface_json in interfaces_json]
 
 
 def get_junos_optics(remote_host: RemoteHosts, interface: str, print_output: bool = False) -> dict:
@@ -492,20 +581,114 @@ def get_junos_bgp_summary(remote_host: RemoteHosts, print_output: bool = False)
     return formatted_peers
 
 
-def run_homer(queries: list, dry_run: bool = True) -> None:
+def run_homer(queries: list, dry_run: bool = True, max_workers: int = HOMER_MAX_WORKERS) -> None:
     """Run Homer.
 
+    The queries are deduplicated first, skipping the ones whose devices are all matched also by another query.
+    Doing a diff, Homer runs concurrently on the queries that can't match the same devices, up to max_workers
+    processes at a time, and the output of each query is logged in order once all of them completed. Doing a commit,
+    Homer runs on one query at a time as it asks to confirm the changes of each device.
+
     Arguments:
         queries: List of queries in a Homer compatible format (glob)
         dry_run: If true, does a diff, otherwise a commit
+        max_workers: The maximum number of Homer processes to run at the same time doing a diff
 
     """
-    environment = {"SSH_AUTH_SOCK": KEYHOLDER_SOCK}
     action = ['diff'] if dry_run else ["commit", f"Ran from cookbook {__name__}"]
+    unique_queries = get_unique_homer_queries(queries)
+    if len(unique_queries) < len(queries):
+        logger.info("Running Homer on %s, the other queries are covered by them", unique_queries)
 
-    for query in queries:
-        try:
-            command = ['/usr/local/bin/homer', query] + action
-            run(command, check=True, env=environment)
-        except CalledProcessError as e:
-            logger.warning("Issue while running Homer on %s, please run it manually.\n%s", query, e)
+    if not dry_run or len(unique_queries) < 2 or max_workers < 2:
+        for query in unique_queries:
+            _log_homer_result(query, *_run_homer_query(query, action, capture_output=False))
+        return
+
+    # Each group of possibly overlapping queries runs sequentially, to not run Homer on the same device twice at once
+    groups: list[list[str]] = []
+    for query in unique_queries:
+        overlapping = [group for group in groups if any(homer_queries_overlap(query, other) for other in group)]
+        groups = [group for group in groups if group not in overlapping]
+        groups.append(sorted([other for group in overlapping for other in group] + [query], key=unique_queries.index))
+
+    def run_group(group: list[str]) -> list[tuple[float, Optional[str], Optional[str]]]:
+        return [_run_homer_query(query, action, capture_output=True) for query in group]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(groups))) as executor:
+        results = dict(zip(sum(groups, []), sum(executor.map(run_group, groups), [])))
+
+    for query in unique_queries:
+        _log_homer_result(query, *results[query])
+
+
+def get_unique_homer_queries(queries: list[str]) -> list[str]:
+    """Return the queries without duplicates and without the ones whose devices are all matched by another query.
+
+    Arguments:
+        queries: List of queries in a Homer compatible format (glob)
+
+    """
+    unique = list(dict.fromkeys(queries))
+    result = []
+    for index, query in enumerate(unique):
+        for other_index, other in enumerate(unique):
+            if other_index == index or not _homer_query_covers(other, query):
+                continue
+            # If the two queries match the same devices keep just the first one
+            if other_index < index or not _homer_query_covers(query, other):
+                break
+        else:
+            result.append(query)
+
+    return result
+
+
+def homer_queries_overlap(first: str, second: str) -> bool:
+    """Return whether the two queries might match the same devices.
+
+    Globs starting with different literal prefixes can't match the same devices, any other query, including Homer's
+    key:value selectors, is considered overlapping.
+
+    Arguments:
+        first: a query in a Homer compatible format (glob)
+        second: another query in a Homer compatible format (glob)
+
+    """
+    if ':' in first or ':' in second:
+        return True
+    first_prefix = re.split(r'[*?\[]', first, maxsplit=1)[0]
+    second_prefix = re.split(r'[*?\[]', second, maxsplit=1)[0]
+    return first_prefix.startswith(second_prefix) or second_prefix.startswith(first_prefix)
+
+
+def _homer_query_covers(query: str, other: str) -> bool:
+    """Return whether all the devices matched by the other query are matched also by the query."""
+    if any(char in query + other for char in '?[:'):  # Supported only for globs with just '*' wildcards
+        return query == other
+    return fnmatchcase(other, query)
+
+
+def _run_homer_query(
+    query: str, action: list[str], *, capture_output: bool
+) -> tuple[float, Optional[str], Optional[str]]:
+    """Run Homer on the query, returning its duration, its output if captured and the error if it failed."""
+    environment = {"SSH_AUTH_SOCK": KEYHOLDER_SOCK}
+    command = ['/usr/local/bin/homer', query] + action
+    output = PIPE if capture_output else None
+    start = time.monotonic()
+    try:
+        result = run(command, check=True, env=environment, stdout=output, stderr=STDOUT if output else None, text=True)
+        return time.monotonic() - start, result.stdout, None
+    except CalledProcessError as e:
+        return time.monotonic() - start, e.stdout, str(e)
+
+
+def _log_homer_result(query: str, seconds: float, output: Optional[str], error: Optional[str]) -> None:
+    """Log the output and the duration of a Homer run."""
+    if output:
+        logger.info("Homer output for %s:\n%s", query, output)
+    if error:
+        logger.warning("Issue while running Homer on %s (%.1fs), please run it manually.\n%s", query, seconds, error)
+    else:
+        logger.info("Homer completed on %s in %.1fs", query, seconds)
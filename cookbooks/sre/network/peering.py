@@ -3,10 +3,11 @@
 import logging
 import smtplib
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Union
 
 from email.message import EmailMessage
-from ipaddress import ip_address
+from ipaddress import ip_address, ip_interface
 
 from prettytable import PrettyTable
 
@@ -84,6 +85,7 @@ class PeeringRunner(CookbookRunnerBase):
         self.netbox = spicerack.netbox()
         self.remote = spicerack.remote()
         self.routers_bgp = {}
+        self.sessions: dict[tuple[int, int], list] = {}
         self.dry_run = spicerack.dry_run
         if self.args.ASN == WIKIMEDIA_ASN:
             raise RuntimeError("That's our AS number...")
@@ -121,48 +123,75 @@ class PeeringRunner(CookbookRunnerBase):
             data_net[ixlan].append(net)
         return data_net
 
-    def ixname(self, ixlan_id: int) -> str:
-        """Returns the name of an IXP based on its ID"""
-        for ixlan in self.pdb.fetch('ixlan'):
-            if ixlan['id'] == ixlan_id:
-                ix_id = ixlan['ix_id']
-                break
-        ix_name = self.pdb.fetch('ix', ix_id)[0]['name']
-
-        return ix_name
-
-    def get_device_fqdn_from_ip(self, address: str) -> str:
-        """Returns the FQDN of a device associated to an IP"""
-        return self.netbox.api.ipam.ip_addresses.get(address=address).assigned_object.device.primary_ip.dns_name
+    def ixlan_names(self, ixlan_ids: list) -> dict:
+        """Returns the names of the IXPs based on their IXLAN IDs, fetching the list of IXLANs only once"""
+        ix_ids = {ixlan['id']: ixlan['ix_id'] for ixlan in self.pdb.fetch('ixlan') if ixlan['id'] in ixlan_ids}
+        return {ixlan_id: self.pdb.fetch('ix', ix_ids[ixlan_id])[0]['name'] for ixlan_id in ixlan_ids}
+
+    def get_devices_fqdn_from_ips(self, addresses: set) -> dict:
+        """Returns the FQDN of the devices associated to the given IPs, with a single Netbox query"""
+        if not addresses:
+            return {}
+        devices_fqdn = {}
+        for nb_address in self.netbox.api.ipam.ip_addresses.filter(address=sorted(addresses)):
+            address = str(ip_interface(nb_address.address).ip)
+            devices_fqdn[address] = nb_address.assigned_object.device.primary_ip.dns_name
+        missing = sorted(addresses - devices_fqdn.keys())
+        if missing:
+            raise RuntimeError(f"IPs not found or not assigned to any device in Netbox: {missing}")
+        return devices_fqdn
+
+    def fetch_routers_bgp(self, routers_fqdn: set) -> None:
+        """Fetch the BGP summary tables of all the given routers concurrently"""
+        missing = sorted(router_fqdn for router_fqdn in routers_fqdn if router_fqdn not in self.routers_bgp)
+        if not missing:
+            return
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            self.routers_bgp.update(zip(missing, executor.map(
+                lambda router_fqdn: get_junos_bgp_summary(self.remote.query('D{' + router_fqdn + '}')), missing)))
 
     def format_sessions(self, asn_l: int, asn_r: int) -> list:
-        """Massage PeeringDB data to a list of BGP sessions between networks"""
-        sessions = []
+        """Massage PeeringDB data to a list of BGP sessions between networks, computed only once per run"""
+        if (asn_l, asn_r) in self.sessions:
+            return self.sessions[(asn_l, asn_r)]
+
         data_l = self.pdb.fetch_asn(asn_l)[0]
         data_r = self.pdb.fetch_asn(asn_r)[0]
         netixlan_l = self.netixlan_net(data_l)
         netixlan_r = self.netixlan_net(data_r)
         common = sorted(set(netixlan_l.keys()).intersection(set(netixlan_r.keys())))
+        candidates = []
         for ixlan in common:
             for i in netixlan_l[ixlan]:
                 for k in netixlan_r[ixlan]:
                     for afi in ['ipaddr4', 'ipaddr6']:
                         if i[afi] is None or k[afi] is None:
                             continue
-                        session: dict = {}
-                        session['ix_name'] = self.ixname(ixlan)
-                        session['name_l'] = data_l['name']
-                        session['asn_l'] = asn_l
-                        session['name_r'] = data_r['name']
-                        session['asn_r'] = asn_r
-                        session['ip_l'] = ip_address(i[afi])
-                        session['ip_r'] = ip_address(k[afi])
-                        session['router_fqdn'] = self.get_device_fqdn_from_ip(i[afi])
-                        router_peer = self.routers_bgp_table(session['router_fqdn'], session['ip_r'])
-                        session['status'] = router_peer['peer-state'] if router_peer else 'Not configured'
-                        session['uptime'] = router_peer['elapsed-time'] if router_peer else ''
-                        session['max_prefixes'] = data_r['info_prefixes' + afi[6:]]
-                        sessions.append(session)
+                        candidates.append((ixlan, afi, ip_address(i[afi]), ip_address(k[afi])))
+
+        # Resolve all the IXPs names, our routers and their BGP tables at once, instead of once per session
+        ix_names = self.ixlan_names(common)
+        routers_fqdn = self.get_devices_fqdn_from_ips({str(ip_l) for _, _, ip_l, _ in candidates})
+        self.fetch_routers_bgp(set(routers_fqdn.values()))
+
+        sessions = []
+        for ixlan, afi, ip_l, ip_r in candidates:
+            session: dict = {}
+            session['ix_name'] = ix_names[ixlan]
+            session['name_l'] = data_l['name']
+            session['asn_l'] = asn_l
+            session['name_r'] = data_r['name']
+            session['asn_r'] = asn_r
+            session['ip_l'] = ip_l
+            session['ip_r'] = ip_r
+            session['router_fqdn'] = routers_fqdn[str(ip_l)]
+            router_peer = self.routers_bgp_table(session['router_fqdn'], session['ip_r'])
+            session['status'] = router_peer['peer-state'] if router_peer else 'Not configured'
+            session['uptime'] = router_peer['elapsed-time'] if router_peer else ''
+            session['max_prefixes'] = data_r['info_prefixes' + afi[6:]]
+            sessions.append(session)
+
+        self.sessions[(asn_l, asn_r)] = sessions
         return sessions
 
     # TODO typehint of peer_address
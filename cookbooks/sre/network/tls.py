@@ -3,9 +3,13 @@
 import datetime
 import json
 import logging
+import re
 import shlex
 
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
 from socket import gaierror
+from threading import Lock
 
 from ssl import get_server_certificate, SSLError
 from subprocess import CalledProcessError, run
@@ -23,15 +27,57 @@ from cookbooks.sre.network import parse_results
 
 NETWORK_ROLES = ('cloudsw', 'asw', 'cr', 'mr', 'pfw', 'msw')
 RENEW_EXPIRATION_DELTA = datetime.timedelta(weeks=4)
+JUNOS_CHUNK_SIZE = 900
+"""The maximum length of the data written by each command, to work around the ~1000 characters Junos limit."""
+JUNOS_INVOCATION_SIZE = 1000
+"""The maximum length of the commands joined in a single invocation, as Junos limits it to ~1000 characters too."""
 logger = logging.getLogger(__name__)
 
 
+def junos_file_chunks(data: str, size: int = JUNOS_CHUNK_SIZE) -> list[str]:
+    """Split the data in chunks of whole lines, escaped to be written with echo -e, that adds the last newline.
+
+    Arguments:
+        data: the file content.
+        size: the maximum length of each escaped chunk, a single longer line is kept in its own chunk.
+
+    """
+    chunks: list[str] = []
+    for line in data.rstrip('\n').split('\n'):
+        if chunks and len(chunks[-1]) + len(line) + 2 <= size:
+            chunks[-1] += '\\n' + line
+        else:
+            chunks.append(line)
+    return chunks
+
+
+def junos_invocations(commands: list[str], size: int = JUNOS_INVOCATION_SIZE) -> list[str]:
+    """Join the commands with ; in as few invocations as possible, keeping their order.
+
+    Arguments:
+        commands: the Junos commands to run.
+        size: the maximum length of each invocation, a single longer command is kept in its own invocation.
+
+    """
+    invocations: list[str] = []
+    for command in commands:
+        if invocations and len(invocations[-1]) + len(command) + 1 <= size:
+            invocations[-1] += ';' + command
+        else:
+            invocations.append(command)
+    return invocations
+
+
 class Tls(CookbookBase):
     """Create or update a Junos or SR-Linux device's TLS certificate for TLS based management.
 
+    With a list of devices, or all to select all the active network devices in Netbox, the devices are processed in
+    parallel, up to --concurrency at a time. A failure on a device doesn't stop the others.
+
     Usage example:
         cookbook sre.network.tls lsw1-e8-eqiad
-        cookbook sre.network.tls all (TODO)
+        cookbook sre.network.tls lsw1-e8-eqiad,lsw1-e7-eqiad
+        cookbook sre.network.tls all
 
     TODO maybe later add the CA to the bundle, but that might enable mTLS on some platforms
 
@@ -40,8 +86,10 @@ class Tls(CookbookBase):
     def argument_parser(self):
         """As specified by Spicerack API."""
         parser = super().argument_parser()
-        parser.add_argument('device', help='Short hostname (or all).')
+        parser.add_argument('device', help='Short hostname, comma separated list of short hostnames, or all.')
         parser.add_argument('--system', action='store_true', help="No ensure_shell_is_durable.")
+        parser.add_argument('--concurrency', type=int, default=10,
+                            help='The number of devices to act upon in parallel (default: %(default)s).')
         return parser
 
     def get_runner(self, args):
@@ -54,14 +102,84 @@ class TlsRunner(CookbookRunnerBase):
 
     def __init__(self, args, spicerack):
         """Initiliaze the TLS certificate management runner and do pre-run checks."""
+        self.netbox = spicerack.netbox()
+        self.concurrency = args.concurrency
+        self._srlinux_auth: Optional[tuple[str, str]] = None
+        self._srlinux_auth_lock = Lock()
+
+        if args.device == 'all':
+            self.devices = []
+            for netbox_device in self.netbox.api.dcim.devices.filter(role=list(NETWORK_ROLES), status='active'):
+                try:
+                    self.devices.append(TlsDevice(self, spicerack, netbox_device))
+                except RuntimeError as exc:
+                    logger.warning('Skipping device: %s', exc)
+        else:
+            self.devices = [TlsDevice(self, spicerack, self.netbox.api.dcim.devices.get(name=device), device)
+                            for device in args.device.split(',')]
+
+        # Only required for Junos as Nokia does all the changes in an atomic way
+        if not spicerack.dry_run and not args.system and any(device.platform == 'junos' for device in self.devices):
+            ensure_shell_is_durable()
+
+        try:
+            puppet_conf_raw = run(shlex.split("puppet config print --render-as json"),
+                                  capture_output=True,
+                                  text=True,
+                                  check=True)
+            self.puppet_conf = json.loads(puppet_conf_raw.stdout)
+        except CalledProcessError as exc:
+            raise RuntimeError("Can't read Puppet's config.") from exc
+
+    @property
+    def runtime_description(self):
+        """Return a nicely formatted string that represents the cookbook action."""
+        if len(self.devices) == 1:
+            return f"for network device {self.devices[0].device}"
+        return f"for {len(self.devices)} network devices"
+
+    def srlinux_auth(self, username: str) -> tuple[str, str]:
+        """Return the SR-Linux credentials, prompting for them only once across all the devices."""
+        with self._srlinux_auth_lock:
+            if self._srlinux_auth is None:
+                self._srlinux_auth = (username, get_secret(f"{username} password"))
+            return self._srlinux_auth
+
+    def run(self):
+        """Required by Spicerack API."""
+        if len(self.devices) == 1:
+            self.devices[0].run()
+            return 0
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(self.devices)))) as executor:
+            futures = {device.device: executor.submit(device.run) for device in self.devices}
+            for device, future in futures.items():
+                try:
+                    future.result()
+                except Exception as exc:  # pylint: disable=broad-except
+                    logger.error("%s: ❌ Failed to manage the certificate: %s", device, exc)
+                    failed.append(device)
+
+        if failed:
+            logger.error("Failed to manage the certificate of %d/%d devices: %s", len(failed), len(self.devices),
+                         ','.join(failed))
+            return 1
+        return 0
+
+
+class TlsDevice:
+    """Manage the TLS certificate of a single network device."""
+
+    def __init__(self, runner: TlsRunner, spicerack, netbox_device, device: str = ''):
+        """Initiliaze the device and do pre-run checks."""
+        self.runner = runner
         self.verbose = spicerack.verbose
         self.dry_run = spicerack.dry_run
-        self.remote = spicerack.remote()
-        self.device = args.device
+        self.device = device or netbox_device.name
 
-        self.netbox = spicerack.netbox()
         # TODO implement "any" selector
-        self.netbox_device = self.netbox.api.dcim.devices.get(name=self.device)
+        self.netbox_device = netbox_device
         if not self.netbox_device:
             raise RuntimeError(f'{self.device}: device not in Netbox.')
         if self.netbox_device.role.slug not in NETWORK_ROLES:
@@ -82,38 +200,19 @@ class TlsRunner(CookbookRunnerBase):
         elif self.netbox_device.device_type.manufacturer.slug == 'juniper':
             self.platform = 'junos'
             self.port = 32767
-            self.remote_host = self.remote.query('D{' + self.device_fqdn + '}')
+            self.remote_host = spicerack.remote().query('D{' + self.device_fqdn + '}')
         else:
             raise RuntimeError(f'{self.device}: invalid manufacturer, must be Nokia or juniper.')
 
-        # Only required for Junos as Nokia does all the changes in an atomic way
-        if not self.dry_run and not args.system and self.platform == 'junos':
-            ensure_shell_is_durable()
-
-        try:
-            puppet_conf_raw = run(shlex.split("puppet config print --render-as json"),
-                                  capture_output=True,
-                                  text=True,
-                                  check=True)
-            self.puppet_conf = json.loads(puppet_conf_raw.stdout)
-        except CalledProcessError as exc:
-            raise RuntimeError("Can't read Puppet's config.") from exc
-
-    @property
-    def runtime_description(self):
-        """Return a nicely formatted string that represents the cookbook action."""
-        return f"for network device {self.device}"
-
     @property
     def srlinux_session(self):
         """Return the SR-Linux requests session, prompting for credentials on first use."""
         if self.remote_host.auth is None:
-            password = get_secret(f"{self.username} password")
-            self.remote_host.auth = (self.username, password)
+            self.remote_host.auth = self.runner.srlinux_auth(self.username)
         return self.remote_host
 
     def run(self):
-        """Required by Spicerack API."""
+        """Create or refresh the device's certificate if needed."""
         new_cert_bundle = {}
         # Get the certificate exposed by the host (if any)
         cert = self.get_cert()
@@ -190,9 +289,9 @@ class TlsRunner(CookbookRunnerBase):
         logger.info("%s: 🔏 cfssl called with operation: %s.", self.device, operation)
         logger.debug("cfssl called with data: %s", data_in)
         command = (f"cfssl {operation} -config /etc/cfssl/client-cfssl.conf "
-                   f"-tls-remote-ca {self.puppet_conf['localcacert']} "
+                   f"-tls-remote-ca {self.runner.puppet_conf['localcacert']} "
                    f"-mutual-tls-client-cert /etc/cfssl/mutual_tls_client_cert.pem "
-                   f"-mutual-tls-client-key {self.puppet_conf['hostprivkey']} "
+                   f"-mutual-tls-client-key {self.runner.puppet_conf['hostprivkey']} "
                    "-label network_devices  -")
         try:
             cfssl_raw = run(shlex.split(command), capture_output=True, text=True, check=True, input=data_in)
@@ -236,33 +335,54 @@ class TlsRunner(CookbookRunnerBase):
             return result_parsed
         raise RuntimeError(f'{self.device}: Invalid data returned when trying to fetch CSR.')
 
-    def _copy_to_junos(self, data: str, path: str, append: bool = False):
-        """Helper function to write to Junos filesystem."""
-        # The line below is to work around Junos limitation and lack of scp support in spicerack
-        data_one_line = data.replace('\n', '\\n')
-        if not append:
-            # Try to delete the file just in case
-            self.remote_host.run_sync(f"file delete {path}",
-                                      print_output=self.verbose, print_progress_bars=False)
-        # Another Junos limitation to this hack, ~1000 characters limit
-        for part in [data_one_line[i:i + 900] for i in range(0, len(data_one_line), 900)]:
-            self.remote_host.run_sync(f"start shell sh command \"echo -e '{part}' >> {path}\"",
-                                      print_output=self.verbose, print_progress_bars=False)
-        logger.debug("Written to %s (append: %s)\n%s", path, str(append), data)
+    def _copy_to_junos(self, files: dict[str, str]):
+        """Helper function to write files to Junos filesystem and verify them.
+
+        Each invocation is limited to JUNOS_INVOCATION_SIZE characters, so every echo of a JUNOS_CHUNK_SIZE chunk
+        needs its own, and only the file delete and checksum commands are joined to the nearby ones. A CSR,
+        certificate and key bundle takes about one invocation per chunk of data, instead of one per command.
+        """
+        # Work around Junos limitations and lack of scp support in spicerack, echoing the files in chunks
+        contents = {}
+        commands = []
+        for path, data in files.items():
+            contents[path] = data.rstrip('\n') + '\n'
+            commands.append(f"file delete {path}")  # Delete the file just in case
+            commands.extend(f"start shell sh command \"echo -e '{part}' >> {path}\""
+                            for part in junos_file_chunks(contents[path]))
+        commands.extend(f"file checksum sha-256 {path}" for path in files)
+
+        result = ''
+        for invocation in junos_invocations(commands):
+            results_raw = self.remote_host.run_sync(invocation, print_output=self.verbose, print_progress_bars=False)
+            result += (parse_results(results_raw, dry_run=self.dry_run) or '') + '\n'
+        if self.dry_run:
+            logger.debug("%s: Not verifying the checksums of %s in dry-run.", self.device, list(files))
+            return
+
+        checksums = {path: checksum for path, checksum in re.findall(r'SHA256 \((\S+)\) = ([0-9a-f]{64})', result)}
+        mismatch = [path for path, data in contents.items()
+                    if checksums.get(path) != sha256(data.encode()).hexdigest()]
+        if mismatch:
+            raise RuntimeError(f"{self.device}: Checksum mismatch of {mismatch} after writing them to the device.")
+        logger.debug("Written and verified %s", list(files))
 
     def deploy_cert_junos(self, cert_bundle):
         """Deploy the needed files on Junos."""
+        files = {}
         if 'csr' in cert_bundle:  # Store the CSR in the a dir that survives upgrades/cleanup
-            self._copy_to_junos(cert_bundle['csr'], '/var/preserve/csr.pem')
-
-        self._copy_to_junos(cert_bundle['cert'], '/var/tmp/cert.pem')  # nosec - hardcoded_tmp_directory
+            files['/var/preserve/csr.pem'] = cert_bundle['csr']
 
         if 'key' in cert_bundle:
             # On junos both the client cert and key are in the same file
-            self._copy_to_junos(cert_bundle['key'], '/var/tmp/cert.pem', append=True)  # nosec - hardcoded_tmp
+            files['/var/tmp/cert.pem'] = cert_bundle['cert'].rstrip('\n') + '\n' + cert_bundle['key']  # nosec
             # But we also need to keep the key somewhere to re-use it during a refresh
-            self._copy_to_junos(cert_bundle['key'], '/var/preserve/key.pem', append=False)
-        else:  # refresh
+            files['/var/preserve/key.pem'] = cert_bundle['key']
+        else:
+            files['/var/tmp/cert.pem'] = cert_bundle['cert']  # nosec - hardcoded_tmp_directory
+
+        self._copy_to_junos(files)
+        if 'key' not in cert_bundle:  # refresh
             self.remote_host.run_sync("start shell sh command \"cat /var/preserve/key.pem >> /var/tmp/cert.pem\"",
                                       print_output=self.verbose, print_progress_bars=False)
 
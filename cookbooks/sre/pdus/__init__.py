@@ -1,44 +1,66 @@
-"""PDU Operations"""
+"""PDU Operations
 
+The PDUs are managed through their web interface. All the operations are asynchronous so that they can be run
+concurrently on many PDUs with :py:func:`run_on_pdus`, limiting how many PDUs of the same site are acted upon at
+the same time, and reporting the results in a per-PDU table with :py:func:`report`.
+"""
+
+import asyncio
+from base64 import b64encode
 from argparse import ArgumentParser
+from collections.abc import Awaitable, Callable, Mapping
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from logging import getLogger
 from re import match
-from typing import Optional
-
-import urllib3
-
-import requests.exceptions
+from time import monotonic
+from typing import TYPE_CHECKING, Optional
 
+from prettytable import PrettyTable
 from spicerack.cookbook import ArgparseFormatter
-from spicerack.decorators import retry
+
+if TYPE_CHECKING:  # aiohttp is imported only when talking to the PDUs, it is slow to import
+    from aiohttp import ClientSession
 
 
 logger = getLogger(__name__)
 __owner_team__ = 'Infrastructure Foundations'
 MIN_SECRET_SIZE = 6
+# Maximum number of PDUs of the same site to act upon at the same time
+MAX_PER_SITE = 5
+# Reboots from experience take at least 60 seconds, poll the uptime until the PDU is back for up to 185 seconds
+REBOOT_TIMEOUT = 185
+REBOOT_POLL_INTERVAL = 5
+
 
+class PDUError(Exception):
+    """Base exception class for errors while operating on a PDU."""
 
-class RequestError(Exception):
+
+class RequestError(PDUError):
     """Raised if there is an issue making a request to the PDU"""
 
 
-class VersionError(Exception):
+class VersionError(PDUError):
     """Raised if there is an issue getting PDU version"""
 
 
-class RebootError(Exception):
+class RebootError(PDUError):
     """Exception raised if password reset fails"""
 
 
-class UptimeError(Exception):
+class UptimeError(PDUError):
     """Exception raised if we fail to get the uptime"""
 
 
-class RemoteCheckError(Exception):
+class RemoteCheckError(PDUError):
     """Exception raised if we fail to get the uptime"""
 
 
+class DefaultUserError(PDUError):
+    """Exception raised if the default user is still configured on the PDU"""
+
+
 def argument_parser_base(doc: Optional[str]):
     """As specified by Spicerack API."""
     parser = ArgumentParser(
@@ -46,137 +68,291 @@ def argument_parser_base(doc: Optional[str]):
     parser.add_argument('--username', help="Username to login to the PDU's", default='root')
     parser.add_argument('--check_default', help='Check for default user',
                         action='store_true')
+    parser.add_argument('--max-per-site', type=int, default=MAX_PER_SITE,
+                        help='Maximum number of PDUs of the same site to act upon at the same time')
     parser.add_argument('query', help='PDU FQDN or \'all\'', nargs='+')
 
     return parser
 
 
-def _request(method, session, url, data=None, timeout=(3, 6)):
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-    try:
-        logger.debug('%s to: %s -> %s', method, url, data)
-        response = session.request(method, url, data=data, timeout=timeout)
-        response.raise_for_status()
-    except (requests.exceptions.ConnectTimeout, requests.exceptions.ReadTimeout,
-            requests.exceptions.ConnectionError, requests.exceptions.SSLError) as err:
-        raise RequestError(url) from err
-    except requests.exceptions.HTTPError as err:
-        raise RequestError("{} ({})".format(url, response.status_code)) from err
-    return response
+@dataclass(frozen=True)
+class Response:
+    """A response received from a PDU."""
 
+    status: int
+    headers: Mapping[str, str]
+    text: str
 
-def get(session, url, timeout=(3, 6)):
-    """Preform a get request against the pdu"""
-    return _request('GET', session, url, data=None, timeout=timeout)
 
+class PDU:
+    """Asynchronous client for the web interface of a single PDU."""
 
-def post(session, url, data, timeout=(3, 6)):
-    """Preform a post request against the pdu"""
-    return _request('POST', session, url, data=data, timeout=timeout)
+    def __init__(self, pdu: str, session: "ClientSession", username: str, password: str):
+        """Initialize the instance.
 
+        Arguments:
+            pdu (str): the pdu address
+            session (aiohttp.ClientSession): the session to use for all the requests to this PDU
+            username (str): the username to login to the PDU
+            password (str): the password to login to the PDU
 
-def check_default(pdu, session):
-    """Checks if the default password is set on the device
+        """
+        self.pdu = pdu
+        self.session = session
+        self.auth = (username, password)
 
-    Arguments:
-        pdu (str): the pdu
-        session (requests.Session): A configured request session
+    def __str__(self) -> str:
+        """String representation of the instance."""
+        return self.pdu
 
-    Returns:
-        bool: indicating if the default password is in use
+    async def request(self, method: str, path: str, data: Optional[dict] = None, *,
+                      auth: Optional[tuple[str, str]] = None, timeout: float = 6,
+                      raise_for_status: bool = True) -> Response:
+        """Perform a request against the pdu
 
-    """
-    auth = session.auth
-    session.auth = ('admn', 'admn')
-    response = get(session, 'https://{}/chngpswd.html'.format(pdu))
-    session.auth = auth
-    if response.ok:
-        logger.warning('%s: Default user found 😞', pdu)
-        return True
-    logger.info('%s: No default user 👍', pdu)
-    return False
+        Arguments:
+            method (str): the HTTP method
+            path (str): the path of the URL to request
+            data (dict, optional): the form data to send
+            auth (tuple, optional): the username and password to use instead of the instance ones
+            timeout (float): the read timeout in seconds
+            raise_for_status (bool): whether to raise if the PDU returns an HTTP error
 
+        Returns:
+            Response: the received response
 
-def get_version(pdu, session):
-    """Check the firmware version and returns the matching Sentry version
+        Raises:
+            RequestError
+
+        """
+        from aiohttp import ClientError, ClientTimeout  # pylint: disable=import-outside-toplevel
+
+        url = 'https://{}{}'.format(self.pdu, path)
+        logger.debug('%s to: %s -> %s', method, url, data)
+        if data is not None:
+            data = {key: str(value) for key, value in data.items()}
+        credentials = b64encode(':'.join(auth or self.auth).encode()).decode()
+        try:
+            async with self.session.request(
+                method, url, data=data, headers={'Authorization': 'Basic {}'.format(credentials)},
+                timeout=ClientTimeout(sock_connect=3, sock_read=timeout),
+            ) as response:
+                body = await response.read()
+        except (ClientError, asyncio.TimeoutError) as err:
+            raise RequestError(url) from err
+        if raise_for_status and response.status >= 400:
+            raise RequestError('{} ({})'.format(url, response.status))
+        return Response(status=response.status, headers=response.headers, text=body.decode(errors='replace'))
+
+    async def get(self, path: str, timeout: float = 6) -> Response:
+        """Perform a get request against the pdu"""
+        return await self.request('GET', path, timeout=timeout)
+
+    async def post(self, path: str, data: dict, timeout: float = 6) -> Response:
+        """Perform a post request against the pdu"""
+        return await self.request('POST', path, data=data, timeout=timeout)
+
+    async def check_default(self) -> bool:
+        """Checks if the default password is set on the device
+
+        Returns:
+            bool: indicating if the default password is in use
+
+        """
+        response = await self.request('GET', '/chngpswd.html', auth=('admn', 'admn'),
+                                      raise_for_status=False)
+        if response.status < 400:
+            logger.warning('%s: Default user found 😞', self.pdu)
+            return True
+        logger.info('%s: No default user 👍', self.pdu)
+        return False
+
+    async def get_version(self) -> int:
+        """Check the firmware version and returns the matching Sentry version
+
+        Returns:
+            int: the version number
+
+        Raises:
+            VersionError
+
+        """
+        try:
+            response = await self.get('/')
+        except RequestError as err:
+            raise VersionError('{}: unable to get the Sentry version'.format(self.pdu)) from err
+        server = response.headers.get('Server', '')
+        if 'v7' in server:
+            logger.debug('%s: Sentry 3 detected', self.pdu)
+            return 3
+        if 'v8' in server:
+            logger.debug('%s: Sentry 4 detected', self.pdu)
+            return 4
+        raise VersionError('{}: Unknown Sentry version'.format(self.pdu))
+
+    async def get_uptime(self) -> str:
+        """Return the PDU uptime
+
+        Returns:
+            (str): the server uptime
+
+        Raises:
+            UptimeError
+
+        """
+        try:
+            response = await self.get('/CDU/summary.txt')
+        except RequestError as err:
+            raise UptimeError('{}: unable to get the uptime'.format(self.pdu)) from err
+        # summary.text has a bunch of entries `/key(=type)?=value/` separated by pipe
+        for entry in response.text.split('|'):
+            tokens = entry.split('=')
+            if tokens[0] == 'uptime':
+                return tokens[2]
+        raise UptimeError('{}: Error unable to parse uptime from summary.txt'.format(self.pdu))
+
+    async def reboot(self, version: int) -> None:
+        """Reboot the PDU
+
+        Arguments:
+            version (int): the Sentry version of the PDU
+
+        Raises:
+            RebootError
+
+        """
+        forms: dict[int, dict] = {
+            3: {'Restart_Action': 1},
+            4: {'RST': '00000001', 'FormButton': 'Apply'},
+        }
+        form = forms.get(version)
+
+        if form is None:
+            raise RebootError('{}: Unknown Sentry version'.format(self.pdu))
+
+        logger.info('%s: rebooting Sentry v%d PDU', self.pdu, version)
+        try:
+            await self.post('/Forms/restart_1', data=form)
+        except RequestError as err:
+            raise RebootError('{}: unable to reboot'.format(self.pdu)) from err
+        try:
+            # This seems to be required to do the actual reboot at least on v3
+            await self.get('/restarting.html', timeout=1)
+        except RequestError:
+            pass
+
+    async def wait_reboot_since(self, since: datetime, timeout: float = REBOOT_TIMEOUT,
+                                interval: float = REBOOT_POLL_INTERVAL) -> None:
+        """Poll the PDU until it is reachable and has an uptime lower than the provided datetime.
+
+        Arguments:
+            since (datetime.datetime): the time after which the PDU should have booted.
+            timeout (float): the maximum number of seconds to wait for.
+            interval (float): the number of seconds between each poll.
+
+        Raises:
+            UptimeError: if unable to connect to the PDU or the uptime is still higher than expected after timeout.
+
+        """
+        deadline = monotonic() + timeout
+        while True:
+            try:
+                uptime = parse_uptime(await self.get_uptime())
+                delta = (datetime.now(timezone.utc) - since).total_seconds()
+                if uptime < delta:
+                    logger.info('%s: found reboot since %s', self.pdu, since)
+                    return
+                error = UptimeError('{}: uptime is higher than threshold: {} > {}'.format(self.pdu, uptime, delta))
+            except UptimeError as err:
+                error = err
+
+            if monotonic() + interval > deadline:
+                raise error
+            logger.debug('%s: not yet rebooted, retrying in %s seconds', self.pdu, interval)
+            await asyncio.sleep(interval)
+
+
+@dataclass
+class PDUResult:
+    """The result of an operation on a single PDU."""
+
+    pdu: str
+    site: str
+    success: bool = False
+    message: str = ''
+    duration: float = 0.0
+
+
+def run_on_pdus(pdus: Mapping[str, str], action: Callable[[PDU], Awaitable[str]], *, username: str, password: str,
+                max_per_site: int = MAX_PER_SITE) -> list[PDUResult]:
+    """Run an operation concurrently on the given PDUs.
+
+    Each PDU gets its own HTTP session and at most `max_per_site` PDUs of the same site are acted upon at the same
+    time. The operation is a coroutine function that gets a :py:class:`PDU` instance, returns a short description
+    of what it did and raises a :py:class:`PDUError` on failure.
 
     Arguments:
-        pdu (str): the pdu fqdn
-        session (requests.Session): A configured request session
+        pdus (dict): the PDU addresses to act upon, mapped to their site, as returned by :py:func:`get_pdus`.
+        action (callable): the coroutine function to run on each PDU.
+        username (str): the username to login to the PDUs.
+        password (str): the password to login to the PDUs.
+        max_per_site (int): the maximum number of PDUs of the same site to act upon at the same time.
 
     Returns:
-        int: the version number
-
-    Raises:
-        VersionError
+        list: the :py:class:`PDUResult` of each PDU.
 
     """
-    try:
-        response = get(session, "https://{}/".format(pdu))
-    except RequestError as err:
-        raise VersionError from err
-    if 'v7' in response.headers['Server']:
-        logger.debug('%s: Sentry 3 detected', pdu)
-        return 3
-    if 'v8' in response.headers['Server']:
-        logger.debug('%s: Sentry 4 detected', pdu)
-        return 4
-    raise VersionError('{}: Unknown Sentry version'.format(pdu))
-
-
-def reboot(pdu, version, session):
-    """Reboot the PDU
+    return asyncio.run(_run_on_pdus(pdus, action, username, password, max_per_site))
 
-    Arguments:
-        pdu (str): the pdu
-        version (int): the Sentry version of the PDU
-        session (requests.Session): A configured request session
 
-    """
-    form = {
-        3: {'Restart_Action': 1},
-        4: {'RST': '00000001', 'FormButton': 'Apply'},
-    }.get(version)
-
-    if form is None:
-        raise RebootError('{}: Unknown Sentry version'.format(pdu))
-
-    logger.info('%s: rebooting Sentry v%d PDU', pdu, version)
-    try:
-        url = 'https://{}/Forms/restart_1'.format(pdu)
-        post(session, url, data=form)
-    except requests.exceptions.HTTPError as err:
-        raise RebootError from err
-    try:
-        # This seems to be required to do the actual reboot at least on v3
-        url = 'https://{}/restarting.html'.format(pdu)
-        get(session, url, timeout=1)
-    except RequestError:
-        pass
-
-
-@retry(tries=25, delay=timedelta(seconds=5), backoff_mode='constant', exceptions=UptimeError)
-def wait_reboot_since(pdu, since, session):
-    """Poll the host until it is reachable and has an uptime lower than the provided datetime.
+async def _run_on_pdus(pdus: Mapping[str, str], action: Callable[[PDU], Awaitable[str]], username: str,
+                       password: str, max_per_site: int) -> list[PDUResult]:
+    """Asynchronous implementation of run_on_pdus()."""
+    from aiohttp import ClientSession, TCPConnector  # pylint: disable=import-outside-toplevel
 
-    Arguments:
-        pdu (str): the pdu
-        since (datetime.datetime): the time after which the host should have booted.
-        session (requests.Session): A configured request session
+    semaphores = {site: asyncio.Semaphore(max(max_per_site, 1)) for site in set(pdus.values())}
 
-    Raises:
-        RemoteCheckError: if unable to connect to the host or the uptime is higher than expected.
+    async def run_one(pdu: str, site: str) -> PDUResult:
+        result = PDUResult(pdu=pdu, site=site)
+        async with semaphores[site]:
+            start = monotonic()
+            async with ClientSession(connector=TCPConnector(ssl=False)) as session:
+                try:
+                    result.message = await action(PDU(pdu, session, username, password))
+                    result.success = True
+                except PDUError as error:
+                    logger.error(error)
+                    result.message = str(error) or error.__class__.__name__
+            result.duration = monotonic() - start
+        return result
+
+    return list(await asyncio.gather(*(run_one(pdu, site) for pdu, site in sorted(pdus.items()))))
 
-    """
-    delta = (datetime.now(timezone.utc) - since).total_seconds()
-    uptime = parse_uptime(get_uptime(pdu, session))
-    if uptime >= delta:
-        raise UptimeError('{}: uptime is higher than threshold: {} > {}'.format(
-            pdu, uptime, delta))
-    logger.info('%s: found reboot since %s', pdu, since)
 
+def report(results: list[PDUResult]) -> int:
+    """Log a per-PDU table of the results.
+
+    Arguments:
+        results (list): the :py:class:`PDUResult` instances to report.
+
+    Returns:
+        int: 0 if the operation was successful on all the PDUs, 1 otherwise.
 
-def get_pdu_ips(netbox, query):
+    """
+    table = PrettyTable(['PDU', 'Site', 'Result', 'Duration', 'Details'])
+    table.align['Details'] = 'l'
+    for result in sorted(results, key=lambda item: (item.site, item.pdu)):
+        table.add_row([result.pdu, result.site, 'OK' if result.success else 'FAILED',
+                       '{:.1f}s'.format(result.duration), result.message])
+    logger.info('Results:\n%s', table)
+    failed = [result.pdu for result in results if not result.success]
+    if failed:
+        logger.error('Failed on %d of %d PDUs: %s', len(failed), len(results), ', '.join(failed))
+        return 1
+    return 0
+
+
+def get_pdus(netbox, query):
     """Query the netbox API for pdus
 
     If the first element in `query` is the word 'all' return all pdus' otherwise
@@ -188,56 +364,33 @@ def get_pdu_ips(netbox, query):
         query (list): A list of pdu ipaddress/device names or the word all
 
     Returns:
-        set: A set of PDU IPs
+        dict: the PDU IPs mapped to the slug of their site
 
     """
     _query = query.copy()
-    pdus = set()
+    pdus = {}
     devices = netbox.api.dcim.devices.filter(role='pdu')
     if 'all' in _query[0]:
         if len(_query) > 1:
             logger.warning('`all` passed as a query argument all other values will be ignored')
-        pdus = set(str(device.primary_ip).split('/', maxsplit=1)[0] for device in devices
-                   if device.primary_ip is not None)
+        pdus = {str(device.primary_ip).split('/', maxsplit=1)[0]: device.site.slug for device in devices
+                if device.primary_ip is not None}
     else:
         for device in devices:
             if device.primary_ip is not None:
                 primary_ip = str(device.primary_ip).split('/', maxsplit=1)[0]
                 if primary_ip in _query:
-                    pdus.add(primary_ip)
+                    pdus[primary_ip] = device.site.slug
                     _query.remove(primary_ip)
                     continue
                 if device.name in _query:
-                    pdus.add(primary_ip)
+                    pdus[primary_ip] = device.site.slug
                     _query.remove(device.name)
         if _query:
             logger.warning("The following PDU's from the query argument where not found: %s", ', '.join(_query))
     return pdus
 
 
-def get_uptime(pdu, session):
-    """Return the PDU uptime
-
-    Arguments:
-        pdu (str): the pdu
-        session (requests.Session): A configured request session
-
-    Returns:
-        (str): the server uptime
-
-    """
-    try:
-        response = get(session, 'https://{}/CDU/summary.txt'.format(pdu))
-    except RequestError as err:
-        raise UptimeError from err
-    # summary.text has a bunch of entries `/key(=type)?=value/` separated by pipe
-    for entry in response.text.split('|'):
-        tokens = entry.split('=')
-        if tokens[0] == 'uptime':
-            return tokens[2]
-    raise UptimeError('{}: Error unable to parse uptime from summary.txt'.format(pdu))
-
-
 def parse_uptime(uptime):
     """Parse the uptime to a datetime object
 
@@ -2,7 +2,7 @@
 
 - Optionally checks if the default user is still configured.
 - Default user is 'root'
-- If host 'all' is passed, will iterate over all PDUs
+- If host 'all' is passed, will reboot all PDUs concurrently, up to --max-per-site per site at a time
 - This script does nothing with --dry-run
 
 Usage example:
@@ -14,9 +14,7 @@ Usage example:
 import logging
 
 from datetime import datetime, timezone
-from time import sleep
 
-from requests import Session
 from wmflib.interactive import ensure_shell_is_durable, get_secret
 
 from cookbooks.sre import pdus
@@ -39,33 +37,28 @@ def run(args, spicerack):
         logger.info('this cookbook does nothing with with --dry-run')
         return 0
     ensure_shell_is_durable()
-    session = Session()
-    session.verify = False
-    return_code = 0
     current_password = get_secret('Current password')
-    session.auth = (args.username, current_password)
 
-    _pdus = pdus.get_pdu_ips(spicerack.netbox(), args.query)
+    _pdus = pdus.get_pdus(spicerack.netbox(), args.query)
 
-    for pdu in _pdus:
-        try:
-            if args.since:
-                uptime = pdus.parse_uptime(pdus.get_uptime(pdu, session))
-                if uptime < args.since:
-                    logger.info('%s: Not rebooting uptime is %d', pdu, uptime)
-                    continue
+    async def reboot(pdu):
+        uptime = pdus.parse_uptime(await pdu.get_uptime()) if args.since else None
+        if uptime is not None and uptime < args.since:
+            logger.info('%s: Not rebooting uptime is %d', pdu, uptime)
+            message = 'not rebooted, uptime is {}'.format(uptime)
+        else:
+            message = 'rebooted'
             reboot_time = datetime.now(timezone.utc)
-            version = pdus.get_version(pdu, session)
-            pdus.reboot(pdu, version, session)
-            # Reboots from expereince take at least 60 seconds
-            logger.info('%s: sleep while reboot', pdu)
-            sleep(60)
-            pdus.wait_reboot_since(pdu, reboot_time, session)
-        except (pdus.VersionError, pdus.RebootError, pdus.UptimeError) as error:
-            logger.error(error)
-            return_code = 1
+            version = await pdu.get_version()
+            await pdu.reboot(version)
+            logger.info('%s: wait for reboot', pdu)
+            await pdu.wait_reboot_since(reboot_time)
         if args.check_default:
-            if pdus.check_default(pdu, session):
+            if await pdu.check_default():
                 # TODO: delete default user
-                return_code = 1
-    return return_code
+                raise pdus.DefaultUserError('{}: {} but default user found'.format(pdu, message))
+        return message
+
+    results = pdus.run_on_pdus(_pdus, reboot, username=args.username, password=current_password,
+                               max_per_site=args.max_per_site)
+    return pdus.report(results)
@@ -2,7 +2,7 @@
 
 - Optionally checks if the default user is still configured.
 - Default user is 'root'
-- If host 'all' is passed, will iterate over all PDUs
+- If host 'all' is passed, will update all PDUs concurrently, up to --max-per-site per site at a time
 - So try --dry-run first 😉
 
 Usage example:
@@ -13,8 +13,6 @@ Usage example:
 
 import logging
 
-from requests import Session
-
 from wmflib.interactive import ensure_shell_is_durable, get_secret
 
 from cookbooks.sre import pdus
@@ -23,7 +21,7 @@ from cookbooks.sre import pdus
 logger = logging.getLogger(__name__)
 
 
-class PasswordResetError(Exception):
+class PasswordResetError(pdus.PDUError):
     """Raised if password reset fails"""
 
 
@@ -32,12 +30,11 @@ def argument_parser():
     return pdus.argument_parser_base(__doc__)
 
 
-def change_password(pdu, session, new_password):
+async def change_password(pdu, new_password):
     """Change the password
 
     Arguments:
-        pdu (str): the pdu fqdn
-        session (requests.Session): A configured request session
+        pdu (cookbooks.sre.pdus.PDU): the pdu client
         new_password (str): the new password to use
 
     Raises:
@@ -46,58 +43,55 @@ def change_password(pdu, session, new_password):
     """
     payload = {
         3: {
-            'Current_Password': session.auth[1],
+            'Current_Password': pdu.auth[1],
             'New_Password': new_password,
             'New_Password_Verify': new_password
         },
         4: {
             'FormButton': 'Apply',
-            'UPWC': session.auth[1],
+            'UPWC': pdu.auth[1],
             'UPW': new_password,
             'UPWV': new_password
         }
-    }.get(pdus.get_version(pdu, session))
+    }.get(await pdu.get_version())
 
     # Then change the password
     try:
-        response = pdus.post(session, 'https://{}/Forms/chngpswd_1'.format(pdu), payload)
+        await pdu.post('/Forms/chngpswd_1', payload)
     except pdus.RequestError as err:
-        raise PasswordResetError from err
+        raise PasswordResetError('{}: password reset failed'.format(pdu)) from err
 
-    session.auth = (session.auth[0], new_password)
-    session.cookies.clear()
+    pdu.auth = (pdu.auth[0], new_password)
+    pdu.session.cookie_jar.clear()
     try:
-        response = pdus.get(session, 'https://{}/chngpswd.html'.format(pdu))
+        await pdu.get('/chngpswd.html')
     except pdus.RequestError as err:
-        logger.error('%s: Error %s. password reset failed', pdu, response.status_code)
-        raise PasswordResetError from err
+        raise PasswordResetError(
+            '{}: password reset failed, unable to login with the new password'.format(pdu)) from err
     logger.info('%s: Password updated successfully 😌', pdu)
 
 
 def run(args, spicerack):
     """Required by Spicerack API."""
     ensure_shell_is_durable()
-    session = Session()
-    session.verify = False
-    return_code = 0
     current_password = get_secret('Current password')
     new_password = get_secret("New password", confirm=True)
 
-    session.auth = (args.username, current_password)
-
-    _pdus = pdus.get_pdu_ips(spicerack.netbox(), args.query)
-
-    for pdu in _pdus:
-        try:
-            if not spicerack.dry_run:
-                change_password(pdu, session, new_password)
-            else:
-                logger.info('%s: Dry run, not trying.', pdu)
-            if args.check_default:
-                if pdus.check_default(pdu, session):
-                    # TODO: delete default user
-                    return_code = 1
-        except (pdus.VersionError, PasswordResetError) as error:
-            logger.error(error)
-            return_code = 1
-    return return_code
+    _pdus = pdus.get_pdus(spicerack.netbox(), args.query)
+
+    async def rotate(pdu):
+        if not spicerack.dry_run:
+            await change_password(pdu, new_password)
+            message = 'password updated'
+        else:
+            logger.info('%s: Dry run, not trying.', pdu)
+            message = 'dry run, not trying'
+        if args.check_default:
+            if await pdu.check_default():
+                # TODO: delete default user
+                raise pdus.DefaultUserError('{}: {} but default user found'.format(pdu, message))
+        return message
+
+    results = pdus.run_on_pdus(_pdus, rotate, username=args.username, password=current_password,
+                               max_per_site=args.max_per_site)
+    return pdus.report(results)
@@ -5,9 +5,7 @@ from datetime import datetime, timezone
 from html.parser import HTMLParser
 from logging import getLogger
 from secrets import token_urlsafe
-from time import sleep
 
-from requests import Session
 from spicerack.cookbook import CookbookBase, CookbookRunnerBase
 from wmflib.interactive import ensure_shell_is_durable, get_secret
 
@@ -17,7 +15,7 @@ from cookbooks.sre import pdus
 logger = getLogger(__name__)
 
 
-class SnmpResetError(Exception):
+class SnmpResetError(pdus.PDUError):
     """Raised if SNMP reset fails"""
 
 
@@ -25,13 +23,18 @@ class PDUParser(HTMLParser):  # pylint: disable=abstract-method
     """Base class for parsing PDU pages"""
 
     form_params = ['GetCom', 'SetCom', 'SysName', 'SysLoc', 'SysContact']
-    _form = {
-        'TrapCom': 'trap',
-        'TrapUser': '',
-        'Trap1': '',
-        'Trap2': '',
-        'TrapTime': 60,
-    }
+
+    def __init__(self):
+        """Initialise object"""
+        super().__init__()
+        # Per instance, as parsers of different PDUs and versions are used at the same time
+        self._form = {
+            'TrapCom': 'trap',
+            'TrapUser': '',
+            'Trap1': '',
+            'Trap2': '',
+            'TrapTime': 60,
+        }
 
     def handle_starttag(self, tag, attrs):
         """Parse html start tags"""
@@ -95,7 +98,7 @@ class ChangeSNMP(CookbookBase):
 
     - Optionally checks if the default user is still configured.
     - Default user is 'root'
-    - If host 'all' is passed, will iterate over all PDUs
+    - If host 'all' is passed, will update all PDUs concurrently, up to --max-per-site per site at a time
     - So try --dry-run first 😉
 
     Usage example:
@@ -133,18 +136,18 @@ class ChangeSNMPRunner(CookbookRunnerBase):
         self.reset_rw = args.force
         self.check_default = args.check_default
 
-        self.session = Session()
-        self.session.verify = False
-        self.session.auth = (args.username, password)
+        self.username = args.username
+        self.password = password
+        self.max_per_site = args.max_per_site
         self.spicerack = spicerack
 
-        self._pdus = pdus.get_pdu_ips(spicerack.netbox(), args.query)
+        self._pdus = pdus.get_pdus(spicerack.netbox(), args.query)
 
-    def change_snmp(self, pdu: str, version: int) -> bool:
+    async def change_snmp(self, pdu: pdus.PDU, version: int) -> bool:
         """Change the snmp_string.
 
         Arguments:
-            pdu (str): the pdu
+            pdu (cookbooks.sre.pdus.PDU): the pdu client
             version (str): The pdu version number
 
         Returns:
@@ -153,7 +156,6 @@ class ChangeSNMPRunner(CookbookRunnerBase):
             SnmpResetError
 
         """
-        version = pdus.get_version(pdu, self.session)
         parser_func = {
             3: PDUParserV3,
             4: PDUParserV4,
@@ -163,15 +165,15 @@ class ChangeSNMPRunner(CookbookRunnerBase):
             raise SnmpResetError("Unknown Version Sentry 👎")
 
         parser = parser_func()
-        snmp_form = 'https://{}/Forms/snmp_1'.format(pdu)
+        snmp_form = '/Forms/snmp_1'
 
         try:
             # first fetch the form to get the current values
             logger.debug('%s: Fetch current values', pdu)
-            response = pdus.get(self.session, snmp_form)
-            parser.feed(response.content.decode())
+            response = await pdu.get(snmp_form)
+            parser.feed(response.text)
         except pdus.RequestError as err:
-            raise SnmpResetError from err
+            raise SnmpResetError('{}: unable to fetch the current values'.format(pdu)) from err
         form = parser.form.copy()
         # update the form paramters with new values
         if form['GetCom'] != self.snmp_ro:
@@ -182,7 +184,7 @@ class ChangeSNMPRunner(CookbookRunnerBase):
             form['SetCom'] = self.snmp_rw
         # post new values
         if form == parser.form:
-            uptime = pdus.get_uptime(pdu, self.session)
+            uptime = await pdu.get_uptime()
             logger.info('%s: SNMP communities already match (version: %d, uptime: %s)',
                         pdu, version, uptime)
             if not self.force:
@@ -190,10 +192,10 @@ class ChangeSNMPRunner(CookbookRunnerBase):
             logger.info('%s: Force update', pdu)
         try:
             logger.debug('Posting: %s -> %s', form, snmp_form)
-            response = pdus.post(self.session, snmp_form, form)
-            parser.feed(response.content.decode())
+            response = await pdu.post(snmp_form, form)
+            parser.feed(response.text)
         except pdus.RequestError as err:
-            raise SnmpResetError from err
+            raise SnmpResetError('{}: unable to post the new values'.format(pdu)) from err
         # Check the new values applied
         if parser.form['GetCom'] != self.snmp_ro:
             raise SnmpResetError('{}: failed to update snmp_ro'.format(pdu))
@@ -205,28 +207,37 @@ class ChangeSNMPRunner(CookbookRunnerBase):
             logger.info('%s: SNMP RW: updated', pdu)
         return True
 
+    async def rotate_snmp(self, pdu: pdus.PDU) -> str:
+        """Change the SNMP communities of a PDU and reboot it to apply them.
+
+        Arguments:
+            pdu (cookbooks.sre.pdus.PDU): the pdu client
+
+        Returns:
+            str: a description of what was done
+
+        """
+        version = await pdu.get_version()
+        if not self.spicerack.dry_run:
+            if await self.change_snmp(pdu, version):
+                reboot_time = datetime.now(timezone.utc)
+                await pdu.reboot(version)
+                logger.info('%s: wait for reboot', pdu)
+                await pdu.wait_reboot_since(reboot_time)
+                message = 'SNMP communities updated, rebooted'
+            else:
+                message = 'SNMP communities already up to date'
+        else:
+            logger.info('%s: Dry run, not trying.', pdu)
+            message = 'dry run, not trying'
+        if self.check_default:
+            if await pdu.check_default():
+                # TODO: delete default user
+                message += ', default user found'
+        return message
+
     def run(self):
         """Required by Spicerack API."""
-        return_code = 0
-
-        for pdu in self._pdus:
-            version = pdus.get_version(pdu, self.session)
-            try:
-                if not self.spicerack.dry_run:
-                    if self.change_snmp(pdu, version):
-                        reboot_time = datetime.now(timezone.utc)
-                        pdus.reboot(pdu, version, self.session)
-                        # Reboots from experience take at least 60 seconds
-                        logger.info('%s: sleep while reboot', pdu)
-                        sleep(60)
-                        pdus.wait_reboot_since(pdu, reboot_time, self.session)
-                else:
-                    logger.info('%s: Dry run, not trying.', pdu)
-                if self.check_default:
-                    if pdus.check_default(pdu, self.session):
-                        # TODO: delete default user
-                        pass
-            except (pdus.VersionError, SnmpResetError, pdus.RebootError) as error:
-                logger.error(error)
-                return_code = 1
-        return return_code
+        results = pdus.run_on_pdus(self._pdus, self.rotate_snmp, username=self.username, password=self.password,
+                                   max_per_site=self.max_per_site)
+        return pdus.report(results)
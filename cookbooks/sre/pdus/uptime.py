@@ -2,7 +2,7 @@
 
 - Optionally checks if the default user is still configured.
 - Default user is 'root'
-- If host 'all' is passed, will iterate over all PDUs
+- If host 'all' is passed, will check all PDUs concurrently, up to --max-per-site per site at a time
 
 Usage example:
     cookbook sre.pdus.uptime --username MrFoo 'ps1-b5-eqiad.mgmt.eqiad.wmnet'
@@ -12,8 +12,6 @@ Usage example:
 
 import logging
 
-from requests import Session
-
 from wmflib.interactive import get_secret
 
 from cookbooks.sre import pdus
@@ -29,24 +27,19 @@ def argument_parser():
 
 def run(args, spicerack):
     """Required by Spicerack API."""
-    session = Session()
-    session.verify = False
-    return_code = 0
     current_password = get_secret('Current password')
-    session.auth = (args.username, current_password)
-
-    _pdus = pdus.get_pdu_ips(spicerack.netbox(), args.query)
-
-    for pdu in _pdus:
-        uptime = None
-        try:
-            uptime = pdus.get_uptime(pdu, session)
-            logger.info('%s: uptime %s', pdu, uptime)
-        except pdus.UptimeError as error:
-            logger.error(error)
-            return_code = 1
+
+    _pdus = pdus.get_pdus(spicerack.netbox(), args.query)
+
+    async def uptime(pdu):
+        uptime = await pdu.get_uptime()
+        logger.info('%s: uptime %s', pdu, uptime)
         if args.check_default:
-            if pdus.check_default(pdu, session):
+            if await pdu.check_default():
                 # TODO: delete default user
-                return_code = 1
-    return return_code
+                raise pdus.DefaultUserError('{}: default user found (uptime {})'.format(pdu, uptime))
+        return 'uptime {}'.format(uptime)
+
+    results = pdus.run_on_pdus(_pdus, uptime, username=args.username, password=current_password,
+                               max_per_site=args.max_per_site)
+    return pdus.report(results)
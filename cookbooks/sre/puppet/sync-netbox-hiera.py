@@ -14,8 +14,6 @@ from typing import DefaultDict, Optional, Union
 
 import yaml
 
-from aiohttp import ClientSession, ClientResponseError
-
 from wmflib.config import load_yaml_config
 from wmflib.interactive import confirm_on_failure
 from spicerack import Spicerack
@@ -247,6 +245,9 @@ class NetboxHieraRunner(CookbookRunnerBase):
         if current_frame is not None and current_frame.f_back is not None:
             calling_method = current_frame.f_back.f_code.co_name
 
+        # aiohttp is slow to import, defer it to when the data is actually fetched
+        from aiohttp import ClientResponseError, ClientSession  # pylint: disable=import-outside-toplevel
+
         async with ClientSession(headers=self._headers, raise_for_status=True) as session:
             try:
                 self.logger.debug("fetching: %s", calling_method)
@@ -10,9 +10,6 @@ import sqlite3
 import tempfile
 import urllib.parse
 
-import transferpy.transfer
-from transferpy.Transferer import Transferer
-
 from spicerack.cookbook import CookbookBase, CookbookRunnerBase
 from wmflib.constants import CORE_DATACENTERS
 from wmflib.interactive import ask_input, ensure_shell_is_durable
@@ -131,6 +128,9 @@ class RemoveGhostObjectsRunner(CookbookRunnerBase):  # pylint: disable=too-many-
         if len(self.fe_host) > 1:
             raise ValueError("Should only specify 1 frontend host")
         # Other prep
+        # transferpy is only needed to run the cleanup, don't import it when the cookbooks are listed
+        import transferpy.transfer  # pylint: disable=import-outside-toplevel
+
         self.tp_options = dict(transferpy.transfer.parse_configurations(
             transferpy.transfer.CONFIG_FILE))
         # this also handles string->bool conversion where necessary
@@ -379,6 +379,8 @@ class RemoveGhostObjectsRunner(CookbookRunnerBase):  # pylint: disable=too-many-
 
     def _fetch_db(self, workdir, fqdn, path):
         """Copy path from fqdn to workdir, rename to shorthostname.db"""
+        from transferpy.Transferer import Transferer  # pylint: disable=import-outside-toplevel
+
         t = Transferer(fqdn, path, [self.localhost], [workdir], self.tp_options)
         # transfer.py produces a lot of log chatter, cf T330882
         logger.debug("Starting transferpy, expect cumin errors")
@@ -1,12 +1,17 @@
 """Switch Datacenter specific steps for Databases."""
 import logging
-from abc import abstractmethod
-from collections.abc import Sequence
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AbstractContextManager, ExitStack, nullcontext
+from typing import Any, Optional
 
+from prettytable import PrettyTable
 from spicerack.cookbook import CookbookBase, CookbookRunnerBase
 from spicerack.mysql import CORE_SECTIONS, Instance
 from wmflib.constants import CORE_DATACENTERS
-from wmflib.interactive import AbortError, ask_confirmation, ensure_shell_is_durable
+from wmflib.actions import Actions
+from wmflib.interactive import AbortError, ask_confirmation, ask_input, confirm_on_failure, ensure_shell_is_durable
 
 from cookbooks.sre import PHABRICATOR_BOT_CONFIG_FILE
 
@@ -14,8 +19,33 @@ from cookbooks.sre import PHABRICATOR_BOT_CONFIG_FILE
 logger = logging.getLogger(__name__)
 
 
+class SectionBase(ABC):
+    """Base class for the steps to perform on a single section."""
+
+    section: str
+    master_from: Instance
+    master_to: Instance
+    actions: Actions
+
+    @abstractmethod
+    def validate(self) -> None:
+        """Validate the section before making any change, raise on failure."""
+
+    @abstractmethod
+    def steps(self) -> list[Callable[[], Any]]:
+        """Return the steps that modify the section, to be executed in order."""
+
+
 class DatabaseRunnerBase(CookbookRunnerBase):
-    """As required by Spicerack API."""
+    """Base runner that performs the steps on all the sections in parallel.
+
+    The masters of all the sections are looked up and validated concurrently and the operator is asked a single
+    confirmation for the combined plan. The steps are then executed for all the valid sections at the same time,
+    each section recording its own actions. A section in which a step fails stops there and, once all the sections
+    completed, the operator is asked what to do for each failed section, one at a time, before resuming it from the
+    failed step.
+    The run fails if any section was skipped because its validation failed or was aborted by the operator.
+    """
 
     lock_ttl = 3600
     max_concurrency = 1
@@ -73,39 +103,115 @@ class DatabaseRunnerBase(CookbookRunnerBase):
         """As required by Spicerack API."""
         self.phabricator.task_comment(self.task_id, f"{self.phab_prefix} started by {self.reason.owner}")
 
-        for i, section in enumerate(self.sections, start=1):
-            num_sections = len(self.sections)
-            logger.info("==> [%d/%d] Performing steps for section %s", i, num_sections, section)
-            remote_master_from, remote_master_to = self.get_remote_masters(section)
-            master_from = remote_master_from.list_hosts_instances()[0]
-            master_to = remote_master_to.list_hosts_instances()[0]
-            logger.info("Found masters for DC_FROM %s and DC_TO %s for section %s",
-                        master_from.host, master_to.host, section)
+        with ThreadPoolExecutor(max_workers=len(self.sections)) as executor:
+            masters = list(executor.map(self._get_masters, self.sections))
+            sections = [self.get_section(name, *pair) for name, pair in zip(self.sections, masters)]
+            validations = list(executor.map(self._validate, sections))
+
+        table = PrettyTable(["Section", "MASTER_FROM", "MASTER_TO", "Validation"])
+        table.align = "l"
+        for section, error in zip(sections, validations):
+            table.add_row([section.section, section.master_from.host, section.master_to.host, error or "OK"])
+        logger.info("Plan for %s:\n%s", self.description_suffix, table)
+
+        valid = [section for section, error in zip(sections, validations) if error is None]
+        if not valid:
+            raise RuntimeError("The validation failed for all the sections, see the plan above")
+
+        ask_confirmation(f"Ready to run on the {len(valid)}/{len(sections)} valid sections shown above, "
+                         "ok to proceed?")
+
+        with ExitStack() as stack:
+            for section in valid:
+                stack.enter_context(self.section_context(section))
+
+            with ThreadPoolExecutor(max_workers=len(valid)) as executor:
+                failed_steps = list(executor.map(self._run_steps, valid))
+
+            aborted = []
+            for section, failed_step in zip(valid, failed_steps):
+                if failed_step is None:
+                    continue
+
+                steps = section.steps()
+                response = ask_input(
+                    f'Section {section.section} failed to execute {getattr(steps[failed_step], "__name__", "")}. '
+                    'What do you want to do? "retry" the failed step and resume the section, manually fix the issue '
+                    'and "skip" the failed step to resume from the next one or completely "abort" the section.',
+                    ["retry", "skip", "abort"])
+                try:
+                    if response == "abort":
+                        raise AbortError("Task manually aborted")
+                    if response == "skip":
+                        failed_step += 1
+
+                    logger.info("==> Resuming section %s from step %d", section.section, failed_step + 1)
+                    for step in steps[failed_step:]:
+                        confirm_on_failure(step)
+                except AbortError:
+                    section.actions.failure("**Execution for this section was manually aborted**")
+                    aborted.append(section.section)
+
+        incomplete = []
+        skipped = [section.section for section, error in zip(sections, validations) if error is not None]
+        if skipped:
+            incomplete.append(f"skipped: {', '.join(skipped)}")
+        if aborted:
+            incomplete.append(f"aborted: {', '.join(aborted)}")
+
+        if incomplete:
+            summary = "; ".join(incomplete)
+            logger.error("Not all the sections were completed (%s)", summary)
+            self.phabricator.task_comment(
+                self.task_id,
+                f"{self.phab_prefix} executed by {self.reason.owner} completed with incomplete sections "
+                f"({summary}):\n{self.actions}")
+            return 1
 
-            ask_confirmation(f"[{i}/{num_sections}] Ready to run on section {section}, ok to proceed?")
+        self.phabricator.task_comment(
+            self.task_id, f"{self.phab_prefix} executed by {self.reason.owner} completed:\n{self.actions}")
+        return 0
+
+    def _get_masters(self, section: str) -> tuple[Instance, Instance]:
+        """Return the from/to master instances of the given section."""
+        remote_master_from, remote_master_to = self.get_remote_masters(section)
+        master_from = remote_master_from.list_hosts_instances()[0]
+        master_to = remote_master_to.list_hosts_instances()[0]
+        logger.info("Found masters for DC_FROM %s and DC_TO %s for section %s",
+                    master_from.host, master_to.host, section)
+        return master_from, master_to
+
+    @staticmethod
+    def _validate(section: SectionBase) -> Optional[str]:
+        """Validate a section, returning the error message if the validation failed."""
+        try:
+            section.validate()
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("[%s] Validation failed: %s", section.section, e)
+            section.actions.failure(f"**Validation failed, section skipped: {e}**")
+            return str(e) or e.__class__.__name__
+
+        return None
+
+    @staticmethod
+    def _run_steps(section: SectionBase) -> Optional[int]:
+        """Run all the steps of a section without interaction, returning the index of the failed step if any."""
+        for index, step in enumerate(section.steps()):
             try:
-                self.run_on_section(section, master_from, master_to)
-                self.phabricator.task_comment(
-                    self.task_id,
-                    f"{self.phab_prefix} run successfully on section {section}:\n{self.actions[section]}",
-                )
-            except AbortError:
-                self.actions[section].failure("**Execution for this section was manually aborted**")
-                self.phabricator.task_comment(
-                    self.task_id,
-                    f"{self.phab_prefix} was aborted for section {section}:\n{self.actions[section]}",
-                )
-                if i < len(self.sections):
-                    num = len(self.sections) - i
-                    ask_confirmation(f"Run on section {section} was manually aborted. "
-                                     f"Continue with the remaining {num} sections or abort completely?")
+                step()
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error("[%s] Failed to execute %s: %s", section.section, getattr(step, "__name__", step), e)
+                return index
 
-        self.phabricator.task_comment(
-            self.task_id, f"{self.phab_prefix} executed by {self.reason.owner} completed.")
+        return None
+
+    def section_context(self, section: SectionBase) -> AbstractContextManager:  # pylint: disable=unused-argument
+        """Return the context manager to wrap the execution of the steps of a section in, no-op by default."""
+        return nullcontext()
 
     @abstractmethod
-    def run_on_section(self, section: str, master_from: Instance, master_to: Instance):
-        """Run all the steps on a given section."""
+    def get_section(self, section: str, master_from: Instance, master_to: Instance) -> SectionBase:
+        """Return the instance that performs the steps on a given section."""
 
 
 class DatabaseCookbookBase(CookbookBase):
@@ -3,9 +3,8 @@ import logging
 
 from spicerack.mysql import Instance, MasterUseGTID, MysqlError
 from wmflib.actions import Actions
-from wmflib.interactive import confirm_on_failure
 
-from cookbooks.sre.switchdc.databases import DatabaseCookbookBase, DatabaseRunnerBase
+from cookbooks.sre.switchdc.databases import DatabaseCookbookBase, DatabaseRunnerBase, SectionBase
 
 
 logger = logging.getLogger(__name__)
@@ -14,19 +13,19 @@ logger = logging.getLogger(__name__)
 class FinalizeRunner(DatabaseRunnerBase):
     """As required by Spicerack API."""
 
-    def run_on_section(self, section: str, master_from: Instance, master_to: Instance):
-        """Run all the steps on a given section."""
-        FinalizeSection(
+    def get_section(self, section: str, master_from: Instance, master_to: Instance) -> "FinalizeSection":
+        """Return the instance that performs the steps on a given section."""
+        return FinalizeSection(
             section=section,
             dc_from=self.dc_from,
             master_from=master_from,
             master_to=master_to,
             actions=self.actions[section],
             dry_run=self.dry_run,
-        ).run()
+        )
 
 
-class FinalizeSection:
+class FinalizeSection(SectionBase):
     """Perform all the finalization steps on a single section."""
 
     def __init__(  # pylint: disable=too-many-arguments
@@ -47,12 +46,9 @@ class FinalizeSection:
         self.actions = actions
         self.dry_run = dry_run
 
-    def run(self):
-        """Execute all the steps on a single instance."""
-        confirm_on_failure(self.validate)
-        confirm_on_failure(self.reset_replication)
-        confirm_on_failure(self.clean_heartbeat)
-        confirm_on_failure(self.enable_gtid)
+    def steps(self) -> list:
+        """Return the steps that modify the section, to be executed in order."""
+        return [self.reset_replication, self.clean_heartbeat, self.enable_gtid]
 
     def validate(self) -> None:
         """Validate that the given hosts are indeed the two masters for that section."""
@@ -170,7 +166,8 @@ class FinalizeSection:
 class Finalize(DatabaseCookbookBase):
     """Perform all the Database related finalization steps after the switch datacenter.
 
-    By default actions are performed for each core sections (sX, x1, RW esX):
+    By default actions are performed for each core sections (sX, x1, RW esX), all in parallel after a single
+    confirmation of the plan:
         * Enable replication on the master of the primary datacenter replicating from the master of the secondary
           datacenter.
         * Enable GTID on the master of the old primary datacenter, now secondary.
@@ -1,6 +1,8 @@
 """Perform all the Database related preparatory steps before the switch datacenter."""
 import logging
+from contextlib import ExitStack
 from datetime import timedelta
+from threading import Lock
 from time import sleep
 
 from pymysql.err import MySQLError
@@ -8,12 +10,13 @@ from pymysql.err import MySQLError
 from spicerack.mysql import Instance, MasterUseGTID, ReplicationInfo
 from wmflib.actions import Actions
 from wmflib.config import load_yaml_config
-from wmflib.interactive import confirm_on_failure
-
-from cookbooks.sre.switchdc.databases import DatabaseCookbookBase, DatabaseRunnerBase
+from cookbooks.sre.switchdc.databases import DatabaseCookbookBase, DatabaseRunnerBase, SectionBase
 
 
 logger = logging.getLogger(__name__)
+# Serializes the temporary change of the logging levels done to hide the replication password, as the sections
+# are prepared in parallel and would otherwise restore each other's levels while a password is being set.
+_logging_lock = Lock()
 
 
 class PrepareRunner(DatabaseRunnerBase):
@@ -28,23 +31,29 @@ class PrepareRunner(DatabaseRunnerBase):
         self.user = config["repl_user"]
         self.password = config["repl_pass"]
 
-    def run_on_section(self, section: str, master_from: Instance, master_to: Instance):
-        """Run all the steps on a given section."""
-        downtime_hosts = self.remote.query(f"A:db-section-{section}").hosts
-        with self.alerting_hosts(downtime_hosts).downtimed(self.reason, duration=timedelta(minutes=30)):
-            with self.puppet(master_to.host).disabled(self.reason):
-                PrepareSection(
-                    section=section,
-                    master_from=master_from,
-                    master_to=master_to,
-                    user=self.user,
-                    password=self.password,
-                    actions=self.actions[section],
-                    dry_run=self.dry_run,
-                ).run()
-
-
-class PrepareSection:
+    def get_section(self, section: str, master_from: Instance, master_to: Instance) -> "PrepareSection":
+        """Return the instance that performs the steps on a given section."""
+        return PrepareSection(
+            section=section,
+            master_from=master_from,
+            master_to=master_to,
+            user=self.user,
+            password=self.password,
+            actions=self.actions[section],
+            dry_run=self.dry_run,
+        )
+
+    def section_context(self, section: SectionBase) -> ExitStack:
+        """Downtime the whole section and disable puppet on MASTER_TO while the steps are executed."""
+        downtime_hosts = self.remote.query(f"A:db-section-{section.section}").hosts
+        stack = ExitStack()
+        stack.enter_context(
+            self.alerting_hosts(downtime_hosts).downtimed(self.reason, duration=timedelta(minutes=30)))
+        stack.enter_context(self.puppet(section.master_to.host).disabled(self.reason))
+        return stack
+
+
+class PrepareSection(SectionBase):
     """Perform all the preparatory steps on a single section."""
 
     def __init__(  # pylint: disable=too-many-arguments
@@ -66,16 +75,18 @@ class PrepareSection:
         self.password = password
         self.actions = actions
         self.dry_run = dry_run
-
-    def run(self) -> None:
-        """Execute all the steps on a single instance."""
-        confirm_on_failure(self.validate)
-        confirm_on_failure(self.disable_gtid)
-        confirm_on_failure(self.master_to_stop_replication)
-        master_to_position = confirm_on_failure(self.wait_master_to_position)
-        confirm_on_failure(self.enable_circular_replication, master_to_position)
-        confirm_on_failure(self.master_to_restart_replication)
-        confirm_on_failure(self.master_from_check_replication)
+        self.master_to_position: dict = {}
+
+    def steps(self) -> list:
+        """Return the steps that modify the section, to be executed in order."""
+        return [
+            self.disable_gtid,
+            self.master_to_stop_replication,
+            self.wait_master_to_position,
+            lambda: self.enable_circular_replication(self.master_to_position),
+            self.master_to_restart_replication,
+            self.master_from_check_replication,
+        ]
 
     def validate(self) -> None:
         """Validate that the given hosts are indeed the two masters for that section."""
@@ -174,7 +185,7 @@ class PrepareSection:
         self.actions.success(f"MASTER_TO {self.master_to.host} STOP SLAVE.")
 
     def wait_master_to_position(self) -> dict:
-        """Waits until the MASTER_TO master position is stable and return it."""
+        """Waits until the MASTER_TO master position is stable, store it and return it."""
         logger.info(
             "[%s] Checking if MASTER_TO %s master position is stable over time", self.section, self.master_to.host)
         stable = 0
@@ -196,10 +207,12 @@ class PrepareSection:
 
             if stable >= 2:  # It means we got 3 consecutive readings that are the same with 3s sleep in between them
                 self.actions.success(f"MASTER_TO {self.master_to.host} MASTER STATUS is stable over time: {current}")
+                self.master_to_position = current
                 return current
 
         if self.dry_run:
             self.actions.success(f"MASTER_TO {self.master_to.host} Ignoring MASTER STATUS is not stable in DRY-RUN")
+            self.master_to_position = current
             return current
 
         message = f"MASTER_TO {self.master_to.host} MASTER STATUS is not stable, see the extended logs"
@@ -217,19 +230,23 @@ class PrepareSection:
         logger.info("[%s] MASTER_FROM %s CHANGE MASTER to %s", self.section, self.master_from.host, repl_info)
         message = f"MASTER_FROM {self.master_from.host} CHANGE MASTER to {repl_info} and user {self.user}"
         # TODO: TEMPORARY HACK START to prevent leaking the password in the logs TO BE MOVED INTO SPICERACK
-        cumin_logger = logging.getLogger("cumin")
-        remote_logger = logging.getLogger("spicerack.remote")
-        cumin_logger_level = cumin_logger.getEffectiveLevel()
-        remote_logger_level = remote_logger.getEffectiveLevel()
-        cumin_logger.info(message)
-        cumin_logger.info("Temporarily setting cumin logging to ERROR level to prevent password leaking")
-        cumin_logger.setLevel(logging.ERROR)
-        remote_logger.setLevel(logging.ERROR)
-        # =====
-        self.master_from.set_replication_parameters(replication_info=repl_info, user=self.user, password=self.password)
-        # =====
-        cumin_logger.setLevel(cumin_logger_level)
-        remote_logger.setLevel(remote_logger_level)
+        with _logging_lock:
+            cumin_logger = logging.getLogger("cumin")
+            remote_logger = logging.getLogger("spicerack.remote")
+            cumin_logger_level = cumin_logger.getEffectiveLevel()
+            remote_logger_level = remote_logger.getEffectiveLevel()
+            cumin_logger.info(message)
+            cumin_logger.info("Temporarily setting cumin logging to ERROR level to prevent password leaking")
+            cumin_logger.setLevel(logging.ERROR)
+            remote_logger.setLevel(logging.ERROR)
+            # =====
+            try:
+                self.master_from.set_replication_parameters(
+                    replication_info=repl_info, user=self.user, password=self.password)
+            finally:
+                # =====
+                cumin_logger.setLevel(cumin_logger_level)
+                remote_logger.setLevel(remote_logger_level)
         # TODO: TEMPORARY HACK END
         self.actions.success(f"MASTER_FROM {self.master_from.host} CHANGE MASTER to {repl_info} and user {self.user}")
 
@@ -323,7 +340,8 @@ class PrepareSection:
 class Prepare(DatabaseCookbookBase):
     """Perform all the Database related preparatory steps before the switch datacenter.
 
-    By default actions are performed for each core sections (sX, xX, RW esX):
+    By default actions are performed for each core sections (sX, xX, RW esX), all in parallel after a single
+    confirmation of the plan:
         * Downtime the whole database section.
         * Disable puppet on the master of the secondary datacanter.
         * Disable GTID on the master of the secondary datacenter.
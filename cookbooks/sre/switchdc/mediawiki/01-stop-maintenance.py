@@ -1,16 +1,22 @@
 """Stop MediaWiki maintenance and cron jobs."""
 
-import datetime
 import logging
+import time
 
-from kubernetes import client
-from spicerack.decorators import retry
+from concurrent.futures import ThreadPoolExecutor
+
+from kubernetes import client, watch
+from kubernetes.client.exceptions import ApiException
+from prettytable import PrettyTable
 from spicerack.exceptions import SpicerackCheckError
 
 from cookbooks.sre.switchdc.mediawiki import MediaWikiSwitchDCBase, MediaWikiSwitchDCRunnerBase
 
 logger = logging.getLogger(__name__)
 NAMESPACES = ['mw-script', 'mw-cron']
+JOBS_STOP_TIMEOUT = 300  # Seconds to wait for all the jobs to stop
+WATCH_TIMEOUT = 60  # Seconds after which a watch expires and is resumed from the last seen resourceVersion
+SLOWEST_JOBS_REPORTED = 10
 
 
 class StopMaintenanceJobsRunner(MediaWikiSwitchDCRunnerBase):
@@ -24,8 +30,10 @@ class StopMaintenanceJobsRunner(MediaWikiSwitchDCRunnerBase):
         else:
             datacenters.append(self.dc_to)
         logger.info('Stopping MediaWiki maintenance jobs in %s', ', '.join(datacenters))
+        batch_apis = {}
         for datacenter in datacenters:
             batch_api = self.spicerack.kubernetes('main', datacenter).api.batch()
+            batch_apis[datacenter] = batch_api
             if self.spicerack.dry_run:
                 logger.info('Skipping deletion of %s Kubernetes jobs in %s, due to --dry-run',
                             ",".join(NAMESPACES), datacenter)
@@ -51,24 +59,117 @@ class StopMaintenanceJobsRunner(MediaWikiSwitchDCRunnerBase):
                     logger.info(
                         'kube-env admin %s; kubectl -n mw-cron delete cronjobs --all;', self.dc_from)
 
-            for namespace in NAMESPACES:
-                _wait_for_jobs_to_stop(batch_api, namespace=namespace, dry_run=self.spicerack.dry_run)
-
-
-@retry(tries=60, delay=datetime.timedelta(seconds=5), backoff_mode='constant')
-def _wait_for_jobs_to_stop(batch_api: client.BatchV1Api, *, namespace: str, dry_run: bool) -> None:
-    # This could be implemented with a Watch. It uses @retry instead because the code is simpler to read and looks more
-    # like the rest of the cookbooks codebase. We also get the correct dry run behavior (one check but no retries) for
-    # free; @retry reads the otherwise-unused dry_run kwarg. The tradeoff is a little more load on the k8s apiserver,
-    # and a little more network traffic, both of which are perfectly affordable for the small amount of data here.
-    _ = dry_run
-    job_list = batch_api.list_namespaced_job(namespace)
-    still_running = [job for job in job_list.items if not _is_stopped(job)]
-    if not still_running:
-        return
-    jobs = 'job' if len(still_running) == 1 else 'jobs'
-    names = ', '.join(job.metadata.name for job in still_running)
-    raise SpicerackCheckError(f'{len(still_running)} {namespace} {jobs} still running: {names}')
+        _wait_for_jobs_to_stop(batch_apis, dry_run=self.spicerack.dry_run)
+
+
+def _wait_for_jobs_to_stop(batch_apis: dict[str, client.BatchV1Api], *, dry_run: bool) -> None:
+    """Wait for the jobs in all NAMESPACES of all the given datacenters to stop, watching them concurrently.
+
+    In DRY-RUN mode the jobs are only listed once, as they were not deleted.
+
+    Arguments:
+        batch_apis: the Kubernetes batch API client of each datacenter, keyed by datacenter name.
+        dry_run: whether this is a DRY-RUN.
+
+    Raises:
+        spicerack.exceptions.SpicerackCheckError: if any job is still running after JOBS_STOP_TIMEOUT seconds.
+
+    """
+    targets = [(datacenter, namespace) for datacenter in batch_apis for namespace in NAMESPACES]
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+        futures = {
+            (datacenter, namespace): executor.submit(
+                _watch_jobs, batch_apis[datacenter], namespace, start=start, dry_run=dry_run)
+            for datacenter, namespace in targets
+        }
+
+    stopped = {}
+    errors = []
+    for (datacenter, namespace), future in futures.items():
+        try:
+            for name, duration in future.result().items():
+                stopped[f'{datacenter}/{namespace}/{name}'] = duration
+        except SpicerackCheckError as e:
+            errors.append(f'{datacenter}: {e}')
+
+    if stopped:
+        table = PrettyTable(['Job', 'Time to stop'])
+        table.align = 'l'
+        for job, duration in sorted(stopped.items(), key=lambda item: item[1], reverse=True)[:SLOWEST_JOBS_REPORTED]:
+            table.add_row([job, f'{duration:.1f}s'])
+        logger.info('%d jobs stopped in %.1fs, the slowest ones were:\n%s',
+                    len(stopped), time.monotonic() - start, table)
+
+    if errors:
+        raise SpicerackCheckError('; '.join(errors))
+
+
+def _watch_jobs(batch_api: client.BatchV1Api, namespace: str, *, start: float, dry_run: bool) -> dict[str, float]:
+    """Watch the jobs of a namespace until all of them stopped, returning how long each of them took to stop.
+
+    The running jobs are listed first and then watched from the list's resourceVersion. When a watch expires it
+    is resumed from the last seen resourceVersion, or the jobs are listed again if that is too old.
+
+    Arguments:
+        batch_api: the Kubernetes batch API client of the datacenter.
+        namespace: the namespace of the jobs.
+        start: the monotonic time from which to measure how long the jobs took to stop.
+        dry_run: whether this is a DRY-RUN, in which case the jobs are listed only once.
+
+    Raises:
+        spicerack.exceptions.SpicerackCheckError: if any job is still running after JOBS_STOP_TIMEOUT seconds.
+
+    """
+    deadline = start + JOBS_STOP_TIMEOUT
+    stopped: dict[str, float] = {}
+    running: set[str] = set()
+    resource_version = None
+    while True:
+        if resource_version is None:
+            job_list = batch_api.list_namespaced_job(namespace)
+            running = {job.metadata.name for job in job_list.items if not _is_stopped(job)}
+            resource_version = job_list.metadata.resource_version
+            if dry_run:
+                if running:
+                    logger.info('%d %s jobs running, not waiting for them in DRY-RUN mode: %s',
+                                len(running), namespace, ', '.join(sorted(running)))
+                return stopped
+
+        if not running:
+            return stopped
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            jobs = 'job' if len(running) == 1 else 'jobs'
+            raise SpicerackCheckError(f'{len(running)} {namespace} {jobs} still running: {", ".join(sorted(running))}')
+
+        logger.debug('Watching %d %s jobs from resourceVersion %s', len(running), namespace, resource_version)
+        watcher = watch.Watch()
+        try:
+            for event in watcher.stream(batch_api.list_namespaced_job, namespace, resource_version=resource_version,
+                                        timeout_seconds=max(1, int(min(WATCH_TIMEOUT, remaining)))):
+                job = event['object']
+                name = job.metadata.name
+                if event['type'] == 'DELETED' or _is_stopped(job):
+                    if name in running:
+                        running.discard(name)
+                        stopped[name] = time.monotonic() - start
+                        logger.info('%s job %s stopped after %.1fs, %d remaining',
+                                    namespace, name, stopped[name], len(running))
+                elif event['type'] == 'ADDED':
+                    running.add(name)
+
+                if not running:
+                    watcher.stop()
+        except ApiException as e:
+            if e.status != 410:
+                raise
+            logger.debug('Watch of the %s jobs expired (%s), listing them again', namespace, e.reason)
+            resource_version = None
+            continue
+
+        resource_version = watcher.resource_version or resource_version
 
 
 def _is_stopped(job: client.V1Job) -> bool:
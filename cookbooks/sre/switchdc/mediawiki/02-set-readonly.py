@@ -32,10 +32,12 @@ class SetReadOnlyRunner(MediaWikiSwitchDCRunnerBase):
             if self.live_test and dc is self.dc_to:
                 logger.info('Skip setting MediaWiki read-only in %s', dc)
                 continue
-            mediawiki.set_readonly(dc, self.ro_reason)
+            with self.timed(f'set_readonly {dc}'):
+                mediawiki.set_readonly(dc, self.ro_reason)
 
         logger.info('Sleeping 10s to allow in-flight requests to complete')
-        time.sleep(10)
+        with self.timed('wait for in-flight requests'):
+            time.sleep(10)
 
 
 class SetReadOnly(MediaWikiSwitchDCBase):
@@ -20,14 +20,17 @@ class SetDBReadOnlyRunner(MediaWikiSwitchDCRunnerBase):
         if self.live_test:
             logger.info('Skip verifying core DB primaries in %s are in read-only mode', self.dc_to)
         else:
-            mysql.verify_core_masters_readonly(self.dc_to, True)
+            with self.timed(f'verify_core_masters_readonly {self.dc_to}'):
+                mysql.verify_core_masters_readonly(self.dc_to, True)
 
-        mysql.set_core_masters_readonly(self.dc_from)
+        with self.timed(f'set_core_masters_readonly {self.dc_from}'):
+            mysql.set_core_masters_readonly(self.dc_from)
 
         logger.info('Check that all core primaries in %s are in sync with the core primaries in %s.',
                     self.dc_to, self.dc_from)
         try:
-            mysql.check_core_masters_in_sync(self.dc_from, self.dc_to)
+            with self.timed('check_core_masters_in_sync'):
+                mysql.check_core_masters_in_sync(self.dc_from, self.dc_to)
         except MysqlError as e:
             if self.live_test:
                 logger.warning(
@@ -3,6 +3,10 @@
 import logging
 import time
 
+from concurrent.futures import ThreadPoolExecutor
+
+from spicerack.dnsdisc import Discovery, DiscoveryError
+
 from cookbooks.sre.switchdc.mediawiki import (
     DNS_SHORT_TTL,
     MEDIAWIKI_SERVICES,
@@ -11,6 +15,8 @@ from cookbooks.sre.switchdc.mediawiki import (
 )
 
 logger = logging.getLogger(__name__)
+RECORD_CHECK_TRIES = 10  # Attempts to verify the discovery records, retrying only the stale ones
+RECORD_CHECK_DELAY = 3  # Seconds between the attempts
 
 
 class SwitchMediaWikiRunner(MediaWikiSwitchDCRunnerBase):
@@ -25,24 +31,86 @@ class SwitchMediaWikiRunner(MediaWikiSwitchDCRunnerBase):
 
         # Pool DNS discovery records on the new dc.
         # This will NOT trigger confd to change the DNS admin state as it will cause a validation error
-        dnsdisc_records.pool(self.dc_to)
+        with self.timed(f'pool discovery records {self.dc_to}'):
+            dnsdisc_records.pool(self.dc_to)
 
         # Switch MediaWiki primary/active datacenter
         start = time.time()
-        mediawiki.set_master_datacenter(self.dc_to)
+        with self.timed(f'set_master_datacenter {self.dc_to}'):
+            mediawiki.set_master_datacenter(self.dc_to)
 
         # Depool DNS discovery records on the old dc, confd will apply the change
-        dnsdisc_records.depool(self.dc_from)
+        with self.timed(f'depool discovery records {self.dc_from}'):
+            dnsdisc_records.depool(self.dc_from)
+
+        # Verify that the IP of the records matches the expected one, while waiting up to DNS_SHORT_TTL to let the
+        # set_master_datacenter to propagate
+        with self.timed('check discovery records and wait for DNS TTL'), ThreadPoolExecutor(max_workers=1) as executor:
+            check = executor.submit(self._check_records, dnsdisc_records)
+            remaining = DNS_SHORT_TTL - (time.time() - start)
+            if remaining > 0:
+                logger.info('Sleeping %.3f seconds to reach the %d seconds mark', remaining, DNS_SHORT_TTL)
+                time.sleep(remaining)
+
+            check.result()
+
+    def _check_records(self, dnsdisc_records: Discovery) -> None:
+        """Check that all the records resolve to DC_TO on all the authoritative nameservers.
+
+        All the record/nameserver pairs are resolved concurrently, through a Discovery instance per nameserver, and
+        only the ones still resolving to the wrong address are retried, up to RECORD_CHECK_TRIES times.
+
+        Raises:
+            spicerack.dnsdisc.DiscoveryError: if any record still resolves to the wrong address on any nameserver.
+
+        """
+        nameservers = self.spicerack.authdns_servers
+        resolvers = {
+            nameserver: Discovery(conftool=self.spicerack.confctl('discovery'), authdns_servers={nameserver: address},
+                                  records=list(MEDIAWIKI_SERVICES), dry_run=self.spicerack.dry_run)
+            for nameserver, address in nameservers.items()
+        }
+        with ThreadPoolExecutor(max_workers=len(MEDIAWIKI_SERVICES) * len(nameservers)) as executor:
+            expected_names = [f'{record}.svc.{self.dc_to}.wmnet' for record in MEDIAWIKI_SERVICES]
+            expected = dict(zip(MEDIAWIKI_SERVICES, executor.map(dnsdisc_records.resolve_address, expected_names)))
+            logger.info('Checking that the discovery records resolve to %s on %d nameservers: %s',
+                        self.dc_to, len(nameservers), expected)
+
+            pending = [(record, nameserver) for record in MEDIAWIKI_SERVICES for nameserver in nameservers]
+            for attempt in range(1, RECORD_CHECK_TRIES + 1):
+                addresses = executor.map(lambda pair: _resolve(resolvers[pair[1]], pair[0]), pending)
+                stale = [(pair, address) for pair, address in zip(pending, addresses) if address != expected[pair[0]]]
+                pending = [pair for pair, _ in stale]
+                if not pending:
+                    break
+
+                for (record, nameserver), address in stale:
+                    logger.debug('[%s] %s.discovery.wmnet resolves to %s, expected %s',
+                                 nameserver, record, address, expected[record])
+
+                if self.spicerack.dry_run:
+                    logger.info('Ignoring %d stale records in DRY-RUN mode: %s', len(pending), pending)
+                    pending = []
+                    break
+
+                if attempt < RECORD_CHECK_TRIES:
+                    logger.info('[%d/%d] %d stale records, retrying them in %ds: %s',
+                                attempt, RECORD_CHECK_TRIES, len(pending), RECORD_CHECK_DELAY, pending)
+                    time.sleep(RECORD_CHECK_DELAY)
+
+        if pending:
+            raise DiscoveryError(f'Records still resolving to the wrong address: {pending}')
+
+        logger.info('All the discovery records resolve to %s on all the nameservers.', self.dc_to)
 
-        # Verify that the IP of the records matches the expected one
-        for record in MEDIAWIKI_SERVICES:
-            dnsdisc_records.check_record(record, '{name}.svc.{dc_to}.wmnet'.format(name=record, dc_to=self.dc_to))
 
-        # Sleep remaining time up to DNS_SHORT_TTL to let the set_master_datacenter to propagate
-        remaining = DNS_SHORT_TTL - (time.time() - start)
-        if remaining > 0:
-            logger.info('Sleeping %.3f seconds to reach the %d seconds mark', remaining, DNS_SHORT_TTL)
-            time.sleep(remaining)
+def _resolve(discovery: Discovery, record: str) -> str | None:
+    """Resolve a discovery record with a single nameserver Discovery instance, returning None on failure."""
+    try:
+        return next(discovery.resolve(record))[0].address
+    except DiscoveryError as e:
+        logger.debug('%s', e)
+        return None
 
 
 class SwitchMediaWiki(MediaWikiSwitchDCBase):
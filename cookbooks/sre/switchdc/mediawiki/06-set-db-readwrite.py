@@ -14,7 +14,8 @@ class SetDBReadWriteRunner(MediaWikiSwitchDCRunnerBase):
         """Required by base class API."""
         logger.info('Setting in read-write mode all the core DB primaries in %s', self.dc_to)
         mysql = self.spicerack.mysql()
-        mysql.set_core_masters_readwrite(self.dc_to)
+        with self.timed(f'set_core_masters_readwrite {self.dc_to}'):
+            mysql.set_core_masters_readwrite(self.dc_to)
 
 
 class SetDBReadWrite(MediaWikiSwitchDCBase):
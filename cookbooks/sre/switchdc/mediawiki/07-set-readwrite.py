@@ -10,7 +10,9 @@ logger = logging.getLogger(__name__)
 
 
 class SetReadWriteRunner(MediaWikiSwitchDCRunnerBase):
-    """A runner to set MediaWiki in read-write mode."""
+    """A runner to set MediaWiki in read-write mode and report the timings of the read-only window."""
+
+    report_timeline = True
 
     def action(self):
         """Required by base class API."""
@@ -21,7 +23,8 @@ class SetReadWriteRunner(MediaWikiSwitchDCRunnerBase):
 
         for dc in (self.dc_to, self.dc_from):
             logger.info('Set MediaWiki in read-write in %s', dc)
-            mediawiki.set_readwrite(dc)
+            with self.timed(f'set_readwrite {dc}'):
+                mediawiki.set_readwrite(dc)
 
         message = f'{prefix}MediaWiki read-only period ends at: {datetime.utcnow()}'
         self.spicerack.sal_logger.info(message)
@@ -29,6 +32,12 @@ class SetReadWriteRunner(MediaWikiSwitchDCRunnerBase):
 
 
 class SetReadWrite(MediaWikiSwitchDCBase):
-    """Set MediaWiki in read-write mode."""
+    """Set MediaWiki in read-write mode.
+
+    At the end, the timings of the read-only window recorded by the previous steps are reported, sorted by their
+    contribution, and posted to the task. In dry-run mode an estimate of the read-only window of a real
+    switchover is logged instead, based on the rehearsal timings and on the timeline of a previous real
+    switchover when available.
+    """
 
     runner_class = SetReadWriteRunner
@@ -5,11 +5,18 @@ ensure that the list of services is accurate and up to date.
 """
 
 import argparse
+import json
+import logging
+import time
 
 from abc import ABCMeta, abstractmethod
+from collections.abc import Iterator
+from contextlib import contextmanager
 from datetime import datetime
+from pathlib import Path
 from typing import Optional
 
+from prettytable import PrettyTable
 from spicerack import Spicerack
 from spicerack.cookbook import CookbookBase, CookbookRunnerBase
 from wmflib.constants import CORE_DATACENTERS
@@ -45,6 +52,154 @@ MEDIAWIKI_RO_SERVICES = (
 # Regex matching services to downtime, when disabling read-only checks on the MariaDB primaries. The blank is for the
 # section name, e.g. "MariaDB read only s1 #page".
 READ_ONLY_SERVICE_RE = r"MariaDB read only \S+ #page"
+# The steps that run while MediaWiki is read-only, in order. The first one starts a new timeline.
+READ_ONLY_STEPS = (
+    "02-set-readonly",
+    "03-set-db-readonly",
+    "04-switch-mediawiki",
+    "06-set-db-readwrite",
+    "07-set-readwrite",
+)
+TIMELINE_DIR = Path("/var/log/spicerack/sre/switchdc/mediawiki")
+# Stand-in for the time the operator takes between two steps, used by the rehearsal estimate when there is no
+# timeline of a real switchover to take it from.
+OPERATOR_GAP_SECONDS = 30.0
+
+logger = logging.getLogger(__name__)
+
+
+class Timeline:
+    """The timings of the steps run while MediaWiki is read-only, persisted as JSON across the step cookbooks.
+
+    Each step is recorded with its start and end time, outcome and the timed sub-operations, for example::
+
+        {"dc_from": "eqiad", "dc_to": "codfw", "dry_run": false, "steps": [
+            {"step": "02-set-readonly", "start": 1700000000.0, "end": 1700000011.2, "outcome": "SUCCESS",
+             "operations": [{"name": "set_readonly codfw", "start": 1700000000.1, "duration": 0.6}]}]}
+
+    """
+
+    def __init__(self, path: Path, *, dc_from: str, dc_to: str, dry_run: bool, steps: Optional[list[dict]] = None):
+        """Initialize the instance.
+
+        Arguments:
+            path: the JSON file the timeline is saved to.
+            dc_from: the datacenter switching away from.
+            dc_to: the datacenter switching to.
+            dry_run: whether the timeline is of a dry-run rehearsal.
+            steps: the steps already recorded.
+
+        """
+        self.path = path
+        self.dc_from = dc_from
+        self.dc_to = dc_to
+        self.dry_run = dry_run
+        self.steps: list[dict] = steps if steps is not None else []
+
+    @classmethod
+    def get_path(cls, dc_from: str, dc_to: str, *, dry_run: bool, base_dir: Path = TIMELINE_DIR) -> Path:
+        """Return the path of the timeline file of a switchover."""
+        return base_dir / f"timeline-{dc_from}-{dc_to}{'-rehearsal' if dry_run else ''}.json"
+
+    @classmethod
+    def load(cls, dc_from: str, dc_to: str, *, dry_run: bool, base_dir: Path = TIMELINE_DIR) -> "Timeline":
+        """Load the timeline of a switchover, returning an empty one if it was not recorded yet."""
+        path = cls.get_path(dc_from, dc_to, dry_run=dry_run, base_dir=base_dir)
+        steps = []
+        if path.exists():
+            steps = json.loads(path.read_text())["steps"]
+
+        return cls(path, dc_from=dc_from, dc_to=dc_to, dry_run=dry_run, steps=steps)
+
+    def save(self) -> None:
+        """Save the timeline to its file."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"dc_from": self.dc_from, "dc_to": self.dc_to, "dry_run": self.dry_run, "steps": self.steps}
+        self.path.write_text(json.dumps(data, indent=2))
+
+    def record_step(self, step: dict) -> None:
+        """Record a step, the first read-only step starts a new timeline and a re-run replaces the previous run."""
+        if step["step"] == READ_ONLY_STEPS[0]:
+            self.steps = []
+
+        self.steps = [recorded for recorded in self.steps if recorded["step"] != step["step"]]
+        self.steps.append(step)
+
+    @property
+    def read_only_window(self) -> float:
+        """The seconds from the start of the first recorded step to the end of the last one."""
+        if not self.steps:
+            return 0.0
+
+        return self.steps[-1]["end"] - self.steps[0]["start"]
+
+    def durations(self) -> list[tuple[str, str, float]]:
+        """Return the (step, operation, seconds) that make up the read-only window, including the operator gaps.
+
+        The time of a step not covered by its timed operations is reported as ``(other)`` and the time between
+        the end of a step and the start of the next one as ``(operator)``.
+        """
+        rows = []
+        previous_end: Optional[float] = None
+        for step in self.steps:
+            if previous_end is not None:
+                rows.append((step["step"], "(operator)", max(0.0, step["start"] - previous_end)))
+
+            timed = 0.0
+            for operation in step["operations"]:
+                rows.append((step["step"], operation["name"], operation["duration"]))
+                timed += operation["duration"]
+
+            rows.append((step["step"], "(other)", max(0.0, step["end"] - step["start"] - timed)))
+            previous_end = step["end"]
+
+        return rows
+
+    def critical_path_report(self, rows: Optional[list[tuple[str, str, float]]] = None) -> str:
+        """Return a report of where the read-only time went, the largest contributors first.
+
+        Arguments:
+            rows: the (step, operation, seconds) to report, the ones from durations() if not set.
+
+        """
+        if rows is None:
+            rows = self.durations()
+
+        total = sum(duration for _, _, duration in rows)
+        table = PrettyTable(["Step", "Operation", "Duration", "Share"])
+        table.align = "l"
+        for step, operation, duration in sorted(rows, key=lambda row: row[2], reverse=True):
+            share = duration / total * 100 if total else 0.0
+            table.add_row([step, operation, f"{duration:.1f}s", f"{share:.1f}%"])
+
+        steps = ", ".join(step["step"] for step in self.steps)
+        return f"Read-only window of {total:.1f}s across {steps}:\n{table}"
+
+    def estimate(self, reference: Optional["Timeline"]) -> list[tuple[str, str, float]]:
+        """Estimate the read-only window of a real switchover from this rehearsal timeline.
+
+        Operations that are no-ops in dry-run take the duration recorded in the reference timeline of a real
+        switchover, when available. The operator gaps are taken from the reference timeline too, or from the
+        OPERATOR_GAP_SECONDS stand-in.
+
+        Arguments:
+            reference: the timeline of a previous real switchover, if any.
+
+        """
+        reference_durations = {}
+        if reference is not None:
+            reference_durations = {(step, operation): duration for step, operation, duration in reference.durations()}
+
+        rows = []
+        for step, operation, duration in self.durations():
+            if (step, operation) in reference_durations:
+                rows.append((step, operation, reference_durations[(step, operation)]))
+            elif operation == "(operator)":
+                rows.append((step, operation, OPERATOR_GAP_SECONDS))
+            else:
+                rows.append((step, operation, duration))
+
+        return rows
 
 
 class MediaWikiSwitchDCBase(CookbookBase, metaclass=ABCMeta):
@@ -98,8 +253,14 @@ class MediaWikiSwitchDCRunnerBase(CookbookRunnerBase, metaclass=ABCMeta):
 
     Subclasses must implement at least the action method. See the Spicerack CookbookRunnerBase API for additional
     optional methods.
+
+    The steps in READ_ONLY_STEPS record their timings, and the ones of the operations wrapped in timed(), into a
+    Timeline. In dry-run mode the timings are saved into a separate rehearsal timeline.
     """
 
+    report_timeline = False
+    """Whether to report the timeline at the end of the step, set by the last read-only step."""
+
     # Switchover cookbooks should run exclusively and the longest-running cookbook should complete in ~ 5m.
     max_concurrency = 1
     lock_ttl = 600  # Set a backstop lock expiration of 2x the longest-running cookbook.
@@ -120,6 +281,8 @@ class MediaWikiSwitchDCRunnerBase(CookbookRunnerBase, metaclass=ABCMeta):
             "MediaWiki DC switchover" + (" live test" if self.live_test else ""), task_id=self.task_id
         )
         self.phabricator = self.spicerack.phabricator(PHABRICATOR_BOT_CONFIG_FILE)
+        self.step = self.__module__.rsplit(".", 1)[-1]
+        self.operations: list[dict] = []
 
     @property
     def runtime_description(self) -> str:
@@ -133,6 +296,15 @@ class MediaWikiSwitchDCRunnerBase(CookbookRunnerBase, metaclass=ABCMeta):
             f"{self.reason.owner} - Cookbook {self.__module__} {self.runtime_description} - {message}"
         )
 
+    @contextmanager
+    def timed(self, operation: str) -> Iterator[None]:
+        """Context manager to record the duration of an operation of the step in the timeline."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.operations.append({"name": operation, "start": start, "duration": time.time() - start})
+
     @abstractmethod
     def action(self) -> Optional[int]:
         """Action to be implemented by subclasses, equivalent to CookbookRunnerBase.run."""
@@ -141,10 +313,49 @@ class MediaWikiSwitchDCRunnerBase(CookbookRunnerBase, metaclass=ABCMeta):
         """Required by Spicerack API."""
         outcome = "**FAILURE**"
         start_time = datetime.now()
+        start = time.time()
         try:
             ret = self.action()
             if ret is None or ret == 0:
                 outcome = "SUCCESS"
         finally:
             self.update_task(f"finished with status: {outcome} elapsed time: {datetime.now() - start_time}")
+            if self.step in READ_ONLY_STEPS:
+                self._record_timeline(start, time.time(), outcome)
         return ret
+
+    def _record_timeline(self, start: float, end: float, outcome: str) -> None:
+        """Record the step in the timeline and report it if this is the last step, never failing the cookbook."""
+        try:
+            timeline = Timeline.load(self.dc_from, self.dc_to, dry_run=self.spicerack.dry_run)
+            timeline.record_step(
+                {"step": self.step, "start": start, "end": end, "outcome": outcome, "operations": self.operations})
+            timeline.save()
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Unable to record the timings of %s in the timeline: %s", self.step, e)
+            return
+
+        logger.info("Recorded the timings of %s in %s", self.step, timeline.path)
+        if not self.report_timeline:
+            return
+
+        if timeline.dry_run:
+            reference = None
+            try:
+                reference = Timeline.load(self.dc_from, self.dc_to, dry_run=False)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Unable to load the timeline of a real switchover: %s", e)
+
+            if reference is not None and not reference.steps:
+                reference = None
+            rows = timeline.estimate(reference)
+            logger.info(
+                "Rehearsal estimate of the read-only window, using %s for the operations skipped in dry-run:\n%s",
+                f"the timings recorded in {reference.path}" if reference is not None else "the dry-run timings",
+                timeline.critical_path_report(rows),
+            )
+            return
+
+        report = timeline.critical_path_report()
+        logger.info(report)
+        self.update_task(f"timings of the read-only window (saved in {timeline.path}):\n```\n{report}\n```")
@@ -3,11 +3,19 @@ __owner_team__ = "Data Platform"
 
 import logging
 import math
-from datetime import timedelta, datetime
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import timedelta
+from graphlib import TopologicalSorter
+from typing import Optional
 
 from spicerack import RemoteHosts, ConftoolEntity
 from spicerack.confctl import ConfctlError
 from spicerack.decorators import retry
+from spicerack.remote import RemoteExecutionError
+
+from cookbooks.sre import StageTimeline
 
 MUTATION_TOPICS = {
     'wikidata': 'rdf-streaming-updater.mutation',
@@ -17,6 +25,26 @@ MUTATION_TOPICS = {
     'commons': 'mediainfo-streaming-updater.mutation',
 }
 
+# The services that must be ready before each query service one is started, and that are stopped only after it.
+# Dependencies on services that are not being started or stopped are ignored.
+SERVICE_DEPENDENCIES = {
+    'wdqs-updater': ('wdqs-blazegraph',),
+    'wcqs-updater': ('wcqs-blazegraph',),
+    'prometheus-blazegraph-exporter-wdqs-blazegraph': ('wdqs-blazegraph',),
+    'prometheus-blazegraph-exporter-wdqs-categories': ('wdqs-categories',),
+    'prometheus-blazegraph-exporter-wcqs-blazegraph': ('wcqs-blazegraph',),
+    'nginx': ('wdqs-updater', 'wcqs-updater', 'wdqs-categories'),
+    'envoyproxy': ('wdqs-updater', 'wcqs-updater', 'wdqs-categories'),
+}
+# The local HTTP endpoints that must respond successfully for a started service to be considered ready, in addition
+# to its systemd unit being active.
+SERVICE_HEALTH_URLS = {
+    'wdqs-blazegraph': 'http://localhost:9999/bigdata/status',
+    'wdqs-categories': 'http://localhost:9990/bigdata/status',
+    'wcqs-blazegraph': 'http://localhost:9999/bigdata/status',
+    'nginx': 'http://localhost/readiness-probe',
+}
+
 logger = logging.getLogger(__name__)
 
 
@@ -87,20 +115,146 @@ def get_hostname(fqdn):
 
 
 class StopWatch:
-    """Stop watch to measure time."""
+    """Stop watch to measure time, optionally recording the measured laps as stages of a timeline."""
 
-    def __init__(self) -> None:
+    def __init__(self, timeline: Optional[StageTimeline] = None) -> None:
         """Create a new StopWatch initialized with current time."""
-        self._start_time = datetime.now()
+        self._timeline = timeline
+        self._start_time = time.monotonic()
 
     def elapsed(self) -> timedelta:
         """Returns the time elapsed since the StopWatch was started."""
-        end_time = datetime.now()
-        return end_time - self._start_time
+        return timedelta(seconds=time.monotonic() - self._start_time)
 
     def reset(self):
         """Reset the StopWatch to current time."""
-        self._start_time = datetime.now()
+        self._start_time = time.monotonic()
+
+    def lap(self, stage: str, hosts: Optional[RemoteHosts] = None, *, wait: bool = False) -> timedelta:
+        """Record the time elapsed since the StopWatch was started as a stage of the timeline, if any, and reset it.
+
+        Returns:
+            The time elapsed since the StopWatch was started.
+
+        """
+        elapsed = self.elapsed()
+        if self._timeline is not None:
+            self._timeline.add(stage, self._start_time, hosts, wait=wait)
+        self.reset()
+        return elapsed
+
+
+@retry(tries=60, delay=timedelta(seconds=10), backoff_mode='constant', exceptions=(RemoteExecutionError,))
+def wait_for_service(remote_hosts: RemoteHosts, service: str) -> None:
+    """Wait for a started service to be active and, if it has one, its local health endpoint to respond."""
+    commands = [f'systemctl is-active --quiet {service}']
+    if service in SERVICE_HEALTH_URLS:
+        commands.append(f'curl -sf -o /dev/null {SERVICE_HEALTH_URLS[service]}')
+    remote_hosts.run_sync(*commands, is_safe=True, print_output=False, print_progress_bars=False)
+
+
+def _start_service(remote_hosts: RemoteHosts, service: str) -> None:
+    remote_hosts.run_sync(f'systemctl start {service}', print_progress_bars=False)
+    wait_for_service(remote_hosts, service)
+
+
+def _stop_service(remote_hosts: RemoteHosts, service: str) -> None:
+    remote_hosts.run_sync(f'systemctl stop {service}', print_progress_bars=False)
+
+
+def _run_service_graph(remote_hosts: RemoteHosts, services: list[str], action: Callable[[RemoteHosts, str], None],
+                       *, stop: bool) -> dict[str, float]:
+    """Run the action on each service as soon as the ones it depends on are done, concurrently where independent.
+
+    Returns:
+        The seconds taken by the action on each service.
+
+    """
+    graph = {
+        service: {dependency for dependency in SERVICE_DEPENDENCIES.get(service, ()) if dependency in services}
+        for service in services
+    }
+    if stop:  # Stop the dependent services first
+        graph = {service: {other for other in services if service in graph[other]} for service in services}
+
+    def timed(service: str) -> float:
+        start = time.monotonic()
+        action(remote_hosts, service)
+        return time.monotonic() - start
+
+    sorter = TopologicalSorter(graph)
+    sorter.prepare()
+    durations = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(services))) as executor:
+        running: dict[Future, str] = {}
+        while sorter.is_active():
+            for service in sorter.get_ready():
+                running[executor.submit(timed, service)] = service
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                service = running.pop(future)
+                durations[service] = future.result()
+                logger.info('%s %s on %s in %.1fs', 'Stopped' if stop else 'Started and ready', service,
+                            remote_hosts, durations[service])
+                sorter.done(service)
+
+    return durations
+
+
+def start_services(remote_hosts: RemoteHosts, services: list[str]) -> dict[str, float]:
+    """Start the services following SERVICE_DEPENDENCIES, each one once the ones it depends on are ready.
+
+    Independent services are started at the same time. A service is ready when its systemd unit is active and its
+    local health endpoint in SERVICE_HEALTH_URLS, if any, responds.
+
+    Arguments:
+        remote_hosts: the hosts on which to start the services.
+        services: the services to start.
+
+    Returns:
+        The seconds each service took to start and be ready.
+
+    """
+    return _run_service_graph(remote_hosts, services, _start_service, stop=False)
+
+
+def stop_services(remote_hosts: RemoteHosts, services: list[str]) -> dict[str, float]:
+    """Stop the services following SERVICE_DEPENDENCIES in reverse, independent services at the same time.
+
+    Arguments:
+        remote_hosts: the hosts on which to stop the services.
+        services: the services to stop.
+
+    Returns:
+        The seconds each service took to stop.
+
+    """
+    return _run_service_graph(remote_hosts, services, _stop_service, stop=True)
+
+
+def restart_services(remote_hosts: RemoteHosts, services: list[str]) -> dict[str, float]:
+    """Stop and then start the services following SERVICE_DEPENDENCIES, see start_services().
+
+    Returns:
+        The seconds each service took to start and be ready.
+
+    """
+    stop_services(remote_hosts, services)
+    return start_services(remote_hosts, services)
+
+
+def get_installed_services(remote_host: RemoteHosts, services: list[str]) -> list[str]:
+    """Return the given services that have a systemd unit on the host, in the same order."""
+    units = ' '.join(f'{service}.service' for service in services)
+    results = remote_host.run_sync(f'systemctl list-unit-files --no-legend {units} || true', is_safe=True,
+                                   print_output=False, print_progress_bars=False)
+    installed = set()
+    for _, output in results:
+        for line in output.message().decode().splitlines():
+            if line.strip():
+                installed.add(line.split()[0].removesuffix('.service'))
+
+    return [service for service in services if service in installed]
 
 
 def is_behind_lvs(conftool: ConftoolEntity, remote_host: RemoteHosts) -> bool:
@@ -8,6 +8,7 @@ from time import sleep
 from spicerack import RemoteHosts, Reason, PuppetHosts, ConftoolEntity, AlertingHosts
 from spicerack.cookbook import CookbookBase, CookbookRunnerBase, LockArgs
 
+from cookbooks.sre import StageTimeline
 from cookbooks.sre.wdqs import StopWatch, is_behind_lvs
 
 logger = logging.getLogger(__name__)
@@ -77,6 +78,7 @@ class CategoryReloadRunner(CookbookRunnerBase):
         self.reason = reason
         self.downtime = downtime
         self.no_depool = no_depool
+        self.timeline = StageTimeline(f"categories reload on {remote_host}")
 
     def _reload_categories(self):
         """Execute commands on host to reload categories data."""
@@ -84,7 +86,7 @@ class CategoryReloadRunner(CookbookRunnerBase):
 
         # TODO: consider keeping a copy of the journal and implement CookbookRunnerBase.rollback
         #  to recover from a failure.
-        with self.puppet.disabled(self.reason):
+        with self.puppet.disabled(self.reason), self.timeline.stage("reset journal", self.remote_host):
             self.remote_host.run_sync(
                 'systemctl stop wdqs-categories',
                 'rm -fv /srv/wdqs/categories.jnl',
@@ -95,14 +97,15 @@ class CategoryReloadRunner(CookbookRunnerBase):
         # Wait for blazegraph to be up
         # TODO: sleeping is far from ideal, consider using another technique (ping some blazegraph API?)
         #  to wait for its availability
-        sleep(30)
+        with self.timeline.stage("wait blazegraph", self.remote_host, wait=True):
+            sleep(30)
         logger.info('Loading data for categories')
-        watch = StopWatch()
+        watch = StopWatch(self.timeline)
         self.remote_host.run_sync(
             'test -f /srv/wdqs/categories.jnl',
             '/usr/local/bin/reloadCategories.sh wdqs'
         )
-        logger.info('Categories loaded in %s', watch.elapsed())
+        logger.info('Categories loaded in %s', watch.lap("load categories", self.remote_host))
 
     @property
     def lock_args(self) -> LockArgs:
@@ -117,10 +120,14 @@ class CategoryReloadRunner(CookbookRunnerBase):
 
     def run(self) -> None:
         """Required by Spicerack API."""
-        with self.alerting_host.downtimed(self.reason, duration=timedelta(hours=self.downtime)):
-            if self.no_depool or not is_behind_lvs(self.confctl, self.remote_host):
-                self._reload_categories()
-            else:
-                with self.confctl.change_and_revert('pooled', True, False, name=str(self.remote_host)):
-                    sleep(180)
+        try:
+            with self.alerting_host.downtimed(self.reason, duration=timedelta(hours=self.downtime)):
+                if self.no_depool or not is_behind_lvs(self.confctl, self.remote_host):
                     self._reload_categories()
+                else:
+                    with self.confctl.change_and_revert('pooled', True, False, name=str(self.remote_host)):
+                        with self.timeline.stage("wait depool", self.remote_host, wait=True):
+                            sleep(180)
+                        self._reload_categories()
+        finally:
+            self.timeline.report()
@@ -11,13 +11,12 @@ from os import getpid
 from time import sleep
 from typing import Optional
 
-import transferpy.transfer
 from spicerack import RemoteHosts, Reason, Remote, Netbox, Kafka, ConftoolEntity, AlertingHosts, PuppetHosts
 from spicerack.cookbook import CookbookBase, CookbookRunnerBase, LockArgs
 from spicerack.kafka import ConsumerDefinition
-from transferpy.Transferer import Transferer
 from wmflib.prometheus import Prometheus
 
+from cookbooks.sre import StageTimeline
 from cookbooks.sre.wdqs import check_hosts_are_valid, wait_for_updater, get_site, MUTATION_TOPICS
 from cookbooks.sre.wdqs import get_hostname, StopWatch, is_behind_lvs
 
@@ -177,10 +176,11 @@ class DataReload(CookbookBase):
         remote_host = DataReload._query_single_host(remote, args.host)
         check_hosts_are_valid(remote_host, remote)
         reload_profile: ReloadProfile = RELOAD_PROFILES[args.reload_data]
+        timeline = StageTimeline(f"data reload of {args.reload_data} on {remote_host}")
 
         prep_command: Runnable
         if reload_profile.dumps_source == DumpsSource.NFS:
-            prep_command = MungeFromNFS(remote_host, args.reload_data)
+            prep_command = MungeFromNFS(remote_host, args.reload_data, timeline=timeline)
         elif reload_profile.dumps_source == DumpsSource.HDFS:
             if len(reload_profile.source_folders) > 1:
                 raise ValueError("Only one data_folder expected when loading from HDFS")
@@ -208,7 +208,8 @@ class DataReload(CookbookBase):
                 query_service_host=remote_host,
                 prometheus=self.spicerack.prometheus(),
                 mutation_topic=reload_profile.mutation_topic,
-                updater_service=reload_profile.updater_service)
+                updater_service=reload_profile.updater_service,
+                timeline=timeline)
         else:
             # noop
             postload = Runnable()
@@ -225,6 +226,7 @@ class DataReload(CookbookBase):
             no_depool=args.no_depool,
             reason=self.spicerack.admin_reason(args.reason, task_id=args.task_id),
             downtime=args.downtime,
+            timeline=timeline,
         )
 
 
@@ -243,7 +245,8 @@ class DataReloadRunner(CookbookRunnerBase):
                  profile_name: str,
                  no_depool: bool,
                  reason: Reason,
-                 downtime: int):
+                 downtime: int,
+                 timeline: StageTimeline):
         """Create the runner"""
         self.alerting_host = alerting_host
         self.confctl = confctl
@@ -256,6 +259,7 @@ class DataReloadRunner(CookbookRunnerBase):
         self.no_depool = no_depool
         self.reason = reason
         self.downtime = downtime
+        self.timeline = timeline
 
     @property
     def runtime_description(self) -> str:
@@ -271,14 +275,20 @@ class DataReloadRunner(CookbookRunnerBase):
 
     def run(self) -> None:
         """The run method"""
-        self.preparation_step.run()
-        with self.alerting_host.downtimed(self.reason, duration=timedelta(hours=self.downtime)):
-            if self.no_depool or not is_behind_lvs(self.confctl, self.query_service_host):
-                self._reload_wikibase()
-            else:
-                with self.confctl.change_and_revert('pooled', True, False, name=self.query_service_host.hosts[0]):
-                    sleep(180)
+        try:
+            with self.timeline.stage("preparation", self.query_service_host):
+                self.preparation_step.run()
+            with self.alerting_host.downtimed(self.reason, duration=timedelta(hours=self.downtime)):
+                if self.no_depool or not is_behind_lvs(self.confctl, self.query_service_host):
                     self._reload_wikibase()
+                else:
+                    with self.confctl.change_and_revert('pooled', True, False,
+                                                        name=self.query_service_host.hosts[0]):
+                        with self.timeline.stage("wait depool", self.query_service_host, wait=True):
+                            sleep(180)
+                        self._reload_wikibase()
+        finally:
+            self.timeline.report()
 
     def _load_data_command(self, dump_path: str) -> str:
         """Build the loadData command to use for importing a folder of RDF files."""
@@ -308,9 +318,10 @@ class DataReloadRunner(CookbookRunnerBase):
         # wait for blazegraph to start
         # TODO: sleeping is far from ideal, consider using another technique (ping some blazegraph API?)
         #  to wait for its availability
-        sleep(60)
+        with self.timeline.stage("wait blazegraph", self.query_service_host, wait=True):
+            sleep(60)
         logger.info('Loading dump')
-        watch = StopWatch()
+        watch = StopWatch(self.timeline)
         self.query_service_host.run_sync(
             f'test -f {self.reload_profile.journal_path}',
             *[self._load_data_command(path) for path in self.reload_profile.source_folders]
@@ -319,7 +330,7 @@ class DataReloadRunner(CookbookRunnerBase):
         logger.info('Setting contents of %s to %s', self.reload_profile.data_loaded_flag, self.profile_name)
         self.query_service_host.run_sync(f'echo {self.profile_name} > {self.reload_profile.data_loaded_flag}')
 
-        logger.info('Loaded dumps in %s', watch.elapsed())
+        logger.info('Loaded dumps in %s', watch.lap("load dumps", self.query_service_host))
         self.postload_step.run()
 
 
@@ -333,7 +344,8 @@ class UpdaterRestart(Runnable):
                  query_service_host: RemoteHosts,
                  prometheus: Prometheus,
                  mutation_topic: str,
-                 updater_service: str):
+                 updater_service: str,
+                 timeline: Optional[StageTimeline] = None):
         """Create the runner"""
         self.netbox = netbox
         self.kafka = kafka
@@ -341,6 +353,7 @@ class UpdaterRestart(Runnable):
         self.prometheus = prometheus
         self.mutation_topic = mutation_topic
         self.updater_service = updater_service
+        self.timeline = timeline
 
     def run(self) -> None:
         """Position kafka offsets, restart the updater and wait"""
@@ -355,9 +368,10 @@ class UpdaterRestart(Runnable):
         self.query_service_host.run_sync(f'/usr/bin/systemctl start {self.updater_service}')
         logger.info('Data reload for blazegraph is complete. Waiting for updater to catch up '
                     'on %s@%s', hostname, site)
-        watch = StopWatch()
+        watch = StopWatch(self.timeline)
         wait_for_updater(self.prometheus, site, self.query_service_host)
-        logger.info('Caught up on updates in %s', watch.elapsed())
+        logger.info('Caught up on updates in %s',
+                    watch.lap("wait updater catch up", self.query_service_host, wait=True))
 
     def _extract_kafka_timestamp_from_sparql(self) -> datetime:
         """Run a SPARQL query to extract the oldest dump timestamp."""
@@ -471,6 +485,10 @@ class HdfsCopy(Runnable):
         qs_hosts = list(self.query_service_host.hosts)
         qs_dirs = [str(self.query_service_target_parent_dir)] * len(qs_hosts)
 
+        # transferpy is only needed to run the transfer, don't import it when the cookbooks are listed
+        import transferpy.transfer  # pylint: disable=import-outside-toplevel
+        from transferpy.Transferer import Transferer  # pylint: disable=import-outside-toplevel
+
         # Read transferpy config from /etc/transferpy/transferpy.conf,
         # which is present on cumin hosts.
         tp_opts = dict(transferpy.transfer.parse_configurations(transferpy.transfer.CONFIG_FILE))
@@ -554,9 +572,11 @@ class MungeFromNFS(Runnable):
     query_service_host: RemoteHosts
     dumps: list[NfsDump]
 
-    def __init__(self, query_service_host: RemoteHosts, profile: str):
+    def __init__(self, query_service_host: RemoteHosts, profile: str, *,
+                 timeline: Optional[StageTimeline] = None):
         """Builds the munger preparation"""
         self.query_service_host: RemoteHosts = query_service_host
+        self.timeline = timeline
         if profile == "wikidata":
             self.dumps = [self.NFS_DUMPS["wikidata"], self.NFS_DUMPS["lexeme"]]
         elif profile == "commons":
@@ -576,7 +596,7 @@ class MungeFromNFS(Runnable):
     def _munge(self) -> None:
         """Run munger for main database and lexeme"""
         logger.info('Running munger for main database and then lexeme')
-        stop_watch = StopWatch()
+        stop_watch = StopWatch(self.timeline)
         for dump in self.dumps:
             logger.info('munging %s', dump.munge_path)
             stop_watch.reset()
@@ -586,7 +606,8 @@ class MungeFromNFS(Runnable):
                 .format(path=dump.read_path,
                         munge_path=dump.munge_path,
                         munge_jar_args=str(dump.munge_jar_args or '')))
-            logger.info('munging %s completed in %s', dump.munge_path, stop_watch.elapsed())
+            logger.info('munging %s completed in %s', dump.munge_path,
+                        stop_watch.lap(f"munge {dump.munge_path}", self.query_service_host))
 
     @property
     def runtime_description(self) -> str:
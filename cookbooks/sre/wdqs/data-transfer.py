@@ -18,18 +18,23 @@ from typing import cast
 from datetime import timedelta
 from time import sleep
 
-import transferpy.transfer
 from cumin import nodeset
-from transferpy.Transferer import Transferer
 
 from spicerack.cookbook import CookbookBase, CookbookRunnerBase
 from spicerack.kafka import ConsumerDefinition
 
-from cookbooks.sre.wdqs import wait_for_updater, get_site, get_hostname, MUTATION_TOPICS
+from cookbooks.sre.wdqs import (
+    MUTATION_TOPICS,
+    get_hostname,
+    get_site,
+    start_services,
+    stop_services,
+    wait_for_updater,
+)
 
 BLAZEGRAPH_INSTANCES = {
 
-    # Stop exporters explicitly; reversed startup restores each one before its updater
+    # Stop exporters explicitly, the services are stopped and started following SERVICE_DEPENDENCIES
     'categories': {
         'services': ['prometheus-blazegraph-exporter-wdqs-categories', 'wdqs-categories'],
         'data_path': '/srv/wdqs',
@@ -167,6 +172,10 @@ class DataTransferRunner(CookbookRunnerBase):
 
     def transfer_datafiles(self, path, files):
         """Transfer WDQS data using transferpy library."""
+        # transferpy is only needed to run the transfer, don't import it when the cookbooks are listed
+        import transferpy.transfer  # pylint: disable=import-outside-toplevel
+        from transferpy.Transferer import Transferer  # pylint: disable=import-outside-toplevel
+
         # Read transferpy config from /etc/transferpy/transferpy.conf,
         # which is present on cumin hosts.
         tp_opts = dict(transferpy.transfer.parse_configurations(transferpy.transfer.CONFIG_FILE))
@@ -247,17 +256,13 @@ class DataTransferRunner(CookbookRunnerBase):
             files.append(data_loaded_flag_filepath)
         logger.info("Decided on ultimately transferring the following files: %s", files)
 
-        stop_services_cmd = " && ".join(["systemctl stop " + service for service in services])
-        services.reverse()
-        start_services_cmd = " && sleep 10 && ".join(["systemctl start " + service for service in services])
-
         with alerting_hosts.downtimed(self.admin_reason, duration=timedelta(hours=self.downtime)):
             with self.puppet(self.remote_hosts).disabled(self.admin_reason):
                 DataTransferRunner.lvs_action(DataTransferRunner._depool_host, self.lvs_strategy, self.r_source,
                                               self.r_dest)
 
-                logger.info('Stopping services [%s]', stop_services_cmd)
-                self.remote_hosts.run_sync(stop_services_cmd)
+                logger.info('Stopping services [%s]', ', '.join(services))
+                stop_services(self.remote_hosts, services)
 
                 data_path = instance['data_path']
 
@@ -293,8 +298,8 @@ class DataTransferRunner(CookbookRunnerBase):
                                                                              'main',
                                                                              dest_hostname))
 
-                logger.info('Starting services [%s]', start_services_cmd)
-                self.remote_hosts.run_sync(start_services_cmd)
+                logger.info('Starting services [%s]', ', '.join(services))
+                start_services(self.remote_hosts, services)
 
                 if bg_instance_name in MUTATION_TOPICS:
                     wait_for_updater(self.prometheus, get_site(source_hostname, self.netbox), self.r_source)
@@ -9,28 +9,16 @@ import logging
 
 from datetime import timedelta
 
-from . import check_hosts_are_valid
+from . import check_hosts_are_valid, get_installed_services, restart_services
 
 
 logger = logging.getLogger(__name__)
 
-
+# The services to restart, in the order given by SERVICE_DEPENDENCIES: the updater is stopped first and started once
+# Blazegraph is ready. wdqs-categories is not present on all the hosts.
 RESTART = {
-    'wdqs': [
-        'systemctl stop wdqs-updater',
-        'systemctl restart wdqs-blazegraph',
-        'systemctl list-unit-files wdqs-categories \
-         && systemctl restart wdqs-categories \
-         || echo wdqs-categories not on this host'
-        'sleep 20',
-        'systemctl start wdqs-updater'
-    ],
-    'wcqs': [
-        'systemctl stop wcqs-updater',
-        'systemctl restart wcqs-blazegraph',
-        'sleep 20',
-        'systemctl start wcqs-updater'
-    ],
+    'wdqs': ['wdqs-blazegraph', 'wdqs-categories', 'wdqs-updater'],
+    'wcqs': ['wcqs-blazegraph', 'wcqs-updater'],
 }
 
 
@@ -59,10 +47,11 @@ def run(args, spicerack):
 
     with alerting_hosts.downtimed(reason, duration=timedelta(hours=args.downtime)):
         with puppet.disabled(reason):
-            base_commands = RESTART[host_kind]
-            if args.no_depool:
-                commands = base_commands
-            else:
-                commands = ['depool', 'sleep 60', *base_commands, 'pool']
+            for remote_host in remote_hosts.split(len(remote_hosts)):
+                if not args.no_depool:
+                    remote_host.run_sync('depool', 'sleep 60')
+
+                restart_services(remote_host, get_installed_services(remote_host, RESTART[host_kind]))
 
-            remote_hosts.run_async(*commands, batch_size=1)
+                if not args.no_depool:
+                    remote_host.run_sync('pool')
@@ -1,2 +1,259 @@
 """Wikireplicas Cookbooks"""
+import logging
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+from prettytable import PrettyTable
+from spicerack import Spicerack
+from spicerack.remote import RemoteExecutionError, RemoteHosts
+
 __owner_team__ = "WMCS"
+logger = logging.getLogger(__name__)
+
+MAINTAIN_VIEWS_WORKERS = 4
+"""The default number of maintain-views processes to run at the same time on each host."""
+SLOWEST_DATABASES_REPORTED = 10
+"""How many of the slowest databases to include in the summary logged at the end of a run."""
+DEPOOL_GRACE_SLEEP = 30
+"""Seconds to wait after depooling a host for the in-flight queries to complete before updating its views."""
+
+_DURATION_MARKER = "maintain-views-duration"
+# Databases with a _p views database on a wikireplica host that are not wikis and are managed by other tools.
+_NOT_WIKI_VIEWS = ("heartbeat_p", "meta_p")
+# Databases on a wikireplica host that never get views.
+_NO_VIEWS_DATABASES = ("heartbeat", "information_schema", "mysql", "ops", "performance_schema", "sys")
+
+
+@dataclass
+class HostViewsResult:
+    """The outcome of running maintain-views on a single wikireplica host."""
+
+    host: str
+    durations: dict[str, float] = field(default_factory=dict)
+    """The seconds taken by maintain-views for each database, keyed by database name."""
+    failed_sections: list[str] = field(default_factory=list)
+    repooled: bool = True
+    """Whether the host is pooled at the end of the run, always true for the runs that don't depool."""
+
+
+def list_databases(host: RemoteHosts) -> tuple[dict[str, list[str]], list[str]]:
+    """Return the wiki databases that have views on a multiinstance wikireplica host, grouped by section.
+
+    Arguments:
+        host: the single wikireplica host to query.
+
+    Returns:
+        A tuple with the databases that have views, grouped by section, and the databases without views yet, like
+        a wiki created after the last views update.
+
+    """
+    command = (
+        "for socket in /run/mysqld/mysqld.*.sock; do "
+        "section=${socket#/run/mysqld/mysqld.}; section=${section%.sock}; "
+        "mysql -S \"$socket\" -BN -e 'SHOW DATABASES' | sed \"s/^/$section /\"; done"
+    )
+    databases: dict[str, set[str]] = {}
+    for _, output in host.run_sync(command, is_safe=True, print_output=False, print_progress_bars=False):
+        for line in output.message().decode().splitlines():
+            section, _, database = line.strip().partition(" ")
+            if database and database not in _NO_VIEWS_DATABASES and database not in _NOT_WIKI_VIEWS:
+                databases.setdefault(section, set()).add(database)
+
+    sections: dict[str, list[str]] = {}
+    missing: list[str] = []
+    for section, names in databases.items():
+        for name in sorted(names):
+            if name.endswith("_p"):
+                sections.setdefault(section, []).append(name.removesuffix("_p"))
+            elif f"{name}_p" not in names:
+                missing.append(name)
+
+    return sections, missing
+
+
+class MaintainViews:
+    """Run maintain-views concurrently on a set of wikireplica hosts.
+
+    The hosts are processed at the same time, but when depooling them one host is always left pooled. Each host is
+    depooled once for its whole run. On each host the databases are split by section and a bounded pool of workers
+    runs one maintain-views process per database, so that each database is timed individually and at most
+    ``workers`` sections are updated at the same time on a host. If a host has databases without views yet, like a
+    newly created wiki, it is updated with a single ``--all-databases`` run instead. A failure in a section stops the
+    remaining databases of that section only, the failed hosts are left depooled and reported once all of them
+    completed.
+    """
+
+    def __init__(
+        self, spicerack: Spicerack, options: str, *, databases: Optional[list[str]] = None,
+        workers: int = MAINTAIN_VIEWS_WORKERS, depool: bool = False
+    ):
+        """Initialize the instance.
+
+        Arguments:
+            spicerack: the Spicerack instance.
+            options: the maintain-views options to use for every database, without the databases selection.
+            databases: the databases to update, all the wiki databases on each host if not set.
+            workers: how many maintain-views processes to run at the same time on each host.
+            depool: whether to depool each host while its views are updated.
+
+        """
+        self._spicerack = spicerack
+        self._options = options
+        self._databases = databases
+        self._workers = workers
+        self._depool = depool
+
+    def run(self, remote_hosts: RemoteHosts) -> list[HostViewsResult]:
+        """Run maintain-views on all the given hosts, recording the outcome in the Spicerack actions.
+
+        Arguments:
+            remote_hosts: the wikireplica hosts to update.
+
+        Raises:
+            spicerack.remote.RemoteExecutionError: if maintain-views failed on any host.
+
+        """
+        hosts = list(remote_hosts.split(len(remote_hosts)))
+        # Keep at least one host pooled, a single host can only be depooled alone
+        max_hosts = max(1, len(hosts) - 1) if self._depool else len(hosts)
+        logger.info("Running maintain-views %s on %d hosts, %d at a time, up to %d processes per host: %s",
+                    self._options, len(hosts), max_hosts, self._workers, remote_hosts)
+        with ThreadPoolExecutor(max_workers=max_hosts) as executor:
+            results = list(executor.map(self._run_on_host, hosts))
+
+        for result in results:
+            host_actions = self._spicerack.actions[result.host]
+            if result.failed_sections:
+                host_actions.failure(
+                    f"**maintain-views failed for sections {', '.join(result.failed_sections)}, "
+                    "see the logs for details**"
+                )
+                if not result.repooled:
+                    host_actions.failure("**Left depooled, repool it with 'pool' once fixed**")
+            else:
+                host_actions.success(
+                    f"Ran 'maintain-views {self._options}' on {len(result.durations)} databases "
+                    f"in {sum(result.durations.values()):.0f}s of maintain-views time"
+                )
+
+        self._report(results)
+        failed = [result.host for result in results if result.failed_sections]
+        if failed:
+            raise RemoteExecutionError(1, f"maintain-views failed on {', '.join(failed)}", iter(()))
+
+        return results
+
+    def _run_on_host(self, host: RemoteHosts) -> HostViewsResult:
+        """Run maintain-views on a single host, depooling it for the whole run if requested."""
+        result = HostViewsResult(host=str(host))
+        if self._databases is not None:
+            sections = {"": self._databases}
+            missing: list[str] = []
+        else:
+            sections, missing = list_databases(host)
+            if missing:
+                logger.warning("%s: databases without views found (%s), updating all of them with --all-databases",
+                               host, ", ".join(missing))
+            elif not sections:
+                logger.warning("%s: no databases with views found, skipping maintain-views", host)
+                return result
+
+        if self._depool:
+            logger.info("%s: depooling and waiting %ds for the in-flight queries", host, DEPOOL_GRACE_SLEEP)
+            host.run_sync("depool", print_progress_bars=False)
+            if not self._spicerack.dry_run:
+                time.sleep(DEPOOL_GRACE_SLEEP)
+
+        if missing:
+            self._run_all_databases(host, result)
+        else:
+            self._run_on_sections(host, sections, result)
+
+        if self._depool:
+            if result.failed_sections:
+                logger.error("%s: leaving the host depooled as maintain-views failed", host)
+                result.repooled = False
+            else:
+                host.run_sync("pool", print_progress_bars=False)
+
+        return result
+
+    def _run_on_sections(self, host: RemoteHosts, sections: dict[str, list[str]], result: HostViewsResult) -> None:
+        """Run maintain-views on the sections of a host in parallel, recording the outcome in the result."""
+        with ThreadPoolExecutor(max_workers=max(1, min(self._workers, len(sections)))) as executor:
+            futures = {
+                section: executor.submit(self._run_on_section, host, section, databases)
+                for section, databases in sections.items()
+            }
+            for section, future in futures.items():
+                try:
+                    result.durations.update(future.result())
+                except RemoteExecutionError as exc:
+                    self._log_failure(host, section or "-", exc)
+                    result.failed_sections.append(section or "-")
+
+    def _run_all_databases(self, host: RemoteHosts, result: HostViewsResult) -> None:
+        """Run a single maintain-views on all the databases of a host, recording the outcome in the result."""
+        start = time.monotonic()
+        try:
+            host.run_sync(f"maintain-views {self._options} --all-databases", print_output=False,
+                          print_progress_bars=False)
+        except RemoteExecutionError as exc:
+            self._log_failure(host, "all", exc)
+            result.failed_sections.append("all")
+        else:
+            result.durations["all-databases"] = time.monotonic() - start
+
+    @staticmethod
+    def _log_failure(host: RemoteHosts, section: str, exc: RemoteExecutionError) -> None:
+        """Log a failed maintain-views run with its output."""
+        logger.error("%s: maintain-views failed for section %s: %s", host, section, exc)
+        for _, output in exc.results:
+            logger.error("%s: %s", host, output.message().decode())
+
+    def _run_on_section(self, host: RemoteHosts, section: str, databases: list[str]) -> dict[str, float]:
+        """Run maintain-views once per database of a section, returning how long each database took."""
+        logger.info("%s: updating the views of %d databases%s", host, len(databases),
+                    f" in section {section}" if section else "")
+        command = (
+            f"for db in {' '.join(shlex.quote(database) for database in databases)}; do "
+            "start=$(date +%s%N); "
+            f"maintain-views {self._options} --databases \"$db\" || exit 1; "
+            f"echo \"{_DURATION_MARKER} $db $(( $(date +%s%N) - start ))\"; done"
+        )
+        durations = {}
+        for _, output in host.run_sync(command, print_output=False, print_progress_bars=False):
+            for line in output.message().decode().splitlines():
+                if line.startswith(_DURATION_MARKER):
+                    _, database, nanoseconds = line.split()
+                    durations[database] = int(nanoseconds) / 1e9
+
+        return durations
+
+    @staticmethod
+    def _report(results: list[HostViewsResult]) -> None:
+        """Log the per-database durations, the full list at debug level and the slowest ones at info level."""
+        rows = sorted(
+            (
+                (result.host, database, duration)
+                for result in results
+                for database, duration in result.durations.items()
+            ),
+            key=lambda row: row[2],
+            reverse=True,
+        )
+        if not rows:
+            return
+
+        for host, database, duration in rows:
+            logger.debug("maintain-views on %s took %.1fs for %s", host, duration, database)
+
+        table = PrettyTable(["Host", "Database", "Duration"])
+        table.align = "l"
+        for host, database, duration in rows[:SLOWEST_DATABASES_REPORTED]:
+            table.add_row([host, database, f"{duration:.1f}s"])
+
+        logger.info("Slowest maintain-views runs (%d databases in total):\n%s", len(rows), table)
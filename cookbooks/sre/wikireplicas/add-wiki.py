@@ -5,6 +5,8 @@ import logging
 from spicerack import Spicerack
 from spicerack.cookbook import CookbookBase, CookbookRunnerBase
 
+from cookbooks.sre.wikireplicas import MaintainViews
+
 logger = logging.getLogger(__name__)
 
 
@@ -72,11 +74,12 @@ class AddWikiRunner(CookbookRunnerBase):
         control_host = next(cloudcontrol.split(len(cloudcontrol)))
 
         index_cmd = f"/usr/bin/maintain-replica-indexes --database {self.database}"
-        view_cmd = f"/usr/bin/maintain-views --replace --databases {self.database}"
         meta_p_cmd = f"/usr/bin/maintain-meta_p --databases {self.database}"
         wiki_dns_cmd = "/usr/local/sbin/wmcs-wikireplica-dns --aliases"
+        logger.info("Generating indexes...")
+        replicas.run_async(index_cmd)
         logger.info("Generating views...")
-        replicas.run_async(index_cmd, view_cmd)
+        MaintainViews(self.spicerack, "--replace", databases=[self.database]).run(replicas)
         if not self.skip_dns:
             logger.info("Adding DNS")
             control_host.run_sync(wiki_dns_cmd)
@@ -4,11 +4,12 @@ from typing import Optional
 
 from spicerack import Spicerack
 from spicerack.cookbook import CookbookBase, CookbookRunnerBase
-from spicerack.remote import RemoteExecutionError, RemoteHosts
+from spicerack.remote import RemoteHosts
 from wmflib.interactive import ask_confirmation, ensure_shell_is_durable
 from wmflib.phabricator import Phabricator
 
 from cookbooks.sre import PHABRICATOR_BOT_CONFIG_FILE
+from cookbooks.sre.wikireplicas import MAINTAIN_VIEWS_WORKERS, MaintainViews
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +21,10 @@ class UpdateWikireplicaViews(CookbookBase):
     and the (currently manual) process is documented in
     https://wikitech.wikimedia.org/wiki/Portal:Data_Services/Admin/Wiki_Replicas#Updating_views
 
+    The hosts of each category are updated at the same time, except one that is kept pooled, with the databases of
+    each host split by section across up to --workers maintain-views processes. Each host is depooled for its whole
+    update. The analytics and web categories are still updated one after the other.
+
     Usage example:
       cookbook sre.wikireplicas.update-views --task-id T12345
     """
@@ -40,6 +45,12 @@ class UpdateWikireplicaViews(CookbookBase):
         parser.add_argument(
             "--database", help="Only update the specified database (e.g. --database centralauth)"
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=MAINTAIN_VIEWS_WORKERS,
+            help="How many maintain-views processes to run at the same time on each host (default: %(default)s)",
+        )
         parser.add_argument(
             "-t", "--task-id", help="Phabricator task ID (e.g. T123456) to log to"
         )
@@ -77,6 +88,19 @@ class UpdateWikireplicaViewsRunner(CookbookRunnerBase):
 
         self.remote = spicerack.remote()
 
+        maintain_views_options = "--replace"
+        if self.clean:
+            maintain_views_options += " --clean"
+        if self.table:
+            maintain_views_options += f" --table {self.table}"
+        self.maintain_views = MaintainViews(
+            spicerack,
+            maintain_views_options,
+            databases=[self.database] if self.database else None,
+            workers=args.workers,
+            depool=True,
+        )
+
         self._ensure_notify_dbas()
         self._ensure_view_definitions_updated()
 
@@ -112,37 +136,12 @@ class UpdateWikireplicaViewsRunner(CookbookRunnerBase):
             f"Does your SQL statement reflect the expected pre-update state on {host}?"
         )
 
-    def _run_maintain_views_on_host(self, remote_hosts: RemoteHosts):
-        host_actions = self.actions[str(remote_hosts)]
-
-        maintain_views_options = "--replace --auto-depool"
-
-        if self.clean:
-            maintain_views_options += " --clean"
-
-        if self.database:
-            maintain_views_options += f" --databases {self.database}"
-        else:
-            maintain_views_options += " --all-databases"
-
-        if self.table:
-            maintain_views_options += f" --table {self.table}"
-
-        try:
-            command = f"maintain-views {maintain_views_options}"
-            remote_hosts.run_sync(command)
-            host_actions.success(f"Ran '{command}'")
-        except RemoteExecutionError:
-            host_actions.failure(
-                "**The maintain-views run failed, see OUTPUT of 'maintain-views ...' above for details**"
-            )
-            raise
-
     def _run_maintain_views(self, remote_hosts: RemoteHosts):
         self.spicerack.puppet(remote_hosts).run()
-        for host in remote_hosts.split(len(remote_hosts)):
-            self.actions[str(host)].success("Ran Puppet agent")
-            self._run_maintain_views_on_host(host)
+        for host in remote_hosts.hosts:
+            self.actions[host].success("Ran Puppet agent")
+
+        self.maintain_views.run(remote_hosts)
 
     @staticmethod
     def _run_sql_test_post(host: RemoteHosts):
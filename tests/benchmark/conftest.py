@@ -0,0 +1,398 @@
+"""Offline benchmark harness: simulated Spicerack backends driven by a virtual clock.
+
+The benchmarks run the real runners against simulated backends whose calls take a configurable amount of virtual
+time and fail at a configurable rate. No real time is spent sleeping or waiting: each thread has its own virtual
+clock, threads and executor tasks start at the virtual time of the thread that created them and joining a thread or
+getting the result of a future moves the caller clock forward to the time the work completed. The wall-clock time
+measured on the main thread is then the time the operation would take in production with those latencies.
+
+The executor tasks queued beyond max_workers start on the worker slot that became free first in real time, that is
+not necessarily the one that became free first in virtual time: size the executors to the number of tasks for exact
+results, otherwise the simulated time is an upper bound.
+"""
+import heapq
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from unittest import mock
+
+import pytest
+from ClusterShell.NodeSet import NodeSet
+from prettytable import PrettyTable
+from spicerack.exceptions import SpicerackError
+from spicerack.remote import RemoteExecutionError
+from wmflib.actions import ActionsDict
+
+DEFAULT_LATENCY = 0.1
+"""The seconds taken by the calls to a backend without a configured latency."""
+DEFAULT_LATENCIES = {
+    "alerting": 0.5,
+    "confctl": 0.2,
+    "dbctl": 0.5,
+    "icinga": 0.5,
+    "icinga.wait_for_optimal": 60.0,
+    "kubernetes": 0.2,
+    "netbox": 0.3,
+    "puppet": 1.0,
+    "puppet.first_run": 300.0,
+    "puppet.run": 60.0,
+    "puppet.wait_since": 90.0,
+    "remote": 1.0,
+    "remote.reboot": 10.0,
+    "remote.wait_reboot_since": 180.0,
+    "requests": 0.2,
+}
+"""The seconds taken by the calls to each backend or to a specific ``backend.method``, the latter taking precedence."""
+
+SLOWEST_IMPORTS_REPORTED = 15
+"""How many of the slowest cookbook imports to print at the end of the session."""
+
+_REPORTS: list[dict] = []
+_STARTUP_REPORTS: list[dict] = []
+
+
+class SimulatedFailure(SpicerackError):
+    """Raised by the simulated backends to inject a failure."""
+
+
+class VirtualClock:
+    """A per-thread virtual clock replacing the time functions while installed."""
+
+    def __init__(self, start: float = 1_700_000_000.0):
+        """Initialize the clock at the given epoch."""
+        self.start = start
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        """Return the virtual time of the current thread."""
+        return getattr(self._local, "now", self.start)
+
+    def advance(self, seconds: float) -> None:
+        """Move the clock of the current thread forward, this replaces time.sleep()."""
+        self._local.now = self.now() + max(0.0, seconds)
+
+    def advance_to(self, when: float) -> None:
+        """Move the clock of the current thread to the given time, if it is in the future."""
+        self._local.now = max(self.now(), when)
+
+    def install(self, stack: ExitStack) -> None:
+        """Replace the time and threading functions until the given stack is closed."""
+        replacements = {"sleep": (time.sleep, self.advance), "monotonic": (time.monotonic, self.now),
+                        "time": (time.time, self.now)}
+        for attr, (_, replacement) in replacements.items():
+            stack.enter_context(mock.patch.object(time, attr, replacement))
+        # Cover the modules that imported the functions directly, e.g. "from time import sleep"
+        for name, module in list(sys.modules.items()):
+            if not name.startswith("cookbooks") or module is None:
+                continue
+            for attr, (original, replacement) in replacements.items():
+                if getattr(module, attr, None) is original:
+                    stack.enter_context(mock.patch.object(module, attr, replacement))
+
+        stack.enter_context(mock.patch.object(threading.Thread, "start", self._thread_start(threading.Thread.start)))
+        stack.enter_context(mock.patch.object(threading.Thread, "join", self._thread_join(threading.Thread.join)))
+        stack.enter_context(mock.patch.object(ThreadPoolExecutor, "submit", self._submit(ThreadPoolExecutor.submit)))
+        stack.enter_context(mock.patch.object(Future, "result", self._result(Future.result)))
+
+    def _run_from(self, func, started: float, holder: dict):
+        """Return a wrapper of func that runs it at the given virtual time, recording when it completed."""
+        def wrapper(*args, **kwargs):
+            self.advance_to(started)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                holder["end"] = self.now()
+
+        return wrapper
+
+    def _thread_start(self, original):
+        def start(thread):
+            thread.virtual_end = {}
+            thread.run = self._run_from(thread.run, self.now(), thread.virtual_end)
+            return original(thread)
+
+        return start
+
+    def _thread_join(self, original):
+        def join(thread, timeout=None):
+            original(thread, timeout)
+            if not thread.is_alive():
+                self.advance_to(getattr(thread, "virtual_end", {}).get("end", self.now()))
+
+        return join
+
+    def _submit(self, original):
+        def submit(executor, fn, /, *args, **kwargs):
+            # The virtual times at which each worker of the executor becomes free
+            slots = executor.__dict__.setdefault("virtual_slots", [float("-inf")] * executor._max_workers)
+            submitted = self.now()
+            holder: dict = {}
+
+            def task(*args, **kwargs):
+                with self._lock:
+                    self._local.now = max(submitted, heapq.heappop(slots))
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    holder["end"] = self.now()
+                    with self._lock:
+                        heapq.heappush(slots, holder["end"])
+
+            future = original(executor, task, *args, **kwargs)
+            future.virtual_end = holder
+            return future
+
+        return submit
+
+    def _result(self, original):
+        def result(future, timeout=None):
+            try:
+                return original(future, timeout)
+            finally:
+                if future.done():
+                    self.advance_to(getattr(future, "virtual_end", {}).get("end", self.now()))
+
+        return result
+
+
+class Simulation:
+    """The simulated environment: latencies, failure injection and call counters shared by all the backends."""
+
+    def __init__(self, clock: VirtualClock, *, seed: int = 0):
+        """Initialize the simulation with the default latencies and no failures."""
+        self.clock = clock
+        self.latencies = dict(DEFAULT_LATENCIES)
+        self.failure_rates: dict[str, float] = {}
+        self.exceptions = {"remote": lambda key: RemoteExecutionError(1, f"Simulated failure of {key}", iter(()))}
+        self.calls: Counter = Counter()
+        self.failures: Counter = Counter()
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._start = clock.now()
+        self.spicerack = self._spicerack()
+
+    @property
+    def elapsed(self) -> float:
+        """The simulated seconds elapsed on the current thread since the simulation started."""
+        return self.clock.now() - self._start
+
+    def _lookup(self, table: dict, key: str, default):
+        """Return the most specific entry of the table for the key, trying the key and then its prefixes."""
+        while key:
+            if key in table:
+                return table[key]
+            key = key.rpartition(".")[0]
+        return default
+
+    def latency(self, key: str) -> float:
+        """Return the seconds taken by a call to the given ``backend.method``."""
+        return self._lookup(self.latencies, key, DEFAULT_LATENCY)
+
+    def call(self, backend: str, method: str) -> None:
+        """Record a call, spending its virtual time and raising if a failure has been injected."""
+        key = f"{backend}.{method}"
+        with self._lock:
+            self.calls[key] += 1
+            rate = self._lookup(self.failure_rates, key, 0.0)
+            failed = rate > 0 and self.random.random() < rate
+            if failed:
+                self.failures[key] += 1
+
+        self.clock.advance(self.latency(key))
+        if failed:
+            factory = self.exceptions.get(backend, lambda key: SimulatedFailure(f"Simulated failure of {key}"))
+            raise factory(key)
+
+    def backend(self, name: str) -> "SimulatedBackend":
+        """Return a new simulated backend with the given name."""
+        return SimulatedBackend(self, name)
+
+    def remote_hosts(self, hosts: str, outputs: dict[str, bytes] | None = None) -> "SimulatedRemoteHosts":
+        """Return simulated RemoteHosts for the given hosts, returning the given outputs for matching commands."""
+        return SimulatedRemoteHosts(self, NodeSet(hosts), outputs or {})
+
+    def _spicerack(self) -> mock.MagicMock:
+        """Return a Spicerack instance whose accessors return the simulated backends."""
+        spicerack = mock.MagicMock()
+        spicerack.dry_run = False
+        spicerack.username = "benchmark"
+        spicerack.actions = ActionsDict()
+        spicerack.remote.return_value.query.side_effect = self.remote_hosts
+        for accessor, name in (
+            ("alerting_hosts", "alerting"),
+            ("confctl", "confctl"),
+            ("dbctl", "dbctl"),
+            ("icinga_hosts", "icinga"),
+            ("kubernetes", "kubernetes"),
+            ("netbox", "netbox"),
+            ("netbox_server", "netbox"),
+            ("puppet", "puppet"),
+            ("requests_session", "requests"),
+        ):
+            getattr(spicerack, accessor).return_value = self.backend(name)
+
+        spicerack.run_cookbook.side_effect = lambda *_args, **_kwargs: self.call("cookbooks", "run_cookbook") or 0
+        return spicerack
+
+    def report(self, name: str) -> dict:
+        """Record and return the results of a benchmark, to be printed at the end of the session."""
+        report = {
+            "name": name,
+            "elapsed": self.elapsed,
+            "calls": dict(self.calls),
+            "failures": dict(self.failures),
+        }
+        _REPORTS.append(report)
+        return report
+
+
+class SimulatedBackend:
+    """A simulated backend, a proxy to a MagicMock in which every call takes virtual time and may fail.
+
+    The wrapped mock is available as ``mock`` to configure the return values of the calls.
+    """
+
+    def __init__(self, simulation: Simulation, name: str, wrapped: mock.MagicMock | None = None, path: str = ""):
+        """Initialize the backend."""
+        self.simulation = simulation
+        self.name = name
+        self.mock = wrapped if wrapped is not None else mock.MagicMock()
+        self.path = path
+
+    def __getattr__(self, attr):
+        """Return a proxy to the attribute of the wrapped mock, keeping track of the path to it."""
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return SimulatedBackend(self.simulation, self.name, getattr(self.mock, attr),
+                                f"{self.path}.{attr}" if self.path else attr)
+
+    def __call__(self, *args, **kwargs):
+        """Spend the time of the call, possibly failing, and return what the wrapped mock returns."""
+        self.simulation.call(self.name, self.path)
+        return self.mock(*args, **kwargs)
+
+
+class SimulatedOutput:
+    """The output of a simulated command, as returned by RemoteHosts.run_sync()."""
+
+    def __init__(self, output: bytes):
+        """Initialize the output."""
+        self.output = output
+
+    def message(self) -> bytes:
+        """Return the output, as ClusterShell.MsgTree.MsgTreeElem.message() does."""
+        return self.output
+
+
+class SimulatedRemoteHosts:
+    """A simulated RemoteHosts in which all the commands run at the same time on all the hosts."""
+
+    def __init__(self, simulation: Simulation, hosts: NodeSet, outputs: dict[str, bytes]):
+        """Initialize the instance, outputs maps the commands to their output."""
+        self.simulation = simulation
+        self.hosts = hosts
+        self.outputs = outputs
+
+    def __len__(self) -> int:
+        """Return the number of hosts."""
+        return len(self.hosts)
+
+    def __str__(self) -> str:
+        """Return the hosts."""
+        return str(self.hosts)
+
+    def split(self, n_slices: int):
+        """Split the hosts in n_slices instances, as RemoteHosts.split() does."""
+        for hosts in self.hosts.split(n_slices):
+            yield SimulatedRemoteHosts(self.simulation, hosts, self.outputs)
+
+    def _run(self, method: str, commands) -> list:
+        self.simulation.call("remote", method)
+        return [
+            (self.hosts, SimulatedOutput(self.outputs[str(command)]))
+            for command in commands if str(command) in self.outputs
+        ]
+
+    def run_sync(self, *commands, **_kwargs) -> list:
+        """Simulate running the commands on all the hosts."""
+        return self._run("run_sync", commands)
+
+    def run_async(self, *commands, **_kwargs) -> list:
+        """Simulate running the commands on all the hosts."""
+        return self._run("run_async", commands)
+
+    def reboot(self, **_kwargs) -> None:
+        """Simulate rebooting all the hosts."""
+        self.simulation.call("remote", "reboot")
+
+    def wait_reboot_since(self, *_args, **_kwargs) -> None:
+        """Simulate waiting for all the hosts to be back after a reboot."""
+        self.simulation.call("remote", "wait_reboot_since")
+
+
+def _answer(_message, choices, **_kwargs):
+    """Answer the interactive prompts, retrying the failed steps and proceeding on the confirmations."""
+    return "retry" if "retry" in choices else choices[0]
+
+
+@pytest.fixture(name="simulation")
+def fixture_simulation():
+    """Return a Simulation with the virtual clock installed and the interactive prompts answered automatically."""
+    clock = VirtualClock()
+    with ExitStack() as stack:
+        clock.install(stack)
+        stack.enter_context(mock.patch("wmflib.interactive.ask_input", side_effect=_answer))
+        yield Simulation(clock)
+
+
+@pytest.fixture(name="startup_reports")
+def fixture_startup_reports():
+    """Return the list in which to record the import time and peak RSS of each cookbook module."""
+    return _STARTUP_REPORTS
+
+
+def pytest_terminal_summary(terminalreporter):
+    """Print the simulated wall-clock time and the API calls of each benchmark and the slowest cookbook imports."""
+    if _STARTUP_REPORTS:
+        _startup_summary(terminalreporter)
+    if not _REPORTS:
+        return
+
+    table = PrettyTable(["Benchmark", "Simulated time", "Calls", "Failures", "Most frequent calls"])
+    table.align = "l"
+    for report in _REPORTS:
+        calls = Counter(report["calls"])
+        table.add_row([
+            report["name"],
+            f"{report['elapsed']:.1f}s",
+            sum(calls.values()),
+            sum(report["failures"].values()),
+            ", ".join(f"{key}={count}" for key, count in calls.most_common(4)),
+        ])
+
+    terminalreporter.write_sep("=", "simulated benchmarks")
+    terminalreporter.write_line(str(table))
+
+
+def _startup_summary(terminalreporter):
+    """Print the slowest cookbook imports and the ones that failed."""
+    baseline, *reports = _STARTUP_REPORTS
+    imported = sorted((report for report in reports if "error" not in report),
+                      key=lambda report: report["seconds"], reverse=True)
+    table = PrettyTable(["Module", "Import time", "Peak RSS"])
+    table.align = "l"
+    for report in imported[:SLOWEST_IMPORTS_REPORTED]:
+        table.add_row([report["module"], f"{report['seconds']:.2f}s", f"{report['rss'] // 1024}MB"])
+
+    terminalreporter.write_sep("=", f"slowest cookbook imports ({len(imported)} modules)")
+    terminalreporter.write_line(str(table))
+    terminalreporter.write_line(f"For reference importing {baseline['module']} alone takes "
+                                f"{baseline['seconds']:.2f}s with a peak RSS of {baseline['rss'] // 1024}MB")
+    for report in reports:
+        if "error" in report:
+            terminalreporter.write_line(f"Unable to import {report['module']}: {report['error']}")
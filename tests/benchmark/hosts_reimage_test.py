@@ -0,0 +1,85 @@
+"""Benchmarks of the sre.hosts.reimage cookbook."""
+from argparse import Namespace
+from unittest import mock
+
+import pytest
+
+from cookbooks.sre.hosts.reimage import ReimageRunner
+
+HOST = "bench1001"
+FQDN = f"{HOST}.eqiad.wmnet"
+
+
+def get_runner(simulation, tmp_path):
+    """Return a ReimageRunner for a physical UEFI host, with all the initialization already done."""
+    simulation.latencies["remote.wait_reboot_since"] = 600.0
+    requests = simulation.backend("requests")
+    requests.mock.post.side_effect = lambda url, **_kwargs: mock.MagicMock(**{
+        "json.return_value": [{"title": HOST}] if "puppetdb" in url else {"result": {"url": "https://netbox/job"}}})
+    requests.mock.get.return_value.json.return_value = {"data": {"log": []}}
+    puppet_installer = simulation.backend("puppet")
+    puppet_installer.mock.regenerate_certificate.return_value = {FQDN: "fingerprint"}
+
+    runner = ReimageRunner.__new__(ReimageRunner)
+    runner.args = Namespace(host=HOST, os="bookworm", task_id="T12345", new=False, no_downtime=False, conftool=False,
+                            no_pxe=False, move_vlan=False, mask=[], httpbb=False, no_check_icinga=False)
+    runner.host = HOST
+    runner.fqdn = FQDN
+    runner.spicerack = simulation.spicerack
+    runner.actions = simulation.spicerack.actions
+    runner.host_actions = runner.actions[HOST]
+    runner.reason = mock.MagicMock(owner="benchmark", reason="benchmark")
+    runner.phabricator = simulation.backend("phabricator")
+    runner.alerting_host = simulation.backend("alerting")
+    runner.alertmanager_host = simulation.backend("alerting")
+    runner.icinga_host = simulation.backend("icinga")
+    runner.confctl = simulation.backend("confctl")
+    runner.confctl_services = []
+    runner.debmonitor = simulation.backend("debmonitor")
+    runner.dhcp = simulation.backend("dhcp")
+    runner.dhcp_config = mock.MagicMock()
+    runner.redfish = simulation.backend("redfish")
+    runner.netbox = simulation.backend("netbox")
+    runner.netbox_data = {"name": HOST}
+    runner.netbox_server = simulation.backend("netbox")
+    runner.requests = requests
+    runner.remote_host = simulation.remote_hosts(FQDN)
+    runner.remote_installer = simulation.remote_hosts(FQDN, {"lsb_release -sc": b"bookworm"})
+    runner.puppet = simulation.backend("puppet")
+    runner.puppet_installer = puppet_installer
+    runner.puppet_server = simulation.backend("puppet")
+    runner.puppet_localhost = simulation.backend("puppet")
+    runner.puppet_configmaster = simulation.backend("puppet")
+    runner.virtual = False
+    runner.is_uefi = True
+    runner.identifier = ""
+    runner.use_tftp = False
+    runner.rollback_masks = False
+    runner.rollback_depool = False
+    runner.populate_puppetdb_attempted = False
+    runner._get_output_filename = lambda _username: tmp_path / "first_run.out"  # pylint: disable=protected-access
+    return runner
+
+
+def test_reimage(simulation, tmp_path):
+    """The reimage time should be the sum of the time spent in the backends and the fixed sleeps."""
+    assert get_runner(simulation, tmp_path).run() == 0
+
+    report = simulation.report("ReimageRunner.run")
+    assert report["calls"]["remote.wait_reboot_since"] == 3
+    # 30s after the Debian installer is up and 60s after the reboot into the new OS
+    busy = sum(count * simulation.latency(key) for key, count in report["calls"].items())
+    assert report["elapsed"] == pytest.approx(busy + 90)
+
+
+def test_reimage_with_first_puppet_run_failures(simulation, tmp_path):
+    """A failed first Puppet run should be retried, each retry taking as long as a full run."""
+    simulation.failure_rates["puppet.first_run"] = 0.5
+    simulation.exceptions["puppet"] = simulation.exceptions["remote"]
+    simulation.random.seed(1)  # The first run fails, the second one succeeds
+    assert get_runner(simulation, tmp_path).run() == 0
+
+    report = simulation.report("ReimageRunner.run, 50% first Puppet run failures")
+    assert (report["calls"]["puppet.first_run"], report["failures"]["puppet.first_run"]) == (2, 1)
+    busy = sum(count * simulation.latency(key) for key, count in report["calls"].items())
+    assert report["elapsed"] == pytest.approx(busy + 90)
@@ -0,0 +1,50 @@
+"""Benchmarks of the sre.mysql.pool gradual pooling."""
+from argparse import Namespace
+from unittest import mock
+
+import pytest
+from conftool.extensions.dbconfig.action import ActionResult
+
+from cookbooks.sre.mysql.pool import PoolRunner
+
+STEPS = (6, 25, 56, 100)
+
+
+def get_runner(simulation, pending_diff_rate=0.0):
+    """Return a PoolRunner for a depooled instance, pending diffs are returned with the given rate."""
+    dbctl = simulation.backend("dbctl")
+    dbctl.mock.instance.get.return_value.sections = {"s1": {"pooled": False, "percentage": 0}}
+    dbctl.mock.instance.pool.return_value = ActionResult(True, 0)
+    dbctl.mock.config.commit.return_value = ActionResult(True, 0)
+    dbctl.mock.config.diff.side_effect = lambda **_kwargs: (
+        ActionResult(True, 1 if simulation.random.random() < pending_diff_rate else 0), None)
+
+    runner = PoolRunner.__new__(PoolRunner)
+    runner.args = Namespace(instance="db1001")
+    runner.dbctl = dbctl
+    runner.datacenter = "eqiad"
+    runner.dry_run = False
+    runner.reason = mock.MagicMock(reason="benchmark")
+    runner.steps = STEPS
+    return runner
+
+
+def test_gradual_pooling(simulation):
+    """The gradual pooling time should be dominated by the sleeps between the steps."""
+    get_runner(simulation).gradual_pooling()
+
+    report = simulation.report("PoolRunner.gradual_pooling")
+    # Each step checks the diff twice, pools and commits
+    assert report["calls"] == {key: len(STEPS) for key in ("dbctl.instance.get", "dbctl.instance.pool",
+                                                           "dbctl.config.commit")} | {"dbctl.config.diff": 8}
+    assert report["elapsed"] == pytest.approx(3 * 900 + sum(report["calls"].values()) * 0.5)
+
+
+def test_gradual_pooling_with_pending_diffs(simulation):
+    """The pending diffs should be polled every 30 seconds until they are clean."""
+    get_runner(simulation, pending_diff_rate=0.5).gradual_pooling()
+
+    report = simulation.report("PoolRunner.gradual_pooling, 50% pending diffs")
+    retries = report["calls"]["dbctl.config.diff"] - 2 * len(STEPS)
+    assert retries > 0
+    assert report["elapsed"] == pytest.approx(3 * 900 + retries * 30 + sum(report["calls"].values()) * 0.5)
@@ -0,0 +1,66 @@
+"""Benchmarks of the SREBatchRunnerBase rolling operations."""
+from argparse import Namespace
+
+import pytest
+
+from cookbooks.sre import SREBatchRunnerBase
+
+HOSTS = "bench[1001-1012].eqiad.wmnet"
+DATACENTERS = ("eqiad", "codfw", "esams", "ulsfo", "eqsin", "drmrs")
+
+
+class BenchmarkRunner(SREBatchRunnerBase):
+    """A minimal batch runner on the simulated hosts."""
+
+    allowed_aliases = ["benchmark"]
+    restart_daemons = ["benchmark"]
+
+
+def get_runner(simulation, action, hosts=HOSTS, **kwargs):
+    """Return a runner for all the simulated hosts, resolving also the queries of the Direct backend."""
+    simulation.spicerack.remote.return_value.query.side_effect = lambda query: simulation.remote_hosts(
+        query[2:-1] if query.startswith("D{") else hosts)
+    args = Namespace(action=action, alias="benchmark", query=None, batchsize=3, grace_sleep=60, max_failed=2,
+                     reason="benchmark", task_id=None, ignore_restart_errors=False, concurrent_groups=False)
+    for key, value in kwargs.items():
+        setattr(args, key, value)
+    return BenchmarkRunner(args, simulation.spicerack)
+
+
+def test_rolling_reboot(simulation):
+    """The rolling reboot time should be the sum of the batches plus the grace sleeps between them."""
+    runner = get_runner(simulation, "reboot")
+    assert runner.run() == 0
+
+    latencies = simulation.latencies
+    batch = (latencies["alerting"] + latencies["remote.reboot"] + latencies["remote.wait_reboot_since"]
+             + latencies["puppet.wait_since"] + latencies["icinga.wait_for_optimal"])
+    report = simulation.report("SREBatchRunnerBase rolling reboot")
+    assert report["elapsed"] == pytest.approx(4 * batch + 3 * 60)
+    assert report["calls"]["remote.reboot"] == 4
+    assert runner.timeline.elapsed == pytest.approx(report["elapsed"])
+
+
+def test_rolling_restart_with_failures(simulation):
+    """The failed restarts should be retried, each retry adding its latency to the total."""
+    simulation.failure_rates["remote.run_sync"] = 0.3
+    runner = get_runner(simulation, "restart_daemons")
+    assert runner.run() == 0
+
+    report = simulation.report("SREBatchRunnerBase rolling restart, 30% failures")
+    failures = report["failures"]["remote.run_sync"]
+    assert failures > 0
+    assert report["calls"]["remote.run_sync"] == 4 + failures
+
+
+def test_rolling_restart_concurrent_groups(simulation):
+    """The datacenters should be restarted at the same time, taking as long as a single datacenter."""
+    hosts = ",".join(f"bench[{index}001-{index}002].{dc}.wmnet" for index, dc in enumerate(DATACENTERS, start=1))
+    runner = get_runner(simulation, "restart_daemons", hosts=hosts, batchsize=1, concurrent_groups=True)
+    assert runner.run() == 0
+
+    batch = (simulation.latency("alerting.downtimed") + simulation.latency("remote.run_sync")
+             + simulation.latency("icinga.wait_for_optimal"))
+    report = simulation.report("SREBatchRunnerBase rolling restart, 6 concurrent datacenters")
+    assert report["calls"]["remote.run_sync"] == 12
+    assert report["elapsed"] == pytest.approx(2 * batch + 60)
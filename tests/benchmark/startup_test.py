@@ -0,0 +1,60 @@
+"""Startup benchmark: import each cookbook module in a fresh interpreter, as listing or running a cookbook does."""
+import json
+import os
+import pathlib
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pkgutil import iter_modules
+
+from setuptools import find_packages
+
+DEFERRED_IMPORTS = ("aiohttp", "gitlab", "scapy", "transferpy")
+"""The slow to import dependencies that the cookbooks must import only when they are run."""
+BASELINE = "spicerack"
+"""The module imported by every cookbook, to compare the cookbooks' own import cost against."""
+# The peak RSS is read from VmHWM as, unlike ru_maxrss, it is not inherited across exec from the pytest process
+IMPORT_SCRIPT = """
+import importlib, json, re, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+with open("/proc/self/status", encoding="utf-8") as status:
+    rss = int(re.search(r"VmHWM:\\s+(\\d+) kB", status.read()).group(1))
+print(json.dumps({
+    "seconds": seconds,
+    "rss": rss,
+    "imported": sorted(name for name in sys.argv[2:] if name in sys.modules),
+}))
+"""
+
+
+def get_modules():
+    """Collect all the cookbook packages and modules."""
+    base_path = pathlib.Path(os.getcwd()) / "cookbooks"
+    modules = set()
+    for package in find_packages(base_path):
+        modules.add(f"cookbooks.{package}")
+        for module_info in iter_modules([str(base_path / package.replace(".", "/"))]):
+            if not module_info.ispkg:
+                modules.add(f"cookbooks.{package}.{module_info.name}")
+
+    return sorted(modules)
+
+
+def import_module(module):
+    """Import the module in a fresh interpreter, returning its import time, peak RSS and deferred imports."""
+    process = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT, module, *DEFERRED_IMPORTS], check=False,
+                             capture_output=True, text=True, env={**os.environ, "PYTHONPATH": os.getcwd()})
+    if process.returncode:
+        return {"module": module, "error": process.stderr.strip().splitlines()[-1]}
+
+    return {"module": module, **json.loads(process.stdout)}
+
+
+def test_startup(startup_reports):
+    """No cookbook should import the slow dependencies that are needed only when it is run."""
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        startup_reports.extend(executor.map(import_module, [BASELINE, *get_modules()]))
+
+    assert not {report["module"]: report["imported"] for report in startup_reports if report.get("imported")}
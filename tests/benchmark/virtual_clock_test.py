@@ -0,0 +1,34 @@
+"""Tests of the virtual clock of the benchmark harness."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+def test_sleep_takes_no_real_time(simulation):
+    """Sleeping should only move the virtual clock."""
+    start = time.perf_counter()
+    time.sleep(3600)
+    assert simulation.elapsed == 3600
+    assert time.perf_counter() - start < 1
+
+
+@pytest.mark.parametrize("max_workers, expected", ((3, 20), (1, 35)))
+def test_executor_tasks(simulation, max_workers, expected):
+    """Tasks running at the same time should take as long as the slowest one, queued tasks should wait."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(time.sleep, seconds) for seconds in (10, 20, 5)]
+        for future in futures:
+            future.result()
+
+    assert simulation.elapsed == expected
+
+
+def test_thread_join(simulation):
+    """Joining a thread should move the clock to the time the thread completed."""
+    time.sleep(5)
+    thread = threading.Thread(target=time.sleep, args=(10,))
+    thread.start()
+    thread.join()
+    assert simulation.elapsed == 15
@@ -0,0 +1,96 @@
+"""Unit tests for the sre.cdn cache warmth gated grace period."""
+
+import json
+from argparse import Namespace
+from logging import getLogger
+from unittest import mock
+
+import pytest
+
+from cookbooks.sre import StageTimeline
+from cookbooks.sre.cdn import CacheStats, CDNBatchRunnerBase
+
+HOST = "cp1001.eqiad.wmnet"
+
+
+class Runner(CDNBatchRunnerBase):
+    """A CDN runner for the tests."""
+
+    allowed_aliases = ["cp"]
+
+
+def varnishstat(hits, misses, objects):
+    """Return a mocked varnishstat output in the Varnish 7 format."""
+    output = mock.MagicMock()
+    output.message.return_value = json.dumps({"version": 1, "counters": {
+        "MAIN.cache_hit": {"value": hits},
+        "MAIN.cache_miss": {"value": misses},
+        "MAIN.n_object": {"value": objects},
+    }}).encode()
+    return [(mock.MagicMock(__iter__=lambda _: iter([HOST])), output)]
+
+
+@pytest.fixture(name="runner")
+def fixture_runner():
+    """Return a runner with a baseline of 90% hit ratio and 1000 objects."""
+    runner = Runner.__new__(Runner)
+    runner._args = Namespace(grace_sleep=600, warmth_fraction=0.9)  # pylint: disable=protected-access
+    runner._spicerack = mock.MagicMock(dry_run=False)  # pylint: disable=protected-access
+    runner.logger = getLogger(__name__)
+    runner.timeline = StageTimeline("test")
+    runner._warmth_baseline = {HOST: CacheStats(hits=900, misses=100, objects=1000)}  # pylint: disable=protected-access
+    return runner
+
+
+@pytest.mark.parametrize("previous, expected", (
+    (None, 0.5),
+    (CacheStats(hits=40, misses=10, objects=10), 0.2),
+    (CacheStats(hits=80, misses=10, objects=10), 0.5),  # The counters were reset
+    (CacheStats(hits=50, misses=50, objects=10), None),
+))
+def test_cache_stats_hit_ratio(previous, expected):
+    """It should return the hit ratio since the previous snapshot, if still valid."""
+    assert CacheStats(hits=50, misses=50, objects=10).hit_ratio(previous) == expected
+
+
+@mock.patch("cookbooks.sre.cdn.time")
+def test_wait_for_grace_period_warm(mocked_time, runner, caplog):
+    """It should stop waiting as soon as both the hit ratio and the number of objects are back to the baseline."""
+    mocked_time.monotonic.side_effect = [0, 0, 60, 60, 120, 120, 180]
+    hosts = mock.MagicMock(hosts=[HOST])
+    hosts.run_sync.side_effect = [
+        varnishstat(50, 50, 100),  # Cold
+        varnishstat(140, 60, 850),  # The hit ratio since the previous poll is 0.9, the objects are still cold
+        varnishstat(225, 65, 960),  # Both warm
+    ]
+
+    with caplog.at_level("INFO"):
+        runner.wait_for_grace_period(hosts)
+
+    assert hosts.run_sync.call_count == 3
+    assert mocked_time.sleep.call_args_list == [mock.call(60)] * 3
+    assert "hit ratio 0.500 (target 0.810), objects 100 (target 900): cold" in caplog.text
+    assert "frontend caches warm after 180s out of at most 600 seconds" in caplog.text
+
+
+@mock.patch("cookbooks.sre.cdn.time")
+def test_wait_for_grace_period_upper_bound(mocked_time, runner, caplog):
+    """It should stop waiting after --grace-sleep seconds if the caches are still cold."""
+    mocked_time.monotonic.side_effect = [0, 0, 550, 550, 600, 600]
+    hosts = mock.MagicMock(hosts=[HOST])
+    hosts.run_sync.return_value = varnishstat(10, 90, 10)
+
+    with caplog.at_level("INFO"):
+        runner.wait_for_grace_period(hosts)
+
+    assert mocked_time.sleep.call_args_list == [mock.call(60), mock.call(50)]
+    assert "upper bound of 600 seconds reached" in caplog.text
+
+
+def test_wait_for_grace_period_no_baseline(runner):
+    """It should sleep for --grace-sleep seconds if the baseline is not available."""
+    runner._warmth_baseline = {}  # pylint: disable=protected-access
+    with mock.patch.object(runner, "_sleep") as mocked_sleep:
+        runner.wait_for_grace_period(mock.MagicMock(hosts=[HOST]))
+
+    mocked_sleep.assert_called_once_with(600)
@@ -0,0 +1,63 @@
+"""Unit tests for the sre.cdn.transfer-purged-positions cookbook."""
+import importlib
+from argparse import Namespace
+from unittest import mock
+
+import pytest
+from cumin import NodeSet
+
+module = importlib.import_module("cookbooks.sre.cdn.transfer-purged-positions")
+
+DESCRIBE_OUTPUT = b"""
+Consumer group 'cp1001' has no active members.
+
+GROUP           TOPIC                      PARTITION  CURRENT-OFFSET  LOG-END-OFFSET  LAG             CONSUMER-ID HOST
+cp1001          eqiad.resource-purge       0          1500            1510            10              -           -
+cp1001          codfw.resource-purge       0          300             300             0               -           -
+
+Consumer group 'cp1002' has no active members.
+
+GROUP           TOPIC                      PARTITION  CURRENT-OFFSET  LOG-END-OFFSET  LAG             CONSUMER-ID HOST
+cp1002          eqiad.resource-purge       0          {offset}        1510            -               -           -
+"""
+
+
+@pytest.fixture(name="runner")
+def fixture_runner():
+    """Return a runner on two cache hosts."""
+    spicerack = mock.MagicMock(dry_run=False)
+    spicerack.remote.return_value.query.return_value.hosts = NodeSet("cp[1001-1002].eqiad.wmnet")
+    args = Namespace(alias="cp-text_eqiad", query=None, action="custom", batchsize=2, grace_sleep=30, max_failed=1,
+                     reason="move purged", task_id=None, puppet_reason="T12345", dc_to="eqiad",
+                     concurrent_groups=False)
+    with mock.patch("cookbooks.sre.ensure_shell_is_durable"):
+        runner = module.TransferPurgedOffsetsRunner(args, spicerack)
+
+    runner.kafka_host = mock.MagicMock()
+    return runner
+
+
+def describe(offset):
+    """Return the mocked result of describing the consumer groups offsets."""
+    output = mock.MagicMock()
+    output.message.return_value = DESCRIBE_OUTPUT.replace(b"{offset}", offset.encode())
+    return [(NodeSet("kafka-main1001.eqiad.wmnet"), output)]
+
+
+def test_group_action_resets_all_groups_at_once(runner):
+    """It should reset the offsets of all the consumer groups in a single command and verify them."""
+    runner.kafka_host.run_sync.side_effect = [[], describe("1500")]
+    runner.group_action(0, 1)
+
+    assert runner.kafka_host.run_sync.call_args_list[0] == mock.call(
+        "kafka-consumer-groups --bootstrap-server localhost:9092 --group cp1001 --group cp1002 --reset-offsets "
+        "--to-latest --all-topics --execute")
+    assert runner.kafka_host.run_sync.call_args_list[1][0] == (
+        "kafka-consumer-groups --bootstrap-server localhost:9092 --group cp1001 --group cp1002 --describe --offsets",)
+
+
+def test_verify_offsets_missing(runner):
+    """It should raise if any consumer group has no committed offset."""
+    runner.kafka_host.run_sync.return_value = describe("-")
+    with pytest.raises(RuntimeError, match=r"consumer groups: \['cp1002'\]"):
+        runner._verify_offsets(["cp1001", "cp1002"])  # pylint: disable=protected-access
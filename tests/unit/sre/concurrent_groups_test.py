@@ -0,0 +1,128 @@
+"""Tests of the concurrent execution of independent groups of hosts of the batch runners."""
+import threading
+from argparse import Namespace
+from unittest import mock
+
+import pytest
+from cumin import NodeSet
+from wmflib.interactive import confirm_on_failure
+
+from cookbooks.sre import SREBatchBase, SREBatchRunnerBase
+
+HOSTS = "cp[1001-1002].eqiad.wmnet,cp[2001-2002].codfw.wmnet,cp[3001-3002].esams.wmnet"
+
+
+def get_hosts(hosts):
+    """Return mocked RemoteHosts for the given hosts, split in batches of one host."""
+    remote_hosts = mock.MagicMock(hosts=NodeSet(hosts))
+    remote_hosts.split.side_effect = lambda _: [get_hosts(host) for host in NodeSet(hosts)]
+    return remote_hosts
+
+
+class Restart(SREBatchBase):
+    """A cookbook restarting a daemon, optionally one group of hosts at a time."""
+
+    def get_runner(self, args):
+        """Required by the base class."""
+
+
+class RestartRunner(SREBatchRunnerBase):
+    """A runner restarting a daemon one host at a time, failing on the hosts in failing_hosts."""
+
+    allowed_aliases = ["cp"]
+
+    def __init__(self, args, spicerack, failing_hosts=""):
+        """Initialize the runner."""
+        self.failing_hosts = NodeSet(failing_hosts)
+        self.threads = set()
+        self.barrier = threading.Barrier(3, timeout=5)
+        super().__init__(args, spicerack)
+
+    def _hosts(self):
+        """Return all the hosts as a single host group."""
+        return [get_hosts(HOSTS)]
+
+    def action(self, hosts):
+        """Fail on the failing hosts, waiting for the other groups on the first batch."""
+        self.threads.add(threading.current_thread().name)
+        if hosts.hosts[0].split(".")[0].endswith("001"):  # The first batch of each group
+            self.barrier.wait()
+        if hosts.hosts & self.failing_hosts:
+            raise RuntimeError(f"failed on {hosts}")
+        self.results.success(hosts.hosts)
+
+
+@pytest.fixture(name="spicerack")
+def fixture_spicerack():
+    """Return a mocked Spicerack that resolves the queries of single groups."""
+    spicerack = mock.MagicMock()
+    spicerack.remote.return_value.query.side_effect = lambda query: get_hosts(query[2:-1])
+    with mock.patch("cookbooks.sre.ensure_shell_is_durable"):
+        yield spicerack
+
+
+def get_args(**kwargs):
+    """Return the parsed arguments."""
+    return Namespace(**{"alias": "cp", "query": None, "action": "restart_daemons", "batchsize": 1, "grace_sleep": 0,
+                        "max_failed": 1, "reason": "restart", "task_id": None, "concurrent_groups": True, **kwargs})
+
+
+def test_concurrent_groups(spicerack):
+    """It should run the batches of each datacenter in its own thread, all at the same time."""
+    runner = RestartRunner(get_args(), spicerack)
+    assert runner.run() == 0
+
+    assert len(runner.threads) == 3
+    assert runner.results.successful == NodeSet(HOSTS)
+    assert {stage.name for stage in runner.timeline.stages} >= {"group codfw", "group eqiad", "group esams"}
+
+
+def test_concurrent_groups_failures(spicerack):
+    """It should stop only the group that reached --max-failed and merge the results of all the groups."""
+    runner = RestartRunner(get_args(), spicerack, failing_hosts="cp2001.codfw.wmnet")
+    assert runner.run() == 1
+
+    assert runner.results.failed == NodeSet("cp2001.codfw.wmnet")
+    assert runner.results.successful == NodeSet("cp[1001-1002].eqiad.wmnet,cp[3001-3002].esams.wmnet")
+
+
+class PromptRunner(RestartRunner):
+    """A runner failing the first batch of each group, asking the operator what to do."""
+
+    def action(self, hosts):
+        """Fail the first batch of each group, at the same time."""
+        if hosts.hosts[0].split(".")[0].endswith("001"):
+            confirm_on_failure(self.fail_batch)
+        self.results.success(hosts.hosts)
+
+    def fail_batch(self):
+        """Fail once all the groups are running their first batch."""
+        self.barrier.wait()
+        raise RuntimeError("failed")
+
+
+@pytest.mark.parametrize("supported", (False, True))
+def test_concurrent_groups_opt_in(supported):
+    """It should add the --concurrent-groups option only to the cookbooks that support it."""
+    with mock.patch.object(Restart, "supports_concurrent_groups", supported):
+        parser = Restart(mock.MagicMock()).argument_parser()
+
+    assert ("--concurrent-groups" in parser.format_help()) is supported
+
+
+def test_concurrent_groups_prompts(spicerack):
+    """It should ask the operator one group at a time, also from wmflib's confirm_on_failure()."""
+    asking = threading.Lock()
+
+    def ask_input(_message, _choices):
+        assert asking.acquire(blocking=False), "Concurrent prompts"
+        threading.Event().wait(0.02)
+        asking.release()
+        return "skip"
+
+    runner = PromptRunner(get_args(), spicerack)
+    with mock.patch("wmflib.interactive.ask_input", side_effect=ask_input) as mocked_ask_input:
+        assert runner.run() == 0
+        assert mocked_ask_input.call_count == 3
+
+    assert runner.results.successful == NodeSet(HOSTS)
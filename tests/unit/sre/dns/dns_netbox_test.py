@@ -0,0 +1,141 @@
+"""sre.dns.netbox tests."""
+import threading
+from datetime import datetime, timezone
+from unittest import mock
+
+import pytest
+from cumin import NodeSet
+from spicerack.remote import RemoteExecutionError
+
+from cookbooks.sre.dns import netbox
+
+SHA1 = "0123456789abcdef0123456789abcdef01234567"
+AUTHDNS = ["dns1004.wikimedia.org", "dns2004.wikimedia.org"]
+
+
+def get_output(hosts, message):
+    """Return a mocked run_sync() result for the given hosts."""
+    output = mock.MagicMock()
+    output.message.return_value = message.encode()
+    return (NodeSet(hosts), output)
+
+
+def get_args(**kwargs):
+    """Return the parsed arguments with the given options."""
+    options = [f"--{name.replace('_', '-')}" for name, value in kwargs.items() if value]
+    return netbox.argument_parser().parse_args(options + ["Update records"])
+
+
+@pytest.fixture(name="spicerack")
+def fixture_spicerack():
+    """Return a mocked Spicerack with a Netbox master, a passive Netbox host and two pooled authdns hosts."""
+    spicerack = mock.MagicMock(dry_run=False)
+    netbox_host = mock.MagicMock(hosts=NodeSet("netbox1003.eqiad.wmnet"))
+    netbox_host.__str__.return_value = "netbox1003.eqiad.wmnet"
+    netbox_host.run_sync.return_value = [
+        get_output("netbox1003.eqiad.wmnet", f"{SHA1} 2026-10-18T10:00:00+00:00")]
+    spicerack.netbox_master_host.return_value = netbox_host
+
+    hosts = {
+        netbox.NETBOX_HOSTS_QUERY: mock.MagicMock(hosts=NodeSet("netbox[1003,2003].eqiad.wmnet")),
+        "netbox2003.eqiad.wmnet": mock.MagicMock(hosts=NodeSet("netbox2003.eqiad.wmnet")),
+        ",".join(AUTHDNS): mock.MagicMock(hosts=NodeSet(",".join(AUTHDNS))),
+    }
+    spicerack.remote.return_value.query.side_effect = hosts.__getitem__
+    spicerack.hosts = hosts
+    conftool_hosts = []
+    for host in AUTHDNS:
+        conftool_host = mock.MagicMock()
+        conftool_host.name = host
+        conftool_hosts.append(conftool_host)
+    spicerack.confctl.return_value.filter_objects.return_value = conftool_hosts
+    spicerack.netbox.return_value.api.core.object_changes.filter.return_value = []
+    spicerack.run_cookbook.return_value = 0
+    return spicerack
+
+
+def test_get_netbox_changes(spicerack):
+    """It should look for the changes of all the relevant object types since before the last commit."""
+    change = mock.MagicMock(time="2026-10-18T10:05:00", changed_object_type="ipam.ipaddress",
+                            object_repr="10.0.0.1/24")
+    change.action.value = "update"
+    spicerack.netbox.return_value.api.core.object_changes.filter.return_value = [change]
+
+    changes = netbox.get_netbox_changes(spicerack, datetime(2026, 10, 18, 10, 0, tzinfo=timezone.utc))
+
+    assert changes == ["2026-10-18T10:05:00 update ipam.ipaddress 10.0.0.1/24"]
+    spicerack.netbox.return_value.api.core.object_changes.filter.assert_called_once_with(
+        changed_object_type=list(netbox.DNS_OBJECT_TYPES), time_after="2026-10-18T09:50:00+00:00")
+
+
+def test_run_delta_skips_when_deployed(spicerack):
+    """It should do nothing without Netbox changes if the last commit is deployed on all the authdns hosts."""
+    authdns = spicerack.hosts[",".join(AUTHDNS)]
+    authdns.run_sync.return_value = [get_output(",".join(AUTHDNS), f"{SHA1}\n")]
+
+    assert netbox.run(get_args(delta=True), spicerack) == 0
+
+    assert spicerack.netbox_master_host.return_value.run_sync.call_count == 1  # Only the last commit lookup
+    assert authdns.run_sync.call_args.args[0].startswith(f"cat {netbox.AUTHDNS_NETBOX_DEPLOYED_PATH}")
+    spicerack.run_cookbook.assert_not_called()
+
+
+def test_run_delta_deploys_where_outdated(spicerack):
+    """It should deploy the last commit without generating the records if an authdns host didn't deploy it."""
+    authdns = spicerack.hosts[",".join(AUTHDNS)]
+    authdns.run_sync.return_value = [get_output(AUTHDNS[0], f"{SHA1}\n"), get_output(AUTHDNS[1], "")]
+
+    assert netbox.run(get_args(delta=True), spicerack) == 0
+
+    assert spicerack.netbox_master_host.return_value.run_sync.call_count == 1  # No generation
+    commands = authdns.run_sync.call_args.args
+    assert f"merge --ff-only {SHA1}" in commands[0]
+    assert commands[1].endswith(f"--deploy && echo {SHA1} > {netbox.AUTHDNS_NETBOX_DEPLOYED_PATH}")
+    spicerack.run_cookbook.assert_called_once()
+
+
+def test_run_delta_generates_on_changes(spicerack):
+    """It should generate the records as usual if there are Netbox changes."""
+    spicerack.netbox.return_value.api.core.object_changes.filter.return_value = [mock.MagicMock()]
+    netbox_host = spicerack.netbox_master_host.return_value
+    netbox_host.run_sync.side_effect = [
+        [get_output("netbox1003.eqiad.wmnet", f"{SHA1} 2026-10-18T10:00:00+00:00")],
+        [get_output("netbox1003.eqiad.wmnet", 'METADATA: {"no_changes": true}')],
+    ]
+
+    assert netbox.run(get_args(delta=True), spicerack) == 0
+    assert "generate_dns_snippets.py commit" in str(netbox_host.run_sync.call_args.args[0])
+
+
+def test_update_repositories_concurrently(spicerack):
+    """It should update the passive copies and authdns while syncing the hiera data, retrying the failed updates."""
+    barrier = threading.Barrier(3, timeout=5)
+    passive = spicerack.hosts["netbox2003.eqiad.wmnet"]
+    authdns = spicerack.hosts[",".join(AUTHDNS)]
+
+    def fail_once(*_args, **_kwargs):
+        barrier.wait()
+        raise RemoteExecutionError(1, "fetch failed", iter(()))
+
+    def sync_hiera(*_args):
+        barrier.wait()  # The updates run while the hiera sync is waiting for the operator
+        return 0
+
+    passive.run_sync.side_effect = fail_once
+    authdns.run_sync.side_effect = lambda *_args, **_kwargs: barrier.wait()
+    spicerack.run_cookbook.side_effect = sync_hiera
+
+    with mock.patch("cookbooks.sre.dns.netbox.confirm_on_failure") as mocked_confirm:
+        assert netbox.update_repositories(get_args(), spicerack, SHA1, mock.MagicMock()) == 0
+
+    mocked_confirm.assert_called_once_with(
+        passive.run_sync,
+        f'runuser -u netbox -- git -C "{netbox.NETBOX_BARE_REPO_PATH}" fetch netbox1003.eqiad.wmnet master:master')
+
+
+def test_update_repositories_skip_authdns_update(spicerack):
+    """It should only update the authdns copies of the repository with --skip-authdns-update."""
+    authdns = spicerack.hosts[",".join(AUTHDNS)]
+    netbox.update_repositories(get_args(skip_authdns_update=True), spicerack, SHA1, mock.MagicMock())
+
+    assert len(authdns.run_sync.call_args.args) == 1
@@ -0,0 +1,99 @@
+"""sre.gitlab.failover tests."""
+from argparse import Namespace
+from unittest import mock
+
+import pytest
+from spicerack.remote import RemoteExecutionError
+
+from cookbooks.sre.gitlab import failover
+
+MODULE = "cookbooks.sre.gitlab.failover"
+
+
+@pytest.fixture(name="runner")
+def fixture_runner():
+    """Return a pipelined failover runner with all the interactive and remote calls mocked."""
+    spicerack = mock.MagicMock(dry_run=False)
+    spicerack.remote.return_value.query.side_effect = lambda query: mock.MagicMock(
+        name=query.split(".")[0], hosts=[query])
+    with mock.patch(f"{MODULE}.ensure_shell_is_durable"), \
+            mock.patch(f"{MODULE}.get_secret", return_value="token"), \
+            mock.patch(f"{MODULE}.ask_confirmation"), \
+            mock.patch(f"{MODULE}.get_disk_usage_for_path", return_value=10), \
+            mock.patch(f"{MODULE}.get_gitlab_url",
+                       side_effect=["https://gitlab.wikimedia.org", "https://gitlab-replica.wikimedia.org"]):
+        runner = failover.FailoverRunner(
+            Namespace(switch_from_host="gitlab1003", switch_to_host="gitlab2002", task_id=None, pipelined=True),
+            spicerack)
+
+    with mock.patch(f"{MODULE}.ask_confirmation"), \
+            mock.patch(f"{MODULE}.lock_backups_on_host"), \
+            mock.patch(f"{MODULE}.unlock_backups_on_host"), \
+            mock.patch(f"{MODULE}.get_checksum_for_path", return_value="abc"):
+        yield runner
+
+
+def test_argument_parser_sequential_by_default():
+    """It should run the sequential failover unless --pipelined is passed."""
+    parser = failover.Failover(mock.MagicMock()).argument_parser()
+    args = parser.parse_args(["--switch-from-host", "gitlab1003", "--switch-to-host", "gitlab2002"])
+    assert not args.pipelined
+
+
+def test_get_component_options():
+    """It should skip all the backup tasks that are not part of the component."""
+    options = failover.FailoverRunner.get_component_options("repositories")
+    assert options.startswith("BACKUP=failover_repositories SKIP=db,uploads,")
+    assert "repositories" not in options.split("SKIP=")[1]
+
+
+def test_failover_pipelined_confirms_role_after_transfers(runner):
+    """It should ask for the primary role change only once all the components were transferred, then restore."""
+    events = []
+    runner.create_component_backup = lambda component: events.append(f"backup {component}") or component
+    runner.transfer_file = lambda backup_file: events.append(f"transfer {backup_file}")
+    runner.restore_component_backup = lambda component: events.append(f"restore {component}")
+    runner.confirm_primary_role = lambda: events.append("confirm_primary_role")
+
+    runner.failover_pipelined()
+
+    confirm = events.index("confirm_primary_role")
+    assert sorted(events[:confirm]) == sorted(
+        [f"backup {component}" for component in failover.BACKUP_COMPONENTS]
+        + [f"transfer {component}" for component in failover.BACKUP_COMPONENTS])
+    assert events[confirm + 1:] == [f"restore {component}" for component in failover.BACKUP_COMPONENTS]
+
+
+def test_failover_pipelined_transfer_failure(runner):
+    """It should not ask for the primary role change nor restore anything if any transfer failed."""
+    runner.create_component_backup = lambda component: component
+    runner.transfer_file = mock.MagicMock(side_effect=[None, RuntimeError("Checksum mismatch"), None])
+    runner.restore_component_backup = mock.MagicMock()
+
+    with pytest.raises(RuntimeError, match="Checksum mismatch"):
+        runner.failover_pipelined()
+
+    assert runner.safe_rollback
+    runner.restore_component_backup.assert_not_called()
+    runner.spicerack.puppet.return_value.run.assert_not_called()
+
+
+@mock.patch("wmflib.decorators.time.sleep")
+def test_transfer_file_retries_on_checksum_mismatch(_mocked_sleep, runner):
+    """It should remove the corrupted file and start the transfer over on a checksum mismatch."""
+    with mock.patch(f"{MODULE}.get_checksum_for_path", side_effect=["abc", "def", "abc", "abc"]):
+        runner.transfer_file("failover_db_gitlab_backup.tar")
+
+    assert runner.switch_from_host.run_sync.call_count == 2
+    runner.switch_to_host.run_sync.assert_called_once_with(
+        "rm -f /srv/gitlab-backup/failover_db_gitlab_backup.tar", print_progress_bars=False)
+
+
+@mock.patch("wmflib.decorators.time.sleep")
+def test_transfer_file_gives_up(_mocked_sleep, runner):
+    """It should give up after all the tries."""
+    runner.switch_from_host.run_sync.side_effect = RemoteExecutionError(1, "rsync failed", iter(()))
+    with pytest.raises(RemoteExecutionError):
+        runner.transfer_file("failover_db_gitlab_backup.tar")
+
+    assert runner.switch_from_host.run_sync.call_count == failover.TRANSFER_TRIES
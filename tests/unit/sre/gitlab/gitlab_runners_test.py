@@ -0,0 +1,29 @@
+"""sre.gitlab runners tests."""
+from unittest import mock
+
+import gitlab
+import pytest
+
+from cookbooks.sre.gitlab import unpause_runners
+
+
+def test_unpause_runners_retries_on_gitlab_errors():
+    """It should retry to unpause the runners while the GitLab API is not available."""
+    runner = mock.MagicMock(id=1)
+    runner.save.side_effect = [gitlab.exceptions.GitlabHttpError("502 Bad Gateway"), None]
+    with mock.patch("wmflib.decorators.time.sleep") as mocked_sleep:
+        unpause_runners([runner], dry_run=False)
+
+    assert runner.save.call_count == 2
+    assert runner.paused is False
+    mocked_sleep.assert_called_once_with(10.0)
+
+
+def test_unpause_runners_other_errors():
+    """It should not retry on errors other than the GitLab API ones."""
+    runner = mock.MagicMock(id=1)
+    runner.save.side_effect = RuntimeError("unexpected")
+    with mock.patch("wmflib.decorators.time.sleep") as mocked_sleep, pytest.raises(RuntimeError, match="unexpected"):
+        unpause_runners([runner], dry_run=False)
+
+    mocked_sleep.assert_not_called()
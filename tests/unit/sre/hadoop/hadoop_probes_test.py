@@ -0,0 +1,135 @@
+"""Unit tests for the helpers probing the state of the Hadoop daemons."""
+from datetime import datetime, timezone
+from unittest import mock
+
+import pytest
+from cumin import NodeSet
+from spicerack.remote import RemoteExecutionError
+
+from cookbooks.sre.hadoop import (are_units_stopped, count_yarn_containers, get_hdfs_namenode_state,
+                                  get_hdfs_report, is_hdfs_safemode_off, wait_until)
+
+HDFS_REPORT = """Configured Capacity: 100 (100 B)
+Under replicated blocks: 12
+-------------------------------------------------
+Live datanodes (2):
+
+Name: 10.64.0.1:50010 (an-worker1001.eqiad.wmnet)
+Hostname: an-worker1001.eqiad.wmnet
+Last Block Report: Mon Oct 12 10:20:30 UTC 2026
+
+Name: 10.64.0.2:50010 (an-worker1002.eqiad.wmnet)
+Hostname: an-worker1002.eqiad.wmnet
+Last Block Report: Never
+"""
+
+
+def get_remote_hosts(*messages):
+    """Return mocked RemoteHosts whose run_sync() returns the given messages, grouped by host."""
+    results = []
+    for hosts, message in messages:
+        output = mock.MagicMock()
+        output.message.return_value = message.encode()
+        results.append((NodeSet(hosts), output))
+
+    remote_hosts = mock.MagicMock()
+    remote_hosts.run_sync.return_value = results
+    return remote_hosts
+
+
+def get_failing_remote_hosts():
+    """Return mocked RemoteHosts whose commands fail."""
+    remote_hosts = mock.MagicMock()
+    remote_hosts.run_sync.side_effect = RemoteExecutionError(1, "failed", iter(()))
+    return remote_hosts
+
+
+@pytest.fixture(name="clock")
+def fixture_clock():
+    """Mock the clock, making each sleep advance it."""
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    with mock.patch("cookbooks.sre.hadoop.time.monotonic", side_effect=lambda: now[0]), \
+            mock.patch("cookbooks.sre.hadoop.time.sleep", side_effect=sleep) as mocked_sleep:
+        yield mocked_sleep
+
+
+def test_wait_until_met_immediately(clock):
+    """It should return as soon as the condition holds, without sleeping."""
+    assert wait_until(lambda: True, "the test", 60)
+    clock.assert_not_called()
+
+
+def test_wait_until_met_after_probes(clock):
+    """It should probe at every interval until the condition holds."""
+    check = mock.MagicMock(side_effect=[False, False, True])
+    assert wait_until(check, "the test", 60, interval=10)
+    assert clock.call_args_list == [mock.call(10), mock.call(10)]
+
+
+def test_wait_until_timeout(clock, caplog):
+    """It should give up with a warning once the timeout expired, never sleeping past it."""
+    assert not wait_until(lambda: False, "the test", 25, interval=10)
+    assert clock.call_args_list == [mock.call(10), mock.call(10), mock.call(5)]
+    assert "Timed out after 25 seconds waiting for the test" in caplog.text
+
+
+def test_get_hdfs_namenode_state():
+    """It should return the stripped state, or an empty string if the Namenode is not reachable."""
+    assert get_hdfs_namenode_state(get_remote_hosts(("an-master1001", "standby\n")), "an-master1001") == "standby"
+    assert get_hdfs_namenode_state(get_failing_remote_hosts(), "an-master1001") == ""
+
+
+@pytest.mark.parametrize("message, expected", (
+    ("Safe mode is OFF in an-master1001\nSafe mode is OFF in an-master1002", True),
+    ("Safe mode is OFF in an-master1001\nSafe mode is ON in an-master1002", False),
+    ("Connection refused", False),
+))
+def test_is_hdfs_safemode_off(message, expected):
+    """It should return whether all the Namenodes report the safe mode as off."""
+    assert is_hdfs_safemode_off(get_remote_hosts(("an-master1001", message))) is expected
+
+
+def test_is_hdfs_safemode_off_unreachable():
+    """It should return False if the Namenodes can't be queried."""
+    assert not is_hdfs_safemode_off(get_failing_remote_hosts())
+
+
+def test_get_hdfs_report():
+    """It should parse the live Datanodes and their last block report."""
+    report = get_hdfs_report(get_remote_hosts(("an-master1001", HDFS_REPORT)))
+    assert report.live_datanodes == 2
+    assert report.last_block_reports == {
+        "an-worker1001.eqiad.wmnet": datetime(2026, 10, 12, 10, 20, 30, tzinfo=timezone.utc),
+        "an-worker1002.eqiad.wmnet": None,
+    }
+
+
+@pytest.mark.parametrize("remote_hosts", (get_remote_hosts(("an-master1001", "garbage")), get_failing_remote_hosts()))
+def test_get_hdfs_report_unavailable(remote_hosts):
+    """It should return None if the report can't be retrieved or parsed."""
+    assert get_hdfs_report(remote_hosts) is None
+
+
+def test_count_yarn_containers():
+    """It should count the containers of all the hosts, applying each output to all the hosts of its group."""
+    remote_hosts = get_remote_hosts(("an-worker[1001-1002]", "3\n"), ("an-worker1003", "1\n"))
+    assert count_yarn_containers(remote_hosts) == 7
+
+
+@pytest.mark.parametrize("remote_hosts", (get_remote_hosts(("an-worker1001", "garbage")), get_failing_remote_hosts()))
+def test_count_yarn_containers_unavailable(remote_hosts):
+    """It should return -1 if the containers can't be counted."""
+    assert count_yarn_containers(remote_hosts) == -1
+
+
+def test_are_units_stopped():
+    """It should check that none of the units is active, failing the command otherwise."""
+    remote_hosts = get_remote_hosts()
+    assert are_units_stopped(remote_hosts, "hadoop-hdfs-namenode", "hadoop-hdfs-zkfc")
+    assert remote_hosts.run_sync.call_args.args[0] == (
+        "! systemctl is-active --quiet hadoop-hdfs-namenode hadoop-hdfs-zkfc")
+    assert not are_units_stopped(get_failing_remote_hosts(), "hadoop-hdfs-namenode")
@@ -0,0 +1,46 @@
+"""Unit tests for the waits of the Hadoop cookbooks on the state of the cluster."""
+import importlib
+from argparse import Namespace
+from datetime import datetime, timezone
+from unittest import mock
+
+import pytest
+from cumin import NodeSet
+
+from cookbooks.sre.hadoop import HDFSReport
+
+reboot_workers = importlib.import_module("cookbooks.sre.hadoop.reboot-workers")
+stop_cluster = importlib.import_module("cookbooks.sre.hadoop.stop-cluster")
+REBOOT_TIME = datetime(2026, 10, 12, 10, 0, tzinfo=timezone.utc)
+REPORTED = datetime(2026, 10, 12, 10, 5, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("live_datanodes, last_block_report, expected", (
+    (2, REPORTED, True),
+    (3, REPORTED, False),  # Another Datanode is not live yet
+    (2, datetime(2026, 10, 12, 9, 0, tzinfo=timezone.utc), False),  # No block report since the reboot
+    (None, REPORTED, True),  # The live Datanodes were unknown before the reboot
+))
+def test_datanodes_reported_since(live_datanodes, last_block_report, expected):
+    """It should wait for the Datanodes of the batch to report and for the live Datanodes to be back."""
+    runner = object.__new__(reboot_workers.RebootHadoopWorkersRunner)
+    runner.hadoop_master = mock.MagicMock()
+    report = HDFSReport(live_datanodes=2, last_block_reports={"an-worker1001.eqiad.wmnet": last_block_report})
+    batch = mock.MagicMock(hosts=NodeSet("an-worker1001.eqiad.wmnet"))
+    with mock.patch.object(reboot_workers, "get_hdfs_report", return_value=report):
+        assert runner._datanodes_reported_since(  # pylint: disable=protected-access
+            batch, REBOOT_TIME, live_datanodes) is expected
+
+
+@pytest.mark.parametrize("state, asked", (("active", False), ("standby", True), ("", True)))
+def test_stop_cluster_confirm_master_active(state, asked):
+    """It should ask the operator whether to continue if the master daemon is not active."""
+    spicerack = mock.MagicMock()
+    spicerack.remote.return_value.query.return_value.hosts = NodeSet("an-master1001.eqiad.wmnet")
+    runner = stop_cluster.StopHadoopRunner(Namespace(cluster="analytics"), spicerack)
+    get_state = mock.MagicMock(return_value=state)
+    with mock.patch.object(stop_cluster, "ask_confirmation") as mocked_ask_confirmation:
+        runner._confirm_master_active("HDFS Namenode", get_state)  # pylint: disable=protected-access
+
+    get_state.assert_called_once_with(runner.hadoop_master, "an-master1001-eqiad-wmnet")
+    assert mocked_ask_confirmation.called is asked
@@ -0,0 +1,113 @@
+"""sre.hosts.bmc-user-mgmt tests."""
+import importlib
+from argparse import Namespace
+from unittest import mock
+
+import pytest
+from spicerack.apiclient import APIClientResponseError
+from spicerack.redfish import RedfishError
+
+module = importlib.import_module("cookbooks.sre.hosts.bmc-user-mgmt")
+
+
+def get_response_error(status_code):
+    """Return a Redfish error caused by an HTTP response with the given status code."""
+    response = mock.MagicMock(status_code=status_code)
+    response.request.method = "get"
+    response.request.url = "https://bmc/redfish/v1"
+    try:
+        raise RedfishError("failed") from APIClientResponseError(response)
+    except RedfishError as error:
+        return error
+
+
+@pytest.fixture(name="sleep", autouse=True)
+def fixture_sleep():
+    """Do not actually sleep between the retries."""
+    with mock.patch("wmflib.decorators.time.sleep") as mocked_sleep:
+        yield mocked_sleep
+
+
+@pytest.mark.parametrize("error, calls", (
+    (get_response_error(503), 3),
+    (RedfishError("connection reset"), 3),
+    (get_response_error(401), 1),
+    (get_response_error(404), 1),
+))
+def test_redfish_call_retries(error, calls):
+    """It should retry only the transient failures, never the client errors that could lock an account out."""
+    func = mock.MagicMock(side_effect=error)
+    with pytest.raises(RedfishError):
+        module.redfish_call(func, "arg", key="value")
+
+    assert func.call_count == calls
+    func.assert_called_with("arg", key="value")
+
+
+def test_redfish_call_transient_then_success():
+    """It should return the result once a transient failure goes away."""
+    func = mock.MagicMock(side_effect=[get_response_error(500), "On"])
+    assert module.redfish_call(func) == "On"
+    assert func.call_count == 2
+
+
+@pytest.fixture(name="runner")
+def fixture_runner():
+    """Return a runner in check-only mode."""
+    spicerack = mock.MagicMock()
+    args = Namespace(query="host1001*", check_only=True, max_redfish_failures=1, concurrency=2)
+    with mock.patch.object(module, "ensure_shell_is_durable"):
+        runner = module.BMCUserMgmtRunner(args, spicerack)
+    runner.spicerack.netbox_server.return_value.as_dict.return_value = {
+        "is_virtual": False, "device_type": {"manufacturer": {"slug": "supermicro"}}}
+    return runner
+
+
+def get_redfish(accounts, valid_passwords, sessions=None):
+    """Return a factory of mocked Redfish sessions, working only with the given passwords."""
+    def redfish(_hostname, username, password):
+        session = mock.MagicMock()
+        session.find_accounts.return_value = accounts
+        if password not in valid_passwords:
+            session.get_power_state.side_effect = get_response_error(401)
+        session.username = username
+        if sessions is not None:
+            sessions.append(session)
+        return session
+
+    return redfish
+
+
+def test_check_host_up_to_date(runner):
+    """It should report no differences if the accounts and passwords are the expected ones."""
+    runner.spicerack.redfish.side_effect = get_redfish({"wmfroot": {}, "ADMIN": {}}, {"mgmt"})
+    assert runner._check_host("host1001.eqiad.wmnet", "mgmt", "mgmt") == (  # pylint: disable=protected-access
+        "success", [])
+
+
+def test_check_host_drift(runner):
+    """It should report the missing and extra accounts and the passwords to change, without changing them."""
+    sessions = []
+    runner.spicerack.redfish.side_effect = get_redfish({"ADMIN": {}, "root": {}}, {"mgmt"}, sessions)
+    status, drift = runner._check_host("host1001.eqiad.wmnet", "mgmt", "new")  # pylint: disable=protected-access
+
+    assert status == "success"
+    assert drift == ["wmfroot: missing", "root: present, to be removed", "ADMIN: password differs"]
+    for session in sessions:
+        assert {name.split("(")[0] for name, _, _ in session.mock_calls} <= {"get_power_state", "find_accounts"}
+
+
+def test_check_host_redfish_failure(runner):
+    """It should report the host as a Redfish failure if unable to log in with the current password."""
+    runner.spicerack.redfish.side_effect = get_redfish({}, set())
+    status, drift = runner._check_host("host1001.eqiad.wmnet", "mgmt", "mgmt")  # pylint: disable=protected-access
+
+    assert status == "fail_redfish"
+    assert drift[0].startswith("unable to retrieve the BMC accounts")
+
+
+def test_check_host_virtual(runner):
+    """It should skip the virtual hosts."""
+    runner.spicerack.netbox_server.return_value.as_dict.return_value = {"is_virtual": True}
+    assert runner._check_host("vm1001.eqiad.wmnet", "mgmt", "mgmt") == (  # pylint: disable=protected-access
+        None, [])
@@ -0,0 +1,97 @@
+"""Tests of the concurrent HTTP checks of the batch runners."""
+import threading
+from argparse import Namespace
+from unittest import mock
+
+import pytest
+from cumin import NodeSet
+from requests import ConnectionError as RequestsConnectionError
+
+from cookbooks.sre import HTTPCheck, SREBatchRunnerBase, run_http_checks
+
+HOSTS = NodeSet("cp[1001-1003].eqiad.wmnet")
+CHECK = HTTPCheck("http://{host}", expected_status=(301,), expected_reason="Moved Permanently")
+
+
+def get_session(responses):
+    """Return a mocked requests session returning the given responses per host, in order."""
+    barrier = threading.Barrier(len(responses), timeout=5)
+
+    def request(method, url, **kwargs):
+        assert method == "HEAD"
+        assert kwargs["allow_redirects"] is False
+        host = url.split("/")[-1]
+        if len(responses[host]) == 3:  # The first attempt runs on all the hosts at the same time
+            barrier.wait()
+        response = responses[host].pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return mock.MagicMock(status_code=response[0], reason=response[1])
+
+    session = mock.MagicMock()
+    session.request.side_effect = request
+    return session
+
+
+@mock.patch("cookbooks.sre.time.sleep")
+def test_run_http_checks_retries_only_failures(mocked_sleep, caplog):
+    """It should check all the hosts concurrently and retry only the failed ones until they pass."""
+    moved = (301, "Moved Permanently")
+    session = get_session({
+        "cp1001.eqiad.wmnet": [moved, moved, moved],
+        "cp1002.eqiad.wmnet": [(301, "TLS Redirect"), RequestsConnectionError("refused"), moved],
+        "cp1003.eqiad.wmnet": [RequestsConnectionError("refused"), moved, moved],
+    })
+    with caplog.at_level("INFO"):
+        results = run_http_checks(session, HOSTS, CHECK, attempts=3, delay=1)
+
+    assert all(result.passed for result in results.values())
+    assert [results[host].attempts for host in HOSTS] == [1, 3, 2]
+    assert session.request.call_count == 6
+    assert mocked_sleep.call_count == 2
+    assert "HTTP check http://{host} results" in caplog.text
+
+
+@mock.patch("cookbooks.sre.time.sleep")
+def test_run_http_checks_stops_when_all_passed(mocked_sleep):
+    """It should not retry nor sleep if the check passed on all the hosts."""
+    session = get_session({host: [(301, "Moved Permanently")] * 3 for host in HOSTS})
+    results = run_http_checks(session, HOSTS, CHECK)
+
+    assert session.request.call_count == 3
+    assert all(result.attempts == 1 for result in results.values())
+    mocked_sleep.assert_not_called()
+
+
+class Runner(SREBatchRunnerBase):
+    """A runner checking the hosts after restarting them."""
+
+    allowed_aliases = ["cp"]
+
+    def _hosts(self):
+        """Return all the hosts as a single host group."""
+        return [mock.MagicMock(hosts=HOSTS)]
+
+
+@pytest.mark.parametrize("dry_run", (False, True))
+@mock.patch("cookbooks.sre.time.sleep")
+def test_verify_http(_mocked_sleep, dry_run):
+    """It should raise with the hosts that are still failing after all the attempts, skipping it in dry-run."""
+    spicerack = mock.MagicMock(dry_run=dry_run)
+    spicerack.requests_session.return_value = get_session({
+        "cp1001.eqiad.wmnet": [(301, "Moved Permanently")] * 3,
+        "cp1002.eqiad.wmnet": [(503, "Service Unavailable")] * 3,
+        "cp1003.eqiad.wmnet": [(301, "Moved Permanently")] * 3,
+    })
+    args = Namespace(alias="cp", query=None, action="restart_daemons", batchsize=1, grace_sleep=0, max_failed=1,
+                     reason="restart", task_id=None, concurrent_groups=False)
+    with mock.patch("cookbooks.sre.ensure_shell_is_durable"):
+        runner = Runner(args, spicerack)
+
+    if dry_run:
+        runner.verify_http(mock.MagicMock(hosts=HOSTS), CHECK)
+        spicerack.requests_session.assert_not_called()
+    else:
+        with pytest.raises(RuntimeError, match=r"failed on 1 host\(s\): cp1002.eqiad.wmnet"):
+            runner.verify_http(mock.MagicMock(hosts=HOSTS), CHECK)
+        assert spicerack.requests_session.return_value.request.call_count == 5
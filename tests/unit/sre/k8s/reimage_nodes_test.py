@@ -0,0 +1,83 @@
+"""Unit tests for the concurrent reimage of Kubernetes nodes."""
+import threading
+import time
+from unittest import mock
+
+from spicerack.exceptions import SpicerackError
+from wmflib import interactive
+
+from cookbooks.sre.k8s import reimage_nodes
+
+NODES = ["kubernetes1001.eqiad.wmnet", "kubernetes1002.eqiad.wmnet", "kubernetes1003.eqiad.wmnet"]
+
+
+class PromptRecorder:
+    """A mocked ask_input() recording the maximum number of prompts shown at the same time."""
+
+    def __init__(self):
+        """Initialize the recorder."""
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+
+    def __call__(self, *_args, **_kwargs):
+        """Answer the prompt after a while, as the operator would."""
+        with self.lock:
+            self.active += 1
+            self.calls += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+        return "yes"
+
+
+def test_reimage_nodes_concurrent_serializes_prompts():
+    """It should reimage the nodes concurrently, showing the prompts of the reimages one at a time."""
+    barrier = threading.Barrier(len(NODES), timeout=5)
+    recorder = PromptRecorder()
+
+    def run_cookbook(_cookbook, args, **_kwargs):
+        barrier.wait()  # All the reimages run at the same time
+        interactive.ask_confirmation(f"Reimage {args[-1]}?")
+        return 0
+
+    spicerack = mock.MagicMock()
+    spicerack.run_cookbook.side_effect = run_cookbook
+    with mock.patch("wmflib.interactive.ask_input", recorder):
+        reimage_nodes(spicerack, NODES, ["--os", "bookworm"], concurrency=3)
+        assert interactive.ask_input is recorder  # Restored after the concurrent pass
+
+    assert recorder.calls == 3
+    assert recorder.max_active == 1
+    assert spicerack.run_cookbook.call_count == 3
+
+
+def test_reimage_nodes_concurrent_retries_failures_serially():
+    """It should retry the failed reimages one at a time, asking the operator what to do on failure."""
+    failures = {"kubernetes1002": 1, "kubernetes1003": SpicerackError("boom")}
+
+    def run_cookbook(_cookbook, args, confirm=False):
+        failure = failures.get(args[-1])
+        if confirm or failure is None:
+            return 0
+        if isinstance(failure, Exception):
+            raise failure
+        return failure
+
+    spicerack = mock.MagicMock()
+    spicerack.run_cookbook.side_effect = run_cookbook
+    reimage_nodes(spicerack, NODES, ["--os", "bookworm"], concurrency=3)
+
+    retries = [call for call in spicerack.run_cookbook.call_args_list if call.kwargs.get("confirm")]
+    assert [call.args[1][-1] for call in retries] == ["kubernetes1002", "kubernetes1003"]
+
+
+def test_reimage_nodes_serial():
+    """It should reimage one node at a time with confirmation on failure when the concurrency is 1."""
+    spicerack = mock.MagicMock()
+    reimage_nodes(spicerack, NODES, ["--os", "bookworm"])
+
+    assert spicerack.run_cookbook.call_args_list == [
+        mock.call("sre.hosts.reimage", ["--os", "bookworm", node.split(".")[0]], confirm=True) for node in NODES]
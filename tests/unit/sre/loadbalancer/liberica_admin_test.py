@@ -0,0 +1,85 @@
+"""Unit tests for the sre.loadbalancer.admin cookbook."""
+import threading
+from argparse import Namespace
+from unittest import mock
+
+from cumin import NodeSet
+
+from cookbooks.sre.loadbalancer.admin import LibericaAdmin, LibericaAdminRunner
+
+
+def test_argument_parser_concurrent_groups():
+    """It should allow to reboot the liberica hosts of each datacenter concurrently."""
+    args = LibericaAdmin(mock.MagicMock()).argument_parser().parse_args(
+        ["--alias", "liberica", "--reason", "maintenance", "--concurrent-groups", "reboot"])
+    assert args.concurrent_groups
+
+
+def test_reboot_pools_the_hosts_of_its_own_batch():
+    """It should pool back only the hosts depooled by the batch of the same concurrent group."""
+    spicerack = mock.MagicMock(dry_run=False)
+    spicerack.remote.return_value.query.return_value.hosts = NodeSet("lvs1017.eqiad.wmnet,lvs2011.codfw.wmnet")
+    args = Namespace(alias="liberica", query=None, action="reboot", batchsize=1, grace_sleep=0, max_failed=1,
+                     reason="maintenance", task_id=None, concurrent_groups=True)
+    with mock.patch("cookbooks.sre.ensure_shell_is_durable"):
+        runner = LibericaAdminRunner(args, spicerack)
+
+    barrier = threading.Barrier(2, timeout=5)
+
+    def reboot(host):
+        hosts = mock.MagicMock(hosts=NodeSet(host))
+        hosts.__len__.return_value = 1
+        runner.pre_action(hosts)
+        barrier.wait()  # Both batches are depooled before any of them is rebooted
+        runner._reboot_action(hosts, "reason")  # pylint: disable=protected-access
+
+    with mock.patch.object(runner, "_get_pooled", side_effect=lambda hosts: hosts), \
+            mock.patch.object(runner, "_depool_action"), mock.patch.object(runner, "_validate_is_pooled"), \
+            mock.patch.object(runner, "_pool_action") as mocked_pool:
+        threads = [threading.Thread(target=reboot, args=(host,))
+                   for host in ("lvs1017.eqiad.wmnet", "lvs2011.codfw.wmnet")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert sorted(str(call.args[0].hosts) for call in mocked_pool.call_args_list) == [
+        "lvs1017.eqiad.wmnet", "lvs2011.codfw.wmnet"]
+
+
+def test_depool_prompts_serialized():
+    """It should ask the operator one group at a time when depooling fails in several concurrent groups."""
+    barrier = threading.Barrier(2, timeout=5)
+    asking = threading.Lock()
+
+    def get_hosts(hosts):
+        remote_hosts = mock.MagicMock(hosts=NodeSet(hosts))
+        remote_hosts.split.side_effect = lambda _: [get_hosts(host) for host in NodeSet(hosts)]
+
+        def run_sync(*_args, **_kwargs):
+            if remote_hosts.run_sync.call_count == 1:
+                barrier.wait()  # Fail in both groups at the same time
+                raise RuntimeError("failed to stop liberica-cp")
+
+        remote_hosts.run_sync.side_effect = run_sync
+        remote_hosts.run_sync.__qualname__ = "RemoteHosts.run_sync"
+        return remote_hosts
+
+    def ask_input(_message, _choices):
+        assert asking.acquire(blocking=False), "Concurrent prompts"
+        threading.Event().wait(0.02)
+        asking.release()
+        return "retry"
+
+    spicerack = mock.MagicMock(dry_run=False)
+    spicerack.remote.return_value.query.side_effect = lambda query: get_hosts(
+        "lvs1017.eqiad.wmnet,lvs2011.codfw.wmnet" if query == "A:liberica" else query[2:-1])
+    args = Namespace(alias="liberica", query=None, action="depool", batchsize=1, grace_sleep=0, max_failed=1,
+                     reason="maintenance", task_id=None, concurrent_groups=True)
+    with mock.patch("cookbooks.sre.ensure_shell_is_durable"):
+        runner = LibericaAdminRunner(args, spicerack)
+
+    with mock.patch.object(runner, "_validate_is_pooled"), \
+            mock.patch("wmflib.interactive.ask_input", side_effect=ask_input) as mocked_ask_input:
+        assert runner.run() == 0
+        assert mocked_ask_input.call_count == 2
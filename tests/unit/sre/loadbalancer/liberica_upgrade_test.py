@@ -0,0 +1,91 @@
+"""Unit tests for the sre.loadbalancer.upgrade cookbook."""
+import threading
+from argparse import Namespace
+from unittest import mock
+
+import pytest
+from cumin import NodeSet
+
+from cookbooks.sre.loadbalancer import get_liberica_pooled
+from cookbooks.sre.loadbalancer.upgrade import RollUpgradeLiberica, RollUpgradeLibericaRunner
+
+POOLED_METRICS = """
+# TYPE bgp_peer_state gauge
+bgp_peer_state{admin_state="UP",peer="10.0.0.1",session_state="ESTABLISHED"} 1
+# TYPE bgp_routes_advertised gauge
+bgp_routes_advertised{peer="10.0.0.1",route_family="ipv4"} 12
+"""
+HOSTS = NodeSet("lvs[1017-1018].eqiad.wmnet")
+
+
+@pytest.fixture(name="spicerack")
+def fixture_spicerack():
+    """Return a mocked Spicerack whose liberica instances are all pooled."""
+    spicerack = mock.MagicMock(dry_run=False)
+    spicerack.remote.return_value.query.return_value.hosts = HOSTS
+    spicerack.requests_session.return_value.get.return_value.text = POOLED_METRICS
+    with mock.patch("cookbooks.sre.ensure_shell_is_durable"):
+        yield spicerack
+
+
+def get_runner(spicerack, seamless):
+    """Return the runner for restarting liberica on a single host."""
+    args = Namespace(alias="liberica-eqiad", query=None, action="restart", batchsize=1, grace_sleep=0,
+                     max_failed=1, reason="restart", task_id=None, concurrent_groups=False, version=None,
+                     seamless=seamless)
+    return RollUpgradeLibericaRunner(args, spicerack)
+
+
+@pytest.mark.parametrize("seamless", (False, True))
+def test_restart_in_process(spicerack, seamless):
+    """It should depool and pool the host in-process and wait for the services to stop on the host itself."""
+    hosts = mock.MagicMock(hosts=NodeSet("lvs1017.eqiad.wmnet"))
+    get_runner(spicerack, seamless)._restart_action(hosts, "reason")  # pylint: disable=protected-access
+
+    spicerack.run_cookbook.assert_not_called()
+    commands = [command for call in hosts.run_sync.call_args_list for command in call.args]
+    stop_index = commands.index("/bin/systemctl kill liberica-fp.service --signal "
+                                f"{'SIGTERM' if seamless else 'SIGUSR1'}")
+    assert commands[stop_index + 3].startswith("/usr/bin/timeout 30 /bin/sh -c 'while /bin/systemctl -q is-active")
+    if seamless:
+        assert "/bin/systemctl stop liberica-cp.service" not in commands
+    else:
+        assert commands[0] == "/bin/systemctl stop liberica-cp.service"
+        assert commands[-1] == "/bin/systemctl start liberica-cp.service"
+        assert spicerack.requests_session.return_value.get.call_count == 2  # Before the depool and after the pool
+
+
+def test_get_liberica_pooled_concurrently():
+    """It should check the pooled state of all the hosts at the same time."""
+    barrier = threading.Barrier(len(HOSTS), timeout=5)
+
+    def get(url):
+        barrier.wait()
+        return mock.MagicMock(text=POOLED_METRICS if "lvs1017" in url else "")
+
+    http = mock.MagicMock()
+    http.get.side_effect = get
+    assert get_liberica_pooled(http, HOSTS) == {"lvs1017.eqiad.wmnet": True, "lvs1018.eqiad.wmnet": False}
+
+
+def test_argument_parser_concurrent_groups():
+    """It should allow to upgrade the liberica hosts of each datacenter concurrently."""
+    args = RollUpgradeLiberica(mock.MagicMock()).argument_parser().parse_args(
+        ["--alias", "liberica", "--reason", "upgrade", "--version", "0.11", "--concurrent-groups", "upgrade"])
+    assert args.concurrent_groups
+
+
+def test_restart_pool_failure(spicerack, caplog):
+    """It should let the operator retry the pooled state check and log the hosts left depooled if it fails."""
+    hosts = mock.MagicMock(hosts=NodeSet("lvs1017.eqiad.wmnet"))
+    hosts.__str__.return_value = "lvs1017.eqiad.wmnet"
+    runner = get_runner(spicerack, False)
+    with mock.patch("cookbooks.sre.loadbalancer.upgrade.confirm_on_failure",
+                    side_effect=lambda func, *args: func(*args)) as mocked_confirm, \
+            mock.patch("cookbooks.sre.loadbalancer.upgrade.wait_for_liberica_pooled",
+                       side_effect=[None, RuntimeError("Unexpected pooled state")]) as mocked_wait:
+        with pytest.raises(RuntimeError, match="Unexpected pooled state"):
+            runner._restart_action(hosts, "reason")  # pylint: disable=protected-access
+
+    assert [call.args[0] for call in mocked_confirm.call_args_list].count(mocked_wait) == 2
+    assert "lvs1017.eqiad.wmnet may still be depooled with Puppet disabled" in caplog.text
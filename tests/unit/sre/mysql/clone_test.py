@@ -140,7 +140,7 @@ yamlconf = dict(replication_user="ru", replication_password="rp")
 @patch("cookbooks.sre.mysql.clone.time.sleep")
 @patch("cookbooks.sre.mysql.clone.ask_confirmation", autospec=True)
 @patch("cookbooks.sre.mysql.clone._add_host_to_zarcillo", autospec=True)
-@patch("cookbooks.sre.mysql.clone.Transferer", autospec=True)
+@patch("transferpy.Transferer.Transferer", autospec=True)
 @patch("cookbooks.sre.mysql.clone._run", autospec=True)
 @patch("cookbooks.sre.mysql.clone.load_yaml_config", autospec=True, return_value=yamlconf)
 @patch("cookbooks.sre.mysql.clone.get_db_instance", autospec=True)
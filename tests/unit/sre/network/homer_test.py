@@ -0,0 +1,61 @@
+"""Unit tests for running Homer from the cookbooks."""
+import threading
+from subprocess import CalledProcessError, CompletedProcess
+from unittest import mock
+
+import pytest
+
+from cookbooks.sre.network import get_unique_homer_queries, homer_queries_overlap, run_homer
+
+
+@pytest.mark.parametrize("queries, expected", (
+    (["asw1-b2-codfw.*", "asw1-b2-codfw.*"], ["asw1-b2-codfw.*"]),
+    (["asw1-b2-codfw.wikimedia.org", "asw1-b2-codfw*"], ["asw1-b2-codfw*"]),
+    (["asw1-b2-codfw*", "asw1-b3-codfw*", "asw1-b*"], ["asw1-b*"]),
+    (["asw1-b2-codfw**", "asw1-b2-codfw*"], ["asw1-b2-codfw**"]),
+    (["role:cr", "cr1-codfw*"], ["role:cr", "cr1-codfw*"]),
+))
+def test_get_unique_homer_queries(queries, expected):
+    """It should remove the duplicate queries and the ones covered by other queries."""
+    assert get_unique_homer_queries(queries) == expected
+
+
+@pytest.mark.parametrize("first, second, expected", (
+    ("asw1-b2-codfw*", "asw1-b3-codfw*", False),
+    ("asw1-b*", "asw1-b3-codfw*", True),
+    ("*codfw*", "asw1-b3-codfw*", True),
+    ("role:cr", "asw1-b3-codfw*", True),
+))
+def test_homer_queries_overlap(first, second, expected):
+    """It should consider overlapping only the queries that might match the same devices."""
+    assert homer_queries_overlap(first, second) is expected
+
+
+@mock.patch("cookbooks.sre.network.run")
+def test_run_homer_diff_concurrently(mocked_run, caplog):
+    """It should run the diffs of the disjoint queries concurrently and log their output in order."""
+    barrier = threading.Barrier(3, timeout=5)
+
+    def run(command, **_kwargs):
+        barrier.wait()  # All the unique queries run at the same time
+        if command[1] == "asw1-b2-codfw*":
+            raise CalledProcessError(1, command, output="failed")
+        return CompletedProcess(command, 0, stdout=f"diff of {command[1]}")
+
+    mocked_run.side_effect = run
+    with caplog.at_level("INFO"):
+        run_homer(["asw1-b3-codfw*", "asw1-b2-codfw*", "asw1-b3-codfw*", "asw1-b2-codfw.wikimedia.org", "cr1-codfw*"])
+
+    assert mocked_run.call_count == 3
+    assert caplog.text.index("diff of asw1-b3-codfw*") < caplog.text.index("diff of cr1-codfw*")
+    assert "Issue while running Homer on asw1-b2-codfw*" in caplog.text
+
+
+@mock.patch("cookbooks.sre.network.run")
+def test_run_homer_commit_sequentially(mocked_run):
+    """It should commit one query at a time, without capturing the output of the interactive Homer."""
+    mocked_run.side_effect = lambda command, **_kwargs: CompletedProcess(command, 0)
+    run_homer(["asw1-b2-codfw*", "asw1-b3-codfw*"], dry_run=False)
+
+    assert [call.args[0][1] for call in mocked_run.call_args_list] == ["asw1-b2-codfw*", "asw1-b3-codfw*"]
+    assert all(call.kwargs["stdout"] is None for call in mocked_run.call_args_list)
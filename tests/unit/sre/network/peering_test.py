@@ -0,0 +1,82 @@
+"""Unit tests for the sre.network.peering cookbook."""
+from argparse import Namespace
+from ipaddress import ip_address
+from unittest import mock
+
+import pytest
+
+from cookbooks.sre.network.peering import WIKIMEDIA_ASN, PeeringRunner
+
+PEER_ASN = 64496
+
+
+def get_netixlan(asn, ixlan_id, ipaddr4, ipaddr6):
+    """Return a PeeringDB IX presence."""
+    return {"asn": asn, "ixlan_id": ixlan_id, "ipaddr4": ipaddr4, "ipaddr6": ipaddr6, "operational": True,
+            "status": "ok"}
+
+
+NETWORKS = {
+    WIKIMEDIA_ASN: {"name": "Wikimedia Foundation", "netixlan_set": [
+        get_netixlan(WIKIMEDIA_ASN, 1, "192.0.2.1", "2001:db8::1"),
+        get_netixlan(WIKIMEDIA_ASN, 2, "198.51.100.1", None),
+    ]},
+    PEER_ASN: {"name": "Peer", "info_prefixes4": 100, "info_prefixes6": 50, "poc_set": [], "netixlan_set": [
+        get_netixlan(PEER_ASN, 1, "192.0.2.2", "2001:db8::2"),
+        get_netixlan(PEER_ASN, 1, "192.0.2.3", None),
+        get_netixlan(PEER_ASN, 2, "198.51.100.2", None),
+    ]},
+}
+ROUTERS = {"192.0.2.1": "cr1-eqiad.wikimedia.org", "2001:db8::1": "cr1-eqiad.wikimedia.org",
+           "198.51.100.1": "cr2-eqiad.wikimedia.org"}
+
+
+def get_nb_address(address):
+    """Return a mocked Netbox IP address assigned to one of our routers."""
+    return mock.MagicMock(address=f"{address}/24",
+                          **{"assigned_object.device.primary_ip.dns_name": ROUTERS[address]})
+
+
+@pytest.fixture(name="spicerack")
+def fixture_spicerack():
+    """Return a mocked Spicerack with the PeeringDB and Netbox data."""
+    spicerack = mock.MagicMock(dry_run=True)
+    pdb = spicerack.peeringdb.return_value
+    pdb.fetch_asn.side_effect = lambda asn: [NETWORKS[asn]]
+    pdb.fetch.side_effect = lambda resource, resource_id=None: (
+        [{"id": 1, "ix_id": 10}, {"id": 2, "ix_id": 20}, {"id": 3, "ix_id": 30}] if resource == "ixlan"
+        else [{"name": f"IX{resource_id}"}])
+    spicerack.netbox.return_value.api.ipam.ip_addresses.filter.side_effect = lambda address: [
+        get_nb_address(item) for item in address]
+    return spicerack
+
+
+@mock.patch("cookbooks.sre.network.peering.get_junos_bgp_summary")
+def test_format_sessions_indexed(mocked_bgp_summary, spicerack):
+    """It should resolve the IXPs, routers and BGP tables once per run and share the sessions across actions."""
+    mocked_bgp_summary.return_value = {ip_address("192.0.2.2"): {"peer-state": "Established", "elapsed-time": "1w"}}
+    runner = PeeringRunner(Namespace(action="clear", ASN=PEER_ASN, no_cache=False), spicerack)
+
+    sessions = runner.format_sessions(WIKIMEDIA_ASN, PEER_ASN)
+    runner.peering_matrix(WIKIMEDIA_ASN, PEER_ASN)
+    runner.prepare_email(WIKIMEDIA_ASN, PEER_ASN)
+
+    assert [(session["ix_name"], str(session["ip_r"]), session["router_fqdn"], session["status"])
+            for session in sessions] == [
+        ("IX10", "192.0.2.2", "cr1-eqiad.wikimedia.org", "Established"),
+        ("IX10", "2001:db8::2", "cr1-eqiad.wikimedia.org", "Not configured"),
+        ("IX10", "192.0.2.3", "cr1-eqiad.wikimedia.org", "Not configured"),
+        ("IX20", "198.51.100.2", "cr2-eqiad.wikimedia.org", "Not configured"),
+    ]
+    spicerack.netbox.return_value.api.ipam.ip_addresses.filter.assert_called_once_with(
+        address=["192.0.2.1", "198.51.100.1", "2001:db8::1"])
+    assert spicerack.peeringdb.return_value.fetch.call_count == 3  # The IXLANs list and the 2 IXPs
+    assert mocked_bgp_summary.call_count == 2  # Once per router
+
+
+def test_get_devices_fqdn_from_ips_missing(spicerack):
+    """It should raise if any of our IPs is not assigned to a device in Netbox."""
+    spicerack.netbox.return_value.api.ipam.ip_addresses.filter.side_effect = lambda address: []
+    runner = PeeringRunner(Namespace(action="clear", ASN=PEER_ASN, no_cache=False), spicerack)
+    with pytest.raises(RuntimeError, match=r"\['192.0.2.1'\]"):
+        runner.get_devices_fqdn_from_ips({"192.0.2.1"})
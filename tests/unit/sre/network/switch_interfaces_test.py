@@ -0,0 +1,84 @@
+"""Unit tests for the configuration of the switch interfaces of a device."""
+import json
+from unittest import mock
+
+import pytest
+from cumin import NodeSet
+
+from cookbooks.sre.network import configure_switch_interfaces, run_junos_transactions
+
+LIVE_INTERFACES = {"configuration": {"interfaces": {"interface": [
+    {"name": "ge-0/0/1", "description": "other1001", "mtu": 9192},
+    {"name": "ge-0/0/2", "description": "host1001", "mtu": 9192},
+]}}}
+
+
+def get_output(message):
+    """Return a mocked run_sync() result with the given message."""
+    output = mock.MagicMock()
+    output.message.return_value = message.encode()
+    return [(NodeSet("switch"), output)]
+
+
+def get_switch(name, commit_output="commit complete\nExiting configuration mode"):
+    """Return a mocked switch that returns the live interfaces config and the given commit output."""
+    def run_sync(command, **_kwargs):
+        if command.startswith("show configuration interfaces"):
+            return get_output(json.dumps(LIVE_INTERFACES))
+        if "commit confirmed" in command:
+            return get_output(commit_output)
+        return get_output("[edit interfaces]")
+
+    switch = mock.MagicMock(dry_run=False)
+    switch.__str__.return_value = name
+    switch.run_sync.side_effect = run_sync
+    return switch
+
+
+def get_interface(switch, name):
+    """Return a mocked Netbox device interface connected to the given switch interface."""
+    switch_interface = mock.MagicMock(enabled=True, mtu=9192, mode=None, device=mock.MagicMock(virtual_chassis=None))
+    switch_interface.name = name
+    switch_interface.__str__.return_value = name
+    switch_interface.device.name = "asw1-a1-eqiad"
+    switch_interface.device.primary_ip.dns_name = switch
+    switch_interface.device.device_type.slug = "qfx5120-48y"
+    return mock.MagicMock(connected_endpoints=[switch_interface])
+
+
+@mock.patch("cookbooks.sre.network.ask_confirmation")
+def test_configure_switch_interfaces_one_transaction_per_switch(mocked_ask_confirmation, caplog):
+    """It should fetch and configure all the interfaces of each switch at once, asking for confirmation once."""
+    switches = {"switch1": get_switch("switch1"), "switch2": get_switch("switch2")}
+    remote = mock.MagicMock()
+    remote.query.side_effect = lambda query: switches[query[2:-1]]
+    netbox = mock.MagicMock()
+    netbox.api.dcim.interfaces.filter.return_value = [
+        get_interface("switch1", "ge-0/0/1"), get_interface("switch1", "ge-0/0/2"), get_interface("switch2", "ge-0/0/1")]
+
+    with caplog.at_level("INFO"):
+        configure_switch_interfaces(remote, netbox, {"id": 1, "name": "host1001"})
+
+    mocked_ask_confirmation.assert_called_once_with("Commit the above changes on 2 devices?")
+    assert "Commit check on switch1:\n[edit interfaces]" in caplog.text
+    commands = [call.args[0] for call in switches["switch1"].run_sync.call_args_list]
+    assert commands[0] == "show configuration interfaces | display json"
+    assert len(commands) == 4  # Live config, compare, commit confirmed, commit check
+    assert 'set interfaces ge-0/0/1 description "host1001"' in commands[1]
+    assert 'set interfaces ge-0/0/2 description "host1001"' not in commands[1]
+    assert switches["switch2"].run_sync.call_args_list[0].args[0] == (
+        "show configuration interfaces ge-0/0/1 | display json")
+
+
+@mock.patch("cookbooks.sre.network.ask_confirmation")
+def test_run_junos_transactions_commit_failure(mocked_ask_confirmation, caplog):
+    """It should log the output of the failed commits and not confirm them on any device."""
+    switches = [get_switch("switch1"), get_switch("switch2", commit_output="error: commit failed\n")]
+    with pytest.raises(RuntimeError, match=r"commit failed on \['switch2'\]"):
+        run_junos_transactions([(switch, ["set interfaces ge-0/0/1 disable"]) for switch in switches])
+
+    mocked_ask_confirmation.assert_called_once_with("Commit the above changes on 2 devices?")
+    assert "Commit output on switch2:\nerror: commit failed" in caplog.text
+    assert "Commit output on switch1" not in caplog.text
+    for switch in switches:
+        assert "commit check" not in switch.run_sync.call_args_list[-1].args[0]
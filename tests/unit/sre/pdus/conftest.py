@@ -0,0 +1,180 @@
+"""Local stub of the Sentry CDU web interface for the sre.pdus tests."""
+import asyncio
+import datetime
+import ssl
+import threading
+import time
+from base64 import b64decode
+
+import pytest
+from aiohttp import web
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+SNMP_FORM = """<html><body><form action="/Forms/snmp_1" method="post">
+<input type="text" name="GetCom" value="{GetCom}">
+<input type="text" name="SetCom" value="{SetCom}">
+<input type="text" name="SysName" value="{SysName}">
+<input type="text" name="SysLoc" value="{SysLoc}">
+<input type="text" name="SysContact" value="{SysContact}">
+</form></body></html>"""
+
+
+class SentryStub:
+    """Minimal emulation of the web interface of a single Sentry PDU."""
+
+    def __init__(self, tracker, *, version=4, password="secret", uptime=86400, reboot_duration=0.2):
+        """Initialize the stub, uptime and reboot_duration are in seconds."""
+        self.tracker = tracker
+        self.version = version
+        self.credentials = {("root", password)}
+        self.boot_time = time.monotonic() - uptime
+        self.reboot_duration = reboot_duration
+        self.snmp = {"GetCom": "public", "SetCom": "private", "SysName": "ps1", "SysLoc": "a1", "SysContact": "noc"}
+        self.default_user = False
+        self.reboots = 0
+        self.address = ""
+
+    def app(self):
+        """Return the aiohttp application serving the Sentry endpoints."""
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/", self._index)
+        app.router.add_get("/CDU/summary.txt", self._summary)
+        app.router.add_get("/chngpswd.html", self._chngpswd)
+        app.router.add_post("/Forms/chngpswd_1", self._change_password)
+        app.router.add_get("/Forms/snmp_1", self._snmp)
+        app.router.add_post("/Forms/snmp_1", self._snmp)
+        app.router.add_post("/Forms/restart_1", self._restart)
+        app.router.add_get("/restarting.html", self._index)
+        return app
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        if time.monotonic() < self.boot_time:
+            raise web.HTTPServiceUnavailable()
+        self.tracker.enter()
+        try:
+            await asyncio.sleep(self.tracker.latency)
+            if request.path != "/chngpswd.html" and self._auth(request) not in self.credentials:
+                raise web.HTTPUnauthorized()
+            return await handler(request)
+        finally:
+            self.tracker.leave()
+
+    @staticmethod
+    def _auth(request):
+        header = request.headers.get("Authorization", "")
+        if not header.startswith("Basic "):
+            return None
+        return tuple(b64decode(header[6:]).decode().split(":", 1))
+
+    async def _index(self, _):
+        return web.Response(text="Sentry", headers={"Server": "v8.0m" if self.version == 4 else "v7.1c"})
+
+    async def _summary(self, _):
+        uptime = datetime.timedelta(seconds=int(time.monotonic() - self.boot_time))
+        hours, remainder = divmod(uptime.seconds, 3600)
+        text = (f"name=s=ps1|uptime=s={uptime.days} days {hours} hours {remainder // 60} minutes "
+                f"{remainder % 60} seconds|version=s=8.0m")
+        return web.Response(text=text)
+
+    async def _chngpswd(self, request):
+        auth = self._auth(request)
+        if auth in self.credentials or (self.default_user and auth == ("admn", "admn")):
+            return web.Response(text="ok")
+        raise web.HTTPUnauthorized()
+
+    async def _change_password(self, request):
+        data = await request.post()
+        if self.version == 4:
+            current, new, verify = data["UPWC"], data["UPW"], data["UPWV"]
+        else:
+            current, new, verify = data["Current_Password"], data["New_Password"], data["New_Password_Verify"]
+        if ("root", current) not in self.credentials or new != verify:
+            raise web.HTTPBadRequest()
+        self.credentials = {("root", new)}
+        return web.Response(text="ok")
+
+    async def _snmp(self, request):
+        if request.method == "POST":
+            data = await request.post()
+            self.snmp.update({key: data[key] for key in self.snmp if key in data})
+        return web.Response(text=SNMP_FORM.format(**self.snmp), content_type="text/html")
+
+    async def _restart(self, _):
+        self.reboots += 1
+        self.boot_time = time.monotonic() + self.reboot_duration
+        return web.Response(text="restarting")
+
+
+class Tracker:
+    """Track how many requests are being served at the same time across all the stubs."""
+
+    def __init__(self):
+        """Initialize the tracker."""
+        self.latency = 0.0
+        self.active = 0
+        self.max_active = 0
+
+    def enter(self):
+        """Record the start of a request."""
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+
+    def leave(self):
+        """Record the end of a request."""
+        self.active -= 1
+
+
+def _ssl_context(tmp_path):
+    """Return a server SSL context with a self-signed certificate."""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number()).not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=1)).sign(key, hashes.SHA256()))
+    cert_file = tmp_path / "cert.pem"
+    key_file = tmp_path / "key.pem"
+    cert_file.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_file.write_bytes(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                           serialization.NoEncryption()))
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert_file, key_file)
+    return context
+
+
+@pytest.fixture(name="sentry")
+def fixture_sentry(tmp_path):
+    """Return a factory of Sentry PDU stubs, each served over HTTPS on its own local port."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    context = _ssl_context(tmp_path)
+    tracker = Tracker()
+    runners = []
+
+    async def start(stub):
+        runner = web.AppRunner(stub.app())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0, ssl_context=context)
+        await site.start()
+        runners.append(runner)
+        return runner.addresses[0][1]
+
+    def factory(**kwargs):
+        stub = SentryStub(tracker, **kwargs)
+        port = asyncio.run_coroutine_threadsafe(start(stub), loop).result()
+        stub.address = f"127.0.0.1:{port}"
+        return stub
+
+    factory.tracker = tracker
+    yield factory
+
+    for runner in runners:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
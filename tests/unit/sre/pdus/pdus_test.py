@@ -0,0 +1,133 @@
+"""sre.pdus tests."""
+import importlib
+from datetime import datetime, timezone
+from unittest import mock
+
+import pytest
+
+from cookbooks.sre import pdus
+
+
+def run(stubs, action, password="secret", **kwargs):
+    """Run the action on the given stubs, all in the same site unless specified otherwise."""
+    site = kwargs.pop("site", "eqiad")
+    targets = {stub.address: site for stub in stubs}
+    return pdus.run_on_pdus(targets, action, username="root", password=password, **kwargs)
+
+
+def test_run_on_pdus_uptime(sentry):
+    """It should run the action on all the PDUs and report their results."""
+    stubs = [sentry(uptime=3661), sentry(version=3, uptime=90061)]
+
+    async def action(pdu):
+        return f"v{await pdu.get_version()} {await pdu.get_uptime()}"
+
+    results = run(stubs, action)
+    assert {result.pdu: result.message for result in results} == {
+        stubs[0].address: "v4 0 days 1 hours 1 minutes 1 seconds",
+        stubs[1].address: "v3 1 days 1 hours 1 minutes 1 seconds",
+    }
+    assert pdus.report(results) == 0
+
+
+def test_run_on_pdus_failure(sentry):
+    """It should record the failed PDUs without affecting the others and report them."""
+    stubs = [sentry(), sentry()]
+    results = run(stubs, lambda pdu: pdu.get_version(), password="wrong")
+    assert not any(result.success for result in results)
+    assert all("unable to get the Sentry version" in result.message for result in results)
+    assert pdus.report(results) == 1
+
+
+@pytest.mark.parametrize("max_per_site, sites, expected", (
+    (1, ("eqiad",), 1),
+    (2, ("eqiad",), 2),
+    (1, ("eqiad", "codfw", "esams"), 3),
+))
+def test_run_on_pdus_max_per_site(sentry, max_per_site, sites, expected):
+    """It should act on at most max_per_site PDUs of each site at the same time."""
+    sentry.tracker.latency = 0.05
+    targets = {sentry().address: site for site in sites for _ in range(3)}
+
+    async def action(pdu):
+        await pdu.get_uptime()
+        return "ok"
+
+    results = pdus.run_on_pdus(targets, action, username="root", password="secret", max_per_site=max_per_site)
+    assert all(result.success for result in results)
+    assert sentry.tracker.max_active == expected
+
+
+def test_wait_reboot_since(sentry):
+    """It should poll the PDU until it is back with an uptime lower than the reboot time."""
+    stub = sentry(reboot_duration=0.3)
+
+    async def action(pdu):
+        since = datetime.now(timezone.utc)
+        await pdu.reboot(await pdu.get_version())
+        await pdu.wait_reboot_since(since, timeout=5, interval=0.1)
+        return "rebooted"
+
+    results = run([stub], action)
+    assert results[0].success
+    assert stub.reboots == 1
+    assert 0.3 <= results[0].duration < 5
+
+
+def test_wait_reboot_since_timeout(sentry):
+    """It should raise UptimeError if the PDU did not reboot within the timeout."""
+    stub = sentry()
+
+    async def action(pdu):
+        await pdu.wait_reboot_since(datetime.now(timezone.utc), timeout=0.3, interval=0.1)
+        return "rebooted"
+
+    results = run([stub], action)
+    assert not results[0].success
+    assert "uptime is higher than threshold" in results[0].message
+
+
+@pytest.mark.parametrize("default_user", (True, False))
+def test_check_default(sentry, default_user):
+    """It should detect if the default user is still configured."""
+    stub = sentry()
+    stub.default_user = default_user
+
+    async def action(pdu):
+        return str(await pdu.check_default())
+
+    assert run([stub], action)[0].message == str(default_user)
+
+
+@pytest.mark.parametrize("version", (3, 4))
+def test_rotate_password(sentry, version):
+    """It should change the password and verify that the new one works."""
+    module = importlib.import_module("cookbooks.sre.pdus.rotate-password")
+    stubs = [sentry(version=version), sentry(version=version)]
+
+    async def action(pdu):
+        await module.change_password(pdu, "new-secret")
+        return "ok"
+
+    assert all(result.success for result in run(stubs, action))
+    assert all(stub.credentials == {("root", "new-secret")} for stub in stubs)
+
+
+@pytest.mark.parametrize("version", (3, 4))
+def test_rotate_snmp(sentry, version):
+    """It should update the SNMP communities, leaving the PDUs already up to date alone."""
+    module = importlib.import_module("cookbooks.sre.pdus.rotate-snmp")
+    stubs = [sentry(version=version), sentry(version=version)]
+    stubs[1].snmp["GetCom"] = "new-ro"
+    args = module.ChangeSNMP(mock.MagicMock()).argument_parser().parse_args(["all"])
+    with mock.patch.object(module, "get_secret", side_effect=["secret", "new-ro"]), \
+            mock.patch.object(module, "ensure_shell_is_durable"):
+        runner = module.ChangeSNMPRunner(args, mock.MagicMock())
+
+    async def action(pdu):
+        return str(await runner.change_snmp(pdu, version))
+
+    results = {result.pdu: result.message for result in run(stubs, action)}
+    assert results == {stubs[0].address: "True", stubs[1].address: "False"}
+    assert all(stub.snmp["GetCom"] == "new-ro" for stub in stubs)
+    assert stubs[0].snmp["SetCom"] == "private"
@@ -0,0 +1,78 @@
+"""Tests of the pre-staging of the packages of the rolling upgrades."""
+from argparse import Namespace
+from unittest import mock
+
+import pytest
+from cumin import NodeSet
+
+from cookbooks.sre import SREBatchRunnerBase
+
+
+class UpgradeRunner(SREBatchRunnerBase):
+    """A runner upgrading a package on two hosts, one at a time."""
+
+    allowed_aliases = ["test"]
+
+    def __init__(self, args, spicerack, packages):
+        """Initialize the runner with the packages to upgrade."""
+        self.packages = packages
+        super().__init__(args, spicerack)
+
+    @property
+    def upgrade_packages(self):
+        """Return the packages to upgrade."""
+        return self.packages
+
+    def _hosts(self):
+        """Return the hosts to upgrade."""
+        return [get_hosts("cp100[1-2].eqiad.wmnet")]
+
+    def _upgrade_action(self, hosts, _reason):
+        """Record the upgrade of each batch."""
+        self._spicerack.upgrade(str(hosts.hosts))
+
+
+def get_hosts(hosts):
+    """Return mocked RemoteHosts for the given hosts, split in batches of one host."""
+    remote_hosts = mock.MagicMock(hosts=NodeSet(hosts))
+    remote_hosts.split.side_effect = lambda _: [mock.MagicMock(hosts=NodeSet(host)) for host in NodeSet(hosts)]
+    return remote_hosts
+
+
+@pytest.fixture(name="spicerack")
+def fixture_spicerack():
+    """Return a mocked Spicerack."""
+    spicerack = mock.MagicMock()
+    with mock.patch("cookbooks.sre.ensure_shell_is_durable"):
+        yield spicerack
+
+
+def get_args(action):
+    """Return the parsed arguments for the given action."""
+    return Namespace(alias="test", query=None, action=action, batchsize=1, grace_sleep=0,
+                     max_failed=1, reason="upgrade", task_id=None, concurrent_groups=False)
+
+
+def test_prestage_packages(spicerack):
+    """It should download and verify the packages on all the hosts at once, before upgrading the first batch."""
+    runner = UpgradeRunner(get_args("upgrade"), spicerack, ["varnish=7.1.1-1", "varnish-modules"])
+    assert runner.run() == 0
+
+    spicerack.remote.return_value.query.assert_called_with("D{cp[1001-1002].eqiad.wmnet}")
+    apt_get = spicerack.apt_get.return_value
+    assert spicerack.mock_calls.index(mock.call.apt_get().update()) < spicerack.mock_calls.index(
+        mock.call.upgrade("cp1001.eqiad.wmnet"))
+    assert apt_get.run.call_args_list == [
+        mock.call("install --download-only varnish=7.1.1-1 varnish-modules"),
+        mock.call("install --download-only --no-download varnish=7.1.1-1 varnish-modules"),
+    ]
+    assert [stage.name for stage in runner.timeline.stages][0] == "prestage packages"
+
+
+@pytest.mark.parametrize("action, packages", (("upgrade", []), ("reboot", ["varnish"])))
+def test_prestage_packages_skipped(spicerack, action, packages):
+    """It should not download anything if not upgrading packages."""
+    with mock.patch.object(UpgradeRunner, f"_{action}_action", create=True):
+        assert UpgradeRunner(get_args(action), spicerack, packages).run() == 0
+
+    spicerack.apt_get.assert_not_called()
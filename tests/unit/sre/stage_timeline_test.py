@@ -0,0 +1,75 @@
+"""StageTimeline tests."""
+import json
+import threading
+from unittest import mock
+
+import pytest
+
+from cookbooks.sre import StageTimeline
+
+
+@pytest.fixture(name="clock")
+def fixture_clock():
+    """Patch time.monotonic with a manually advanced clock."""
+    now = [100.0]
+    with mock.patch("cookbooks.sre.time.monotonic", side_effect=lambda: now[0]):
+        yield now
+
+
+def test_stage_records_durations_and_nesting(clock):
+    """It should record the duration, hosts and parent of each stage."""
+    timeline = StageTimeline("rolling reboot")
+    with timeline.stage("action", "host1"):
+        clock[0] += 2
+        with timeline.stage("wait reboot", "host1", wait=True):
+            clock[0] += 5
+
+    wait, action = timeline.stages
+    assert (action.name, action.start, action.duration, action.hosts, action.parent) == ("action", 0, 7, "host1", "")
+    assert (wait.name, wait.start, wait.duration, wait.wait, wait.parent) == ("wait reboot", 2, 5, True, "action")
+
+
+def test_stage_records_failures(clock):
+    """It should record the stage also when it raises."""
+    timeline = StageTimeline("rolling restart")
+    with pytest.raises(RuntimeError), timeline.stage("restart daemons"):
+        clock[0] += 1
+        raise RuntimeError("failed")
+
+    assert timeline.stages[0].failed
+    assert timeline.stages[0].duration == 1
+
+
+def test_summary_counts_nested_waits_once(clock):
+    """It should aggregate the stages by name and not count the waits nested in other waits twice."""
+    timeline = StageTimeline("rolling reboot")
+    for _ in range(2):
+        with timeline.stage("grace sleep", wait=True):
+            with timeline.stage("sleep", wait=True):
+                clock[0] += 3
+        with timeline.stage("reboot"):
+            clock[0] += 2
+
+    summary = timeline.summary()
+    assert summary.startswith("rolling reboot took 10.0s, of which 6.0s (60%) waiting")
+    assert summary.index("| grace sleep") < summary.index("| reboot")
+    assert json.loads(timeline.to_json())["waiting"] == 6
+
+
+def test_stage_from_multiple_threads(clock):
+    """It should track the nesting of the stages separately for each thread."""
+    timeline = StageTimeline("rolling restart")
+
+    def worker(name):
+        with timeline.stage(name), timeline.stage(f"{name} child"):
+            pass
+
+    with timeline.stage("main"):
+        threads = [threading.Thread(target=worker, args=(f"group{i}",)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    parents = {stage.name: stage.parent for stage in timeline.stages}
+    assert parents == {"group0": "", "group0 child": "group0", "group1": "", "group1 child": "group1", "main": ""}
@@ -0,0 +1,167 @@
+"""Unit tests for the runner of the switchdc database steps."""
+from argparse import Namespace
+from unittest import mock
+
+import pytest
+from wmflib.interactive import AbortError
+
+from cookbooks.sre.switchdc.databases import DatabaseRunnerBase, SectionBase
+
+
+class Section(SectionBase):
+    """A section recording the steps executed, with configurable failures."""
+
+    def __init__(self, section, master_from, master_to, actions, *, invalid=False, failures=0):
+        """Initialize the section, the second step fails the given number of times."""
+        self.section = section
+        self.master_from = master_from
+        self.master_to = master_to
+        self.actions = actions
+        self.invalid = invalid
+        self.failures = failures
+        self.executed = []
+        self.attempts = 0
+
+    def validate(self):
+        """Fail the validation if the section is invalid."""
+        if self.invalid:
+            raise RuntimeError("MASTER_FROM should be read only")
+
+    def steps(self):
+        """Return the steps of the section."""
+        return [self.first, self.second, self.third]
+
+    def first(self):
+        """First step."""
+        self.executed.append("first")
+
+    def second(self):
+        """Second step, failing the first times."""
+        self.attempts += 1
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("replication broken")
+        self.executed.append("second")
+
+    def third(self):
+        """Third step."""
+        self.executed.append("third")
+
+
+class Runner(DatabaseRunnerBase):
+    """A runner for the test sections."""
+
+    def __init__(self, args, spicerack, sections):
+        """Initialize the runner with the configuration of each section."""
+        self.config = sections
+        self.created = {}
+        super().__init__(args, spicerack)
+
+    def get_remote_masters(self, section):
+        """Return mocked masters for the section."""
+        return mock.MagicMock(), mock.MagicMock()
+
+    def get_section(self, section, master_from, master_to):
+        """Return the test section."""
+        self.created[section] = Section(section, master_from, master_to, self.actions[section],
+                                        **self.config[section])
+        return self.created[section]
+
+
+def get_runner(sections):
+    """Return a runner for the given sections configuration."""
+    spicerack = mock.MagicMock(dry_run=False)
+    spicerack.actions = mock.MagicMock()
+    args = Namespace(dc_from="eqiad", dc_to="codfw", task_id="T12345", section=None)
+    with mock.patch("cookbooks.sre.switchdc.databases.ensure_shell_is_durable"), \
+            mock.patch("cookbooks.sre.switchdc.databases.CORE_SECTIONS", tuple(sections)):
+        return Runner(args, spicerack, sections)
+
+
+def last_comment(runner):
+    """Return the last comment posted to the Phabricator task."""
+    return runner.phabricator.task_comment.call_args.args[1]
+
+
+@pytest.fixture(autouse=True, name="ask_confirmation")
+def fixture_ask_confirmation():
+    """Confirm the plan without prompting."""
+    with mock.patch("cookbooks.sre.switchdc.databases.ask_confirmation") as mocked:
+        yield mocked
+
+
+def test_run_all_sections(ask_confirmation):
+    """It should run all the steps of all the sections and report the completion."""
+    runner = get_runner({"s1": {}, "s2": {}})
+    assert runner.run() == 0
+
+    assert all(section.executed == ["first", "second", "third"] for section in runner.created.values())
+    assert "2/2 valid sections" in ask_confirmation.call_args.args[0]
+    assert "completed:" in last_comment(runner)
+
+
+def test_run_skips_invalid_sections(ask_confirmation, caplog):
+    """It should show the failed validations in the plan, skip those sections and fail the run."""
+    runner = get_runner({"s1": {}, "s2": {"invalid": True}})
+    with caplog.at_level("INFO"):
+        assert runner.run() == 1
+
+    assert runner.created["s1"].executed == ["first", "second", "third"]
+    assert runner.created["s2"].executed == []
+    plan = caplog.text[caplog.text.index("Plan for all core sections"):]
+    assert "| s1      |" in plan and "| OK " in plan
+    assert "| s2      |" in plan and "| MASTER_FROM should be read only |" in plan
+    assert "1/2 valid sections" in ask_confirmation.call_args.args[0]
+    assert "completed with incomplete sections (skipped: s2)" in last_comment(runner)
+
+
+def test_run_all_sections_invalid():
+    """It should raise without running any step if all the validations failed."""
+    runner = get_runner({"s1": {"invalid": True}})
+    with pytest.raises(RuntimeError, match="The validation failed for all the sections"):
+        runner.run()
+
+
+def test_run_resumes_failed_sections():
+    """It should ask the operator before retrying the failed step and then resume the section from it."""
+    runner = get_runner({"s1": {"failures": 1}, "s2": {}})
+    attempts_at_prompt = []
+
+    def ask_input(message, choices):
+        assert "Section s1 failed to execute second" in message
+        assert choices == ["retry", "skip", "abort"]
+        attempts_at_prompt.append(runner.created["s1"].attempts)
+        return "retry"
+
+    with mock.patch("cookbooks.sre.switchdc.databases.ask_input", side_effect=ask_input), \
+            mock.patch("cookbooks.sre.switchdc.databases.confirm_on_failure",
+                       side_effect=lambda step: step()) as mocked_confirm:
+        assert runner.run() == 0
+
+    assert attempts_at_prompt == [1]  # The failed step was not run again before asking
+    assert runner.created["s1"].executed == ["first", "second", "third"]
+    assert [call.args[0].__name__ for call in mocked_confirm.call_args_list] == ["second", "third"]
+
+
+def test_run_skips_failed_step():
+    """It should resume the section from the next step if the operator fixed the failed one manually."""
+    runner = get_runner({"s1": {"failures": 1}, "s2": {}})
+    with mock.patch("cookbooks.sre.switchdc.databases.ask_input", return_value="skip"), \
+            mock.patch("cookbooks.sre.switchdc.databases.confirm_on_failure", side_effect=lambda step: step()):
+        assert runner.run() == 0
+
+    assert runner.created["s1"].attempts == 1
+    assert runner.created["s1"].executed == ["first", "third"]
+
+
+@pytest.mark.parametrize("response, confirm_side_effect", (("abort", None), ("retry", AbortError("aborted"))))
+def test_run_aborted_section(response, confirm_side_effect):
+    """It should record the sections aborted at the prompt or while resuming them and fail the run."""
+    runner = get_runner({"s1": {"failures": 1}, "s2": {}})
+    with mock.patch("cookbooks.sre.switchdc.databases.ask_input", return_value=response), \
+            mock.patch("cookbooks.sre.switchdc.databases.confirm_on_failure", side_effect=confirm_side_effect):
+        assert runner.run() == 1
+
+    assert runner.created["s1"].executed == ["first"]
+    runner.created["s1"].actions.failure.assert_called_with("**Execution for this section was manually aborted**")
+    assert "completed with incomplete sections (aborted: s1)" in last_comment(runner)
@@ -0,0 +1,152 @@
+"""sre.switchdc.mediawiki.01-stop-maintenance tests."""
+import importlib
+from unittest import mock
+
+import pytest
+from kubernetes.client.exceptions import ApiException
+from spicerack.exceptions import SpicerackCheckError
+
+module = importlib.import_module("cookbooks.sre.switchdc.mediawiki.01-stop-maintenance")
+
+
+def get_job(name, condition=None):
+    """Return a mocked Kubernetes job, stopped if a condition type is given."""
+    job = mock.MagicMock()
+    job.metadata.name = name
+    job.status.conditions = [mock.MagicMock(status="True", type=condition)] if condition else None
+    return job
+
+
+def get_job_list(jobs, resource_version):
+    """Return a mocked list of jobs with the given resourceVersion."""
+    job_list = mock.MagicMock(items=jobs)
+    job_list.metadata.resource_version = resource_version
+    return job_list
+
+
+class Watch:
+    """A mocked Kubernetes watch replaying the given streams, one per watch."""
+
+    streams: list = []
+    calls: list = []
+
+    def __init__(self):
+        """Initialize the watch."""
+        self.resource_version = None
+        self.stopped = False
+
+    def stream(self, _func, namespace, **kwargs):
+        """Yield the events of the next stream, or raise its exception."""
+        Watch.calls.append((namespace, kwargs))
+        events = Watch.streams.pop(0)
+        if isinstance(events, Exception):
+            raise events
+        for event_type, job, resource_version in events:
+            if self.stopped:
+                return
+            self.resource_version = resource_version
+            yield {"type": event_type, "object": job}
+
+    def stop(self):
+        """Stop the watch."""
+        self.stopped = True
+
+
+@pytest.fixture(name="watch", autouse=True)
+def fixture_watch():
+    """Mock the Kubernetes watch."""
+    Watch.streams = []
+    Watch.calls = []
+    with mock.patch.object(module.watch, "Watch", Watch):
+        yield Watch
+
+
+@pytest.fixture(name="clock")
+def fixture_clock():
+    """Mock the monotonic clock, advancing it by 10 seconds each time it's read."""
+    now = [0.0]
+
+    def monotonic():
+        now[0] += 10
+        return now[0]
+
+    with mock.patch.object(module.time, "monotonic", side_effect=monotonic):
+        yield now
+
+
+def test_watch_jobs_until_stopped(watch, clock):  # pylint: disable=unused-argument
+    """It should watch from the listed resourceVersion until all the jobs stopped, tracking the new ones."""
+    batch_api = mock.MagicMock()
+    batch_api.list_namespaced_job.return_value = get_job_list(
+        [get_job("job1"), get_job("job2"), get_job("done", "Complete")], "100")
+    watch.streams = [
+        [("MODIFIED", get_job("job1", "Failed"), "101"), ("ADDED", get_job("job3"), "102")],  # Watch expires
+        [("DELETED", get_job("job2"), "103"), ("MODIFIED", get_job("job3", "Complete"), "104"),
+         ("MODIFIED", get_job("other"), "105")],
+    ]
+
+    stopped = module._watch_jobs(batch_api, "mw-script", start=0.0, dry_run=False)  # pylint: disable=protected-access
+
+    assert list(stopped) == ["job1", "job2", "job3"]
+    assert [kwargs["resource_version"] for _, kwargs in watch.calls] == ["100", "102"]
+    batch_api.list_namespaced_job.assert_called_once_with("mw-script")
+
+
+def test_watch_jobs_relists_on_expired_version(watch, clock):  # pylint: disable=unused-argument
+    """It should list the jobs again if the resourceVersion is too old to be watched."""
+    batch_api = mock.MagicMock()
+    batch_api.list_namespaced_job.side_effect = [
+        get_job_list([get_job("job1")], "100"),
+        get_job_list([get_job("job1", "Complete")], "200"),
+    ]
+    watch.streams = [ApiException(status=410, reason="Gone")]
+
+    assert module._watch_jobs(batch_api, "mw-cron", start=0.0, dry_run=False) == {}  # pylint: disable=protected-access
+    assert batch_api.list_namespaced_job.call_count == 2
+
+
+def test_watch_jobs_api_error(watch, clock):  # pylint: disable=unused-argument
+    """It should not swallow the other API errors."""
+    batch_api = mock.MagicMock()
+    batch_api.list_namespaced_job.return_value = get_job_list([get_job("job1")], "100")
+    watch.streams = [ApiException(status=500, reason="Internal Server Error")]
+
+    with pytest.raises(ApiException):
+        module._watch_jobs(batch_api, "mw-cron", start=0.0, dry_run=False)  # pylint: disable=protected-access
+
+
+def test_watch_jobs_timeout(watch, clock):
+    """It should raise with the jobs still running once the timeout expired, never watching past it."""
+    batch_api = mock.MagicMock()
+    batch_api.list_namespaced_job.return_value = get_job_list([get_job("job1"), get_job("job2")], "100")
+    watch.streams = [[("MODIFIED", get_job("job2", "Complete"), "101")]] + [[]] * 100
+
+    with pytest.raises(SpicerackCheckError, match="1 mw-script job still running: job1"):
+        module._watch_jobs(batch_api, "mw-script", start=0.0, dry_run=False)  # pylint: disable=protected-access
+
+    assert clock[0] >= module.JOBS_STOP_TIMEOUT
+    assert all(0 < kwargs["timeout_seconds"] <= module.WATCH_TIMEOUT for _, kwargs in watch.calls)
+
+
+def test_watch_jobs_dry_run(watch):
+    """It should only list the jobs in DRY-RUN mode."""
+    batch_api = mock.MagicMock()
+    batch_api.list_namespaced_job.return_value = get_job_list([get_job("job1")], "100")
+
+    assert module._watch_jobs(batch_api, "mw-script", start=0.0, dry_run=True) == {}  # pylint: disable=protected-access
+    assert not watch.calls
+
+
+def test_wait_for_jobs_to_stop_reports_failures():
+    """It should watch all the datacenters and namespaces, reporting all the ones with jobs still running."""
+    def watch_jobs(_batch_api, namespace, **_kwargs):
+        if namespace == "mw-cron":
+            raise SpicerackCheckError("1 mw-cron job still running: cron1")
+        return {"job1": 1.0}
+
+    with mock.patch.object(module, "_watch_jobs", side_effect=watch_jobs) as mocked_watch:
+        with pytest.raises(SpicerackCheckError, match="eqiad: 1 mw-cron job .*; codfw: 1 mw-cron job"):
+            module._wait_for_jobs_to_stop(  # pylint: disable=protected-access
+                {"eqiad": mock.MagicMock(), "codfw": mock.MagicMock()}, dry_run=False)
+
+    assert mocked_watch.call_count == 4
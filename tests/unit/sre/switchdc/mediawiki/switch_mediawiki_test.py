@@ -0,0 +1,94 @@
+"""sre.switchdc.mediawiki.04-switch-mediawiki tests."""
+import importlib
+from argparse import Namespace
+from unittest import mock
+
+import pytest
+from spicerack.dnsdisc import DiscoveryError
+
+from cookbooks.sre.switchdc.mediawiki import MEDIAWIKI_SERVICES
+
+module = importlib.import_module("cookbooks.sre.switchdc.mediawiki.04-switch-mediawiki")
+
+NAMESERVERS = {"dns1004": "10.64.0.1", "dns2004": "10.192.0.1"}
+OLD_ADDRESS = "10.2.2.1"
+NEW_ADDRESS = "10.2.1.1"
+
+
+def get_discovery(answers):
+    """Return a mocked Discovery class whose instances resolve the records with the given answers, in order.
+
+    Arguments:
+        answers: the addresses or exceptions to return for each record, keyed by (record, nameserver).
+
+    """
+    def discovery(*, conftool, authdns_servers, records, dry_run):  # pylint: disable=unused-argument
+        (nameserver,) = authdns_servers
+
+        def resolve(record):
+            answer = answers[(record, nameserver)].pop(0)
+            if isinstance(answer, Exception):
+                raise answer
+            yield [mock.MagicMock(address=answer)]
+
+        instance = mock.MagicMock()
+        instance.resolve.side_effect = resolve
+        return instance
+
+    return mock.MagicMock(side_effect=discovery)
+
+
+@pytest.fixture(name="runner")
+def fixture_runner():
+    """Return a runner switching to codfw with two authoritative nameservers."""
+    spicerack = mock.MagicMock(dry_run=False, authdns_servers=NAMESERVERS)
+    args = Namespace(dc_from="eqiad", dc_to="codfw", ro_reason="maintenance", live_test=False, task_id=None)
+    return module.SwitchMediaWikiRunner(args, spicerack)
+
+
+@pytest.fixture(name="sleep", autouse=True)
+def fixture_sleep():
+    """Do not actually sleep between the attempts."""
+    with mock.patch.object(module.time, "sleep") as mocked_sleep:
+        yield mocked_sleep
+
+
+def check_records(runner, answers):
+    """Run the check of the records with the given answers, returning the mocked Discovery class."""
+    discovery = get_discovery(answers)
+    dnsdisc_records = mock.MagicMock()
+    dnsdisc_records.resolve_address.return_value = NEW_ADDRESS
+    with mock.patch.object(module, "Discovery", discovery):
+        runner._check_records(dnsdisc_records)  # pylint: disable=protected-access
+
+    return discovery
+
+
+def test_check_records_retries_only_stale_pairs(runner, sleep):
+    """It should resolve all the pairs once and then retry only the ones still resolving to the old address."""
+    answers = {(record, nameserver): [NEW_ADDRESS] for record in MEDIAWIKI_SERVICES for nameserver in NAMESERVERS}
+    answers[("mw-web", "dns2004")] = [OLD_ADDRESS, DiscoveryError("timeout"), NEW_ADDRESS]
+    discovery = check_records(runner, answers)
+
+    assert all(not remaining for remaining in answers.values())
+    assert sleep.call_args_list == [mock.call(module.RECORD_CHECK_DELAY)] * 2
+    # The records are resolved through a Discovery instance per nameserver
+    assert [call.kwargs["authdns_servers"] for call in discovery.call_args_list] == [
+        {nameserver: address} for nameserver, address in NAMESERVERS.items()]
+
+
+def test_check_records_stale_after_all_tries(runner):
+    """It should raise with the pairs still resolving to the wrong address after all the attempts."""
+    answers = {(record, nameserver): [NEW_ADDRESS] for record in MEDIAWIKI_SERVICES for nameserver in NAMESERVERS}
+    answers[("mw-web", "dns1004")] = [OLD_ADDRESS] * module.RECORD_CHECK_TRIES
+    with pytest.raises(DiscoveryError, match=r"wrong address: \[\('mw-web', 'dns1004'\)\]"):
+        check_records(runner, answers)
+
+
+def test_check_records_dry_run(runner, sleep):
+    """It should not retry nor fail on the stale records in DRY-RUN mode."""
+    runner.spicerack.dry_run = True
+    answers = {(record, nameserver): [OLD_ADDRESS] for record in MEDIAWIKI_SERVICES for nameserver in NAMESERVERS}
+    check_records(runner, answers)
+
+    sleep.assert_not_called()
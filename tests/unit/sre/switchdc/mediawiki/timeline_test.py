@@ -0,0 +1,71 @@
+"""sre.switchdc.mediawiki Timeline tests."""
+import pytest
+
+from cookbooks.sre.switchdc.mediawiki import OPERATOR_GAP_SECONDS, Timeline
+
+
+def step(name, start, end, **operations):
+    """Return a recorded step with the given operations, all starting at the step start."""
+    return {
+        "step": name,
+        "start": start,
+        "end": end,
+        "outcome": "SUCCESS",
+        "operations": [{"name": op, "start": start, "duration": duration} for op, duration in operations.items()],
+    }
+
+
+@pytest.fixture(name="timeline")
+def fixture_timeline(tmp_path):
+    """Return a timeline of a real switchover with two steps."""
+    timeline = Timeline.load("eqiad", "codfw", dry_run=False, base_dir=tmp_path)
+    timeline.record_step(step("02-set-readonly", 100.0, 112.0, readonly=1.0, wait=10.0))
+    timeline.record_step(step("07-set-readwrite", 152.0, 154.0, readwrite=2.0))
+    return timeline
+
+
+def test_durations(timeline):
+    """It should split the read-only window into operations, untracked time and operator gaps."""
+    assert timeline.read_only_window == 54.0
+    assert timeline.durations() == [
+        ("02-set-readonly", "readonly", 1.0),
+        ("02-set-readonly", "wait", 10.0),
+        ("02-set-readonly", "(other)", 1.0),
+        ("07-set-readwrite", "(operator)", 40.0),
+        ("07-set-readwrite", "readwrite", 2.0),
+        ("07-set-readwrite", "(other)", 0.0),
+    ]
+
+
+def test_critical_path_report(timeline):
+    """It should report the largest contributors first."""
+    report = timeline.critical_path_report()
+    assert report.startswith("Read-only window of 54.0s across 02-set-readonly, 07-set-readwrite:")
+    lines = report.splitlines()
+    assert "(operator)" in lines[4] and "74.1%" in lines[4]
+    assert "wait" in lines[5]
+
+
+def test_save_load_and_restart(timeline, tmp_path):
+    """It should persist the steps, a re-run replacing the step and the first step starting a new timeline."""
+    timeline.record_step(step("07-set-readwrite", 160.0, 161.0))
+    timeline.save()
+    loaded = Timeline.load("eqiad", "codfw", dry_run=False, base_dir=tmp_path)
+    assert [recorded["step"] for recorded in loaded.steps] == ["02-set-readonly", "07-set-readwrite"]
+    assert loaded.read_only_window == 61.0
+
+    loaded.record_step(step("02-set-readonly", 200.0, 201.0))
+    assert [recorded["step"] for recorded in loaded.steps] == ["02-set-readonly"]
+
+
+@pytest.mark.parametrize("with_reference", (True, False))
+def test_estimate(timeline, tmp_path, with_reference):
+    """It should take the reference timings when available and the stand-in operator gap otherwise."""
+    rehearsal = Timeline.load("eqiad", "codfw", dry_run=True, base_dir=tmp_path)
+    assert rehearsal.path != timeline.path
+    rehearsal.record_step(step("02-set-readonly", 0.0, 10.5, readonly=0.1, wait=10.0))
+    rehearsal.record_step(step("07-set-readwrite", 11.0, 11.1, readwrite=0.1))
+
+    rows = dict(((s, op), duration) for s, op, duration in rehearsal.estimate(timeline if with_reference else None))
+    assert rows[("02-set-readonly", "readonly")] == (1.0 if with_reference else 0.1)
+    assert rows[("07-set-readwrite", "(operator)")] == (40.0 if with_reference else OPERATOR_GAP_SECONDS)
@@ -23,7 +23,7 @@ def test_raises_when_transferpy_reports_failure():
     """A failed transfer must abort before data_loaded, Kafka offsets, and repooling."""
     runner = make_runner()
 
-    with mock.patch.object(data_transfer, "Transferer") as transferer:
+    with mock.patch("transferpy.Transferer.Transferer") as transferer:
         transferer.return_value.run.return_value = [-1]
 
         with pytest.raises(RuntimeError, match="wikidata.jnl"):
@@ -35,7 +35,7 @@ def test_transfers_every_file_when_all_succeed():
     runner = make_runner()
     files = ["/srv/wdqs/wikidata.jnl", "/srv/wdqs/data_loaded"]
 
-    with mock.patch.object(data_transfer, "Transferer") as transferer:
+    with mock.patch("transferpy.Transferer.Transferer") as transferer:
         transferer.return_value.run.return_value = [0]
 
         runner.transfer_datafiles("/srv/wdqs", files)
@@ -47,7 +47,7 @@ def test_stops_at_the_first_failed_file():
     """Remaining files must not be transferred once one has failed."""
     runner = make_runner()
 
-    with mock.patch.object(data_transfer, "Transferer") as transferer:
+    with mock.patch("transferpy.Transferer.Transferer") as transferer:
         transferer.return_value.run.side_effect = [[0], [2], [0]]
 
         with pytest.raises(RuntimeError, match="aliases.map"):
@@ -63,7 +63,7 @@ def test_transferpy_cumin_reporter_stays_off():
     """transferpy's internal commands must not bury the cookbook's own output."""
     runner = make_runner()
 
-    with mock.patch.object(data_transfer, "Transferer") as transferer:
+    with mock.patch("transferpy.Transferer.Transferer") as transferer:
         transferer.return_value.run.return_value = [0]
 
         runner.transfer_datafiles("/srv/wdqs", ["/srv/wdqs/wikidata.jnl"])
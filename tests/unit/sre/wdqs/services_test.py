@@ -0,0 +1,78 @@
+"""Unit tests for the sre.wdqs services dependency graph."""
+
+import threading
+
+from unittest import mock
+
+import pytest
+
+from cookbooks.sre.wdqs import get_installed_services, restart_services, start_services
+
+
+class RecordingHosts:
+    """Record the commands run on the hosts, from any thread."""
+
+    def __init__(self, barrier_commands=()):
+        """Initialize the instance, the barrier_commands must all be running at the same time to proceed."""
+        self.commands = []
+        self._lock = threading.Lock()
+        self._barrier_commands = set(barrier_commands)
+        self._barrier = threading.Barrier(len(self._barrier_commands) or 1, timeout=5)
+
+    def run_sync(self, *commands, **_kwargs):
+        """Record the commands."""
+        with self._lock:
+            self.commands.extend(commands)
+        if self._barrier_commands.intersection(commands):
+            self._barrier.wait()
+        return []
+
+
+def test_restart_services_order():
+    """It should stop the updater first and start it only once Blazegraph is healthy."""
+    hosts = RecordingHosts()
+    durations = restart_services(hosts, ["wdqs-blazegraph", "wdqs-updater"])
+
+    assert hosts.commands == [
+        "systemctl stop wdqs-updater",
+        "systemctl stop wdqs-blazegraph",
+        "systemctl start wdqs-blazegraph",
+        "systemctl is-active --quiet wdqs-blazegraph",
+        "curl -sf -o /dev/null http://localhost:9999/bigdata/status",
+        "systemctl start wdqs-updater",
+        "systemctl is-active --quiet wdqs-updater",
+    ]
+    assert set(durations) == {"wdqs-blazegraph", "wdqs-updater"}
+
+
+def test_start_services_independent_concurrently():
+    """It should start the independent services at the same time."""
+    hosts = RecordingHosts(barrier_commands=("systemctl start wdqs-blazegraph", "systemctl start wdqs-categories"))
+    start_services(hosts, ["wdqs-blazegraph", "wdqs-categories", "wdqs-updater"])
+
+    assert hosts.commands.index("systemctl start wdqs-updater") > max(
+        hosts.commands.index("curl -sf -o /dev/null http://localhost:9999/bigdata/status"),
+        hosts.commands.index("curl -sf -o /dev/null http://localhost:9990/bigdata/status"),
+    )
+
+
+def test_start_services_failure():
+    """It should not start the dependent services if a dependency fails to start."""
+    hosts = mock.MagicMock()
+    hosts.run_sync.side_effect = RuntimeError("failed")
+
+    with pytest.raises(RuntimeError, match="failed"):
+        start_services(hosts, ["wcqs-blazegraph", "wcqs-updater"])
+
+    hosts.run_sync.assert_called_once_with("systemctl start wcqs-blazegraph", print_progress_bars=False)
+
+
+def test_get_installed_services():
+    """It should return only the services with a systemd unit, in the given order."""
+    host = mock.MagicMock()
+    output = mock.MagicMock()
+    output.message.return_value = b"wdqs-updater.service enabled enabled\nwdqs-blazegraph.service enabled enabled\n"
+    host.run_sync.return_value = [("wdqs1001.eqiad.wmnet", output)]
+
+    installed = get_installed_services(host, ["wdqs-blazegraph", "wdqs-categories", "wdqs-updater"])
+    assert installed == ["wdqs-blazegraph", "wdqs-updater"]
@@ -0,0 +1,131 @@
+"""Unit tests for the concurrent maintain-views runs on the wikireplicas."""
+import threading
+from unittest import mock
+
+import pytest
+from cumin import NodeSet
+from spicerack.remote import RemoteExecutionError
+
+from cookbooks.sre.wikireplicas import DEPOOL_GRACE_SLEEP, MaintainViews, list_databases
+
+HOSTS = ["clouddb1013.eqiad.wmnet", "clouddb1014.eqiad.wmnet", "clouddb1015.eqiad.wmnet"]
+DATABASES = "s1 enwiki\ns1 enwiki_p\ns1 heartbeat\ns1 heartbeat_p\ns1 mysql\ns2 itwiki\ns2 itwiki_p\ns2 meta_p\n"
+
+
+def get_output(message):
+    """Return a mocked run_sync() result with the given message."""
+    output = mock.MagicMock()
+    output.message.return_value = message.encode()
+    return [(NodeSet("clouddb1013.eqiad.wmnet"), output)]
+
+
+class Host:
+    """A mocked wikireplica host recording the commands run and how many hosts are depooled at the same time."""
+
+    depooled = 0
+    max_depooled = 0
+    lock = threading.Lock()
+
+    def __init__(self, name, databases=DATABASES, fail=False):
+        """Initialize the host."""
+        self.name = name
+        self.databases = databases
+        self.fail = fail
+        self.commands = []
+        self.run_sync = mock.MagicMock(side_effect=self._run_sync)
+
+    def __str__(self):
+        """Return the host name."""
+        return self.name
+
+    def _run_sync(self, command, **_kwargs):
+        """Run a mocked command."""
+        self.commands.append(command)
+        if command == "depool":
+            with Host.lock:
+                Host.depooled += 1
+                Host.max_depooled = max(Host.max_depooled, Host.depooled)
+        elif command == "pool":
+            with Host.lock:
+                Host.depooled -= 1
+        elif "SHOW DATABASES" in command:
+            return get_output(self.databases)
+        elif command.startswith("for db in"):
+            threading.Event().wait(0.02)  # time.sleep() is mocked
+            if self.fail:
+                raise RemoteExecutionError(1, "failed", iter(get_output("ERROR")))
+            databases = command.split(";")[0].split()[3:]
+            return get_output("\n".join(f"maintain-views-duration {db} 1000000000" for db in databases))
+        return []
+
+
+@pytest.fixture(name="hosts")
+def fixture_hosts():
+    """Return the mocked hosts, resetting the depool counters."""
+    Host.depooled = Host.max_depooled = 0
+    return [Host(name) for name in HOSTS]
+
+
+def get_remote_hosts(hosts):
+    """Return a mocked RemoteHosts that splits into the given hosts."""
+    remote_hosts = mock.MagicMock(__len__=mock.MagicMock(return_value=len(hosts)))
+    remote_hosts.split.return_value = iter(hosts)
+    return remote_hosts
+
+
+def test_list_databases():
+    """It should group the databases with views by section and return the ones without views."""
+    host = Host(HOSTS[0], databases=DATABASES + "s2 newwiki\n")
+    assert list_databases(host) == ({"s1": ["enwiki"], "s2": ["itwiki"]}, ["newwiki"])
+
+
+@mock.patch("cookbooks.sre.wikireplicas.time.sleep")
+def test_run_depools_each_host_once_keeping_one_pooled(mocked_sleep, hosts):
+    """It should depool each host once around its whole run, leaving at least one host pooled."""
+    spicerack = mock.MagicMock(dry_run=False)
+    results = MaintainViews(spicerack, "--replace", depool=True).run(get_remote_hosts(hosts))
+
+    assert Host.max_depooled == len(HOSTS) - 1
+    assert Host.depooled == 0
+    assert mocked_sleep.call_args_list == [mock.call(DEPOOL_GRACE_SLEEP)] * len(HOSTS)
+    for host in hosts:
+        assert host.commands[1] == "depool"
+        assert host.commands[-1] == "pool"
+        assert host.commands.count("depool") == 1
+        assert not any("--auto-depool" in command for command in host.commands)
+    assert all(result.durations == {"enwiki": 1.0, "itwiki": 1.0} for result in results)
+
+
+@mock.patch("cookbooks.sre.wikireplicas.time.sleep")
+def test_run_single_host_depooled(_mocked_sleep):
+    """It should depool a single host alone."""
+    Host.depooled = Host.max_depooled = 0
+    host = Host(HOSTS[0])
+    MaintainViews(mock.MagicMock(dry_run=False), "--replace", depool=True).run(get_remote_hosts([host]))
+
+    assert Host.max_depooled == 1
+    assert host.commands[-1] == "pool"
+
+
+def test_run_new_wiki_uses_all_databases(hosts):
+    """It should fall back to a single --all-databases run on the hosts with databases without views yet."""
+    hosts[0].databases = DATABASES + "s2 newwiki\n"
+    MaintainViews(mock.MagicMock(), "--replace").run(get_remote_hosts(hosts))
+
+    assert hosts[0].commands[1:] == ["maintain-views --replace --all-databases"]
+    assert hosts[1].commands[1].startswith("for db in")
+    assert "depool" not in hosts[0].commands
+
+
+@mock.patch("cookbooks.sre.wikireplicas.time.sleep")
+def test_run_failure_leaves_host_depooled(_mocked_sleep, hosts):
+    """It should leave the failed hosts depooled, repool the others and raise once all the hosts completed."""
+    hosts[1].fail = True
+    spicerack = mock.MagicMock(dry_run=False)
+    with pytest.raises(RemoteExecutionError, match="maintain-views failed on clouddb1014.eqiad.wmnet"):
+        MaintainViews(spicerack, "--replace", depool=True).run(get_remote_hosts(hosts))
+
+    assert "pool" not in hosts[1].commands
+    assert hosts[0].commands[-1] == hosts[2].commands[-1] == "pool"
+    spicerack.actions["clouddb1014.eqiad.wmnet"].failure.assert_any_call(
+        "**Left depooled, repool it with 'pool' once fixed**")